@@ -1,10 +1,16 @@
 import os
 import json
 import pandas as pd
-import chromadb
 import ollama
-from typing import Dict, List, Any, Tuple, Optional
+from typing import Callable, Dict, List, Any, Tuple, Optional
 from models.data_models import QueryContext, AgentResponse
+from utils.schema_fingerprint import is_current
+from utils.column_index import column_documents, rank_tables, sample_values
+from utils.column_descriptions import (DEFAULT_TOKEN_BUDGET, PENDING_DIR, WORKER_LOG_FILE, drain_pending,
+                                       fallback_description, get_column_describer, launch_worker, spool_pending)
+from utils.lexical_index import get_metadata_index, invalidate_metadata_index, table_terms
+from utils.hybrid_search import clear_winner, cross_encoder_scorer, reciprocal_rank_fusion, rerank
+from utils.metadata_store import metadata_collection
 from pathlib import Path
 import re
 
@@ -16,58 +22,45 @@ class MetadataIndexerAgent:
     """
     
     def __init__(self, llm_model="llama3.1", api_base="http://localhost:11434", 
-                 chroma_persist_dir="../data/db_storage"):
-        """Initialize the Metadata Indexer Agent with model and storage config."""
+                 chroma_persist_dir="../data/db_storage", background_descriptions=True,
+                 description_token_budget=DEFAULT_TOKEN_BUDGET, rerank_model=None,
+                 detach_descriptions=True):
+        """
+        Initialize the Metadata Indexer Agent with model and storage config.
+        
+        With background_descriptions, an uploaded table is indexed at once with
+        cached or placeholder column descriptions, and the LLM descriptions
+        replace them when ready. With detach_descriptions they are generated by
+        a detached worker process, so the upload process exits without waiting
+        for the LLM; otherwise by a thread of this process. rerank_model names a
+        local cross-encoder that reranks the hybrid search candidates (None to
+        skip reranking).
+        """
         self.llm_model = llm_model
         ollama.api_base = api_base
         self.chroma_persist_dir = chroma_persist_dir
+        self.background_descriptions = background_descriptions
+        self.detach_descriptions = detach_descriptions
+        self.pending_dir = os.path.join(chroma_persist_dir, PENDING_DIR)
+        # Key of the table metadata collection in the shared BM25 index cache
+        self.metadata_store = f"{os.path.abspath(chroma_persist_dir)}|tables"
+        self.rerank_model = rerank_model
+        self.describer = get_column_describer(llm_model, description_token_budget)
         
         # Ensure directory exists
         os.makedirs(chroma_persist_dir, exist_ok=True)
         
-        # We'll create separate ChromaDB clients for each user as needed
-        self.chroma_clients = {}
-        self.collections = {}
-        
     def _get_user_collection(self, user_id):
-        """Get or create a user-specific ChromaDB collection"""
-        if user_id in self.collections:
-            return self.collections[user_id]
-            
-        # Create user directory if it doesn't exist
-        user_dir = os.path.join(self.chroma_persist_dir, user_id)
-        os.makedirs(user_dir, exist_ok=True)
-        
-        # Create or get client for this user
-        if user_id not in self.chroma_clients:
-            try:
-                print(f"Creating ChromaDB client at path: {user_dir}")
-                self.chroma_clients[user_id] = chromadb.PersistentClient(path=user_dir)
-                print(f"ChromaDB client created successfully")
-            except Exception as e:
-                print(f"Error creating ChromaDB client: {str(e)}, {type(e).__name__}")
-                raise
-        
-        # Create or get collection for this user
+        """Get the table metadata collection shared by all users; reads must filter on user_id"""
         try:
-            print(f"Attempting to get collection: {user_id}_metadata")
-            collection = self.chroma_clients[user_id].get_collection(f"{user_id}_metadata")
-            print(f"Successfully retrieved existing collection")
+            return metadata_collection(self.chroma_persist_dir, "tables")
         except Exception as e:
-            print(f"Collection not found, error: {str(e)}, {type(e).__name__}")
-            try:
-                print(f"Attempting to create new collection: {user_id}_metadata")
-                collection = self.chroma_clients[user_id].create_collection(
-                    name=f"{user_id}_metadata",
-                    metadata={"hnsw:space": "cosine", "user_id": user_id}
-                )
-                print(f"Successfully created new collection")
-            except Exception as e:
-                print(f"Failed to create collection: {str(e)}, {type(e).__name__}")
-                raise
-            
-        self.collections[user_id] = collection
-        return collection
+            print(f"Failed to open the table metadata collection: {str(e)}, {type(e).__name__}")
+            raise
+    
+    def _get_column_collection(self, user_id):
+        """Get the column metadata collection shared by all users; reads must filter on user_id"""
+        return metadata_collection(self.chroma_persist_dir, "columns")
     
     def process(self, context: QueryContext) -> AgentResponse:
         """Process the context and handle metadata operations."""
@@ -84,8 +77,10 @@ class MetadataIndexerAgent:
             
             # Check if we have a CSV file to process (metadata extraction mode)
             if hasattr(context, 'csv_file') and context.csv_file:
-                # Extract metadata from CSV
-                metadata = self.extract_metadata_with_llm(context.csv_file)
+                # Extract metadata from CSV; in the background mode the LLM runs after indexing
+                metadata, samples, pending = self._extract_csv_metadata(
+                    context.csv_file, use_llm=not self.background_descriptions
+                )
                 
                 if not metadata:
                     return AgentResponse(
@@ -93,42 +88,79 @@ class MetadataIndexerAgent:
                         message=f"Failed to extract metadata from CSV file: {context.csv_file}"
                     )
                 
-                # Save metadata to user's ChromaDB
-                document_id = self.save_metadata_to_chroma(
-                    context.user_id, 
-                    metadata.get("table_name", context.table_name),
-                    metadata.get("columns", {})
-                )
+                # Save metadata to user's ChromaDB, with sample values for the column documents
+                table_name = metadata.get("table_name", context.table_name)
+                document_id = self.save_metadata_batch(
+                    context.user_id,
+                    {table_name: metadata.get("columns", {})},
+                    samples={table_name: samples} if samples else None
+                )[0]
                 
                 # Create log file in user's db directory
                 user_db_dir = os.path.join(self.chroma_persist_dir, context.user_id)
+                os.makedirs(user_db_dir, exist_ok=True)
                 log_file = os.path.join(user_db_dir, f"metadata_{Path(context.csv_file).stem}.json")
                 
                 # Save the complete metadata to the log file
+                log_entry = {
+                    "user_id": context.user_id,
+                    "table_name": table_name,
+                    "csv_file": context.csv_file,
+                    "document_id": document_id,
+                    "metadata": metadata,
+                    "descriptions": "pending" if pending else "complete"
+                }
                 with open(log_file, 'w') as f:
-                    json.dump({
-                        "user_id": context.user_id,
-                        "table_name": metadata.get("table_name", context.table_name),
-                        "csv_file": context.csv_file,
-                        "document_id": document_id,
-                        "metadata": metadata
-                    }, f, indent=2)
+                    json.dump(log_entry, f, indent=2)
+                
+                # The table is queryable now; the LLM descriptions replace the placeholders when ready
+                if pending and self.detach_descriptions:
+                    spool_pending(self.pending_dir, {
+                        "user_id": context.user_id, "table_name": table_name, "samples": samples,
+                        "log_file": log_file, "log_entry": log_entry
+                    })
+                    self._launch_description_worker()
+                elif pending:
+                    self.describer.describe_in_background(
+                        {table_name: samples},
+                        lambda descriptions: self._apply_descriptions(
+                            context.user_id, table_name, descriptions.get(table_name, {}), samples, log_file, log_entry
+                        )
+                    )
                 
                 return AgentResponse(
                     success=True,
                     message="Metadata extracted and saved successfully",
-                    data={"metadata": metadata, "document_id": document_id}
+                    data={"metadata": metadata, "document_id": document_id, "pending_descriptions": pending}
                 )
             
             # Otherwise, search for relevant metadata (query mode)
-            relevant_metadata = self.search_relevant_metadata(
-                context.user_id, context.user_question
-            )
+            # Vector, BM25 and column-hit rankings are fused; column hits also pick
+            # the columns worth describing in the prompt
+            search = self._hybrid_search(context.user_id, context.user_question)
+            candidates = search["candidates"]
+            relevant_metadata = None
+            
+            if candidates:
+                table_name = candidates[0]["table_name"]
+                # The metadata is shared with the cached index, so hand out a copy
+                relevant_metadata = dict(search["metadata"][table_name])
+                if search["columns"].get(table_name):
+                    relevant_metadata = dict(
+                        relevant_metadata,
+                        columns=search["columns"][table_name],
+                        column_descriptions=search["descriptions"].get(table_name, {})
+                    )
             
             return AgentResponse(
                 success=True,
                 message="Relevant metadata retrieved successfully",
-                data={"relevant_metadata": relevant_metadata}
+                data={
+                    "relevant_metadata": relevant_metadata,
+                    "table_ranking": [(candidate["table_name"], candidate["score"]) for candidate in candidates],
+                    "table_candidates": candidates,
+                    "clear_winner": search["clear_winner"]
+                }
             )
             
         except Exception as e:
@@ -147,123 +179,96 @@ class MetadataIndexerAgent:
         Returns:
             Dictionary containing table_name and columns with descriptions
         """
-        try:
-            # Read first few rows of CSV to analyze structure
-            df = pd.read_csv(csv_path, nrows=10)
+        return self._extract_csv_metadata(csv_path)[0]
+    
+    def _extract_csv_metadata(self, csv_path: str,
+                              use_llm: bool = True) -> Tuple[Dict[str, Any], Dict[str, List[str]], List[str]]:
+        """
+        Extract the table name, column descriptions and sample values of a CSV file.
+        
+        Args:
+            csv_path: Path to the CSV file
+            use_llm: Describe uncached columns with the LLM now; otherwise they get
+                placeholder descriptions
             
+        Returns:
+            Tuple of (metadata with table_name and columns, sample values per column,
+            columns still waiting for an LLM description)
+        """
+        # Get base name from the CSV file path - this will be our table name
+        base_table_name = Path(csv_path).stem
+        # Remove any numeric suffix that might be part of the file name
+        base_table_name = re.sub(r'_\d+$', '', base_table_name)
+        
+        try:
+            # Read the first rows of the CSV to get its columns and sample values
+            df = pd.read_csv(csv_path, nrows=500)
             print(f"Successfully loaded CSV with columns: {list(df.columns)}")
-            
-            # Get base name from the CSV file path - this will be our table name
-            base_table_name = Path(csv_path).stem
-            # Remove any numeric suffix that might be part of the file name
-            base_table_name = re.sub(r'_\d+$', '', base_table_name)
-            
-            print(f"Using base table name from file: {base_table_name}")
-            
-            # Try LLM approach for column descriptions only, but if it fails, use fallback
-            try:
-                # Get column data types and sample values
-                column_info = {}
-                for column in df.columns:
-                    data_type = str(df[column].dtype)
-                    sample_values = df[column].dropna().head(3).tolist()
-                    sample_values_str = ", ".join([str(val) for val in sample_values])
-                    column_info[column] = {
-                        "data_type": data_type,
-                        "sample_values": sample_values_str
-                    }
-                
-                # Generate sample data summary
-                column_summary = "\n".join([
-                    f"Column: {col}\nData Type: {info['data_type']}\nSample Values: {info['sample_values']}" 
-                    for col, info in column_info.items()
-                ])
-                
-                # Create improved prompt for LLM - only for column descriptions
-                prompt = f"""
-                Task: Analyze CSV data and generate clean, simple column descriptions
-
-                CSV File Analysis:
-                {column_summary}
-
-                Instructions:
-                1. The table name will be: "{base_table_name}" - DO NOT suggest a different name
-                2. For each column, provide a simple, clear description (max 10 words)
-                   - Focus on WHAT the column contains, not technical details
-                   - Use plain, non-technical language
-                   - Avoid mentioning data types, formats, or technical jargon
-
-                Response Format (JSON only):
-                {{
-                  "table_name": "{base_table_name}",
-                  "columns": {{
-                    "column1": "Simple description of what this contains",
-                    "column2": "Simple description of what this contains",
-                    ...
-                  }}
-                }}
-
-                Important Rules:
-                - Return ONLY valid JSON, no explanation or other text
-                - Use the exact table_name provided: "{base_table_name}"
-                - Keep descriptions very simple and clear
-                - Do NOT include data types in descriptions
-                - Do NOT use technical jargon or database terminology
-                - Descriptions should be readable by non-technical users
-                """
-                
-                print(f"Sending prompt to LLM model: {self.llm_model}")
-                
-                # Call LLM for inference
-                try:
-                    response = ollama.chat(
-                        model=self.llm_model,
-                        messages=[{"role": "user", "content": prompt}]
-                    )
-                    
-                    # Extract JSON from response
-                    content = response['message']['content']
-                    print(f"Received response from LLM")
-                    
-                    # Parse JSON response
-                    metadata = json.loads(content)
-                    
-                    # Validate the structure
-                    if not isinstance(metadata, dict):
-                        raise ValueError("Response is not a dictionary")
-                    
-                    if "table_name" not in metadata or "columns" not in metadata:
-                        raise ValueError("Response missing required keys")
-                    
-                    if not isinstance(metadata["columns"], dict):
-                        raise ValueError("Columns should be a dictionary")
-                    
-                    # Force the table name to be the base name from the file
-                    metadata["table_name"] = base_table_name
-                    
-                    print(f"Successfully parsed metadata with table_name: {metadata['table_name']}")
-                    return metadata
-                    
-                except Exception as e:
-                    print(f"Error with LLM: {str(e)}. Using fallback method.")
-                    return self._fallback_metadata_extraction(df, base_table_name)
-                    
-            except Exception as e:
-                print(f"Error preparing LLM prompt: {str(e)}. Using fallback method.")
-                return self._fallback_metadata_extraction(df, base_table_name)
-                
         except Exception as e:
             print(f"Error loading CSV: {str(e)}")
-            
-            # Use fallback method with default name
-            base_table_name = Path(csv_path).stem
-            # Remove any numeric suffix that might be part of the file name
-            base_table_name = re.sub(r'_\d+$', '', base_table_name)
-            
             return {
                 "table_name": base_table_name,
                 "columns": {"file": "CSV data file"}
-            }
+            }, {}, []
+        
+        print(f"Using base table name from file: {base_table_name}")
+        samples = {str(column): values for column, values in sample_values(df).items()}
+        
+        try:
+            if use_llm:
+                print(f"Describing columns with LLM model: {self.llm_model}")
+                columns = self.describer.describe({base_table_name: samples})[base_table_name]
+                pending = []
+            else:
+                cached = self.describer.cached({base_table_name: samples}).get(base_table_name, {})
+                columns = {column: cached.get(column, fallback_description(column)) for column in samples}
+                pending = [column for column in samples if column not in cached]
+        except Exception as e:
+            print(f"Error with LLM: {str(e)}. Using fallback method.")
+            return self._fallback_metadata_extraction(df, base_table_name), samples, []
+        
+        return {"table_name": base_table_name, "columns": columns}, samples, pending
+    
+    def _launch_description_worker(self):
+        """Start a detached main.py --describe-pending process for the spooled description runs."""
+        agent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        launch_worker(
+            [os.path.join(agent_dir, "main.py"), "--describe-pending"],
+            cwd=agent_dir,
+            log_path=os.path.join(self.pending_dir, WORKER_LOG_FILE)
+        )
+    
+    def describe_pending(self) -> int:
+        """
+        Generate the column descriptions of every spooled upload and save them.
+        
+        Runs in the worker process started after an upload; runs left behind by a
+        worker that died are picked up by the next one.
+        
+        Returns:
+            Number of tables described
+        """
+        def describe(run: Dict[str, Any]):
+            table_name = run["table_name"]
+            descriptions = self.describer.describe({table_name: run["samples"]})
+            self._apply_descriptions(run["user_id"], table_name, descriptions.get(table_name, {}),
+                                     run["samples"], run["log_file"], run["log_entry"])
+        
+        return drain_pending(self.pending_dir, describe)
+    
+    def _apply_descriptions(self, user_id: str, table_name: str, columns: Dict[str, str],
+                            samples: Dict[str, List[str]], log_file: str, log_entry: Dict[str, Any]):
+        """Replace the placeholder descriptions of an indexed table with generated ones."""
+        if not columns:
+            return
+        try:
+            self.save_metadata_batch(user_id, {table_name: columns}, samples={table_name: samples})
+            log_entry = dict(log_entry, metadata=dict(log_entry["metadata"], columns=columns), descriptions="complete")
+            with open(log_file, 'w') as f:
+                json.dump(log_entry, f, indent=2)
+            print(f"Saved generated column descriptions of {table_name} for user {user_id}")
+        except Exception as e:
+            print(f"Warning: Could not save generated column descriptions of {table_name}: {e}")
     
     def _fallback_metadata_extraction(self, df: pd.DataFrame, table_name: str) -> Dict[str, Any]:
         """
@@ -289,10 +294,10 @@ class MetadataIndexerAgent:
             "columns": columns
         }
     
-    def save_metadata_to_chroma(self, user_id: str, table_name: str, 
-                               columns: Dict[str, str]) -> str:
+    def _metadata_document(self, user_id: str, table_name: str, 
+                           columns: Dict[str, str]) -> Tuple[str, str, Dict[str, Any]]:
         """
-        Save table metadata to user-specific ChromaDB collection.
+        Build the document ID, text and metadata describing a table.
         
         Args:
             user_id: User identifier
@@ -300,11 +305,8 @@ class MetadataIndexerAgent:
             columns: Dictionary of column names and descriptions
             
         Returns:
-            Document ID of the saved metadata
+            Tuple of (document_id, document_text, metadata)
         """
-        # Get the collection for this user
-        collection = self._get_user_collection(user_id)
-        
         # Create document ID from user_id and table_name
         document_id = f"{table_name}_{user_id}"
         
@@ -324,43 +326,200 @@ class MetadataIndexerAgent:
             safe_col_name = f"col_{col_name.replace(' ', '_').replace('.', '_')}"
             metadata[safe_col_name] = str(col_desc)  # Ensure value is string
         
-        # Check if document already exists
+        return document_id, document_text, metadata
+    
+    def save_metadata_to_chroma(self, user_id: str, table_name: str, 
+                               columns: Dict[str, str]) -> str:
+        """
+        Save table metadata to user-specific ChromaDB collection.
+        
+        Args:
+            user_id: User identifier
+            table_name: Name of the table
+            columns: Dictionary of column names and descriptions
+            
+        Returns:
+            Document ID of the saved metadata
+        """
+        return self.save_metadata_batch(user_id, {table_name: columns})[0]
+    
+    def save_metadata_batch(self, user_id: str, tables: Dict[str, Dict[str, str]], 
+                            batch_size: int = 256,
+                            progress: Optional[Callable[[int, int], None]] = None,
+                            samples: Optional[Dict[str, Dict[str, List[Any]]]] = None) -> List[str]:
+        """
+        Save the metadata of many tables with one upsert per batch.
+        
+        Every batch is embedded in a single call instead of one get plus one
+        add or update per table. Each column is also saved as its own document
+        in the user's column collection.
+        
+        Args:
+            user_id: User identifier
+            tables: Dictionary of table name to its column descriptions
+            batch_size: Maximum number of tables per upsert
+            progress: Called with (tables saved, total tables) after every batch
+            samples: Dictionary of table name to sample values per column (optional)
+            
+        Returns:
+            Document IDs of the saved metadata, in the order of tables
+        """
+        # Get the collection for this user
+        collection = self._get_user_collection(user_id)
+        
+        documents = [self._metadata_document(user_id, table_name, columns) for table_name, columns in tables.items()]
+        total = len(documents)
+        
+        for start in range(0, total, batch_size):
+            batch = documents[start:start + batch_size]
+            ids = [document_id for document_id, _, _ in batch]
+            texts = [document_text for _, document_text, _ in batch]
+            try:
+                collection.upsert(ids=ids, documents=texts, metadatas=[metadata for _, _, metadata in batch])
+            except Exception as e:
+                print(f"Error while saving to ChromaDB: {e}")
+                try:
+                    # Fallback with even simpler metadata if needed
+                    collection.upsert(
+                        ids=ids,
+                        documents=texts,
+                        metadatas=[{
+                            "user_id": user_id,
+                            "table_name": metadata["table_name"],
+                            "columns_count": str(len(tables[metadata["table_name"]]))
+                        } for _, _, metadata in batch]
+                    )
+                except Exception as e2:
+                    print(f"Fallback save also failed: {e2}")
+                    raise
+            
+            self._save_column_documents(
+                user_id,
+                {metadata["table_name"]: tables[metadata["table_name"]] for _, _, metadata in batch},
+                samples or {},
+                batch_size
+            )
+            
+            invalidate_metadata_index(self.metadata_store, user_id)
+            
+            if progress:
+                progress(min(start + batch_size, total), total)
+        
+        return [document_id for document_id, _, _ in documents]
+    
+    def _save_column_documents(self, user_id: str, tables: Dict[str, Dict[str, str]],
+                               samples: Dict[str, Dict[str, List[Any]]], batch_size: int):
+        """Upsert the column documents of some tables; table-level metadata stays usable if this fails."""
+        documents = []
+        for table_name, columns in tables.items():
+            documents.extend(column_documents(user_id, table_name, columns, samples.get(table_name)))
+        if not documents:
+            return
+        
         try:
-            existing = collection.get(ids=[document_id])
-            if existing and existing['ids']:
-                # Update existing document
-                collection.update(
-                    ids=[document_id],
-                    documents=[document_text],
-                    metadatas=[metadata]
-                )
-            else:
-                # Create new document
-                collection.add(
-                    ids=[document_id],
-                    documents=[document_text],
-                    metadatas=[metadata]
+            collection = self._get_column_collection(user_id)
+            # Columns dropped from a re-indexed table must not keep matching
+            collection.delete(where={"$and": [
+                {"user_id": user_id}, {"table_name": {"$in": list(tables.keys())}}
+            ]})
+            for start in range(0, len(documents), batch_size):
+                batch = documents[start:start + batch_size]
+                collection.upsert(
+                    ids=[document_id for document_id, _, _ in batch],
+                    documents=[document_text for _, document_text, _ in batch],
+                    metadatas=[metadata for _, _, metadata in batch]
                 )
         except Exception as e:
-            print(f"Error while saving to ChromaDB: {e}")
-            # Attempt to add as new in case of error
-            try:
-                # Fallback with even simpler metadata if needed
-                simplified_metadata = {
-                    "user_id": user_id,
-                    "table_name": table_name,
-                    "columns_count": str(len(columns))
-                }
-                collection.add(
-                    ids=[document_id],
-                    documents=[document_text],
-                    metadatas=[simplified_metadata]
-                )
-            except Exception as e2:
-                print(f"Fallback save also failed: {e2}")
-                raise
+            print(f"Warning: Could not save column documents: {e}")
+    
+    def rank_tables_by_columns(self, user_id: str, query_text: str, top_k: int = 20) -> Dict[str, Any]:
+        """
+        Rank the user's tables by the column documents closest to the query.
         
-        return document_id
+        Args:
+            user_id: User identifier
+            query_text: Natural language query text
+            top_k: Number of column hits to aggregate
+            
+        Returns:
+            Dictionary with "tables" ([(table, score)], best first), "columns" (table to
+            matching columns) and "descriptions" (table to column descriptions)
+        """
+        try:
+            return rank_tables(self._get_column_collection(user_id), user_id, query_text, top_k)
+        except Exception as e:
+            print(f"Error ranking tables by columns: {e}")
+            return {"tables": [], "columns": {}, "descriptions": {}}
+    
+    def _usable_metadata(self, metadata: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Return table metadata unless its table name is invalid or it describes an older schema."""
+        if not metadata:
+            return None
+        
+        # Skip if table name is empty or single letter
+        table_name = metadata.get('table_name', '')
+        if not table_name or len(table_name) <= 1:
+            print(f"Found invalid table name in metadata: '{table_name}', skipping")
+            return None
+            
+        # Descriptions recorded for an older shape of the table may name columns that are gone
+        fingerprint = metadata.get('schema_fingerprint')
+        fingerprint_key = metadata.get('fingerprint_key')
+        if fingerprint and fingerprint_key and not is_current({fingerprint_key: fingerprint}):
+            print(f"Metadata for table {table_name} was recorded for an older schema, skipping")
+            return None
+            
+        print(f"Found relevant metadata for table: {table_name}")
+        return metadata
+    
+    def get_table_metadata(self, user_id: str, table_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the saved metadata of one table.
+        
+        Args:
+            user_id: User identifier
+            table_name: Name of the table
+            
+        Returns:
+            Dictionary containing the table metadata if found, None otherwise
+        """
+        try:
+            collection = self._get_user_collection(user_id)
+            results = collection.get(ids=[f"{table_name}_{user_id}"], include=["metadatas"])
+            if not results or not results['ids']:
+                return None
+            return self._usable_metadata(results['metadatas'][0])
+        except Exception as e:
+            print(f"Error getting metadata for table {table_name}: {e}")
+            return None
+    
+    def record_fingerprint(self, user_id: str, document_id: str, physical_table: str, fingerprint: str,
+                           fingerprint_key: Optional[str] = None):
+        """
+        Record the schema fingerprint of the table a metadata document describes.
+        
+        Args:
+            user_id: User identifier
+            document_id: Document ID returned by save_metadata_to_chroma
+            physical_table: Name of the loaded table
+            fingerprint: Schema fingerprint of the loaded table
+            fingerprint_key: Key the table's fingerprint is published under (engine, schema, table)
+        """
+        try:
+            collection = self._get_user_collection(user_id)
+            existing = collection.get(ids=[document_id], include=["metadatas"])
+            if not existing or not existing['ids']:
+                return
+            
+            metadata = dict(existing['metadatas'][0] or {})
+            metadata["physical_table"] = physical_table
+            metadata["schema_fingerprint"] = fingerprint
+            if fingerprint_key:
+                metadata["fingerprint_key"] = fingerprint_key
+            collection.update(ids=[document_id], metadatas=[metadata])
+            invalidate_metadata_index(self.metadata_store, user_id)
+        except Exception as e:
+            print(f"Warning: Could not record schema fingerprint for {document_id}: {e}")
     
     def search_relevant_metadata(self, user_id: str, query_text: str) -> Optional[Dict[str, Any]]:
         """
@@ -373,33 +532,108 @@ class MetadataIndexerAgent:
         Returns:
             Dictionary containing relevant metadata if found, None otherwise
         """
+        search = self._hybrid_search(user_id, query_text)
+        if search["candidates"]:
+            return dict(search["metadata"][search["candidates"][0]["table_name"]])
+        return None
+    
+    def search_relevant_tables(self, user_id: str, query_text: str, top_k: int = 10) -> Dict[str, Any]:
+        """
+        Rank the user's tables for a query with hybrid retrieval.
+        
+        Args:
+            user_id: User identifier
+            query_text: Natural language query text
+            top_k: Candidates taken from every retriever
+            
+        Returns:
+            Dictionary with "candidates" (best first, each with "table_name", the fused
+            "score", per-retriever "ranks" and "rerank_score" when reranked) and
+            "clear_winner" (whether the first candidate clearly beats the rest)
+        """
+        search = self._hybrid_search(user_id, query_text, top_k)
+        return {"candidates": search["candidates"], "clear_winner": search["clear_winner"]}
+    
+    def _hybrid_search(self, user_id: str, query_text: str, top_k: int = 10) -> Dict[str, Any]:
+        """
+        Fuse vector search over the table documents, BM25 over table names, column
+        names and descriptions, and column-document hits with reciprocal rank fusion,
+        then optionally rerank the top candidates with a cross-encoder.
+        
+        Returns:
+            Dictionary with "candidates", "clear_winner", "metadata" (table to its
+            metadata) and the "columns" and "descriptions" of the column ranking
+        """
+        empty = {"candidates": [], "clear_winner": False, "metadata": {}, "columns": {}, "descriptions": {}}
         try:
-            # Get the collection for this user
             collection = self._get_user_collection(user_id)
-            
-            # Search for relevant metadata
+            # Built once per user and reused until their metadata is written again
+            index, (metadata_by_table, documents) = get_metadata_index(
+                self.metadata_store, user_id, lambda: self._load_metadata_terms(collection, user_id)
+            )
+        except Exception as e:
+            print(f"Error searching metadata: {str(e)}")
+            return empty
+        
+        if not metadata_by_table:
+            return empty
+        
+        rankings = {}
+        try:
             results = collection.query(
                 query_texts=[query_text],
-                n_results=1
+                n_results=min(top_k, len(metadata_by_table)),
+                where={"user_id": user_id}
             )
-            
-            if results and results['metadatas'] and len(results['metadatas']) > 0:
-                metadata = results['metadatas'][0]
-                
-                # Skip if table name is empty or single letter
-                table_name = metadata.get('table_name', '')
-                if not table_name or len(table_name) <= 1:
-                    print(f"Found invalid table name in metadata: '{table_name}', skipping")
-                    return None
-                    
-                print(f"Found relevant metadata for table: {table_name}")
-                return metadata
-            
-            return None
-            
+            rankings["vector"] = [metadata.get("table_name") for metadata in results["metadatas"][0] if metadata]
         except Exception as e:
-            print(f"Error searching metadata: {str(e)}")
-            return None
+            print(f"Vector search failed, ranking tables lexically: {e}")
+        
+        rankings["lexical"] = [table_name for table_name, _ in index.search(query_text, top_k)]
+        
+        column_ranking = self.rank_tables_by_columns(user_id, query_text)
+        rankings["columns"] = [table_name for table_name, _ in column_ranking["tables"][:top_k]]
+        
+        candidates = [
+            candidate for candidate in reciprocal_rank_fusion(rankings)
+            if candidate["table_name"] in metadata_by_table
+        ]
+        if self.rerank_model and len(candidates) > 1:
+            scorer = cross_encoder_scorer(self.rerank_model)
+            if scorer:
+                candidates = rerank(query_text, candidates, documents, scorer, top_n=top_k)
+        
+        # The best candidate must describe the current schema of its table
+        while candidates and self._usable_metadata(metadata_by_table[candidates[0]["table_name"]]) is None:
+            candidates.pop(0)
+        
+        return {
+            "candidates": candidates[:top_k],
+            "clear_winner": clear_winner(candidates),
+            "metadata": metadata_by_table,
+            "columns": column_ranking["columns"],
+            "descriptions": column_ranking["descriptions"]
+        }
+    
+    def _load_metadata_terms(self, collection, user_id: str) -> Tuple[Dict[str, List[str]], Tuple[Dict, Dict]]:
+        """
+        Read a user's table metadata documents for the BM25 index.
+        
+        Returns:
+            Tuple of table name to its BM25 terms, and (table name to metadata,
+            table name to document text)
+        """
+        stored = collection.get(where={"user_id": user_id}, include=["metadatas", "documents"])
+        terms, metadata_by_table, documents = {}, {}, {}
+        for metadata, document in zip(stored["metadatas"] or [], stored["documents"] or []):
+            if metadata and metadata.get("table_name"):
+                table_name = metadata["table_name"]
+                metadata_by_table[table_name] = metadata
+                documents[table_name] = document or ""
+                columns = [col for col in (metadata.get("columns_list") or "").split(",") if col]
+                descriptions = {key[len("col_"):]: value for key, value in metadata.items() if key.startswith("col_")}
+                terms[table_name] = table_terms(table_name, columns, descriptions, user_id)
+        return terms, (metadata_by_table, documents)
     
     def list_user_tables(self, user_id: str) -> List[Dict[str, Any]]:
         """
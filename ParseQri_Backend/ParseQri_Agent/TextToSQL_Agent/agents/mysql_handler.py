@@ -2,11 +2,14 @@ import os
 import pandas as pd
 import numpy as np
 import sqlalchemy
-from sqlalchemy import Column, MetaData, Table, create_engine, text, inspect
+from sqlalchemy import Column, MetaData, Table, create_engine, text
 from sqlalchemy.engine import Engine
 from sqlalchemy.sql import select
 from typing import Dict, List, Any, Optional, Tuple
 from models.data_models import QueryContext, AgentResponse
+from utils.schema_catalog import get_schema_catalog
+from utils.value_index import get_value_index, save_value_index, index_dataframe
+from utils.schema_fingerprint import bump_ingest_generation, table_fingerprint, table_key
 
 class MySQLHandlerAgent:
     """
@@ -69,7 +72,11 @@ class MySQLHandlerAgent:
                 return AgentResponse(
                     success=True,
                     message=f"Data loaded successfully into MySQL table {table_name}",
-                    data={"table_name": table_name}
+                    data={
+                        "table_name": table_name,
+                        "schema_fingerprint": table_fingerprint(self.engine, table_name, self.schema),
+                        "fingerprint_key": table_key(self.engine, table_name, self.schema)
+                    }
                 )
             
             # For SQL query execution (check if query has user_id condition)
@@ -152,8 +159,7 @@ class MySQLHandlerAgent:
             # Create table in MySQL
             with self.engine.connect() as conn:
                 # Check if table exists
-                inspector = inspect(self.engine)
-                if qualified_table_name in inspector.get_table_names(schema=self.schema):
+                if get_schema_catalog().has_table(self.engine, qualified_table_name, self.schema):
                     # Drop existing table
                     conn.execute(text(f'DROP TABLE IF EXISTS `{self.schema}`.`{qualified_table_name}`'))
                     conn.commit()
@@ -178,6 +184,18 @@ class MySQLHandlerAgent:
                 except Exception as idx_error:
                     print(f"Warning: Could not create index on user_id: {idx_error}")
             
+            # The table list and columns changed, make every agent reload them
+            get_schema_catalog().invalidate(self.engine, self.schema, qualified_table_name)
+            # Reloading changes the table's fingerprint even when its columns stay the same
+            bump_ingest_generation(table_key(self.engine, qualified_table_name, self.schema))
+            
+            # Index categorical values from the DataFrame we already have in memory
+            try:
+                value_index = get_value_index(user_id, self.schema)
+                save_value_index(user_id, index_dataframe(value_index, qualified_table_name, df), self.schema)
+            except Exception as value_error:
+                print(f"Warning: Could not index column values: {value_error}")
+            
             return True, "Table created and populated successfully", qualified_table_name
             
         except Exception as e:
@@ -283,24 +301,23 @@ class MySQLHandlerAgent:
         """
         try:
             tables = []
-            with self.engine.connect() as conn:
-                # Get all tables
-                inspector = inspect(self.engine)
-                all_tables = inspector.get_table_names(schema=self.schema)
-                
-                # Filter tables by user_id prefix
-                for table in all_tables:
-                    if table.startswith(f"{user_id}_"):
-                        tables.append(table)
-                        
-                        # Get column information for verbose output
-                        try:
-                            columns = inspector.get_columns(table, schema=self.schema)
-                            column_names = [col['name'] for col in columns]
-                            print(f"  Table {table}: {len(column_names)} columns - {', '.join(column_names[:5])}" + 
-                                 ("..." if len(column_names) > 5 else ""))
-                        except Exception as col_err:
-                            print(f"  Error fetching columns for {table}: {col_err}")
+            # Get all tables
+            catalog = get_schema_catalog()
+            all_tables = catalog.table_names(self.engine, self.schema)
+            
+            # Filter tables by user_id prefix
+            for table in all_tables:
+                if table.startswith(f"{user_id}_"):
+                    tables.append(table)
+                    
+                    # Get column information for verbose output
+                    try:
+                        columns = catalog.get_columns(self.engine, table, schema=self.schema)
+                        column_names = [col['name'] for col in columns]
+                        print(f"  Table {table}: {len(column_names)} columns - {', '.join(column_names[:5])}" + 
+                             ("..." if len(column_names) > 5 else ""))
+                    except Exception as col_err:
+                        print(f"  Error fetching columns for {table}: {col_err}")
             
             return tables
             
@@ -1,32 +1,53 @@
 import os
 import joblib
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 from models.data_models import QueryContext, AgentResponse
+from utils.query_templates import QueryTemplateStore, bound_sql_issues
+from utils.cache_backend import get_cache_backend
+from utils.schema_fingerprint import is_current
+from utils.value_index import get_value_index
+
+QUERY_NAMESPACE = "query"
+TEMPLATE_NAMESPACE = "template"
+HISTORY_NAMESPACE = "history"
+MAX_HISTORY_PER_USER = 1000
 
 class QueryCacheAgent:
     """
     Agent responsible for caching and retrieving previous queries.
     Helps improve performance by reusing results for repeated queries.
+    Questions that only differ in literals are answered from learned templates.
+    Entries live in the shared cache backend, scoped by user, and record the
+    schema fingerprints of the tables their SQL was generated for.
     """
     
-    def __init__(self, cache_dir: str = "cache"):
+    def __init__(self, cache_dir: str = "cache", use_templates: bool = True, redis_url: str = None,
+                 value_schema: str = None):
         """
         Initialize the Query Cache Agent.
         
         Args:
             cache_dir: Directory to store cache files
+            use_templates: Whether to learn and bind parameterized query templates
+            redis_url: Optional Redis URL for a shared cache (defaults to REDIS_URL)
+            value_schema: Schema whose value index string template values are checked against
+                (the orchestrator fills it in from the schema understanding agent)
         """
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(exist_ok=True)
-        self.query_cache = {}
+        self.backend = get_cache_backend(persist_dir=str(self.cache_dir), redis_url=redis_url)
+        self.use_templates = use_templates
+        self.value_schema = value_schema
+        self.template_store = QueryTemplateStore()
+        self._template_users_loaded = set()
         self._load_cache()
         
     def process(self, context: QueryContext) -> AgentResponse:
         """Process the query context to check for cached queries."""
         try:
             # Look for a cached query
-            cached_query = self.get_cached_query(context.user_question)
+            cached_query = self.get_cached_query(context.user_question, context.user_id)
             
             if cached_query:
                 return AgentResponse(
@@ -37,6 +58,25 @@ class QueryCacheAgent:
                         "sql_query": cached_query
                     }
                 )
+            
+            # Look for a template with the same question shape
+            template_match = self.match_template(context.user_id, context.user_question)
+            
+            if template_match:
+                template_key, template_query = template_match
+                template = self.template_store.get(context.user_id, template_key) or {}
+                return AgentResponse(
+                    success=True,
+                    message="Query built from cached template",
+                    data={
+                        "cache_hit": True,
+                        "template_hit": True,
+                        "template_key": template_key,
+                        # Bound SQL is validated against the schema the template was learned for
+                        "schema": template.get("schema"),
+                        "sql_query": template_query
+                    }
+                )
             else:
                 return AgentResponse(
                     success=True,
@@ -54,7 +94,7 @@ class QueryCacheAgent:
             
     def cache_query(self, context: QueryContext):
         """
-        Cache a successful query.
+        Cache a successful query and learn a template from it.
         
         Args:
             context: The query context containing the user question and SQL query
@@ -62,32 +102,197 @@ class QueryCacheAgent:
         if not context.sql_query:
             return
             
-        self.query_cache[context.user_question] = context.sql_query
-        self._save_cache()
+        entry = context.sql_query
+        if context.schema_fingerprints:
+            entry = {"sql_query": context.sql_query, "fingerprints": context.schema_fingerprints}
+        self.backend.set(QUERY_NAMESPACE, context.user_question, entry, user_id=context.user_id)
         
-    def get_cached_query(self, query_text: str) -> Optional[str]:
+        if self.use_templates:
+            self._load_templates(context.user_id)
+            template_key = self.template_store.learn(
+                context.user_id, context.user_question, context.sql_query, context.schema
+            )
+            if template_key and self.template_store.take_changed(context.user_id):
+                print(f"Learned query template: {template_key}")
+                self._save_templates(context.user_id)
+        
+    def get_cached_query(self, query_text: str, user_id: str = None) -> Optional[str]:
         """
         Retrieve a cached SQL query for a given natural language query.
         
         Args:
             query_text: The natural language query
+            user_id: User the query was cached for
             
         Returns:
-            The cached SQL query or None if not found
+            The cached SQL query or None if not found or its tables changed shape
         """
-        return self.query_cache.get(query_text)
+        cached_query = self.backend.get(QUERY_NAMESPACE, query_text, user_id=user_id)
+        if cached_query is None and user_id:
+            # Entries from the old unscoped cache file live in the global scope
+            cached_query = self.backend.get(QUERY_NAMESPACE, query_text)
         
-    def _save_cache(self):
-        """Save the cache to disk."""
-        cache_path = self.cache_dir / "query_cache.joblib"
-        joblib.dump(self.query_cache, cache_path)
+        if isinstance(cached_query, dict):
+            if not is_current(cached_query.get("fingerprints"), self.backend):
+                print(f"Cached query for '{query_text}' was built for an older schema, dropping it")
+                self.backend.delete(QUERY_NAMESPACE, query_text, user_id=user_id)
+                return None
+            cached_query = cached_query.get("sql_query")
+        return cached_query
+    
+    def record_history(self, context: QueryContext):
+        """
+        Count an answered question so it can be replayed when warming the cache.
+        
+        Args:
+            context: The query context of an answered question
+        """
+        if not context.user_question or not context.user_id:
+            return
+        
+        # History is kept per user in the global scope so all users can be listed
+        history = self.backend.get(HISTORY_NAMESPACE, context.user_id) or {}
+        entry = (context.table_name or "", context.user_question)
+        history[entry] = history.get(entry, 0) + 1
+        
+        if len(history) > MAX_HISTORY_PER_USER:
+            most_asked = sorted(history.items(), key=lambda item: item[1], reverse=True)
+            history = dict(most_asked[:MAX_HISTORY_PER_USER])
+        
+        self.backend.set(HISTORY_NAMESPACE, context.user_id, history)
+        
+    def get_top_questions(self, user_id: str, top_n: int = 10) -> List[Tuple[str, str]]:
+        """
+        Get the most frequently asked questions of a user, per table.
+        
+        Args:
+            user_id: User identifier
+            top_n: Number of questions to return for each table
+            
+        Returns:
+            List of (table_name, question) tuples, most asked first within each table
+        """
+        history = self.backend.get(HISTORY_NAMESPACE, user_id) or {}
+        by_table: Dict[str, List[Tuple[int, str]]] = {}
+        for (table_name, question), count in history.items():
+            by_table.setdefault(table_name, []).append((count, question))
+        
+        top_questions = []
+        for table_name, questions in by_table.items():
+            questions.sort(key=lambda item: item[0], reverse=True)
+            top_questions.extend((table_name, question) for _, question in questions[:top_n])
+        return top_questions
+    
+    def history_users(self) -> List[str]:
+        """List the users that have recorded question history."""
+        return self.backend.keys(HISTORY_NAMESPACE)
+    
+    def get_template_query(self, user_id: str, query_text: str) -> Optional[str]:
+        """
+        Build an SQL query for a question from a learned template.
+        
+        Args:
+            user_id: User identifier the templates were learned for
+            query_text: The natural language query
+            
+        Returns:
+            The bound SQL query or None if no template fits the question
+        """
+        match = self.match_template(user_id, query_text)
+        return match[1] if match else None
+    
+    def match_template(self, user_id: str, query_text: str) -> Optional[Tuple[str, str]]:
+        """
+        Find a learned template for a question and bind its literals.
+        
+        String values are only bound when the user's value index knows them for
+        the template's column, in their stored spelling. Hit counts are kept in
+        memory and saved with the next change to the user's templates.
+        
+        Args:
+            user_id: User identifier the templates were learned for
+            query_text: The natural language query
+            
+        Returns:
+            Tuple of (template key, bound SQL query), or None if no template fits
+        """
+        if not self.use_templates or not query_text:
+            return None
+        
+        self._load_templates(user_id)
+        match = self.template_store.match(user_id, query_text, self._value_resolver(user_id))
+        if match:
+            print(f"Bound question to cached template: {match[0]}")
+        return match
+    
+    def template_query_issues(self, user_id: str, template_key: str, sql_query: str) -> Optional[str]:
+        """
+        Check SQL bound from a template locally, without the LLM.
+        
+        Args:
+            user_id: User identifier the template was learned for
+            template_key: Key of the template
+            sql_query: SQL bound from the template
+            
+        Returns:
+            Description of the problem, or None if the SQL passes
+        """
+        template = self.template_store.get(user_id, template_key)
+        if not template:
+            return "template no longer exists"
+        return bound_sql_issues(template, sql_query)
+    
+    def forget_template(self, user_id: str, template_key: str):
+        """
+        Delete a template whose bound SQL failed validation or execution.
+        
+        Args:
+            user_id: User identifier the template was learned for
+            template_key: Key of the template
+        """
+        self._load_templates(user_id)
+        if self.template_store.forget(user_id, template_key):
+            print(f"Dropped query template: {template_key}")
+            self.template_store.take_changed(user_id)
+            self._save_templates(user_id)
+    
+    def _value_resolver(self, user_id: str):
+        """Function of (column, text) returning the stored spelling of a known column value, or None."""
+        index = get_value_index(user_id, self.value_schema, self.backend)
+        
+        def resolve(column: Optional[str], text: str) -> Optional[str]:
+            if not column:
+                return None
+            for _, indexed_column, value in index.lookup(text):
+                if indexed_column.lower() == column.lower():
+                    return value
+            return None
+        
+        return resolve
+    
+    def _load_templates(self, user_id: str):
+        """Load a user's templates from the cache backend once per process."""
+        if user_id in self._template_users_loaded:
+            return
+        templates = self.backend.get(TEMPLATE_NAMESPACE, "templates", user_id=user_id)
+        if templates:
+            self.template_store.import_user(user_id, templates)
+        self._template_users_loaded.add(user_id)
+        
+    def _save_templates(self, user_id: str):
+        """Save a user's templates to the cache backend."""
+        self.backend.set(
+            TEMPLATE_NAMESPACE, "templates", self.template_store.export_user(user_id), user_id=user_id
+        )
         
     def _load_cache(self):
-        """Load the cache from disk."""
+        """Import the old unscoped query cache file into the cache backend once."""
         cache_path = self.cache_dir / "query_cache.joblib"
-        if cache_path.exists():
-            try:
-                self.query_cache = joblib.load(cache_path)
-            except Exception as e:
-                print(f"Warning: Failed to load query cache: {str(e)}")
-                self.query_cache = {} 
\ No newline at end of file
+        if not cache_path.exists() or self.backend.get(QUERY_NAMESPACE, "__legacy_imported__"):
+            return
+        try:
+            legacy_cache = joblib.load(cache_path)
+            self.backend.set_many(QUERY_NAMESPACE, legacy_cache)
+            self.backend.set(QUERY_NAMESPACE, "__legacy_imported__", True)
+        except Exception as e:
+            print(f"Warning: Failed to load query cache: {str(e)}")
@@ -3,7 +3,8 @@ import pandas as pd
 from sqlalchemy import create_engine, text
 from typing import Optional
 from models.data_models import QueryContext, AgentResponse
-from sqlalchemy import inspect
+from utils.table_registry import get_table_registry
+from utils.user_registry import get_user_registry, auth_users_source, table_owner_source
 import re
 
 class QueryExecutionAgent:
@@ -29,6 +30,13 @@ class QueryExecutionAgent:
             self.engine = None
             print(f"Error connecting to MySQL: {e}")
         
+        # Users are validated against the shared registry, fed by the auth users table and table owners;
+        # the owner scan only runs in the registry's background refresh
+        self.user_registry = get_user_registry()
+        if self.engine:
+            self.user_registry.add_source("auth_users", auth_users_source(self.engine))
+            self.user_registry.add_source("table_owners", table_owner_source(self.engine, 'parseqri'), background=True)
+        
     def process(self, context: QueryContext) -> AgentResponse:
         """Process an SQL query execution request"""
         try:
@@ -49,8 +57,8 @@ class QueryExecutionAgent:
                     print("No user ID provided and no users available, using default_user")
             else:
                 # Validate if user exists in the database
-                available_users = self._get_available_users()
-                if available_users and context.user_id not in available_users:
+                if not self.user_registry.exists(context.user_id) and self._get_available_users():
+                    available_users = self._get_available_users()
                     print(f"Warning: User '{context.user_id}' not found. Available users: {', '.join(available_users)}")
                     if available_users:
                         context.user_id = available_users[0]
@@ -64,7 +72,7 @@ class QueryExecutionAgent:
             # First, try to execute with MySQL if we have a properly configured engine
             if self.engine:
                 # Execute with MySQL
-                results = self.execute_postgres_query(sql_query)
+                results = self.execute_postgres_query(sql_query, context.user_id)
                 if results is not None:
                     # Query executed successfully
                     print(f"Successfully executed query for user {context.user_id}")
@@ -129,12 +137,98 @@ class QueryExecutionAgent:
             print(f"Error executing SQLite query: {e}")
             return None
     
-    def execute_postgres_query(self, query: str) -> Optional[pd.DataFrame]:
+    def explain_query(self, query: str, user_id: Optional[str] = None) -> Optional[str]:
+        """
+        Have the database plan a query without running it.
+        
+        Args:
+            query: SQL query to check
+            user_id: Owner of the queried tables, used to correct base table names
+            
+        Returns:
+            The database error, or None if the query plans (or there is no engine to ask)
+        """
+        if not self.engine:
+            return None
+        try:
+            query = self.prepare_query(query, user_id)
+            with self.engine.connect() as conn:
+                conn.execute(text("EXPLAIN " + query.rstrip().rstrip(';'))).fetchall()
+            return None
+        except Exception as e:
+            return str(e)
+    
+    def prepare_query(self, query: str, user_id: Optional[str] = None) -> str:
+        """
+        Fix common problems of generated SQL before it is run.
+        
+        Args:
+            query: SQL query
+            user_id: Owner of the queried tables, used to correct base table names
+            
+        Returns:
+            The query to run
+        """
+        # Remove any trailing "WHERE user_id = 'X'" conditions to avoid errors
+        if query.rstrip().endswith(';'):
+            # Remove the trailing semicolon before checking
+            query_without_semicolon = query.rstrip(';')
+            
+            # Check for problematic "WHERE user_id = 'X'" pattern at the end
+            if re.search(r'WHERE\s+user_id\s*=\s*[\'"].*?[\'"]$', query_without_semicolon, re.IGNORECASE):
+                # Remove the entire problematic WHERE clause
+                query = re.sub(r'WHERE\s+user_id\s*=\s*[\'"].*?[\'"]$', '', query_without_semicolon) + ';'
+                print(f"Removed trailing user_id filter from query")
+            
+            # Check for syntax error with multiple WHERE clauses
+            where_count = query.upper().count("WHERE")
+            if where_count > 1:
+                # Replace second WHERE with AND to fix syntax
+                first_where_index = query.upper().find("WHERE")
+                second_where_index = query.upper().find("WHERE", first_where_index + 5)
+                
+                if second_where_index != -1:
+                    query = query[:second_where_index] + "AND" + query[second_where_index + 5:]
+                    print(f"Fixed multiple WHERE clauses in query")
+            
+            # Make sure we don't accidentally append more conditions that could cause errors
+            query = query.rstrip(';') + ';'
+        
+        # Check if the query contains a FROM clause without the user_id suffix in table name
+        # This is a common issue where the LLM generates queries with just the base table name
+        from_match = re.search(r'FROM\s+([`"]?)(\w+)([`"]?)', query, re.IGNORECASE)
+        if from_match:
+            table_name = from_match.group(2)
+            # Check if this table exists in the database
+            registry = get_table_registry(self.engine, 'parseqri')
+            
+            # If the table doesn't exist, resolve it to the user's table or a version with a suffix
+            if not registry.exists(table_name):
+                corrected_table = registry.resolve(table_name, user_id)
+                if not corrected_table:
+                    # Look for tables with this base name followed by underscore (potential user_id suffix)
+                    potential_tables = registry.find_by_prefix(f"{table_name}_")
+                    corrected_table = potential_tables[0] if potential_tables else None
+                if corrected_table:
+                    print(f"Table '{table_name}' not found, using '{corrected_table}' instead")
+                    
+                    # Replace the table name in the query
+                    quote_start = from_match.group(1)
+                    quote_end = from_match.group(3)
+                    query = query.replace(
+                        f"FROM {quote_start}{table_name}{quote_end}", 
+                        f"FROM {quote_start}{corrected_table}{quote_end}"
+                    )
+                    print(f"Corrected query: {query}")
+        return query
+    
+    def execute_postgres_query(self, query: str, user_id: Optional[str] = None) -> Optional[pd.DataFrame]:
         """
         Execute an SQL query against a MySQL database.
         
         Args:
             query: SQL query to execute
+            user_id: Owner of the queried tables, used to correct base table names
             
         Returns:
             DataFrame with query results or None if execution fails
@@ -143,59 +237,8 @@ class QueryExecutionAgent:
             if not self.engine:
                 print("MySQL engine not initialized")
                 return None
-                
-            # Remove any trailing "WHERE user_id = 'X'" conditions to avoid errors
-            if query.rstrip().endswith(';'):
-                # Remove the trailing semicolon before checking
-                query_without_semicolon = query.rstrip(';')
-                
-                # Check for problematic "WHERE user_id = 'X'" pattern at the end
-                if re.search(r'WHERE\s+user_id\s*=\s*[\'"].*?[\'"]$', query_without_semicolon, re.IGNORECASE):
-                    # Remove the entire problematic WHERE clause
-                    query = re.sub(r'WHERE\s+user_id\s*=\s*[\'"].*?[\'"]$', '', query_without_semicolon) + ';'
-                    print(f"Removed trailing user_id filter from query")
-                
-                # Check for syntax error with multiple WHERE clauses
-                where_count = query.upper().count("WHERE")
-                if where_count > 1:
-                    # Replace second WHERE with AND to fix syntax
-                    first_where_index = query.upper().find("WHERE")
-                    second_where_index = query.upper().find("WHERE", first_where_index + 5)
-                    
-                    if second_where_index != -1:
-                        query = query[:second_where_index] + "AND" + query[second_where_index + 5:]
-                        print(f"Fixed multiple WHERE clauses in query")
-                
-                # Make sure we don't accidentally append more conditions that could cause errors
-                query = query.rstrip(';') + ';'
-            
-            # Check if the query contains a FROM clause without the user_id suffix in table name
-            # This is a common issue where the LLM generates queries with just the base table name
-            from_match = re.search(r'FROM\s+([`"]?)(\w+)([`"]?)', query, re.IGNORECASE)
-            if from_match:
-                table_name = from_match.group(2)
-                # Check if this table exists in the database
-                with self.engine.connect() as conn:
-                    inspector = inspect(self.engine)
-                    all_tables = inspector.get_table_names(schema='parseqri')
-                    
-                    # If the table doesn't exist, check if there's a version with user_id suffix
-                    if table_name not in all_tables:
-                        # Look for tables with this base name followed by underscore (potential user_id suffix)
-                        potential_tables = [t for t in all_tables if t.startswith(f"{table_name}_")]
-                        if potential_tables:
-                            # Use the first matching table
-                            corrected_table = potential_tables[0]
-                            print(f"Table '{table_name}' not found, using '{corrected_table}' instead")
-                            
-                            # Replace the table name in the query
-                            quote_start = from_match.group(1)
-                            quote_end = from_match.group(3)
-                            query = query.replace(
-                                f"FROM {quote_start}{table_name}{quote_end}", 
-                                f"FROM {quote_start}{corrected_table}{quote_end}"
-                            )
-                            print(f"Corrected query: {query}")
+            
+            query = self.prepare_query(query, user_id)
             
             # Print the final query for debugging
             print(f"Executing SQL query: {query}")
@@ -212,24 +255,5 @@ class QueryExecutionAgent:
             return None
     
     def _get_available_users(self):
-        """Get list of users with data in MySQL"""
-        try:
-            if not self.engine:
-                return []
-                
-            user_ids = set()
-            with self.engine.connect() as conn:
-                inspector = inspect(self.engine)
-                all_tables = inspector.get_table_names(schema='parseqri')
-                
-                # Extract user IDs from table names (format: user_id_tablename)
-                for table in all_tables:
-                    parts = table.split('_', 1)
-                    if len(parts) > 1:
-                        user_ids.add(parts[0])
-                        
-            return list(user_ids)
-                
-        except Exception as e:
-            print(f"Error getting available users: {e}")
-            return [] 
\ No newline at end of file
+        """Get list of known users from the cached user registry"""
+        return self.user_registry.users()
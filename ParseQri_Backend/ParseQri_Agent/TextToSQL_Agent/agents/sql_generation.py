@@ -1,6 +1,7 @@
 import ollama
-from typing import Dict, Any, Optional
+from typing import Dict, List, Any, Optional
 from models.data_models import QueryContext, AgentResponse
+from utils.table_registry import TableRegistry
 import re
 import json
 
@@ -10,10 +11,19 @@ class SQLGenerationAgent:
     Uses an LLM to translate user questions into executable SQL.
     """
     
-    def __init__(self, llm_model="qwen2.5", api_base="http://localhost:11434"):
-        """Initialize the SQL Generation Agent with the specified LLM model."""
+    def __init__(self, llm_model="qwen2.5", api_base="http://localhost:11434", prune_schema_above=30):
+        """
+        Initialize the SQL Generation Agent with the specified LLM model.
+        
+        Args:
+            llm_model: Ollama model used to write SQL
+            api_base: Ollama API base URL
+            prune_schema_above: Schemas with more columns are cut down to the columns
+                the question matched (plus key columns) before prompting
+        """
         self.llm_model = llm_model
         ollama.api_base = api_base
+        self.prune_schema_above = prune_schema_above
     
     def process(self, context: QueryContext) -> AgentResponse:
         """Process the query context to generate a SQL query."""
@@ -66,21 +76,25 @@ class SQLGenerationAgent:
         Returns:
             Generated SQL query
         """
-        # Prepare schema information for prompt
-        schema_info = "\n".join([f"- {col}: {dtype}" for col, dtype in context.schema.items()])
-        
         # Get the relevant metadata if available
         relevant_metadata = None
         if hasattr(context, 'relevant_metadata') and context.relevant_metadata:
             relevant_metadata = context.relevant_metadata
         
+        # Prepare schema information for prompt
+        schema = self._prune_schema(context.schema, context.table_name, relevant_metadata, context.value_links,
+                                    context.user_id)
+        schema_info = "\n".join([f"- {col}: {dtype}" for col, dtype in schema.items()])
+        
         # Build a more detailed prompt with user context awareness
         prompt = self._build_sql_generation_prompt(
             context.user_question, 
             context.table_name,
             schema_info,
             context.user_id,
-            relevant_metadata
+            relevant_metadata,
+            context.join_plan,
+            context.value_links
         )
         
         # Call LLM for SQL generation
@@ -93,9 +107,57 @@ class SQLGenerationAgent:
         sql_query = self._extract_sql_from_response(response['message']['content'])
         return sql_query
     
+    def _prune_schema(self, schema: Dict[str, str], table_name: str,
+                      relevant_metadata: Optional[Dict[str, Any]] = None,
+                      value_links: Optional[List[Dict[str, str]]] = None,
+                      user_id: Optional[str] = None) -> Dict[str, str]:
+        """
+        Keep only the columns a wide table's prompt needs.
+        
+        The metadata indexer returns the columns whose documents matched the
+        question; those, the key columns and the columns of linked values are kept.
+        Value links name physical tables ("sales_7") and table_name is the logical
+        one ("sales"), so both are compared without the user part.
+        
+        Args:
+            schema: Column names and types of the table
+            table_name: Name of the table
+            relevant_metadata: Metadata with the matched "columns" (optional)
+            value_links: Column values the question mentions (optional)
+            user_id: Owner of the table (optional)
+            
+        Returns:
+            The pruned schema, or the full schema when it is narrow or nothing matched
+        """
+        if not relevant_metadata or len(schema) <= self.prune_schema_above:
+            return schema
+        if relevant_metadata.get("table_name") != table_name or not relevant_metadata.get("columns"):
+            return schema
+        
+        def key(name):
+            return str(name).strip().lower().replace(" ", "_")
+        
+        wanted = {key(col) for col in relevant_metadata["columns"]}
+        base_table = TableRegistry.base_name(table_name, user_id)
+        wanted.update(
+            key(link["column"]) for link in (value_links or [])
+            if TableRegistry.base_name(link.get("table") or "", user_id) == base_table
+        )
+        if not any(key(col) in wanted for col in schema):
+            # The matched columns do not name columns of this schema
+            return schema
+        pruned = {
+            col: dtype for col, dtype in schema.items()
+            if key(col) in wanted or key(col) == "id" or key(col).endswith("_id")
+        }
+        print(f"Pruned schema of {table_name} from {len(schema)} to {len(pruned)} columns")
+        return pruned
+    
     def _build_sql_generation_prompt(self, question: str, table_name: str, 
                                     schema_info: str, user_id: str,
-                                    relevant_metadata: Dict[str, Any] = None) -> str:
+                                    relevant_metadata: Dict[str, Any] = None,
+                                    join_plan: Dict[str, Any] = None,
+                                    value_links: List[Dict[str, str]] = None) -> str:
         """
         Build a detailed prompt for SQL generation with user context awareness.
         
@@ -105,6 +167,8 @@ class SQLGenerationAgent:
             schema_info: Table schema information
             
             relevant_metadata: Additional metadata about the table (optional)
+            join_plan: Related tables and join conditions selected by schema understanding (optional)
+            value_links: Column values the question mentions, from the value index (optional)
             
         Returns:
             Prompt for SQL generation
@@ -140,6 +204,28 @@ class SQLGenerationAgent:
             fully_qualified_table = f"{table_name}_{user_id}"
             database_note = "This is an internal database with user-specific tables."
         
+        # Only the tables and join paths selected from the join graph are described
+        join_context = ""
+        if join_plan and len(join_plan.get("tables", [])) > 1:
+            related_tables = []
+            for related_table in join_plan["tables"][1:]:
+                columns = ", ".join(f"{col} ({dtype})" for col, dtype in join_plan["schemas"].get(related_table, {}).items())
+                related_tables.append(f"- {related_table}: {columns}")
+            join_conditions = "\n".join(f"- {condition}" for condition in join_plan["joins"])
+            join_context = (
+                "Related tables you may JOIN if the question needs them:\n" + "\n".join(related_tables) +
+                "\n\nJoin conditions (use only these to join):\n" + join_conditions + "\n\n"
+            )
+        
+        # Values the question mentions, with the column holding them and their stored spelling
+        value_context = ""
+        if value_links:
+            known_values = "\n".join(
+                f"- \"{link['phrase']}\" refers to {link['table']}.{link['column']} = '{link['value']}'"
+                for link in value_links
+            )
+            value_context = "Known values (filter on these columns with these exact literals):\n" + known_values + "\n\n"
+        
         # Build the prompt with user context awareness
         return f"""
         Generate an SQL query to answer the following question: "{question}"
@@ -153,7 +239,8 @@ class SQLGenerationAgent:
         {schema_info}
         
         {metadata_context}
-        
+        {join_context}
+        {value_context}
         IMPORTANT REQUIREMENTS:
         1. Use only columns that exist in the schema
         2. Return only the data that answers the user's question
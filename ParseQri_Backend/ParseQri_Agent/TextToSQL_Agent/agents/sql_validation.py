@@ -3,6 +3,7 @@ import re
 import json
 from typing import Dict, Any
 from models.data_models import QueryContext, AgentResponse
+from utils.llm_cache import cached_chat
 
 class SQLValidationAgent:
     """
@@ -131,7 +132,11 @@ class SQLValidationAgent:
             Dictionary with validation results
         """
         if sql_query == "NOT_RELEVANT":
-            return {"sql_query": "NOT_RELEVANT", "sql_valid": False}
+            return {
+                "sql_query": "NOT_RELEVANT",
+                "sql_valid": False,
+                "sql_issues": "The question is not related to the available data"
+            }
 
         prompt = (
             "You are an SQL validator. Validate the following SQL query and fix any issues with the syntax.\n\n"
@@ -148,7 +153,8 @@ class SQLValidationAgent:
         )
 
         try:
-            response = ollama.chat(model=self.llm_model, messages=[{"role": "user", "content": prompt}])
+            # Validation is deterministic for a given query and schema, so responses are memoized
+            response = cached_chat(self.llm_model, [{"role": "user", "content": prompt}])
             
             if response and 'message' in response and 'content' in response['message']:
                 result_str = response['message']['content'].strip()
@@ -0,0 +1,121 @@
+"""
+Benchmark the per-user and shared metadata store layouts.
+
+Builds the same synthetic metadata (users x tables, random 384-dimension
+embeddings so no model is needed) in both layouts under a temporary directory,
+then runs user-scoped queries against each. Every layout runs in its own
+process so peak memory can be compared.
+
+Usage:
+    python benchmark_metadata_store.py --users 200 --tables 20 --queries 1000
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+from typing import Any, Dict
+
+DIMENSION = 384
+
+
+def _vector(rng: random.Random):
+    return [rng.uniform(-1.0, 1.0) for _ in range(DIMENSION)]
+
+
+def _peak_memory_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_layout(layout: str, root: str, users: int, tables: int, queries: int, seed: int) -> Dict[str, Any]:
+    """Build one layout under root and time user-scoped queries against it."""
+    from utils.chroma_registry import get_chroma_registry
+
+    registry = get_chroma_registry()
+    rng = random.Random(seed)
+
+    def collection(user_id):
+        if layout == "shared":
+            return registry.collection(os.path.join(root, "_shared"), "table_metadata", create=True,
+                                       metadata={"hnsw:space": "cosine"}, pinned=True)
+        return registry.collection(os.path.join(root, user_id), f"{user_id}_metadata", create=True,
+                                   metadata={"hnsw:space": "cosine", "user_id": user_id})
+
+    started = time.perf_counter()
+    for user in range(users):
+        user_id = f"user{user}"
+        collection(user_id).upsert(
+            ids=[f"table{table}_{user_id}" for table in range(tables)],
+            embeddings=[_vector(rng) for _ in range(tables)],
+            documents=[f"Table table{table} of {user_id}" for table in range(tables)],
+            metadatas=[{"user_id": user_id, "table_name": f"table{table}"} for table in range(tables)]
+        )
+    build_seconds = time.perf_counter() - started
+
+    latencies = []
+    for _ in range(queries):
+        user_id = f"user{rng.randrange(users)}"
+        embedding = _vector(rng)
+        started = time.perf_counter()
+        collection(user_id).query(query_embeddings=[embedding], n_results=1, where={"user_id": user_id})
+        latencies.append(time.perf_counter() - started)
+
+    latencies.sort()
+    metrics = registry.metrics()
+    return {
+        "layout": layout,
+        "build_seconds": round(build_seconds, 3),
+        "query_ms_p50": round(1000 * latencies[len(latencies) // 2], 3),
+        "query_ms_p95": round(1000 * latencies[int(len(latencies) * 0.95) - 1], 3),
+        "query_ms_mean": round(1000 * sum(latencies) / len(latencies), 3),
+        "client_opens": metrics["client_opens"],
+        "open_clients": metrics["open_clients"],
+        "peak_memory_mb": _peak_memory_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the per-user and shared metadata store layouts")
+    parser.add_argument('--users', type=int, default=100, help='Number of users')
+    parser.add_argument('--tables', type=int, default=20, help='Tables per user')
+    parser.add_argument('--queries', type=int, default=500, help='Queries per layout')
+    parser.add_argument('--seed', type=int, default=7, help='Random seed')
+    parser.add_argument('--layout', choices=["per-user", "shared"], help=argparse.SUPPRESS)
+    parser.add_argument('--root', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.layout:
+        # Worker process: run a single layout and report it as JSON
+        print(json.dumps(run_layout(args.layout, args.root, args.users, args.tables, args.queries, args.seed)))
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        for layout in ["per-user", "shared"]:
+            output = subprocess.run(
+                [sys.executable, __file__, "--layout", layout, "--root", os.path.join(root, layout),
+                 "--users", str(args.users), "--tables", str(args.tables),
+                 "--queries", str(args.queries), "--seed", str(args.seed)],
+                capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+            )
+            results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    print(f"{args.users} users x {args.tables} tables, {args.queries} queries per layout")
+    columns = ["layout", "build_seconds", "query_ms_p50", "query_ms_p95", "query_ms_mean",
+               "client_opens", "open_clients", "peak_memory_mb"]
+    print("  ".join(f"{column:>14}" for column in columns))
+    for result in results:
+        print("  ".join(f"{str(result[column]):>14}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
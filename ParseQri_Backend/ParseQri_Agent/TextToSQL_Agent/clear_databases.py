@@ -159,6 +159,13 @@ def clear_chromadb_data(user_id=None, db_storage_dir="../data/db_storage", max_r
             return False
         
         if user_id:
+            # Delete the user's documents from the shared metadata store
+            try:
+                from utils.metadata_store import delete_user_documents
+                delete_user_documents(str(storage_path), str(user_id))
+            except Exception as e:
+                print(f"Could not remove shared metadata for user {user_id}: {e}")
+            
             # Delete specific user directory
             user_dir = storage_path / str(user_id)
             if user_dir.exists():
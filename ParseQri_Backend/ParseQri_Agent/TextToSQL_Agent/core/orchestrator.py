@@ -1,6 +1,9 @@
 from typing import Dict, Any, Optional
 from models.data_models import QueryContext, AgentResponse
+from utils.negative_cache import NegativeCache, NOT_RELEVANT, INVALID_SQL, EXECUTION_ERROR
+from utils.user_registry import get_user_registry
 import importlib
+import threading
 import re
 
 class TextSQLOrchestrator:
@@ -12,6 +15,21 @@ class TextSQLOrchestrator:
         self.agents = {}
         self._load_agents()
         
+        # Interactive queries in flight; background cache warming yields while this is non-zero
+        self.active_queries = 0
+        self._active_lock = threading.Lock()
+        self._cache_warmer = None
+        
+        # Recent failures, so retried unanswerable questions return at once
+        self.negative_cache = None
+        negative_config = self.config.get('negative_cache', {})
+        if negative_config.get('enabled', True):
+            cache_dir = self.config.get('agents', {}).get('query_cache', {}).get('params', {}).get('cache_dir', 'cache')
+            self.negative_cache = NegativeCache(
+                cache_dir=cache_dir,
+                ttl_seconds=negative_config.get('ttl_seconds', 300)
+            )
+        
     def _load_config(self, config_path: str) -> Dict[str, Any]:
         """Load configuration from JSON file"""
         import json
@@ -30,10 +48,60 @@ class TextSQLOrchestrator:
             
             # Initialize agent with its config
             self.agents[agent_id] = agent_class(**agent_config.get('params', {}))
+        
+        # Template values are checked against the value index of the schema queries run on
+        query_cache = self.agents.get('query_cache')
+        if query_cache is not None and getattr(query_cache, 'value_schema', False) is None:
+            query_cache.value_schema = getattr(self.agents.get('schema_understanding'), 'schema', None)
+    
+    @staticmethod
+    def base_table_name(table_name: str, user_id: str = None) -> str:
+        """Strip the user suffix from a physical table name"""
+        if user_id and table_name.endswith(f"_{user_id}"):
+            return table_name[:-(len(user_id) + 1)]
+        return table_name
+    
+    def get_cache_warmer(self):
+        """Get the background cache warmer for this orchestrator, creating it on first use"""
+        if self._cache_warmer is None:
+            from utils.cache_warmer import CacheWarmer
+            warming_config = self.config.get('cache_warming', {})
+            self._cache_warmer = CacheWarmer(
+                self,
+                pause_seconds=warming_config.get('pause_seconds', 0.5)
+            )
+        return self._cache_warmer
     
     def process_query(self, user_question: str, db_name: str, table_name: str, 
-                     user_id: str = None, force_visualization: bool = False) -> QueryContext:
-        """Process a natural language query through the agent pipeline"""
+                     user_id: str = None, force_visualization: bool = False,
+                     force_retry: bool = False) -> QueryContext:
+        """
+        Process a natural language query through the agent pipeline
+        
+        Args:
+            user_question: Natural language question
+            db_name: Database path or name
+            table_name: Table to query, empty to determine it from metadata
+            user_id: User identifier for multi-user support
+            force_visualization: Always produce a visualization
+            force_retry: Ignore a recently cached failure for this question
+            
+        Returns:
+            QueryContext with processing results
+        """
+        with self._active_lock:
+            self.active_queries += 1
+        try:
+            return self._process_query(user_question, db_name, table_name, user_id,
+                                       force_visualization, force_retry)
+        finally:
+            with self._active_lock:
+                self.active_queries -= 1
+    
+    def _process_query(self, user_question: str, db_name: str, table_name: str, 
+                      user_id: str = None, force_visualization: bool = False,
+                      force_retry: bool = False) -> QueryContext:
+        """Run the query pipeline for process_query"""
         # Initialize query context with user_id for multi-user support
         # (user ID validation will be handled by individual agents)
         context = QueryContext(
@@ -54,7 +122,29 @@ class TextSQLOrchestrator:
             if cache_response.success and cache_response.data.get('cache_hit'):
                 context.cache_hit = True
                 context.sql_query = cache_response.data.get('sql_query')
-                return self._execute_cached_query(context)
+                template_key = cache_response.data.get('template_key')
+                if not template_key:
+                    return self._execute_cached_query(context)
+                if self._validate_template_query(context, template_key, cache_response.data.get('schema')):
+                    return self._execute_cached_query(context, template_key)
+                # The template was dropped; answer the question the normal way
+                context.cache_hit = False
+                context.sql_query = None
+                context.schema = None
+        
+        # Then check whether this question failed recently
+        if self.negative_cache:
+            if force_retry:
+                self.negative_cache.forget(user_question, user_id)
+            else:
+                failure = self.negative_cache.get(user_question, user_id)
+                if failure:
+                    print(f"Question failed recently ({failure['kind']}), returning cached failure. "
+                          "Use force_retry to run it again.")
+                    context.negative_cache_hit = True
+                    context.sql_query = failure.get('sql_query')
+                    context.formatted_response = f"Error: {failure['reason']}"
+                    return context
         
         # Route the query through metadata indexer if user_id is provided
         if user_id and 'query_router' in self.agents:
@@ -69,7 +159,10 @@ class TextSQLOrchestrator:
                     if metadata_response.success and metadata_response.data.get('relevant_metadata'):
                         # Add relevant metadata to context
                         context.relevant_metadata = metadata_response.data['relevant_metadata']
-                        print(f"Found relevant metadata for table: {context.relevant_metadata.get('table_name')}")
+                        context.table_candidates = metadata_response.data.get('table_candidates')
+                        context.table_confident = bool(metadata_response.data.get('clear_winner'))
+                        print(f"Found relevant metadata for table: {context.relevant_metadata.get('table_name')}"
+                              f"{' (clear winner)' if context.table_confident else ''}")
                         
                         # Update table name if needed
                         metadata_table = context.relevant_metadata.get('table_name')
@@ -103,7 +196,8 @@ class TextSQLOrchestrator:
             # Process SQL query
             return self._process_sql_query(context)
     
-    def process_upload(self, csv_file: str, user_id: str = None, suggested_table_name: str = None, db_id: int = None) -> QueryContext:
+    def process_upload(self, csv_file: str, user_id: str = None, suggested_table_name: str = None, db_id: int = None,
+                       warm_cache: bool = True) -> QueryContext:
         """
         Process a CSV upload through the agent pipeline with user context.
         
@@ -112,6 +206,7 @@ class TextSQLOrchestrator:
             user_id: User identifier for multi-user support
             suggested_table_name: Optional suggested name for the table
             db_id: Optional database ID for API integration
+            warm_cache: Whether to pre-warm the query cache for the new table in the background
             
         Returns:
             QueryContext with processing results
@@ -144,10 +239,12 @@ class TextSQLOrchestrator:
                 return self._handle_error(context, f"Data ingestion failed: {ingestion_response.message}")
         
         # Step 2: Extract metadata using the metadata indexer
+        document_id = None
         if 'metadata_indexer' in self.agents:
             metadata_response = self.agents['metadata_indexer'].process(context)
             if metadata_response.success and metadata_response.data.get('metadata'):
                 metadata = metadata_response.data['metadata']
+                document_id = metadata_response.data.get('document_id')
                 
                 # Update table name from metadata if available
                 if suggested_table_name is None and 'table_name' in metadata:
@@ -175,6 +272,28 @@ class TextSQLOrchestrator:
             # Update table name from MySQL response if available
             if mysql_response.data and 'table_name' in mysql_response.data:
                 context.table_name = mysql_response.data['table_name']
+            
+            # Mark the table's metadata document with the shape it describes
+            fingerprint = (mysql_response.data or {}).get('schema_fingerprint')
+            if fingerprint and document_id and 'metadata_indexer' in self.agents:
+                self.agents['metadata_indexer'].record_fingerprint(
+                    user_id, document_id, context.table_name, fingerprint,
+                    fingerprint_key=mysql_response.data.get('fingerprint_key')
+                )
+            
+            # New data can make previously failing questions answerable
+            if self.negative_cache:
+                self.negative_cache.bump_schema_version(user_id)
+            
+            # The uploader now owns tables, make them known to user validation
+            get_user_registry().register(user_id)
+        
+        # Step 4: Pre-warm the query cache with exploratory questions in the background
+        if warm_cache and context.table_name and 'query_cache' in self.agents and \
+                self.config.get('cache_warming', {}).get('on_upload', True):
+            warmer = self.get_cache_warmer()
+            warmer.warm_after_upload(user_id, self.base_table_name(context.table_name, user_id))
+            warmer.start()
         
         return context
     
@@ -198,13 +317,22 @@ class TextSQLOrchestrator:
         
         return context
     
-    def _process_sql_query(self, context: QueryContext) -> QueryContext:
-        """Process an SQL query request"""
+    def prepare_sql(self, context: QueryContext) -> Optional[str]:
+        """
+        Run schema understanding, SQL generation, validation and user context
+        for a question without executing it.
+        
+        Args:
+            context: Query context holding the user question
+            
+        Returns:
+            An error message if a step failed, None if context.sql_query is ready
+        """
         # Get schema information
         if 'schema_understanding' in self.agents:
             schema_response = self.agents['schema_understanding'].process(context)
             if not schema_response.success:
-                return self._handle_error(context, "Failed to retrieve schema")
+                return "Failed to retrieve schema"
             
             context.schema = schema_response.data.get('schema')
         
@@ -212,7 +340,7 @@ class TextSQLOrchestrator:
         if 'sql_generation' in self.agents:
             sql_response = self.agents['sql_generation'].process(context)
             if not sql_response.success:
-                return self._handle_error(context, "Failed to generate SQL query")
+                return "Failed to generate SQL query"
             
             context.sql_query = sql_response.data.get('sql_query')
         
@@ -223,7 +351,7 @@ class TextSQLOrchestrator:
             context.sql_issues = validation_response.data.get('sql_issues')
             
             if not context.sql_valid:
-                return self._handle_error(context, f"SQL validation failed: {context.sql_issues}")
+                return f"SQL validation failed: {context.sql_issues}"
         
         # Apply user context with MySQL handler
         if context.user_id and 'mysql_handler' in self.agents:
@@ -231,10 +359,24 @@ class TextSQLOrchestrator:
             if mysql_response.success and mysql_response.data.get('sql_query'):
                 context.sql_query = mysql_response.data.get('sql_query')
         
+        return None
+    
+    def _process_sql_query(self, context: QueryContext) -> QueryContext:
+        """Process an SQL query request"""
+        # Build and validate the SQL query
+        error_message = self.prepare_sql(context)
+        if error_message:
+            if context.sql_query and not context.sql_valid:
+                kind = NOT_RELEVANT if context.sql_query == "NOT_RELEVANT" else INVALID_SQL
+                self._record_failure(context, error_message, kind)
+            return self._handle_error(context, error_message)
+        
         # Execute the query
         if 'query_execution' in self.agents:
             execution_response = self.agents['query_execution'].process(context)
             if not execution_response.success:
+                self._record_failure(context, f"Failed to execute SQL query: {execution_response.message}",
+                                     EXECUTION_ERROR)
                 return self._handle_error(context, "Failed to execute SQL query")
             
             context.query_results = execution_response.data.get('query_results')
@@ -250,15 +392,37 @@ class TextSQLOrchestrator:
         # Cache the successful query
         if 'query_cache' in self.agents:
             self.agents['query_cache'].cache_query(context)
+            self.agents['query_cache'].record_history(context)
         
         return context
     
-    def _execute_cached_query(self, context: QueryContext) -> QueryContext:
+    def _validate_template_query(self, context: QueryContext, template_key: str, schema: Optional[Dict[str, str]]) -> bool:
+        """
+        Validate SQL bound from a template, dropping the template if it fails.
+        
+        The check is local (statement shape and the template's schema) plus an
+        EXPLAIN by the execution agent; the LLM is never asked, so a template hit
+        costs no LLM call and the bound SQL is never rewritten.
+        """
+        context.schema = schema
+        issue = self.agents['query_cache'].template_query_issues(context.user_id, template_key, context.sql_query)
+        if not issue and 'query_execution' in self.agents:
+            issue = self.agents['query_execution'].explain_query(context.sql_query, context.user_id)
+        if not issue:
+            context.sql_valid = True
+            return True
+        print(f"SQL bound from template failed validation: {issue}")
+        self.agents['query_cache'].forget_template(context.user_id, template_key)
+        return False
+    
+    def _execute_cached_query(self, context: QueryContext, template_key: str = None) -> QueryContext:
         """Execute a cached query and format the response"""
         # Execute the query
         if 'query_execution' in self.agents:
             execution_response = self.agents['query_execution'].process(context)
             if not execution_response.success:
+                if template_key:
+                    self.agents['query_cache'].forget_template(context.user_id, template_key)
                 return self._handle_error(context, "Failed to execute cached SQL query")
             
             context.query_results = execution_response.data.get('query_results')
@@ -271,8 +435,19 @@ class TextSQLOrchestrator:
             
             context.formatted_response = formatting_response.data.get('formatted_response')
         
+        if 'query_cache' in self.agents:
+            self.agents['query_cache'].record_history(context)
+        
         return context
     
+    def _record_failure(self, context: QueryContext, error_message: str, kind: str):
+        """Remember a failed question in the negative cache"""
+        if self.negative_cache:
+            self.negative_cache.record(
+                context.user_question, error_message, kind,
+                user_id=context.user_id, sql_query=context.sql_query
+            )
+    
     def _handle_error(self, context: QueryContext, error_message: str) -> QueryContext:
         """Handle errors during processing"""
         print(f"Error: {error_message}")
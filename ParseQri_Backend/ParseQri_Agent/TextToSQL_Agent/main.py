@@ -10,8 +10,13 @@ import shutil
 from typing import Dict, List, Optional, Any
 from core.orchestrator import TextSQLOrchestrator
 from utils.data_folder_monitor import DataFolderMonitor
+from utils.schema_catalog import get_schema_catalog
+from utils.user_registry import get_user_registry, chroma_dir_source
+from utils.metadata_store import (
+    build_local_indexes, delete_user_documents, legacy_user_dirs, migrate_user_directories, user_document_count
+)
 import sqlalchemy
-from sqlalchemy import inspect, create_engine, text
+from sqlalchemy import create_engine, text
 
 # Load environment variables
 try:
@@ -84,16 +89,10 @@ class Config:
             return f"mysql+pymysql://{user}:{password}@{host}:{port}/{db_name}"
 
 def get_available_users() -> List[str]:
-    """Get available user IDs from storage directory"""
-    storage_dir = Path(Config.CHROMA_PERSIST_DIR)
-    if not storage_dir.exists():
-        return ["default_user"]
-    
-    users = []
-    for item in storage_dir.iterdir():
-        if item.is_dir():
-            users.append(item.name)
-    
+    """Get available user IDs from the cached user registry"""
+    registry = get_user_registry()
+    registry.add_source("chroma", chroma_dir_source(str(Config.CHROMA_PERSIST_DIR)))
+    users = registry.users()
     return users if users else ["default_user"]
 
 def get_external_database_config(db_id: Optional[int]) -> Optional[Dict[str, Any]]:
@@ -229,72 +228,50 @@ def get_mysql_tables(user_id: Optional[str] = None) -> List[str]:
                 schema_name = Config.DB_NAME
         
         engine = create_engine(db_url)
-        with engine.connect() as conn:
-            inspector = inspect(engine)
-            all_tables = inspector.get_table_names(schema=schema_name)
-            
-            if use_external_db:
-                # For external databases, return all tables (no user filtering)
-                return all_tables
+        all_tables = get_schema_catalog().table_names(engine, schema_name)
+        
+        if use_external_db:
+            # For external databases, return all tables (no user filtering)
+            return all_tables
+        else:
+            # For internal databases, apply user filtering
+            if user_id:
+                # Filter tables for specific user
+                tables = [table for table in all_tables if table.startswith(f"{user_id}_")]
             else:
-                # For internal databases, apply user filtering
-                if user_id:
-                    # Filter tables for specific user
-                    tables = [table for table in all_tables if table.startswith(f"{user_id}_")]
-                else:
-                    # Get all tables with user ID info
-                    tables = []
-                    user_tables = {}
-                    
-                    for table in all_tables:
-                        parts = table.split("_", 1)
-                        if len(parts) > 1:
-                            user_id = parts[0]
-                            table_name = parts[1]
-                            if user_id not in user_tables:
-                                user_tables[user_id] = []
-                            user_tables[user_id].append(table_name)
-                    
-                    # Format table info
-                    for user, tables_list in user_tables.items():
-                        for table in tables_list:
-                            tables.append(f"{user}: {table}")
-                            
-                return tables
+                # Get all tables with user ID info
+                tables = []
+                user_tables = {}
+                
+                for table in all_tables:
+                    parts = table.split("_", 1)
+                    if len(parts) > 1:
+                        user_id = parts[0]
+                        table_name = parts[1]
+                        if user_id not in user_tables:
+                            user_tables[user_id] = []
+                        user_tables[user_id].append(table_name)
+                
+                # Format table info
+                for user, tables_list in user_tables.items():
+                    for table in tables_list:
+                        tables.append(f"{user}: {table}")
+                        
+            return tables
             
     except Exception as e:
         print(f"Error connecting to MySQL: {e}")
         return []
 
 def validate_chromadb_collection(user_id: str) -> bool:
-    """Validate ChromaDB collection exists and has valid content"""
+    """Validate the user has table metadata in the shared ChromaDB store"""
     try:
-        collection_base_path = Path(Config.CHROMA_PERSIST_DIR) / user_id
-        
-        # Check if the base directory exists
-        if not collection_base_path.exists():
-            return False
-        
-        # Check for essential ChromaDB files
-        required_files = ['chroma.sqlite3']
-        for file_name in required_files:
-            if not (collection_base_path / file_name).exists():
-                print(f"Missing ChromaDB file: {file_name}")
-                return False
-        
-        # Check if there are any collection directories with valid structure
-        collection_dirs = [d for d in collection_base_path.iterdir() if d.is_dir()]
-        if not collection_dirs:
-            print("No collection directories found")
-            return False
-        
-        # Validate at least one collection has the required files
-        for collection_dir in collection_dirs:
-            required_collection_files = ['data_level0.bin', 'header.bin', 'length.bin', 'link_lists.bin']
-            if all((collection_dir / file_name).exists() for file_name in required_collection_files):
-                return True
+        if user_document_count(Config.CHROMA_PERSIST_DIR, user_id) > 0:
+            return True
         
-        print("No valid collection structure found")
+        if user_id in legacy_user_dirs(Config.CHROMA_PERSIST_DIR):
+            print(f"Metadata of user {user_id} is still in a per-user directory, "
+                  f"run: python main.py --migrate-metadata")
         return False
         
     except Exception as e:
@@ -311,10 +288,8 @@ def initialize_chromadb_collection(user_id: str, force: bool = False) -> bool:
         
         # Clean up corrupted data if force is True
         if force:
-            collection_path = Path(Config.CHROMA_PERSIST_DIR) / user_id
-            if collection_path.exists():
-                print(f"Removing existing ChromaDB data for user {user_id}")
-                shutil.rmtree(collection_path)
+            print(f"Removing existing ChromaDB data for user {user_id}")
+            delete_user_documents(Config.CHROMA_PERSIST_DIR, user_id)
             
         # Get orchestrator with all agents
         config_path = Path("config.json")
@@ -336,18 +311,18 @@ def initialize_chromadb_collection(user_id: str, force: bool = False) -> bool:
             print(f"No MySQL tables found for user {user_id}")
             return False
             
-        # For each table, create a metadata entry
+        # Create a minimal metadata entry for every table, indexed in batches
+        tables = {}
         for full_table_name in mysql_tables:
             # Get table name without user prefix
             table_name = full_table_name[len(f"{user_id}_"):]
+            tables[table_name] = {"table": "MySQL table"}  # Placeholder for columns
             
-            # Create minimal metadata document
-            print(f"Creating metadata entry for table: {table_name}")
-            metadata_indexer.save_metadata_to_chroma(
-                user_id=user_id,
-                table_name=table_name,
-                columns={"table": "MySQL table"}  # Placeholder for columns
-            )
+        metadata_indexer.save_metadata_batch(
+            user_id,
+            tables,
+            progress=lambda done, total: print(f"Indexed metadata for {done}/{total} tables")
+        )
             
         print(f"Successfully initialized ChromaDB collection for user {user_id}")
         return True
@@ -356,6 +331,56 @@ def initialize_chromadb_collection(user_id: str, force: bool = False) -> bool:
         print(f"Error initializing ChromaDB collection: {e}")
         return False
 
+def run_cache_admin(args, config, user_id):
+    """
+    Run the --cache-* commands and print the result as JSON after a
+    "Cache Admin Result:" marker, so callers can parse it from stdout.
+    """
+    from utils.cache_backend import get_cache_backend
+    from utils import cache_admin
+    
+    cache_dir = config.get('agents', {}).get('query_cache', {}).get('params', {}).get('cache_dir', Config.CACHE_DIR)
+    backend = get_cache_backend(persist_dir=cache_dir)
+    result = {}
+    
+    try:
+        if args.cache_import:
+            result['imported'] = cache_admin.import_snapshot(backend, args.cache_import, namespaces=args.cache_tier)
+        if args.cache_invalidate:
+            result['invalidated'] = cache_admin.invalidate(
+                backend, user_id=user_id, table_name=args.table, namespaces=args.cache_tier
+            )
+        if args.cache_export:
+            result['exported'] = cache_admin.export_snapshot(
+                backend, args.cache_export, namespaces=args.cache_tier, user_id=user_id
+            )
+        if args.cache_stats:
+            result['stats'] = cache_admin.cache_stats(backend)
+    except Exception as e:
+        result['error'] = str(e)
+    
+    print("\nCache Admin Result:")
+    print(json.dumps(result, indent=2, default=str))
+
+def start_background_cache_warming(user_id, table_name):
+    """
+    Pre-warm the query cache for a new table in a detached, low-priority process,
+    so the upload command can return without waiting for the LLM calls.
+    """
+    if not table_name:
+        return
+    try:
+        subprocess.Popen(
+            [sys.executable, "main.py", "--warm-cache", "--user", user_id, "--table", table_name],
+            cwd=str(Path(__file__).parent),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+        print(f"Started background cache warming for table: {table_name}")
+    except Exception as e:
+        print(f"Warning: Could not start background cache warming: {e}")
+
 def main():
     """Main entry point for the integrated PDF/Image to SQL query system"""
     # Get available users
@@ -373,7 +398,32 @@ def main():
     parser.add_argument('--list-tables', action='store_true', help='List available tables for the user')
     parser.add_argument('--list-all-tables', action='store_true', help='List all tables in the database')
     parser.add_argument('--init-chromadb', action='store_true', help='Initialize ChromaDB collection for user')
+    parser.add_argument('--migrate-metadata', action='store_true',
+                        help='Copy per-user ChromaDB directories into the shared metadata store')
+    parser.add_argument('--remove-legacy', action='store_true',
+                        help='With --migrate-metadata, delete the per-user ChromaDB files once copied')
+    parser.add_argument('--build-local-index', action='store_true',
+                        help='Copy the shared metadata store into the local vector indexes used by VECTOR_STORE=local/failover')
+    parser.add_argument('--describe-pending', action='store_true',
+                        help='Generate the column descriptions uploads left pending (started after uploads)')
+    parser.add_argument('--refresh-users', action='store_true',
+                        help='Rebuild the user index from every source, including the table owner scan')
     parser.add_argument('--db-id', type=int, help='Database ID for API integration')
+    parser.add_argument('--warm-cache', action='store_true',
+                      help='Pre-warm the query cache from query history (and --table exploratory questions)')
+    parser.add_argument('--force-retry', action='store_true',
+                      help='Run the query again even if it failed recently')
+    parser.add_argument('--cache-stats', action='store_true',
+                      help='Print hit ratios, sizes, evictions and hot keys of the cache tiers as JSON')
+    parser.add_argument('--cache-invalidate', action='store_true',
+                      help='Remove cache entries for --user (or --all-users), optionally only those using --table')
+    parser.add_argument('--cache-export', type=str, metavar='PATH', help='Write a cache snapshot to PATH')
+    parser.add_argument('--cache-import', type=str, metavar='PATH', help='Load a cache snapshot from PATH')
+    parser.add_argument('--cache-tier', action='append',
+                      help='Limit cache commands to a tier (query, template, negative, llm, history); repeatable')
+    parser.add_argument('--all-users', action='store_true', help='Apply cache commands to all users')
+    parser.add_argument('--warm-top', type=int, default=10,
+                      help='Number of historical questions per table to replay with --warm-cache')
     
     args = parser.parse_args()
     
@@ -395,6 +445,33 @@ def main():
     with config_path.open('r') as f:
         config = json.load(f)
     
+    # Handle cache administration commands
+    if args.cache_stats or args.cache_invalidate or args.cache_export or args.cache_import:
+        # Cache entries may belong to users that no longer exist, so use --user as given
+        run_cache_admin(args, config, None if args.all_users else args.user)
+        return
+    
+    # Handle the migrate-metadata command (all users with a per-user directory)
+    if args.migrate_metadata:
+        result = migrate_user_directories(
+            Config.CHROMA_PERSIST_DIR,
+            remove_legacy=args.remove_legacy,
+            progress=lambda user, kind, done: print(f"Copied {done} {kind} documents of user {user}")
+        )
+        print("Migration Result:")
+        print(json.dumps(result, indent=2))
+        return
+    
+    # Handle the build-local-index command (all users share the indexes)
+    if args.build_local_index:
+        result = build_local_indexes(
+            Config.CHROMA_PERSIST_DIR,
+            progress=lambda kind, done: print(f"Copied {done} {kind} documents")
+        )
+        print("Local Index Result:")
+        print(json.dumps(result, indent=2))
+        return
+    
     # If database ID is provided, fetch external database configuration
     if args.db_id:
         external_db_config = get_external_database_config(args.db_id)
@@ -414,11 +491,35 @@ def main():
     # Initialize the orchestrator
     orchestrator = TextSQLOrchestrator(str(config_path))
     
+    # Handle the describe-pending command (the detached worker started after uploads)
+    if args.describe_pending:
+        if 'metadata_indexer' in orchestrator.agents:
+            described = orchestrator.agents['metadata_indexer'].describe_pending()
+            print(f"Described {described} pending tables")
+        return
+    
+    # Handle the refresh-users command (the agents registered the user sources)
+    if args.refresh_users:
+        users = get_user_registry().refresh()
+        print(f"Found {len(users)} users")
+        return
+    
     # Handle the init-chromadb command
     if args.init_chromadb:
         initialize_chromadb_collection(current_user, force=True)
         return
     
+    # Handle the warm-cache command
+    if args.warm_cache:
+        warmer = orchestrator.get_cache_warmer()
+        if args.table:
+            warmer.warm_after_upload(current_user, args.table)
+        warmer.warm_from_history(top_n=args.warm_top, user_ids=[current_user])
+        warmer.start()
+        warmer.wait()
+        print(f"Cache warming finished: {json.dumps(warmer.get_stats())}")
+        return
+    
     # Handle the list-all-tables command
     if args.list_all_tables:
         all_tables = get_mysql_tables()
@@ -503,12 +604,16 @@ def main():
             csv_file=str(upload_path),
             user_id=current_user,
             suggested_table_name=table_name,
-            db_id=args.db_id
+            db_id=args.db_id,
+            warm_cache=False
         )
         
         # Display results
         if hasattr(context, 'table_name') and context.table_name:
             print(f"\nSuccessfully uploaded data to table: {context.table_name}")
+            start_background_cache_warming(
+                current_user, TextSQLOrchestrator.base_table_name(context.table_name, current_user)
+            )
             print("You can now query this data with:")
             print(f"  python main.py \"your question about the data\" --user {current_user}")
         else:
@@ -595,7 +700,8 @@ def main():
             str(user_db_path) if user_db_path.exists() else "", # Use empty string if path doesn't exist
             "",  # Table name will be determined by metadata lookup
             user_id=current_user,
-            force_visualization=force_visualization
+            force_visualization=force_visualization,
+            force_retry=args.force_retry
         )
         
         # Display results
@@ -799,6 +905,14 @@ def create_default_config(config_path: Path):
                 "schema": Config.DB_NAME
             }
         },
+        "cache_warming": {
+            "on_upload": True,
+            "pause_seconds": 0.5
+        },
+        "negative_cache": {
+            "enabled": True,
+            "ttl_seconds": 300
+        },
         "logging": {
             "level": "INFO",
             "file": Config.LOG_FILE
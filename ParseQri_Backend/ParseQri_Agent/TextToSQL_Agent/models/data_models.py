@@ -19,7 +19,13 @@ class QueryContext:
     visualization_data: Dict[str, Any] = None
     needs_visualization: bool = False
     cache_hit: bool = False
+    negative_cache_hit: bool = False  # Set when a recent failure was returned instead of running the pipeline
     schema_reasoning: Dict[str, Any] = None  # Stores the chain-of-thought reasoning about schema linking
+    join_plan: Dict[str, Any] = None  # Related tables, their schemas and join conditions for multi-table questions
+    value_links: List[Dict[str, str]] = None  # Column values the question mentions, e.g. state = 'Karnataka'
+    schema_fingerprints: Dict[str, str] = None  # Fingerprint of every table the query uses, recorded with cached artifacts
+    table_candidates: List[Dict[str, Any]] = None  # Tables ranked by hybrid retrieval, with their scores
+    table_confident: bool = False  # Set when the top table candidate clearly beats the rest
     
 @dataclass
 class AgentResponse:
@@ -0,0 +1,99 @@
+"""
+Shared test fixtures.
+"""
+import pytest
+from utils import cache_backend, schema_catalog, user_registry
+from utils.vector_index import matches
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    """
+    Give every test its own shared cache backend under tmp_path.
+
+    The default backend persists to the relative CACHE_DIR, which would
+    otherwise be the repository's cache directory.
+    """
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    monkeypatch.setattr(cache_backend, "_shared_backends", {})
+    monkeypatch.setattr(schema_catalog, "_catalog", None)
+    monkeypatch.setattr(user_registry, "_registry",
+                        user_registry.UserRegistry(index_path=str(tmp_path / "cache" / "user_index.json")))
+    yield
+    # Save pending writes now, while tmp_path still exists, instead of at exit
+    for backend in cache_backend._shared_backends.values():
+        getattr(backend, "fallback", backend).flush()
+
+
+class FakeCollection:
+    """
+    In-memory stand-in for a ChromaDB collection that records every write.
+
+    Documents are kept in insertion order and filtered with the same where
+    matching as the local vector index. query returns them in vector_order
+    (table names) when given, else in insertion order.
+    """
+
+    name = "fake_collection"
+
+    def __init__(self, metadatas=None, vector_order=None):
+        self.documents = {}
+        self.upserts = []
+        self.deletes = []
+        self.vector_order = vector_order
+        for metadata in metadatas or []:
+            document = f"Table {metadata['table_name']} with columns {metadata.get('columns_list', '')}"
+            self.documents[f"{metadata['table_name']}_{metadata['user_id']}"] = (document, metadata)
+
+    def upsert(self, ids, documents=None, metadatas=None, embeddings=None):
+        self.upserts.append({"ids": ids, "documents": documents, "metadatas": metadatas})
+        for position, doc_id in enumerate(ids):
+            self.documents[doc_id] = (documents[position] if documents else None,
+                                      metadatas[position] if metadatas else None)
+
+    def update(self, ids, metadatas):
+        for doc_id, metadata in zip(ids, metadatas):
+            if doc_id in self.documents:
+                self.documents[doc_id] = (self.documents[doc_id][0], metadata)
+
+    def delete(self, ids=None, where=None):
+        self.deletes.append(where if ids is None else {"ids": ids})
+        for doc_id in self._select(ids, where):
+            del self.documents[doc_id]
+
+    def get(self, ids=None, where=None, include=None, limit=None, offset=0):
+        selected = self._select(ids, where)[offset:]
+        if limit is not None:
+            selected = selected[:limit]
+        return {
+            "ids": selected,
+            "documents": [self.documents[doc_id][0] for doc_id in selected],
+            "metadatas": [self.documents[doc_id][1] for doc_id in selected],
+        }
+
+    def query(self, query_texts, n_results, where=None, include=None):
+        selected = self._select(None, where)
+        if self.vector_order is not None:
+            by_name = {self.documents[doc_id][1]["table_name"]: doc_id for doc_id in selected}
+            selected = [by_name[name] for name in self.vector_order if name in by_name]
+        selected = selected[:n_results]
+        return {
+            "ids": [selected],
+            "documents": [[self.documents[doc_id][0] for doc_id in selected]],
+            "metadatas": [[self.documents[doc_id][1] for doc_id in selected]],
+            "distances": [[0.1 * rank for rank in range(len(selected))]],
+        }
+
+    def count(self):
+        return len(self.documents)
+
+    def _select(self, ids, where):
+        candidates = [doc_id for doc_id in ids if doc_id in self.documents] if ids is not None else list(self.documents)
+        return [doc_id for doc_id in candidates if matches(self.documents[doc_id][1], where)]
+
+
+@pytest.fixture
+def fake_collection():
+    """The FakeCollection class, to build (or subclass) in-memory collections."""
+    return FakeCollection
@@ -0,0 +1,79 @@
+"""
+Tests for cache statistics, targeted invalidation and snapshots.
+"""
+import pickle
+import pytest
+from utils.cache_backend import InProcessCacheBackend
+from utils.cache_admin import cache_stats, invalidate, export_snapshot, import_snapshot
+
+
+def make_backend():
+    backend = InProcessCacheBackend()
+    backend.set("query", "total sales", "SELECT SUM(amount) FROM sales_u1", user_id="u1")
+    backend.set("query", "list customers", "SELECT * FROM customers_u1", user_id="u1")
+    backend.set("query", "total sales", "SELECT SUM(amount) FROM sales_u2", user_id="u2")
+    backend.set("negative", "0:weather", {"reason": "x", "sql_query": "NOT_RELEVANT"}, user_id="u1", ttl=300)
+    backend.set("llm", "abc", {"message": {"content": "ok"}}, ttl=3600)
+    return backend
+
+
+def test_stats_report_ratios_sizes_and_hot_keys():
+    backend = make_backend()
+    for _ in range(3):
+        backend.get("query", "total sales", user_id="u1")
+    backend.get("query", "unknown", user_id="u1")
+
+    stats = cache_stats(backend)["tiers"]
+    assert stats["query"]["entries"] == 3
+    assert stats["query"]["bytes"] > 0
+    assert stats["query"]["hit_ratio"] == 0.75
+    assert stats["query"]["hot_keys"][0] == {"key": "u1:total sales", "hits": 3}
+    assert stats["llm"]["entries"] == 1
+
+    # Counters survive a save and are merged with new ones
+    backend.save_stats()
+    backend.get("query", "total sales", user_id="u2")
+    assert cache_stats(backend)["tiers"]["query"]["hits"] == 4
+
+
+def test_invalidate_by_user_and_table():
+    backend = make_backend()
+    assert invalidate(backend, user_id="u1", table_name="sales") == {"query": 1, "template": 0, "negative": 0}
+    assert backend.get("query", "list customers", user_id="u1")
+    assert backend.get("query", "total sales", user_id="u2")
+
+    assert invalidate(backend, table_name="sales")["query"] == 1
+    assert invalidate(backend, user_id="u1", namespaces=["query", "negative"]) == {"query": 1, "negative": 1}
+    assert backend.get("llm", "abc")
+
+
+def test_snapshot_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setenv("CACHE_SNAPSHOT_KEY", "node-secret")
+    source = make_backend()
+    path = str(tmp_path / "snapshot.bin")
+    assert export_snapshot(source, path) == 5
+    assert export_snapshot(source, str(tmp_path / "u2.bin"), user_id="u2") == 1
+
+    target = InProcessCacheBackend()
+    assert import_snapshot(target, path, namespaces=["query", "llm"]) == 4
+    assert target.get("query", "total sales", user_id="u2") == "SELECT SUM(amount) FROM sales_u2"
+    assert target.entries("llm")[0]["ttl"] <= 3600
+    assert target.get("negative", "0:weather", user_id="u1") is None
+
+
+def test_unsigned_or_tampered_snapshots_are_never_unpickled(tmp_path):
+    path = tmp_path / "snapshot.bin"
+    export_snapshot(make_backend(), str(path), key="node-secret")
+
+    with pytest.raises(ValueError):
+        import_snapshot(InProcessCacheBackend(), str(path), key="other-secret")
+
+    data = path.read_bytes()
+    path.write_bytes(data[:-1] + bytes([data[-1] ^ 1]))
+    with pytest.raises(ValueError):
+        import_snapshot(InProcessCacheBackend(), str(path), key="node-secret")
+
+    # A plain pickle uploaded in place of a snapshot
+    path.write_bytes(pickle.dumps({"version": 2, "entries": []}))
+    with pytest.raises(ValueError):
+        import_snapshot(InProcessCacheBackend(), str(path), key="node-secret")
@@ -0,0 +1,141 @@
+"""
+Tests for the cache backends, using an in-memory stand-in for the Redis client.
+"""
+import time
+import fnmatch
+from utils.cache_backend import InProcessCacheBackend, RedisCacheBackend
+
+
+class FakeRedis:
+    """Minimal in-memory stand-in for the redis-py client API used by RedisCacheBackend."""
+
+    def __init__(self):
+        self.store = {}
+        self.down = False
+        self.pipelines_executed = 0
+
+    def _check(self):
+        if self.down:
+            raise ConnectionError("Redis is down")
+
+    def get(self, key):
+        self._check()
+        value = self.store.get(key)
+        if value is None or (value[1] is not None and value[1] <= time.time()):
+            return None
+        return value[0]
+
+    def set(self, key, value, ex=None):
+        self._check()
+        self.store[key] = (value, time.time() + ex if ex else None)
+
+    def delete(self, *keys):
+        self._check()
+        return sum(1 for key in keys if self.store.pop(key, None) is not None)
+
+    def scan_iter(self, match="*"):
+        self._check()
+        return [key.encode() for key in list(self.store) if fnmatch.fnmatch(key, match)]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def get(self, key):
+        self.calls.append(("get", (key,), {}))
+
+    def set(self, key, value, ex=None):
+        self.calls.append(("set", (key, value), {"ex": ex}))
+
+    def execute(self):
+        self.client._check()
+        self.client.pipelines_executed += 1
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+def test_in_process_namespacing_and_ttl(tmp_path):
+    backend = InProcessCacheBackend(persist_path=str(tmp_path / "store.joblib"))
+    backend.set("query", "q1", "SELECT 1;", user_id="u1")
+    backend.set("query", "q1", "SELECT 2;", user_id="u2")
+    backend.set("query", "short", "x", user_id="u1", ttl=0.01)
+    time.sleep(0.02)
+
+    assert backend.get("query", "q1", user_id="u1") == "SELECT 1;"
+    assert backend.get("query", "q1", user_id="u2") == "SELECT 2;"
+    assert backend.get("query", "short", user_id="u1") is None
+    assert sorted(backend.keys("query")) == ["q1", "q1"]
+
+    backend.flush()
+    reloaded = InProcessCacheBackend(persist_path=str(tmp_path / "store.joblib"))
+    assert reloaded.get("query", "q1", user_id="u2") == "SELECT 2;"
+    assert reloaded.clear("query", user_id="u1") == 1
+    assert reloaded.get("query", "q1", user_id="u1") is None
+
+
+def test_batched_saves_merge_with_other_processes(tmp_path):
+    path = str(tmp_path / "store.joblib")
+    first = InProcessCacheBackend(persist_path=path, save_interval=60)
+    second = InProcessCacheBackend(persist_path=path, save_interval=60)
+    first.set("query", "a", 1)
+    first.set("query", "shared", "first")
+    first.flush()
+    second.set("query", "b", 2)
+    second.delete("query", "missing")
+    second.flush()
+    first.delete("query", "shared")
+    first.flush()
+
+    reloaded = InProcessCacheBackend(persist_path=path)
+    # Neither save lost the other's entries, and the delete reached the file
+    assert reloaded.get_many("query", ["a", "b", "shared"]) == {"a": 1, "b": 2}
+    # Saving also picks up what other processes saved
+    assert second.get("query", "a") == 1
+
+
+def test_reload_picks_up_saves_of_other_processes(tmp_path):
+    path = str(tmp_path / "store.joblib")
+    reader = InProcessCacheBackend(persist_path=path, save_interval=60)
+    writer = InProcessCacheBackend(persist_path=path, save_interval=60)
+    reader.set("query", "mine", "unsaved")
+    writer.set("fingerprint", "sales_7", "aaaa")
+    writer.flush()
+
+    assert reader.get("fingerprint", "sales_7") is None
+    reader.reload()
+    assert reader.get("fingerprint", "sales_7") == "aaaa"
+    assert reader.get("query", "mine") == "unsaved"
+
+
+def test_redis_pipelined_get_many():
+    client = FakeRedis()
+    backend = RedisCacheBackend(client=client)
+    backend.set_many("schema", {"a": [1], "b": [2], "c:d": [3]}, user_id="u1")
+
+    assert backend.get_many("schema", ["a", "b", "c:d", "missing"], user_id="u1") == {
+        "a": [1], "b": [2], "c:d": [3]
+    }
+    assert client.pipelines_executed == 2
+    assert sorted(backend.keys("schema", user_id="u1")) == ["a", "b", "c:d"]
+    assert sorted(backend.keys("schema")) == ["a", "b", "c:d"]
+
+
+def test_redis_falls_back_when_down():
+    client = FakeRedis()
+    backend = RedisCacheBackend(client=client, retry_after=60)
+    backend.set("llm", "k", {"message": {"content": "ok"}})
+
+    client.down = True
+    assert backend.get("llm", "k") is None
+    backend.set("llm", "k2", "local")
+    assert backend.get("llm", "k2") == "local"
+    assert not backend.available
+
+    # Once the cool-down passes Redis is used again
+    client.down = False
+    backend._down_until = 0
+    assert backend.get("llm", "k") == {"message": {"content": "ok"}}
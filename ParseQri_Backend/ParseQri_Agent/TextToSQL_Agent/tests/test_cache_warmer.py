@@ -0,0 +1,60 @@
+"""
+Tests for background cache warming from query history and after uploads.
+"""
+from agents.query_cache import QueryCacheAgent
+from models.data_models import QueryContext
+from utils.cache_warmer import CacheWarmer, EXPLORATORY_QUESTIONS
+
+
+class StubOrchestrator:
+    """Orchestrator stand-in whose SQL generation just echoes the question."""
+
+    def __init__(self, query_cache):
+        self.agents = {'query_cache': query_cache}
+        self.active_queries = 0
+        self.prepared = []
+
+    def prepare_sql(self, context):
+        self.prepared.append(context.user_question)
+        context.schema = {"id": "INTEGER"}
+        context.sql_query = f"SELECT COUNT(*) FROM {context.table_name}"
+        context.sql_valid = True
+        return None
+
+
+def ask(query_cache, question, table_name="sales", times=1):
+    context = QueryContext(user_question=question, db_name="", table_name=table_name, user_id="alice")
+    for _ in range(times):
+        query_cache.record_history(context)
+
+
+def test_history_replay_and_upload_warming(tmp_path):
+    query_cache = QueryCacheAgent(cache_dir=str(tmp_path), use_templates=False)
+    ask(query_cache, "How many orders were shipped?", times=3)
+    ask(query_cache, "List all customers", times=1)
+    ask(query_cache, "Average price", table_name="products", times=2)
+
+    assert query_cache.get_top_questions("alice", top_n=1) == [
+        ("sales", "How many orders were shipped?"),
+        ("products", "Average price"),
+    ]
+
+    orchestrator = StubOrchestrator(query_cache)
+    warmer = CacheWarmer(orchestrator, pause_seconds=0.01, niceness=0)
+    assert warmer.warm_from_history(top_n=1) == 2
+    assert warmer.warm_after_upload("alice", "orders") == len(EXPLORATORY_QUESTIONS)
+    warmer.start()
+    assert warmer.wait(timeout=10)
+    warmer.stop()
+
+    assert query_cache.get_cached_query("Average price", "alice") == "SELECT COUNT(*) FROM products"
+    first_question = EXPLORATORY_QUESTIONS[0].format(table="orders")
+    assert query_cache.get_cached_query(first_question, "alice") == "SELECT COUNT(*) FROM orders"
+    assert warmer.get_stats()["warmed"] == 2 + len(EXPLORATORY_QUESTIONS)
+
+    # Questions already in the cache are not generated again
+    orchestrator.prepared.clear()
+    warmer.warm_from_history(top_n=1)
+    warmer.start()
+    assert warmer.wait(timeout=10)
+    assert orchestrator.prepared == []
@@ -0,0 +1,72 @@
+"""
+Tests for the shared ChromaDB client registry.
+"""
+from utils.chroma_registry import ChromaClientRegistry
+
+
+class FakeClient:
+    def __init__(self, path):
+        self.path = path
+        self.closed = False
+        self.collections = {}
+
+    def get_collection(self, name):
+        if name not in self.collections:
+            raise ValueError(f"Collection {name} does not exist")
+        return self.collections[name]
+
+    def get_or_create_collection(self, name, metadata=None):
+        return self.collections.setdefault(name, {"name": name, "metadata": metadata})
+
+    def close(self):
+        self.closed = True
+
+
+class FakeRegistry(ChromaClientRegistry):
+    def _open_client(self, path):
+        return FakeClient(path)
+
+
+def test_least_recently_used_clients_are_closed(tmp_path):
+    registry = FakeRegistry(max_clients=2, idle_seconds=0)
+    first = registry.client(str(tmp_path / "u1"))
+    registry.client(str(tmp_path / "u2"))
+    assert registry.client(str(tmp_path / "u1")) is first
+
+    registry.client(str(tmp_path / "u3"))
+
+    metrics = registry.metrics()
+    assert metrics["open_clients"] == 2
+    assert metrics["evictions"] == 1
+    assert metrics["client_opens"] == 3
+    assert metrics["client_hits"] == 1
+    assert not first.closed
+    # u2 was the least recently used client; it is reopened on next use
+    assert registry.client(str(tmp_path / "u2")) is not first
+    assert first.closed
+
+
+def test_pinned_clients_are_never_evicted(tmp_path):
+    registry = FakeRegistry(max_clients=1, idle_seconds=0)
+    store = registry.client(str(tmp_path / "store"), pinned=True)
+    registry.client(str(tmp_path / "u1"))
+    registry.client(str(tmp_path / "u2"))
+
+    assert registry.client(str(tmp_path / "store")) is store
+    assert not store.closed
+    assert registry.metrics()["pinned_clients"] == 1
+
+
+def test_missing_collections_are_not_cached(tmp_path):
+    registry = FakeRegistry()
+    path = str(tmp_path / "u1")
+
+    assert registry.collection(path, "u1_metadata") is None
+    created = registry.collection(path, "u1_metadata", create=True, metadata={"hnsw:space": "cosine"})
+    assert registry.collection(path, "u1_metadata") is created
+
+    metrics = registry.metrics()
+    assert metrics["missing_collections"] == 1
+    assert metrics["collection_loads"] == 1
+    assert metrics["collection_hits"] == 1
+    assert metrics["open_collections"] == 1
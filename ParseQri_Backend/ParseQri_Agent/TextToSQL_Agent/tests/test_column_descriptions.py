@@ -0,0 +1,127 @@
+"""
+Tests for batched, cached column descriptions.
+"""
+import json
+import pytest
+from utils.cache_backend import InProcessCacheBackend
+from utils.column_descriptions import (ColumnDescriber, WORKER_LOCK_FILE, column_signature, drain_pending,
+                                       estimate_tokens, launch_worker, pack_batches, spool_pending)
+
+
+class FakeChat:
+    """Describes every requested column as "<column> of <table>"; fails when told to."""
+
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    def __call__(self, model, messages, **options):
+        self.calls.append(options)
+        if self.fail:
+            raise ConnectionError("LLM unavailable")
+        schema = options["format"]
+        reply = {
+            table: {column: f"{column} of {table}" for column in spec["properties"]}
+            for table, spec in schema["properties"].items()
+        }
+        return {"message": {"role": "assistant", "content": json.dumps(reply)}}
+
+
+def test_signature_depends_on_name_and_samples():
+    assert column_signature("City", ["Pune", "Delhi"]) == column_signature("city", ["Delhi", "Pune"])
+    assert column_signature("city", ["Pune"]) != column_signature("city", ["Paris"])
+    assert column_signature("city", ["Pune"]) != column_signature("town", ["Pune"])
+
+
+def test_tables_are_packed_under_the_token_budget():
+    tables = {f"table{t}": {f"column_{c}": ["value one", "value two"] for c in range(10)} for t in range(6)}
+
+    batches = pack_batches(tables, token_budget=300)
+
+    assert 1 < len(batches) < 6 * 10
+    assert sum(len(columns) for batch in batches for columns in batch.values()) == 60
+    for batch in batches:
+        listing = sum(estimate_tokens(f"- {column}: value one, value two")
+                      for columns in batch.values() for column in columns)
+        assert listing <= 300
+    # A table larger than the budget is split across requests
+    assert len(pack_batches({"wide": tables["table0"]}, token_budget=160)) > 1
+
+
+def test_many_tables_are_described_in_one_structured_request():
+    chat = FakeChat()
+    describer = ColumnDescriber(backend=InProcessCacheBackend(), chat=chat)
+    tables = {
+        "orders": {"amount": ["10", "20"], "city": ["Pune"]},
+        "customers": {"name": ["Asha"], "city": ["Pune"]},
+    }
+
+    descriptions = describer.describe(tables)
+
+    assert len(chat.calls) == 1
+    assert chat.calls[0]["format"]["required"] == ["orders", "customers"]
+    assert descriptions["orders"] == {"amount": "amount of orders", "city": "city of orders"}
+    # The identical city column is described once and shared
+    assert descriptions["customers"] == {"name": "name of customers", "city": "city of orders"}
+    assert describer.metrics()["described"] == 3
+
+
+def test_cached_columns_skip_the_llm_across_tables_and_users():
+    backend = InProcessCacheBackend()
+    ColumnDescriber(backend=backend, chat=FakeChat()).describe({"sales": {"region": ["South", "North"]}})
+    chat = FakeChat()
+    describer = ColumnDescriber(backend=backend, chat=chat)
+
+    descriptions = describer.describe({"other_users_sales": {"region": ["North", "South"], "units": ["4"]}})
+
+    assert descriptions["other_users_sales"]["region"] == "region of sales"
+    assert list(chat.calls[0]["format"]["properties"]["other_users_sales"]["properties"]) == ["units"]
+    assert describer.cached({"t": {"region": ["South", "North"]}}) == {"t": {"region": "region of sales"}}
+    assert describer.metrics()["cache_hits"] == 1
+
+
+def test_failed_requests_fall_back_without_caching():
+    backend = InProcessCacheBackend()
+    describer = ColumnDescriber(backend=backend, chat=FakeChat(fail=True))
+
+    descriptions = describer.describe({"orders": {"order_date": ["2024-01-01"]}})
+
+    assert descriptions == {"orders": {"order_date": "Order Date"}}
+    assert describer.cached({"orders": {"order_date": ["2024-01-01"]}}) == {}
+    assert describer.metrics()["failed_requests"] == 1
+
+
+def test_background_runs_report_their_descriptions():
+    describer = ColumnDescriber(backend=InProcessCacheBackend(), chat=FakeChat())
+    received = []
+
+    future = describer.describe_in_background({"orders": {"amount": ["5"]}}, received.append)
+
+    assert future.result(timeout=5) == {"orders": {"amount": "amount of orders"}}
+    assert received == [{"orders": {"amount": "amount of orders"}}]
+
+
+def test_spooled_runs_are_drained_by_one_worker(tmp_path):
+    spool_dir = str(tmp_path / "pending")
+    spool_pending(spool_dir, {"table_name": "orders"})
+    spool_pending(spool_dir, {"table_name": "stock"})
+    handled = []
+
+    # Another worker holds the lock and drains the runs itself
+    fcntl = pytest.importorskip("fcntl")
+    with open(tmp_path / "pending" / WORKER_LOCK_FILE, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        assert drain_pending(spool_dir, handled.append) == 0
+
+    assert drain_pending(spool_dir, handled.append) == 2
+    assert sorted(run["table_name"] for run in handled) == ["orders", "stock"]
+    assert list((tmp_path / "pending").glob("*.json")) == []
+
+
+def test_worker_runs_detached_with_its_output_in_a_log(tmp_path):
+    log_path = tmp_path / "pending" / "worker.log"
+
+    worker = launch_worker(["-c", "print('described')"], cwd=str(tmp_path), log_path=str(log_path))
+
+    assert worker.wait(timeout=30) == 0
+    assert log_path.read_text().strip() == "described"
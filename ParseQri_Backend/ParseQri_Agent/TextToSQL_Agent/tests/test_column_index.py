@@ -0,0 +1,46 @@
+"""
+Tests for column-level documents and table ranking.
+"""
+import pandas as pd
+
+from agents.sql_generation import SQLGenerationAgent
+from utils.column_index import aggregate_column_hits, sample_values
+
+
+def test_tables_are_ranked_by_their_best_column_hits():
+    metadatas = [
+        {"table_name": "orders", "column_name": "ship_state", "description": "State shipped to"},
+        {"table_name": "customers", "column_name": "state"},
+        {"table_name": "orders", "column_name": "amount"},
+    ] + [{"table_name": "wide", "column_name": f"c{i}"} for i in range(10)]
+    distances = [0.1, 0.2, 0.3] + [0.75] * 10
+
+    ranking = aggregate_column_hits(metadatas, distances)
+
+    # Ten weak hits on a wide table do not beat two strong ones
+    assert [table for table, _ in ranking["tables"]] == ["orders", "customers", "wide"]
+    assert ranking["columns"]["orders"] == ["ship_state", "amount"]
+    assert ranking["descriptions"]["orders"] == {"ship_state": "State shipped to"}
+
+
+def test_sample_values_skip_missing_and_repeated_values():
+    df = pd.DataFrame({"state": ["Goa", None, "Goa", "Kerala", "Assam", "Bihar"]})
+    assert sample_values(df) == {"state": ["Goa", "Kerala", "Assam"]}
+
+
+def test_wide_schemas_are_pruned_to_matched_and_key_columns():
+    agent = SQLGenerationAgent(prune_schema_above=3)
+    schema = {"id": "int", "customer_id": "int", "state": "text", "amount": "float", "notes": "text"}
+    metadata = {"table_name": "sales", "columns": ["state"]}
+    links = [{"table": "sales", "column": "amount", "value": "10", "phrase": "10"}]
+
+    assert agent._prune_schema(schema, "sales", metadata, links) == {
+        "id": "int", "customer_id": "int", "state": "text", "amount": "float"
+    }
+    # Value links name the physical table
+    physical_links = [{"table": "sales_7", "column": "state", "value": "Kerala", "phrase": "kerala"}]
+    assert "state" in agent._prune_schema(schema, "sales", {"table_name": "sales", "columns": ["amount"]},
+                                          physical_links, "7")
+    # Columns matched for another table, or narrow schemas, are left alone
+    assert agent._prune_schema(schema, "orders", metadata) == schema
+    assert SQLGenerationAgent()._prune_schema(schema, "sales", metadata) == schema
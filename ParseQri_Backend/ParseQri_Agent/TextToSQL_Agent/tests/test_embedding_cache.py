@@ -0,0 +1,73 @@
+"""
+Tests for the persistent embedding cache.
+"""
+import json
+
+from utils.embedding_cache import EmbeddingCache
+
+
+class CountingEncoder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0, 0.5] for text in texts]
+
+
+def test_repeated_texts_are_only_encoded_once(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model-a", lru_size=1)
+    encode = CountingEncoder()
+
+    first = cache.embed(["orders", "customers", "orders"], encode)
+    second = cache.embed(["customers", "orders"], encode)
+
+    assert encode.calls == [["customers", "orders"]]
+    assert [list(vector) for vector in first] == [[6.0, 1.0, 0.5], [9.0, 1.0, 0.5], [6.0, 1.0, 0.5]]
+    assert [list(vector) for vector in second] == [[9.0, 1.0, 0.5], [6.0, 1.0, 0.5]]
+    # The LRU holds one vector, so each lookup pushes the other one back to the memory-mapped file
+    metrics = cache.metrics()
+    assert metrics["disk_hits"] == 2
+    assert metrics["misses"] == 3
+
+
+def test_vectors_persist_across_processes(tmp_path):
+    EmbeddingCache(str(tmp_path), "model-a").embed(["orders"], CountingEncoder())
+
+    encode = CountingEncoder()
+    reopened = EmbeddingCache(str(tmp_path), "model-a")
+    assert list(reopened.embed(["orders"], encode)[0]) == [6.0, 1.0, 0.5]
+    assert encode.calls == []
+    assert reopened.metrics()["entries"] == 1
+
+
+def test_another_model_invalidates_the_cache(tmp_path):
+    EmbeddingCache(str(tmp_path), "model-a").embed(["orders"], CountingEncoder())
+
+    upgraded = EmbeddingCache(str(tmp_path), "model-b")
+    encode = CountingEncoder()
+    upgraded.embed(["orders"], encode)
+
+    assert encode.calls == [["orders"]]
+    assert upgraded.metrics()["entries"] == 1
+    assert upgraded.stats["invalidations"] == 1
+    assert json.loads((tmp_path / "model.json").read_text())["model"] == "model-b"
+
+
+def test_a_reset_by_another_process_drops_the_mapped_rows(tmp_path):
+    first = EmbeddingCache(str(tmp_path), "model-a")
+    first.embed(["orders", "customers"], CountingEncoder())
+    first._lru.clear()
+
+    other = EmbeddingCache(str(tmp_path), "model-a")
+    other.clear()
+    other.put_many(["customers", "orders"], [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+
+    # Row 0 used to be "orders"; after the refill it holds "customers"
+    assert [list(vector) for vector in first.get_many(["orders", "customers"])] == [[4.0, 5.0, 6.0], [1.0, 2.0, 3.0]]
+    # Appends of a process that missed the reset do not land in the refilled file
+    stale = first._epoch
+    other.clear()
+    first._epoch, first._meta_mtime = stale, other._meta_mtime
+    first.put_many(["stock"], [[7.0, 8.0, 9.0]])
+    assert other.get_many(["stock"]) == [None]
@@ -0,0 +1,111 @@
+"""
+Tests for hybrid lexical and vector table retrieval.
+"""
+from agents.metadata_indexer import MetadataIndexerAgent
+from models.data_models import QueryContext
+from utils.hybrid_search import clear_winner, reciprocal_rank_fusion, rerank
+from utils.lexical_index import metadata_generation
+
+
+def test_fusion_rewards_agreement_between_retrievers():
+    fused = reciprocal_rank_fusion({
+        "vector": ["orders", "customers", "products"],
+        "lexical": ["customers", "orders"],
+        "columns": ["customers"],
+    })
+
+    assert [candidate["table_name"] for candidate in fused] == ["customers", "orders", "products"]
+    assert fused[0]["ranks"] == {"vector": 2, "lexical": 1, "columns": 1}
+    assert fused[0]["score"] == 1 / 62 + 1 / 61 + 1 / 61
+
+
+def test_clear_winner_needs_agreement_or_a_margin():
+    agreed = reciprocal_rank_fusion({"vector": ["sales", "stock"], "lexical": ["sales", "stock"]})
+    split = reciprocal_rank_fusion({"vector": ["sales", "stock"], "lexical": ["stock", "sales"]})
+    vector_only = reciprocal_rank_fusion({"vector": ["sales", "stock"]})
+    majority = reciprocal_rank_fusion({
+        "vector": ["sales", "stock"], "lexical": ["sales"], "columns": ["stock", "sales"]
+    })
+
+    assert clear_winner(agreed)
+    assert not clear_winner(split)
+    # One retriever always ranks something first
+    assert not clear_winner(vector_only)
+    # Two of three retrievers agree; the fused score decides
+    assert clear_winner(majority, margin=1.4)
+    assert not clear_winner(majority, margin=2.0)
+    assert clear_winner(reciprocal_rank_fusion({"vector": ["sales"]}))
+    assert not clear_winner([])
+
+
+def test_rerank_reorders_the_head_and_must_agree_to_win():
+    fused = reciprocal_rank_fusion({"vector": ["sales", "stock", "staff"], "lexical": ["sales", "stock"]})
+    documents = {"sales": "Table sales", "stock": "Table stock of warehouse items", "staff": "Table staff"}
+
+    def scorer(query_text, texts):
+        return [10.0 if "warehouse" in text else 1.0 for text in texts]
+
+    reranked = rerank("warehouse stock", fused, documents, scorer, top_n=2)
+
+    assert [candidate["table_name"] for candidate in reranked] == ["stock", "sales", "staff"]
+    assert reranked[0]["rerank_score"] == 10.0
+    assert "rerank_score" not in reranked[2]
+    assert not clear_winner(reranked)
+
+
+def _agent(tmp_path, fake_collection, vector_order):
+    agent = MetadataIndexerAgent(chroma_persist_dir=str(tmp_path))
+    collection = fake_collection([
+        {"user_id": "7", "table_name": "orders", "columns_list": "order_id,amount,city",
+         "col_amount": "Total paid for the order"},
+        {"user_id": "7", "table_name": "employees", "columns_list": "employee_id,salary,department",
+         "col_salary": "Monthly pay of the employee"},
+        {"user_id": "7", "table_name": "products", "columns_list": "product_id,price",
+         "col_price": "Price of one unit"},
+    ], vector_order)
+    agent._get_user_collection = lambda user_id: collection
+    agent.rank_tables_by_columns = lambda user_id, query_text: {"tables": [], "columns": {}, "descriptions": {}}
+    return agent
+
+
+def test_lexical_match_outvotes_a_vector_miss(tmp_path, fake_collection):
+    agent = _agent(tmp_path, fake_collection, ["products", "employees", "orders"])
+
+    search = agent.search_relevant_tables("7", "average salary per department")
+
+    assert search["candidates"][0]["table_name"] == "employees"
+    assert search["candidates"][0]["ranks"] == {"vector": 2, "lexical": 1}
+    assert not search["clear_winner"]
+    assert agent.search_relevant_metadata("7", "average salary per department")["table_name"] == "employees"
+
+
+def test_query_mode_reports_scored_candidates_and_clear_winner(tmp_path, fake_collection):
+    agent = _agent(tmp_path, fake_collection, ["employees", "orders", "products"])
+
+    response = agent.process(QueryContext(user_question="salary by department", db_name="", table_name="", user_id="7"))
+
+    assert response.data["relevant_metadata"]["table_name"] == "employees"
+    assert response.data["clear_winner"]
+    assert response.data["table_ranking"][0][0] == "employees"
+    assert response.data["table_candidates"][0]["score"] > response.data["table_candidates"][1]["score"]
+
+
+def test_lexical_index_is_reused_until_metadata_is_saved(tmp_path, fake_collection):
+    agent = _agent(tmp_path, fake_collection, ["products", "employees", "orders"])
+    collection = agent._get_user_collection("7")
+    agent._get_column_collection = lambda user_id: fake_collection()
+    reads = []
+    read = collection.get
+    collection.get = lambda **kwargs: reads.append(kwargs) or read(**kwargs)
+
+    agent.search_relevant_tables("7", "average salary per department")
+    agent.search_relevant_tables("7", "total paid per city")
+    assert len(reads) == 1
+
+    agent.save_metadata_batch("7", {"shifts": {"shift_id": "Shift number", "rota": "Weekly rota of the staff"}})
+    search = agent.search_relevant_tables("7", "weekly rota")
+
+    assert len(reads) == 2
+    assert metadata_generation(agent.metadata_store, "7") == 1
+    ranks = {candidate["table_name"]: candidate["ranks"] for candidate in search["candidates"]}
+    assert ranks["shifts"].get("lexical") == 1
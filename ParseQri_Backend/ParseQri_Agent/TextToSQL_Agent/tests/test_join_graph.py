@@ -0,0 +1,105 @@
+"""
+Tests for the join graph and the Steiner-tree join planner.
+"""
+from sqlalchemy import create_engine, text
+from utils.join_graph import JoinGraph, get_join_graph, join_candidates
+from utils.schema_catalog import get_schema_catalog
+
+
+def make_graph():
+    graph = JoinGraph()
+    graph.add_foreign_keys({
+        "orders": [{"constrained_columns": ["customer_id"], "referred_table": "customers", "referred_columns": ["id"]}],
+        "order_items": [
+            {"constrained_columns": ["order_id"], "referred_table": "orders", "referred_columns": ["id"]},
+            {"constrained_columns": ["product_id"], "referred_table": "products", "referred_columns": ["id"]},
+        ],
+        "customers": [],
+        "products": [],
+        "suppliers": [],
+    })
+    return graph
+
+
+def test_connect_adds_bridge_tables():
+    graph = make_graph()
+    plan = graph.connect(["customers", "products"])
+
+    assert plan["tables"] == ["customers", "orders", "order_items", "products"]
+    assert [graph.describe_join(edge) for edge in plan["joins"]] == [
+        "orders.customer_id = customers.id",
+        "order_items.order_id = orders.id",
+        "order_items.product_id = products.id",
+    ]
+    assert plan["unreachable"] == []
+
+
+def test_connect_reports_unreachable_and_respects_limit():
+    graph = make_graph()
+
+    plan = graph.connect(["orders", "suppliers", "missing"])
+    assert plan["tables"] == ["orders"]
+    assert sorted(plan["unreachable"]) == ["missing", "suppliers"]
+
+    limited = graph.connect(["customers", "products"], max_tables=2)
+    assert limited["tables"] == ["customers"]
+    assert limited["unreachable"] == ["products"]
+
+
+def test_inferred_keys_for_uploaded_tables():
+    graph = JoinGraph()
+    graph.infer_keys({
+        "sales_42": ["id", "customer_id", "amount"],
+        "customers_42": ["id", "name"],
+        "categories_42": ["category_id", "label"],
+        "products_42": ["id", "category_id"],
+    }, user_id="42")
+
+    plan = graph.connect(["sales_42", "customers_42"])
+    assert [graph.describe_join(edge) for edge in plan["joins"]] == ["sales_42.customer_id = customers_42.id"]
+    assert plan["joins"][0]["inferred"]
+
+    plan = graph.connect(["products_42", "categories_42"])
+    assert [graph.describe_join(edge) for edge in plan["joins"]] == [
+        "products_42.category_id = categories_42.category_id"
+    ]
+
+
+def test_graph_from_database_foreign_keys(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'joins.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE customer (customer_id INTEGER PRIMARY KEY, name TEXT)"))
+        conn.execute(text(
+            "CREATE TABLE rental (rental_id INTEGER PRIMARY KEY, "
+            "customer_id INTEGER REFERENCES customer(customer_id), amount REAL)"
+        ))
+
+    graph = get_join_graph(engine)
+    plan = graph.connect(["rental", "customer"])
+    assert [graph.describe_join(edge) for edge in plan["joins"]] == [
+        "rental.customer_id = customer.customer_id"
+    ]
+    assert not plan["joins"][0]["inferred"]
+    get_schema_catalog().invalidate(engine)
+
+
+def test_join_candidates_come_from_retrieval_rankings():
+    tables = ["orders_7", "customers_7", "products_7", "stock_7"]
+    retrieval = [
+        {"table_name": "orders", "score": 0.03, "ranks": {"vector": 1, "bm25": 2}},
+        {"table_name": "customers", "score": 0.03, "ranks": {"vector": 2, "bm25": 1}},
+        {"table_name": "stock", "score": 0.01, "ranks": {"vector": 3}},
+    ]
+    lexical = [("orders_7", 4.0), ("products_7", 2.5), ("stock_7", 1.0)]
+    resolve = lambda name: f"{name}_7"
+
+    # "buyers" names no table, so the candidates come from the rankings
+    candidates = join_candidates("orders_7", tables, retrieval, lexical, ["revenue", "per", "buyers"],
+                                 user_id="7", resolve=resolve)
+    assert candidates == ["orders_7", "customers_7", "products_7"]
+
+    # A clear winner keeps only the tables the question names
+    assert join_candidates("orders_7", tables, retrieval, lexical, ["orders", "stock"], user_id="7",
+                           confident=True, resolve=resolve) == ["orders_7", "stock_7"]
+    assert join_candidates("orders_7", tables, retrieval, lexical, [], user_id="7",
+                           resolve=resolve, max_tables=2) == ["orders_7", "customers_7"]
@@ -0,0 +1,87 @@
+"""
+Tests for the BM25 lexical table index.
+"""
+from sqlalchemy import create_engine, text
+from utils import lexical_index
+from utils.cache_backend import InProcessCacheBackend
+from utils.lexical_index import (BM25Index, tokenize, table_terms, get_lexical_index, get_metadata_index,
+                                 invalidate_metadata_index)
+from utils.schema_catalog import get_schema_catalog
+
+
+def test_tokenize_splits_identifiers_and_stems():
+    assert tokenize("customerOrders") == ["customer", "order"]
+    assert tokenize("order_items_42") == ["order", "item", "42"]
+    assert tokenize("How many categories were shipped?") == ["category", "ship"]
+    assert tokenize("HTTPRequests") == ["http", "request"]
+
+
+def test_bm25_ranks_table_name_matches_first():
+    index = BM25Index()
+    index.add_document("customers_7", table_terms("customers_7", ["id", "name", "email"], user_id="7"))
+    index.add_document("orders_7", table_terms("orders_7", ["id", "customer_id", "total"], user_id="7"))
+    index.add_document("products_7", table_terms("products_7", ["id", "title", "price"],
+                                                 {"price": "Unit price in dollars"}, user_id="7"))
+
+    assert index.search("total of each order")[0][0] == "orders_7"
+    assert index.search("customer emails")[0][0] == "customers_7"
+    assert index.search("which items cost more than 10 dollars")[0][0] == "products_7"
+    assert index.search("weather forecast") == []
+
+
+def test_index_is_cached_per_schema_version(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'lexical.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE rental (rental_id INTEGER, rental_date TEXT)"))
+        conn.execute(text("CREATE TABLE payment (payment_id INTEGER, amount REAL)"))
+
+    index = get_lexical_index(engine)
+    assert get_lexical_index(engine) is index
+    assert index.search("payment amounts")[0][0] == "payment"
+
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE film (film_id INTEGER, title TEXT)"))
+    rebuilt = get_lexical_index(engine)
+    assert rebuilt is not index
+    assert rebuilt.search("film titles")[0][0] == "film"
+
+    described = get_lexical_index(engine, descriptions={"payment": {"amount": "Money paid"}})
+    assert described is not rebuilt
+    assert get_lexical_index(engine, descriptions={"payment": {"amount": "Money paid"}}) is described
+    # Newer table lists and descriptions replace the cached index instead of adding to the cache
+    assert len([key for key in lexical_index._indexes if key[0] == get_schema_catalog().engine_key(engine)]) == 1
+    get_schema_catalog().invalidate(engine)
+
+
+class CountingBackend(InProcessCacheBackend):
+    reloads = 0
+
+    def reload(self):
+        self.reloads += 1
+        super().reload()
+
+
+def test_metadata_index_rebuilds_on_a_new_generation_and_throttles_reloads(tmp_path, monkeypatch):
+    monkeypatch.setattr(lexical_index, "_reloaded_at", {})
+    path = str(tmp_path / "store.joblib")
+    reader = CountingBackend(persist_path=path, save_interval=0)
+    writer = InProcessCacheBackend(persist_path=path, save_interval=0)
+    loads = []
+
+    def load():
+        loads.append(1)
+        return {"orders": ["order", "amount"]}, len(loads)
+
+    assert get_metadata_index("store", "7", load, reader)[1] == 1
+    assert get_metadata_index("store", "7", load, reader)[1] == 1
+    # The file backend is re-read once per interval, not on every search
+    assert reader.reloads == 1
+
+    monkeypatch.setattr(lexical_index, "METADATA_RELOAD_SECONDS", 0)
+    writer.set(lexical_index.METADATA_NAMESPACE, "store", 5, user_id="7")
+    # Another process bumped the generation; the reader sees it on its next reload
+    assert get_metadata_index("store", "7", load, reader)[1] == 2
+    assert reader.reloads == 2
+
+    invalidate_metadata_index("store", "7", reader)
+    assert get_metadata_index("store", "7", load, reader)[1] == 3
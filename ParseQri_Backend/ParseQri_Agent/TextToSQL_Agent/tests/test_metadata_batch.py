@@ -0,0 +1,53 @@
+"""
+Tests for bulk metadata indexing.
+"""
+from agents.metadata_indexer import MetadataIndexerAgent
+
+
+def test_tables_are_upserted_in_batches_with_progress(tmp_path, fake_collection):
+    agent = MetadataIndexerAgent(chroma_persist_dir=str(tmp_path))
+    collection = fake_collection()
+    agent._get_user_collection = lambda user_id: collection
+    agent._get_column_collection = lambda user_id: fake_collection()
+    tables = {f"table{i}": {"id": "Identifier", "total amount": "Order total"} for i in range(5)}
+    progress = []
+
+    ids = agent.save_metadata_batch("7", tables, batch_size=2, progress=lambda done, total: progress.append((done, total)))
+
+    assert ids == [f"table{i}_7" for i in range(5)]
+    assert [len(upsert["ids"]) for upsert in collection.upserts] == [2, 2, 1]
+    assert progress == [(2, 5), (4, 5), (5, 5)]
+    first = collection.upserts[0]
+    assert first["documents"][0] == "Table table0 with columns id, total amount"
+    assert first["metadatas"][0]["col_total_amount"] == "Order total"
+    assert first["metadatas"][0]["columns_list"] == "id,total amount"
+
+
+def test_single_table_save_uses_the_batch_path(tmp_path, fake_collection):
+    agent = MetadataIndexerAgent(chroma_persist_dir=str(tmp_path))
+    collection = fake_collection()
+    agent._get_user_collection = lambda user_id: collection
+    agent._get_column_collection = lambda user_id: fake_collection()
+
+    assert agent.save_metadata_to_chroma("7", "sales", {"state": "State name"}) == "sales_7"
+    assert len(collection.upserts) == 1
+
+
+def test_every_column_is_saved_as_its_own_document(tmp_path, fake_collection):
+    agent = MetadataIndexerAgent(chroma_persist_dir=str(tmp_path))
+    agent._get_user_collection = lambda user_id: fake_collection()
+    columns = fake_collection()
+    agent._get_column_collection = lambda user_id: columns
+
+    agent.save_metadata_batch(
+        "7", {"sales": {"state": "State of the sale", "amount": "Amount"}},
+        samples={"sales": {"State": ["Kerala", "Goa"]}}
+    )
+
+    assert columns.deletes == [{"$and": [{"user_id": "7"}, {"table_name": {"$in": ["sales"]}}]}]
+    upsert = columns.upserts[0]
+    assert upsert["ids"] == ["sales_7:state", "sales_7:amount"]
+    assert upsert["documents"][0] == "Column state of table sales: State of the sale. Examples: Kerala, Goa"
+    # A description that only repeats the column name adds nothing to embed
+    assert upsert["documents"][1] == "Column amount of table sales"
+    assert upsert["metadatas"][0]["column_name"] == "state"
@@ -0,0 +1,43 @@
+"""
+Tests for the shared multi-tenant metadata store.
+"""
+from utils.chroma_registry import get_chroma_registry
+from utils.metadata_store import (
+    delete_user_documents, legacy_user_dirs, metadata_collection, migrate_user_directories, user_document_count
+)
+
+
+def _legacy_user(persist_dir, user_id, tables):
+    user_dir = persist_dir / user_id
+    collection = get_chroma_registry().collection(str(user_dir), f"{user_id}_metadata", create=True)
+    collection.upsert(
+        ids=[f"{table}_{user_id}" for table in tables],
+        embeddings=[[float(i), 1.0, 0.0] for i in range(len(tables))],
+        documents=[f"Table {table}" for table in tables],
+        metadatas=[{"table_name": table} for table in tables]
+    )
+    (user_dir / "metadata_sales.json").write_text("{}")
+
+
+def test_user_directories_are_merged_without_reembedding(tmp_path):
+    _legacy_user(tmp_path, "7", ["sales", "stock"])
+    _legacy_user(tmp_path, "8", ["sales"])
+    assert legacy_user_dirs(str(tmp_path)) == ["7", "8"]
+
+    result = migrate_user_directories(str(tmp_path), remove_legacy=True)
+
+    assert result["documents"] == 3
+    assert result["users"]["7"] == {"tables": 2, "columns": 0}
+    assert user_document_count(str(tmp_path), "7") == 2
+    assert user_document_count(str(tmp_path), "8") == 1
+    shared = metadata_collection(str(tmp_path), "tables")
+    copied = shared.get(ids=["stock_7"], include=["metadatas", "embeddings"])
+    assert copied["metadatas"][0] == {"table_name": "stock", "user_id": "7"}
+    assert [round(float(value), 4) for value in copied["embeddings"][0]] == [1.0, 1.0, 0.0]
+    # ChromaDB files are gone, the metadata logs next to them are kept
+    assert legacy_user_dirs(str(tmp_path)) == []
+    assert (tmp_path / "7" / "metadata_sales.json").exists()
+
+    delete_user_documents(str(tmp_path), "7")
+    assert user_document_count(str(tmp_path), "7") == 0
+    assert user_document_count(str(tmp_path), "8") == 1
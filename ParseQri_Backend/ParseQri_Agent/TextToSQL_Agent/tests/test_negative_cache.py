@@ -0,0 +1,49 @@
+"""
+Tests for the negative cache of failed questions.
+"""
+import time
+from utils.cache_backend import InProcessCacheBackend
+from utils.negative_cache import NegativeCache, NOT_RELEVANT, EXECUTION_ERROR
+
+
+def test_failures_are_scoped_and_expire():
+    cache = NegativeCache(backend=InProcessCacheBackend(), ttl_seconds=0.2)
+    cache.record("What is the weather today?", "Not related to the data", NOT_RELEVANT, user_id="alice")
+
+    # Normalization ignores case, spacing and trailing punctuation
+    failure = cache.get("  what is the WEATHER today ", user_id="alice")
+    assert failure["kind"] == NOT_RELEVANT
+    assert failure["reason"] == "Not related to the data"
+    assert cache.get("What is the weather today?", user_id="bob") is None
+
+    time.sleep(0.3)
+    assert cache.get("What is the weather today?", user_id="alice") is None
+    assert cache.get_metrics()["process"] == {"hits": 1, "misses": 2, "records": 1, "forced_retries": 0}
+
+
+def test_schema_change_and_forced_retry_drop_failures():
+    cache = NegativeCache(backend=InProcessCacheBackend())
+    cache.record("Total sales by region", "Unknown column 'region'", EXECUTION_ERROR, user_id="alice")
+    cache.record("Total sales by region", "Unknown column 'region'", EXECUTION_ERROR, user_id="alice")
+    assert cache.get("Total sales by region", user_id="alice")["count"] == 2
+
+    cache.bump_schema_version("alice")
+    assert cache.get("Total sales by region", user_id="alice") is None
+
+    cache.record("Total sales by region", "Unknown column 'region'", EXECUTION_ERROR, user_id="alice")
+    cache.forget("Total sales by region", user_id="alice")
+    assert cache.get("Total sales by region", user_id="alice") is None
+    assert cache.get_metrics()["total"]["forced_retries"] == 1
+
+
+def test_lookups_do_not_write_metrics_until_saved():
+    backend = InProcessCacheBackend()
+    cache = NegativeCache(backend=backend)
+    for _ in range(3):
+        cache.get("Total sales by region", user_id="alice")
+    assert backend.keys("metrics") == []
+
+    cache.save_metrics()
+    other_process = NegativeCache(backend=backend)
+    other_process.get("Total sales by region", user_id="alice")
+    assert other_process.get_metrics()["total"]["misses"] == 4
@@ -0,0 +1,34 @@
+"""
+Tests for the query execution agent's EXPLAIN check of template-bound SQL.
+"""
+import sqlite3
+
+from sqlalchemy import create_engine
+
+import agents.query_execution as query_execution
+from agents.query_execution import QueryExecutionAgent
+from utils.table_registry import TableRegistry
+
+
+def _agent(tmp_path, monkeypatch):
+    db_path = tmp_path / "sales.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE sales_u1 (year INTEGER, amount REAL)")
+    monkeypatch.setattr(query_execution, "get_table_registry", lambda engine, schema: TableRegistry(["sales_u1"]))
+    agent = QueryExecutionAgent.__new__(QueryExecutionAgent)
+    agent.engine = create_engine(f"sqlite:///{db_path}")
+    return agent
+
+
+def test_explain_accepts_valid_sql_and_reports_errors(tmp_path, monkeypatch):
+    agent = _agent(tmp_path, monkeypatch)
+    assert agent.explain_query("SELECT SUM(amount) FROM sales_u1 WHERE year = 2023;", "u1") is None
+    # Base table names are corrected the same way as when the query runs
+    assert agent.explain_query("SELECT SUM(amount) FROM sales WHERE year = 2023;", "u1") is None
+    assert agent.explain_query("SELECT SUM(amount) FROM sales_u1 WHERE region = 'x';", "u1") is not None
+
+
+def test_explain_is_skipped_without_an_engine():
+    agent = QueryExecutionAgent.__new__(QueryExecutionAgent)
+    agent.engine = None
+    assert agent.explain_query("SELECT 1", "u1") is None
@@ -0,0 +1,134 @@
+"""
+Tests for parameterized query templates learned by the query cache.
+"""
+from utils.query_templates import QueryTemplateStore, learn_template, bind_template, bound_sql_issues
+
+SCHEMA = {"state": "VARCHAR(50)", "year": "INTEGER", "amount": "DOUBLE", "population": "BIGINT"}
+
+
+def test_year_literal_is_rebound():
+    template = learn_template(
+        "What were total sales in 2022?",
+        "SELECT SUM(amount) FROM sales_u1 WHERE year = 2022;",
+        SCHEMA
+    )
+    assert template is not None
+    assert bind_template(template, "What were total sales in 2023?") == \
+        "SELECT SUM(amount) FROM sales_u1 WHERE year = 2023;"
+
+
+def test_limit_and_string_literals():
+    template = learn_template(
+        "Show the top 5 cities in Karnataka by population",
+        "SELECT name FROM city_u1 WHERE state = 'Karnataka' ORDER BY population DESC LIMIT 5;",
+        SCHEMA
+    )
+    sql = bind_template(template, "Show the top 20 cities in Tamil Nadu by population")
+    assert sql == "SELECT name FROM city_u1 WHERE state = 'Tamil Nadu' ORDER BY population DESC LIMIT 20;"
+
+
+def test_thousands_separators_and_between():
+    template = learn_template(
+        "Which cities have a population between 500,000 and 1,000,000?",
+        "SELECT name FROM city WHERE population BETWEEN 500000 AND 1000000;",
+        SCHEMA
+    )
+    sql = bind_template(template, "Which cities have a population between 20,000 and 75,000?")
+    assert sql == "SELECT name FROM city WHERE population BETWEEN 20000 AND 75000;"
+
+
+def test_rejects_values_that_fail_checks():
+    template = learn_template(
+        "Show the top 5 cities in Karnataka",
+        "SELECT name FROM city WHERE state = 'Karnataka' LIMIT 5;",
+        SCHEMA
+    )
+    assert bind_template(template, "Show the top 0 cities in Karnataka") is None
+    assert bind_template(template, "Show the top 5 cities in x'; DROP TABLE city; --") is None
+    assert bind_template(template, "Show the top 2.5 cities in Karnataka") is None
+
+
+def test_unaligned_literals_stay_fixed():
+    template = learn_template(
+        "Show the name of each city in India.",
+        "SELECT name FROM city WHERE countrycode = 'IND';",
+        SCHEMA
+    )
+    assert template is None
+
+
+def test_store_is_scoped_per_user():
+    store = QueryTemplateStore()
+    store.learn("u1", "How many orders in 2021?", "SELECT COUNT(*) FROM orders_u1 WHERE year = 2021;", SCHEMA)
+    assert store.match("u2", "How many orders in 2024?") is None
+    key, sql = store.match("u1", "How many orders in 2024?")
+    assert sql == "SELECT COUNT(*) FROM orders_u1 WHERE year = 2024;"
+
+    restored = QueryTemplateStore()
+    restored.load_dict(store.to_dict())
+    assert restored.match("u1", "how many orders in 2020?")[1].endswith("year = 2020;")
+
+
+def test_string_slot_does_not_swallow_following_clauses():
+    template = learn_template(
+        "Show customers in Karnataka",
+        "SELECT name FROM customers_u1 WHERE state = 'Karnataka';",
+        SCHEMA
+    )
+    assert bind_template(template, "Show customers in Karnataka with balance over 500 sorted by name") is None
+    assert bind_template(template, "Show customers in Uttar Pradesh East") is not None
+    assert bind_template(template, "Show customers in one two three four") is None
+
+
+def test_string_values_must_be_known_and_use_their_stored_spelling():
+    template = learn_template(
+        "Show customers in Karnataka",
+        "SELECT name FROM customers_u1 WHERE state = 'Karnataka';",
+        SCHEMA
+    )
+    known = {("state", "tamil nadu"): "Tamil Nadu"}
+
+    def resolve(column, text):
+        return known.get((column, text.lower()))
+
+    assert bind_template(template, "Show customers in tamil nadu", resolve) == \
+        "SELECT name FROM customers_u1 WHERE state = 'Tamil Nadu';"
+    assert bind_template(template, "Show customers in Atlantis", resolve) is None
+
+
+def test_negative_amounts_need_a_negative_example():
+    template = learn_template(
+        "Orders with amount over 500",
+        "SELECT * FROM orders_u1 WHERE amount > 500;",
+        SCHEMA
+    )
+    assert bind_template(template, "Orders with amount over -500") is None
+    assert bind_template(template, "Orders with amount over 750") == "SELECT * FROM orders_u1 WHERE amount > 750;"
+
+
+def test_forgotten_templates_no_longer_match():
+    store = QueryTemplateStore()
+    key = store.learn("u1", "How many orders in 2021?", "SELECT COUNT(*) FROM orders_u1 WHERE year = 2021;", SCHEMA)
+    assert store.take_changed("u1")
+    store.learn("u1", "How many orders in 2022?", "SELECT COUNT(*) FROM orders_u1 WHERE year = 2022;", SCHEMA)
+    # Same shape and SQL: nothing to save
+    assert not store.take_changed("u1")
+
+    assert store.forget("u1", key)
+    assert store.take_changed("u1")
+    assert store.match("u1", "How many orders in 2024?") is None
+
+
+def test_bound_sql_is_checked_locally():
+    template = learn_template(
+        "What were total sales in 2022?",
+        "SELECT SUM(amount) FROM sales_u1 WHERE year = 2022;",
+        SCHEMA
+    )
+    assert bound_sql_issues(template, bind_template(template, "What were total sales in 2023?")) is None
+    assert bound_sql_issues(template, "SELECT SUM(amount) FROM sales_u1 WHERE year = 2023; DROP TABLE sales_u1;") \
+        == "more than one statement"
+    assert bound_sql_issues(template, "SELECT SUM(amount) FROM sales_u1 WHERE year = 2023 -- x") == "contains a comment"
+    assert bound_sql_issues(template, "SELECT * FROM sales_u1 WHERE year = 2023;") == "does not match the template's SQL"
+    assert bound_sql_issues(template, "SELECT SUM(amount) FROM sales_u1 WHERE region = 'x';") is not None
+    assert bound_sql_issues(template, "DELETE FROM sales_u1 WHERE year = 2023;") == "not a SELECT query"
@@ -0,0 +1,83 @@
+"""
+Tests for the write-behind schema reasoning store.
+"""
+import json
+from utils.reasoning_store import ReasoningStore, reasoning_id
+
+
+def reasoning(tables):
+    return {"think": "...", "answer": {"Related_Tables": tables, "Related_Columns": []}}
+
+
+def test_writes_are_batched_in_the_background(tmp_path, fake_collection):
+    collection = fake_collection()
+    queries = []
+    collection.query = lambda **kwargs: queries.append(kwargs)
+    store = ReasoningStore(str(tmp_path), collection=collection, flush_interval=0.2)
+
+    for i in range(5):
+        store.enqueue("7", f"question {i}", reasoning(["sales_7"]), ["sales_7"])
+    store.close(spool=False)
+
+    assert len(collection.documents) == 5
+    assert len(collection.upserts) <= 2
+    assert store.lookup("7", "Question 3?", ["sales_7"]) == reasoning(["sales_7"])
+    # Reasoning about tables the user no longer has is not reused
+    assert store.lookup("7", "question 3", ["orders_7"]) is None
+    assert store.lookup("8", "question 3") is None
+    # Lookups are id gets; similar-question search is opt-in
+    assert queries == []
+
+
+def test_pending_reasoning_is_spooled_and_picked_up(tmp_path, fake_collection):
+    store = ReasoningStore(str(tmp_path), collection=fake_collection(), reuse_similar=False)
+    store.start = lambda: None  # keep the writer from running
+    store.enqueue("7", "top customers", reasoning([]))
+    store.close()
+    assert store.stats["spooled"] == 1
+
+    collection = fake_collection()
+    next_process = ReasoningStore(str(tmp_path), collection=collection, flush_interval=0.1)
+    next_process.start()
+    next_process.close(spool=False)
+    assert reasoning_id("7", "top customers") in collection.documents
+    assert not (tmp_path / "reasoning_spool.jsonl").exists()
+
+
+def test_claims_of_dead_processes_are_drained_again(tmp_path, monkeypatch, fake_collection):
+    import utils.reasoning_store as reasoning_store
+    item = {"id": reasoning_id("7", "late orders"), "user_id": "7", "question": "late orders",
+            "reasoning": reasoning([]), "tables": [], "created_at": 0}
+    # Claimed by a process that died while draining, and by one still running
+    (tmp_path / "reasoning_spool.jsonl.999999").write_text(json.dumps(item) + "\n")
+    (tmp_path / "reasoning_spool.jsonl.424242.0").write_text(json.dumps(dict(item, id="running")) + "\n")
+    monkeypatch.setattr(reasoning_store, "_pid_alive", lambda pid: pid == 424242)
+
+    collection = fake_collection()
+    store = ReasoningStore(str(tmp_path), collection=collection, reuse_similar=False)
+    store._drain_spool()
+
+    assert list(collection.documents) == [item["id"]]
+    assert not (tmp_path / "reasoning_spool.jsonl.999999").exists()
+    assert (tmp_path / "reasoning_spool.jsonl.424242.0").exists()
+    assert store._in_flight == []
+
+
+def test_claimed_spool_survives_a_failed_drain(tmp_path, fake_collection):
+    class DyingCollection(fake_collection):
+        def upsert(self, ids, documents, metadatas):
+            raise SystemExit  # the process exits mid-drain
+
+    store = ReasoningStore(str(tmp_path), collection=fake_collection(), reuse_similar=False)
+    store.start = lambda: None
+    store.enqueue("7", "top customers", reasoning([]))
+    store.close()
+
+    draining = ReasoningStore(str(tmp_path), collection=DyingCollection(), reuse_similar=False)
+    try:
+        draining._drain_spool()
+    except SystemExit:
+        pass
+    # The drained documents are in flight, and the claimed file is still on disk
+    assert [item["question"] for item in draining._in_flight] == ["top customers"]
+    assert len(list(tmp_path.glob("reasoning_spool.jsonl.*"))) == 1
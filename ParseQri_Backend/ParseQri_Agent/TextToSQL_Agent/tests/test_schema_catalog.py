@@ -0,0 +1,81 @@
+"""
+Tests for the process-wide schema catalog.
+"""
+import time
+from sqlalchemy import create_engine, event, text
+from utils.cache_backend import InProcessCacheBackend
+from utils.schema_catalog import SchemaCatalog
+
+
+def make_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'catalog.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE sales_u1 (id INTEGER, amount REAL)"))
+        conn.execute(text("CREATE TABLE customers_u1 (id INTEGER, name TEXT)"))
+    return engine
+
+
+def count_statements(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return statements
+
+
+def test_tables_and_columns_are_cached(tmp_path):
+    engine = make_engine(tmp_path)
+    catalog = SchemaCatalog()
+
+    assert sorted(catalog.table_names(engine)) == ["customers_u1", "sales_u1"]
+    assert catalog.column_types(engine, "sales_u1") == {"id": "INTEGER", "amount": "REAL"}
+
+    statements = count_statements(engine)
+    for _ in range(3):
+        catalog.table_names(engine)
+        catalog.column_types(engine, "customers_u1")
+    assert statements == []
+    assert catalog.stats["hits"] == 6
+
+
+def test_ddl_and_explicit_invalidation(tmp_path):
+    engine = make_engine(tmp_path)
+    catalog = SchemaCatalog()
+    catalog.table_names(engine)
+
+    # DDL executed through a watched engine drops the cached schema
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE orders_u1 (id INTEGER)"))
+    assert catalog.has_table(engine, "orders_u1")
+
+    # Changes made elsewhere are picked up after explicit invalidation
+    other_engine = create_engine(f"sqlite:///{tmp_path / 'catalog.db'}")
+    with other_engine.begin() as conn:
+        conn.execute(text("ALTER TABLE orders_u1 ADD COLUMN total REAL"))
+    catalog.invalidate(engine, table_name="orders_u1")
+    assert "total" in catalog.column_types(engine, "orders_u1")
+
+
+def test_entries_expire_after_ttl(tmp_path):
+    engine = make_engine(tmp_path)
+    catalog = SchemaCatalog(ttl_seconds=0.05)
+    catalog.table_names(engine)
+    time.sleep(0.1)
+    catalog.table_names(engine)
+    assert catalog.stats["misses"] == 2
+
+
+def test_metadata_is_shared_through_the_backend(tmp_path):
+    engine = make_engine(tmp_path)
+    backend = InProcessCacheBackend()
+    SchemaCatalog(backend=backend).column_types(engine, "sales_u1")
+    # Another worker process: its own catalog, the same backend
+    other_worker = SchemaCatalog(backend=backend)
+
+    statements = count_statements(engine)
+    assert sorted(other_worker.table_names(engine)) == ["customers_u1", "sales_u1"]
+    assert other_worker.column_types(engine, "customers_u1") == {"id": "INTEGER", "name": "TEXT"}
+    assert statements == []
+    assert other_worker.stats["shared_hits"] == 2
+
+    # Invalidation in one process drops the shared copy for all of them
+    other_worker.invalidate(engine)
+    assert backend.keys("catalog") == []
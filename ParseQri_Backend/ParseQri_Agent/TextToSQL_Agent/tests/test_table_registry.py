@@ -0,0 +1,62 @@
+"""
+Tests for indexed per-user table-name resolution.
+"""
+from sqlalchemy import create_engine, text
+from utils.schema_catalog import get_schema_catalog
+from utils.table_registry import TableRegistry, get_table_registry
+
+TABLES = [
+    "sales_42",
+    "sales_data_42",
+    "customers_42",
+    "sales_7",
+    "9_orders",
+    "inventory_42_v2",
+]
+
+
+def test_tables_for_user():
+    registry = TableRegistry(TABLES)
+
+    assert registry.tables_for_user("42") == ["customers_42", "sales_42", "sales_data_42"]
+    assert registry.tables_for_user("7") == ["sales_7"]
+    # Legacy "<user>_<base>" names are used when no suffixed table exists
+    assert registry.tables_for_user("9") == ["9_orders"]
+
+
+def test_resolve_is_deterministic():
+    registry = TableRegistry(TABLES)
+
+    assert registry.resolve("sales_42", "42") == "sales_42"
+    assert registry.resolve("SALES_42") == "sales_42"
+    assert registry.resolve("sales", "42") == "sales_42"
+    assert registry.resolve("customers", "42") == "customers_42"
+    # Names carrying a UUID suffix fall back to their first segment
+    assert registry.resolve("sales_3f2a9c", "7") == "sales_7"
+    assert registry.resolve("orders", "9") == "9_orders"
+    assert registry.resolve("missing", "42") is None
+    assert registry.resolve("sales") is None
+
+
+def test_find_by_prefix():
+    registry = TableRegistry(TABLES)
+    assert registry.find_by_prefix("sales_") == ["sales_42", "sales_7", "sales_data_42"]
+    assert registry.find_by_prefix("zzz") == []
+
+
+def test_registry_rebuilds_after_schema_change(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'registry.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE sales_u1 (id INTEGER)"))
+
+    registry = get_table_registry(engine)
+    assert get_table_registry(engine) is registry
+    assert registry.resolve("sales", "u1") == "sales_u1"
+
+    # DDL invalidates the catalog, which makes the registry rebuild
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE orders_u1 (id INTEGER)"))
+    rebuilt = get_table_registry(engine)
+    assert rebuilt is not registry
+    assert rebuilt.resolve("orders", "u1") == "orders_u1"
+    get_schema_catalog().invalidate(engine)
@@ -0,0 +1,76 @@
+"""
+Tests for the cached user registry.
+"""
+from sqlalchemy import create_engine, text
+from utils.user_registry import UserRegistry, auth_users_source, chroma_dir_source, table_owner_source
+
+
+def test_sources_are_read_once_and_persisted(tmp_path):
+    storage = tmp_path / "db_storage"
+    for name in ("7", "42", "_shared"):
+        (storage / name).mkdir(parents=True)
+
+    calls = []
+    chroma = chroma_dir_source(str(storage))
+
+    def counting_source():
+        calls.append(1)
+        return chroma()
+
+    index_path = str(tmp_path / "user_index.json")
+    registry = UserRegistry(index_path=index_path)
+    registry.add_source("chroma", counting_source)
+
+    assert registry.users() == ["42", "7"]
+    assert registry.exists("42") and registry.exists(7)
+    assert not registry.exists("_shared")
+    assert len(calls) == 1
+
+    # A new process starts from the index file without reading any source
+    fresh = UserRegistry(index_path=index_path)
+    assert fresh.users() == ["42", "7"]
+
+
+def test_register_notifies_listeners(tmp_path):
+    registry = UserRegistry(index_path=str(tmp_path / "user_index.json"))
+    registry.add_source("static", lambda: ["1"])
+    changes = []
+    registry.subscribe(lambda added, removed: changes.append((added, removed)))
+
+    registry.users()
+    registry.register("2")
+    registry.register("2")
+
+    assert changes == [({"1"}, set()), ({"2"}, set())]
+    assert registry.exists("2")
+
+
+def test_database_sources(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'users.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT)"))
+        conn.execute(text("INSERT INTO users (id, username) VALUES (3, 'ana'), (5, 'bo')"))
+        conn.execute(text("CREATE TABLE sales_9 (user_id TEXT, amount REAL)"))
+        conn.execute(text("INSERT INTO sales_9 (user_id, amount) VALUES ('9', 1.5), ('9', 2.0)"))
+        # A year suffix is not a user
+        conn.execute(text("CREATE TABLE sales_2023 (user_id TEXT, amount REAL)"))
+        conn.execute(text("INSERT INTO sales_2023 (user_id, amount) VALUES ('5', 3.0)"))
+
+    index_path = str(tmp_path / "user_index.json")
+    registry = UserRegistry(index_path=index_path)
+    registry.add_source("auth_users", auth_users_source(engine))
+    registry.add_source("table_owners", table_owner_source(engine), background=True)
+
+    # The owner scan is left to the background refresh
+    assert registry.users() == ["3", "5"]
+    registry.wait_for_refresh(timeout=10)
+    assert registry.users() == ["3", "5", "9"]
+
+    # Once the index is stale, lookups keep the known users and never scan in the caller
+    stale = UserRegistry(index_path=index_path, ttl_seconds=0)
+    scans = []
+    stale.add_source("table_owners", lambda: scans.append(1) or ["9", "11"], background=True)
+    assert stale.users() == ["3", "5", "9"]
+    stale.wait_for_refresh(timeout=10)
+    assert scans == [1]
+    assert "11" in stale.refresh(include_background=False)
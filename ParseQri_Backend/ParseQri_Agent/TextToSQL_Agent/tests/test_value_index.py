@@ -0,0 +1,91 @@
+"""
+Tests for the categorical value index.
+"""
+import pandas as pd
+from sqlalchemy import create_engine, text
+from utils.cache_backend import InProcessCacheBackend
+from utils.schema_catalog import get_schema_catalog
+from utils.value_index import (
+    ValueIndex, index_dataframe, get_value_index, save_value_index, refresh_value_index, refresh_in_background,
+    wait_for_refreshes
+)
+
+
+def _sales_index():
+    df = pd.DataFrame({
+        "user_id": ["7"] * 4,
+        "state": ["Karnataka", "Tamil Nadu", "Kerala", "Karnataka"],
+        "region": ["South", "South", "South", "South"],
+        "order_ref": ["A-1", "A-2", "A-3", "A-4"],
+        "amount": [10.0, 20.0, 30.0, 40.0],
+    })
+    return index_dataframe(ValueIndex(max_distinct=3), "sales_7", df)
+
+
+def test_dataframe_index_keeps_only_categorical_text_columns():
+    index = _sales_index()
+
+    columns = index.tables["sales_7"]["columns"]
+    assert columns["state"] == ["Karnataka", "Kerala", "Tamil Nadu"]
+    assert columns["region"] == ["South"]
+    # Too many distinct values, numbers and the owner column are not indexed
+    assert "order_ref" not in columns
+    assert "amount" not in columns
+    assert "user_id" not in columns
+
+
+def test_match_links_exact_prefix_and_fuzzy_phrases():
+    index = _sales_index()
+
+    links = index.match("Total sales in tamil nadu and karnatka")
+    assert [(link["column"], link["value"], link["match"]) for link in links] == [
+        ("state", "Tamil Nadu", "exact"),
+        ("state", "Karnataka", "fuzzy"),
+    ]
+    assert index.match("orders from Kera")[0]["value"] == "Kerala"
+    assert index.match("sales in kerala", tables=["other_7"]) == []
+    assert index.complete("ka") == [("sales_7", "state", "Karnataka")]
+
+
+def test_index_round_trips_through_the_cache_backend():
+    backend = InProcessCacheBackend()
+    save_value_index("7", _sales_index(), "parseqri", backend=backend)
+
+    restored = ValueIndex.from_dict(backend.get("values", "parseqri", user_id="7"))
+    assert restored.lookup("KERALA") == [("sales_7", "state", "Kerala")]
+    assert get_value_index("7", "parseqri", backend=backend).lookup("south") == [("sales_7", "region", "South")]
+
+
+def test_external_tables_are_indexed_with_distinct_queries(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'values.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE film (film_id INTEGER, rating VARCHAR(10), title VARCHAR(50))"))
+        conn.execute(text("INSERT INTO film VALUES (1, 'PG', 'Alien'), (2, 'R', 'Heat'), (3, 'PG', 'Up')"))
+    backend = InProcessCacheBackend()
+
+    index = refresh_value_index(engine, None, ["film"], backend=backend, max_age=60)
+    assert index.tables["film"]["columns"]["rating"] == ["PG", "R"]
+    assert index.match("films rated pg")[0]["column"] == "rating"
+
+    built_at = index.tables["film"]["built_at"]
+    assert refresh_value_index(engine, None, ["film"], backend=backend, max_age=60).tables["film"]["built_at"] == built_at
+
+    get_schema_catalog().invalidate(engine)
+
+
+def test_background_refresh_leaves_the_question_path_to_read_the_index(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'values.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE store (store_id INTEGER, city VARCHAR(20))"))
+        conn.execute(text("INSERT INTO store VALUES (1, 'Lethbridge'), (2, 'Woodridge')"))
+    backend = InProcessCacheBackend()
+    before = get_value_index("7", "main", backend)
+
+    assert refresh_in_background(engine, "7", ["store"], "main", max_age=60, backend=backend)
+    wait_for_refreshes(timeout=10)
+
+    # The scan went into a new index; the one questions were matching was left alone
+    assert "store" not in before.tables
+    assert get_value_index("7", "main", backend).lookup("woodridge") == [("store", "city", "Woodridge")]
+    assert not refresh_in_background(engine, "7", ["store"], "main", max_age=60, backend=backend)
+    get_schema_catalog().invalidate(engine)
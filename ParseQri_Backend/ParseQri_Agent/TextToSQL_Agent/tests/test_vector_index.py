@@ -0,0 +1,210 @@
+"""
+Tests for the local vector index and ChromaDB failover.
+"""
+import numpy as np
+from utils import vector_index
+from utils.vector_index import FailoverCollection, LocalVectorIndex, matches, mirror_collection
+
+
+def embed(texts):
+    """Bag-of-letters embedding, enough to tell the test documents apart."""
+    vectors = np.zeros((len(texts), 26), dtype="float32")
+    for row, text in enumerate(texts):
+        for char in text.lower():
+            if "a" <= char <= "z":
+                vectors[row, ord(char) - ord("a")] += 1
+    return vectors
+
+
+def _index(tmp_path, **kwargs):
+    return LocalVectorIndex(str(tmp_path / "tables"), "table_metadata", embedding_function=embed, **kwargs)
+
+
+def _fill(index):
+    index.upsert(
+        ids=["orders_1", "employees_1", "orders_2"],
+        documents=["orders amount city", "employees salary department", "orders amount city"],
+        metadatas=[{"user_id": "1", "table_name": "orders"},
+                   {"user_id": "1", "table_name": "employees"},
+                   {"user_id": "2", "table_name": "orders"}],
+    )
+
+
+def test_where_filters():
+    metadata = {"user_id": "1", "table_name": "orders", "rows": 5}
+
+    assert matches(metadata, {"user_id": "1"})
+    assert matches(metadata, {"$and": [{"user_id": "1"}, {"table_name": {"$in": ["orders", "sales"]}}]})
+    assert matches(metadata, {"$or": [{"user_id": "2"}, {"rows": {"$gte": 5}}]})
+    assert not matches(metadata, {"table_name": {"$ne": "orders"}})
+    assert not matches(metadata, {"missing": {"$gt": 1}})
+
+
+def test_query_ranks_by_cosine_distance_within_the_filter(tmp_path):
+    index = _index(tmp_path)
+    _fill(index)
+
+    results = index.query(query_texts=["salary by department"], n_results=5, where={"user_id": "1"},
+                          include=["metadatas", "distances"])
+
+    assert results["ids"] == [["employees_1", "orders_1"]]
+    assert results["documents"] is None
+    assert results["distances"][0][0] < results["distances"][0][1]
+    assert index.get(where={"user_id": "2"}, include=[])["ids"] == ["orders_2"]
+    assert index.get(ids=["orders_2", "orders_1"])["documents"] == ["orders amount city"] * 2
+
+
+def test_writes_persist_and_deleted_rows_are_reused(tmp_path):
+    index = _index(tmp_path)
+    _fill(index)
+    index.delete(where={"$and": [{"user_id": "1"}, {"table_name": {"$in": ["orders"]}}]})
+    index.upsert(ids=["stock_1"], documents=["stock warehouse"], metadatas=[{"user_id": "1", "table_name": "stock"}])
+    index.update(ids=["employees_1", "unknown"], metadatas=[{"user_id": "1", "table_name": "staff"}, {}])
+
+    reopened = _index(tmp_path)
+
+    assert reopened.count() == 3
+    assert reopened.get(ids=["stock_1"], include=["embeddings"])["embeddings"].shape == (1, 26)
+    assert reopened.get(ids=["employees_1"])["metadatas"] == [{"user_id": "1", "table_name": "staff"}]
+    assert reopened.get(ids=["employees_1"])["documents"] == ["employees salary department"]
+    # The deleted row was reused, so the vectors file did not grow
+    assert (tmp_path / "tables" / "vectors.f32").stat().st_size == 3 * 26 * 4
+    assert reopened.query(query_texts=["warehouse stock"], n_results=1)["ids"] == [["stock_1"]]
+
+
+def test_writes_append_to_the_log_until_it_outgrows_the_snapshot(tmp_path, monkeypatch):
+    index = _index(tmp_path)
+    other = _index(tmp_path)
+    _fill(index)
+    snapshot = tmp_path / "tables" / "index.json"
+    written = snapshot.stat().st_mtime_ns
+
+    index.upsert(ids=["stock_1"], documents=["stock warehouse"], metadatas=[{"user_id": "1", "table_name": "stock"}])
+    index.delete(ids=["orders_2"])
+
+    # Both writes went to the log; the other instance (or process) replays it
+    assert snapshot.stat().st_mtime_ns == written
+    assert other.count() == 3
+    assert other.query(query_texts=["warehouse stock"], n_results=1)["ids"] == [["stock_1"]]
+
+    monkeypatch.setattr(vector_index, "LOG_COMPACT_BYTES", 0)
+    # Rewriting the same row grows the log past the snapshot, which is then rewritten
+    for name in ["stock", "inventory", "stock", "inventory", "stock", "inventory"]:
+        index.update(ids=["stock_1"], metadatas=[{"user_id": "1", "table_name": name}])
+    index.upsert(ids=["sales_1"], documents=["sales revenue"], metadatas=[{"user_id": "1", "table_name": "sales"}])
+
+    assert snapshot.stat().st_mtime_ns != written
+    assert not (tmp_path / "tables" / "index.1.log").exists()
+    assert other.get(ids=["stock_1", "sales_1"])["metadatas"] == [
+        {"user_id": "1", "table_name": "inventory"}, {"user_id": "1", "table_name": "sales"}
+    ]
+    assert _index(tmp_path).count() == 4
+
+
+class FakeHnswIndex:
+    """Exact stand-in for hnswlib.Index that counts the graphs built."""
+
+    built = 0
+
+    def __init__(self, space, dim):
+        self.vectors, self.labels = None, None
+
+    def init_index(self, max_elements, ef_construction, M):
+        FakeHnswIndex.built += 1
+
+    def add_items(self, vectors, labels):
+        self.vectors, self.labels = np.asarray(vectors), list(labels)
+
+    def set_ef(self, ef):
+        pass
+
+    def knn_query(self, queries, k, filter=None):
+        allowed = [i for i, label in enumerate(self.labels) if filter is None or filter(label)]
+        distances = 1.0 - queries @ self.vectors[allowed].T
+        order = np.argsort(distances, axis=1)[:, :k]
+        labels = np.asarray([self.labels[i] for i in allowed])
+        return labels[order], np.take_along_axis(distances, order, axis=1)
+
+
+def test_hnsw_is_used_only_when_the_filter_leaves_enough_rows(tmp_path, monkeypatch):
+    FakeHnswIndex.built = 0
+    monkeypatch.setattr(vector_index, "hnswlib", type("hnswlib", (), {"Index": FakeHnswIndex}))
+    index = _index(tmp_path, hnsw_threshold=3)
+    _fill(index)
+    index.upsert(ids=["stock_1"], documents=["stock warehouse"], metadatas=[{"user_id": "1", "table_name": "stock"}])
+
+    # Tenant 2 has one row: brute force, even though the index has four
+    assert index.query(query_texts=["orders city"], n_results=2, where={"user_id": "2"})["ids"] == [["orders_2"]]
+    assert FakeHnswIndex.built == 0
+
+    results = index.query(query_texts=["warehouse stock"], n_results=2, where={"user_id": "1"})
+    assert FakeHnswIndex.built == 1
+    assert results["ids"][0][0] == "stock_1"
+    assert set(results["ids"][0]) <= {"orders_1", "employees_1", "stock_1"}
+
+
+def test_writes_merge_metadata_like_chromadb(tmp_path):
+    index = _index(tmp_path)
+    _fill(index)
+    index.update(ids=["orders_1"], metadatas=[{"schema_fingerprint": "aaaa"}])
+    index.upsert(ids=["orders_1"], documents=["orders amount city country"],
+                 metadatas=[{"user_id": "1", "table_name": "orders", "col_city": "Delivery city"}])
+    index.update(ids=["orders_1"], metadatas=[{"col_city": None}])
+
+    assert index.get(ids=["orders_1"])["metadatas"] == [
+        {"user_id": "1", "table_name": "orders", "schema_fingerprint": "aaaa"}
+    ]
+    assert index.get(ids=["orders_1"])["documents"] == ["orders amount city country"]
+
+
+class BrokenCollection:
+    name = "table_metadata"
+
+    def __getattr__(self, method):
+        def fail(*args, **kwargs):
+            raise ConnectionError("ChromaDB unavailable")
+        return fail
+
+
+def test_failover_serves_reads_and_writes_from_the_local_index(tmp_path):
+    collection = FailoverCollection(BrokenCollection(), _index(tmp_path))
+
+    _fill(collection)
+
+    assert collection.count() == 3
+    assert collection.query(query_texts=["orders city"], n_results=1, where={"user_id": "2"})["ids"] == [["orders_2"]]
+
+
+class RecordingCollection:
+    name = "table_metadata"
+
+    def __init__(self):
+        self.writes = []
+
+    def upsert(self, **kwargs):
+        self.writes.append(kwargs)
+
+
+def test_failover_embeds_each_document_once(tmp_path):
+    calls = []
+    primary = RecordingCollection()
+    fallback = LocalVectorIndex(str(tmp_path / "tables"), "table_metadata",
+                                embedding_function=lambda texts: calls.append(texts) or embed(texts))
+
+    FailoverCollection(primary, fallback).upsert(ids=["stock_1"], documents=["stock warehouse"],
+                                                 metadatas=[{"user_id": "1"}])
+
+    assert calls == [["stock warehouse"]]
+    assert np.allclose(primary.writes[0]["embeddings"], embed(["stock warehouse"]))
+    assert fallback.count() == 1
+
+
+def test_mirror_copies_embeddings(tmp_path):
+    source = LocalVectorIndex(str(tmp_path / "source"), "table_metadata", embedding_function=embed)
+    _fill(source)
+    # No embedding function: the copied embeddings are used as they are
+    target = LocalVectorIndex(str(tmp_path / "target"), "table_metadata")
+
+    assert mirror_collection(source, target, batch_size=2) == 3
+    assert target.get(ids=["orders_2"])["metadatas"] == [{"user_id": "2", "table_name": "orders"}]
+    assert np.allclose(target.get(include=["embeddings"])["embeddings"], source.get(include=["embeddings"])["embeddings"])
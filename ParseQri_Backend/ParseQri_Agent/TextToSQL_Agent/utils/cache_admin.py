@@ -0,0 +1,213 @@
+"""
+Inspection and maintenance of the cache tiers stored in the cache backend.
+
+Used by the --cache-* commands of main.py and, through them, by the backend's
+admin endpoints. The tiers are the namespaces written by the agents:
+- query:    question -> SQL, per user
+- template: learned parameterized SQL templates, per user
+- negative: recently failed questions, per user
+- llm:      memoized LLM responses, shared
+- history:  question counts used for cache warming
+
+Snapshots hold pickled values, so they are signed with HMAC-SHA256 using the
+CACHE_SNAPSHOT_KEY secret, and a snapshot is only unpickled once its
+signature checks out. A file that was not exported with the same key is
+rejected, never loaded.
+"""
+import os
+import re
+import hmac
+import time
+import pickle
+import hashlib
+from typing import Dict, List, Any, Optional
+from utils.cache_backend import CacheBackend, CacheStats, STATS_NAMESPACE
+
+CACHE_TIERS = ["query", "template", "negative", "llm", "history"]
+
+# Tiers holding answers that depend on a user's tables
+TABLE_SCOPED_TIERS = ["query", "template", "negative"]
+
+SNAPSHOT_VERSION = 2
+SNAPSHOT_MAGIC = b"PARSEQRI-CACHE-SNAPSHOT\n"
+
+
+def _snapshot_key(key: Optional[str]) -> bytes:
+    """Signing key of snapshots, from the argument or CACHE_SNAPSHOT_KEY."""
+    key = key or os.getenv("CACHE_SNAPSHOT_KEY")
+    if not key:
+        raise ValueError("Set CACHE_SNAPSHOT_KEY to export or import cache snapshots")
+    return key.encode("utf-8")
+
+
+def _signature(payload: bytes, key: bytes) -> bytes:
+    return hmac.new(key, payload, hashlib.sha256).hexdigest().encode("ascii")
+
+
+def cache_stats(backend: CacheBackend, top_n: int = 10) -> Dict[str, Any]:
+    """
+    Report usage and size of every cache tier.
+
+    Args:
+        backend: Cache backend to inspect
+        top_n: Number of hot keys to report per tier
+
+    Returns:
+        Dictionary with a "tiers" entry per namespace (entries, bytes, hits, misses,
+        hit_ratio, sets, deletes, evictions, hot_keys) and backend details
+    """
+    usage = backend.load_stats()
+    sizes: Dict[str, Dict[str, int]] = {}
+    for entry in backend.entries():
+        if entry["namespace"] == STATS_NAMESPACE:
+            continue
+        size = sizes.setdefault(entry["namespace"], {"entries": 0, "bytes": 0})
+        size["entries"] += 1
+        size["bytes"] += entry["size"]
+
+    tiers = {}
+    for namespace in sorted(set(CACHE_TIERS) | set(sizes) | set(usage["counters"])):
+        counters = usage["counters"].get(namespace, dict.fromkeys(CacheStats.COUNTERS, 0))
+        lookups = counters.get("hits", 0) + counters.get("misses", 0)
+        hot_keys = sorted(usage["hot_keys"].get(namespace, {}).items(), key=lambda item: item[1], reverse=True)
+        tiers[namespace] = dict(
+            sizes.get(namespace, {"entries": 0, "bytes": 0}),
+            **counters,
+            hit_ratio=round(counters.get("hits", 0) / lookups, 4) if lookups else None,
+            hot_keys=[{"key": key, "hits": hits} for key, hits in hot_keys[:top_n]]
+        )
+
+    result = {"backend": type(backend).__name__, "tiers": tiers}
+    if hasattr(backend, "server_stats"):
+        result["available"] = backend.available
+        result["server"] = backend.server_stats()
+    return result
+
+
+def _table_pattern(table_name: str, user_id: Optional[str]) -> re.Pattern:
+    """Regex matching references to a table, by base or per-user physical name."""
+    if user_id:
+        names = f"(?:{re.escape(table_name)}|{re.escape(table_name)}_{re.escape(str(user_id))})"
+    else:
+        # Without a user any per-user copy of the table matches
+        names = f"{re.escape(table_name)}(?:_\\w+)?"
+    return re.compile(rf"(?<![\w]){names}(?![\w])", re.IGNORECASE)
+
+
+def _mentions_table(value: Any, pattern: re.Pattern) -> bool:
+    """Whether a cached value refers to the table."""
+    if isinstance(value, str):
+        return bool(pattern.search(value))
+    if isinstance(value, dict) and "sql_query" in value:
+        return bool(pattern.search(value.get("sql_query") or ""))
+    return bool(pattern.search(repr(value)))
+
+
+def invalidate(backend: CacheBackend, user_id: Optional[str] = None, table_name: Optional[str] = None,
+               namespaces: Optional[List[str]] = None) -> Dict[str, int]:
+    """
+    Remove cache entries for a user, a table, or both.
+
+    Args:
+        backend: Cache backend to modify
+        user_id: Only remove entries of this user (None for all users)
+        table_name: Only remove entries whose SQL refers to this table
+        namespaces: Tiers to clear, defaults to the table-dependent tiers
+
+    Returns:
+        Number of removed entries per tier
+    """
+    namespaces = namespaces or TABLE_SCOPED_TIERS
+    removed = {}
+    for namespace in namespaces:
+        if not table_name:
+            removed[namespace] = backend.clear(namespace, user_id=user_id)
+            continue
+
+        pattern = _table_pattern(table_name, user_id)
+        count = 0
+        for entry in backend.entries(namespace, user_id=user_id):
+            if _mentions_table(entry["value"], pattern):
+                backend.delete(namespace, entry["key"], user_id=entry["user_id"])
+                count += 1
+        removed[namespace] = count
+    return removed
+
+
+def export_snapshot(backend: CacheBackend, path: str, namespaces: Optional[List[str]] = None,
+                    user_id: Optional[str] = None, key: Optional[str] = None) -> int:
+    """
+    Write cache entries to a signed snapshot file, e.g. to warm a new node.
+
+    Args:
+        backend: Cache backend to read
+        path: Snapshot file to write
+        namespaces: Tiers to export, defaults to all tiers
+        user_id: Only export entries of this user
+        key: Signing key (defaults to CACHE_SNAPSHOT_KEY)
+
+    Returns:
+        Number of exported entries
+    """
+    entries = []
+    for namespace in namespaces or CACHE_TIERS:
+        for entry in backend.entries(namespace, user_id=user_id):
+            entries.append({k: entry[k] for k in ("namespace", "user_id", "key", "value", "ttl")})
+
+    signing_key = _snapshot_key(key)
+    payload = pickle.dumps({"version": SNAPSHOT_VERSION, "exported_at": time.time(), "entries": entries})
+    with open(path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC + _signature(payload, signing_key) + b"\n" + payload)
+    return len(entries)
+
+
+def import_snapshot(backend: CacheBackend, path: str, namespaces: Optional[List[str]] = None,
+                    key: Optional[str] = None) -> int:
+    """
+    Load entries from a snapshot written by export_snapshot.
+
+    Args:
+        backend: Cache backend to fill
+        path: Snapshot file to read
+        namespaces: Only import these tiers (defaults to everything in the snapshot)
+        key: Signing key the snapshot was exported with (defaults to CACHE_SNAPSHOT_KEY)
+
+    Returns:
+        Number of imported entries
+
+    Raises:
+        ValueError: If the file is not a snapshot signed with the key
+    """
+    signing_key = _snapshot_key(key)
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(SNAPSHOT_MAGIC):
+        raise ValueError("Not a cache snapshot")
+    signature, _, payload = data[len(SNAPSHOT_MAGIC):].partition(b"\n")
+    # Verified before anything is unpickled
+    if not hmac.compare_digest(signature, _signature(payload, signing_key)):
+        raise ValueError("Cache snapshot signature does not match CACHE_SNAPSHOT_KEY")
+
+    snapshot = pickle.loads(payload)
+    if snapshot.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported cache snapshot version: {snapshot.get('version')}")
+
+    # Entries keep the time they had left when exported
+    elapsed = time.time() - snapshot.get("exported_at", time.time())
+    batches: Dict[tuple, Dict[str, Any]] = {}
+    for entry in snapshot["entries"]:
+        if namespaces and entry["namespace"] not in namespaces:
+            continue
+        ttl = entry.get("ttl")
+        if ttl is not None:
+            ttl = int(ttl - elapsed)
+            if ttl <= 0:
+                continue
+        batches.setdefault((entry["namespace"], entry["user_id"], ttl), {})[entry["key"]] = entry["value"]
+
+    # Write in batches so persisted and remote backends are not hit once per entry
+    imported = 0
+    for (namespace, user_id, ttl), items in batches.items():
+        backend.set_many(namespace, items, user_id=user_id, ttl=ttl)
+        imported += len(items)
+    return imported
@@ -0,0 +1,693 @@
+"""
+Pluggable cache backends shared by the query cache, schema catalog and LLM memoization.
+
+Two implementations are provided:
+- InProcessCacheBackend: a dictionary with TTLs, optionally persisted to a joblib file
+  so short-lived CLI processes keep their cache between runs. Writes are saved in
+  batches (after save_interval seconds and at exit), merged under a file lock
+  with what other processes saved in the meantime.
+- RedisCacheBackend: a shared tier for multi-worker deployments, enabled through the
+  REDIS_URL environment variable. When Redis is unreachable it falls back to an
+  in-process backend and retries the connection after a cool-down.
+
+Keys are namespaced by cache tier and user: "<prefix>:<namespace>:<user_id>:<key>".
+
+Every backend counts hits, misses, writes, deletes and evictions per namespace,
+along with the most frequently hit keys. Counters are kept in memory and merged
+into the "stats" namespace of the backend itself when the process exits.
+"""
+import os
+import time
+import pickle
+import atexit
+import threading
+import joblib
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Iterable
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves are not locked across processes
+    fcntl = None
+
+GLOBAL_SCOPE = "_global"
+DEFAULT_PREFIX = "parseqri"
+STATS_NAMESPACE = "stats"
+MAX_HOT_KEYS = 200
+# Seconds writes may wait before the in-process cache file is saved
+DEFAULT_SAVE_INTERVAL = 5.0
+
+
+class CacheStats:
+    """
+    Thread-safe usage counters per cache namespace.
+    """
+
+    COUNTERS = ("hits", "misses", "sets", "deletes", "evictions")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Dict[str, int]] = {}
+        self.hot_keys: Dict[str, Dict[str, int]] = {}
+
+    def record(self, namespace: str, event: str, count: int = 1):
+        """Add to one of the COUNTERS of a namespace."""
+        if namespace == STATS_NAMESPACE or count <= 0:
+            return
+        with self._lock:
+            counters = self.counters.setdefault(namespace, dict.fromkeys(self.COUNTERS, 0))
+            counters[event] += count
+
+    def record_hit(self, namespace: str, key: str, user_id: Optional[str] = None):
+        """Count a hit and remember which key was hit."""
+        self.record(namespace, "hits")
+        if namespace == STATS_NAMESPACE:
+            return
+        with self._lock:
+            hot_keys = self.hot_keys.setdefault(namespace, {})
+            scoped_key = f"{user_id or GLOBAL_SCOPE}:{key}"
+            hot_keys[scoped_key] = hot_keys.get(scoped_key, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Copy of the current counters and hot keys."""
+        with self._lock:
+            return {
+                "counters": {ns: dict(c) for ns, c in self.counters.items()},
+                "hot_keys": {ns: dict(k) for ns, k in self.hot_keys.items()},
+            }
+
+    def reset(self):
+        """Forget all counters, e.g. after they were saved."""
+        with self._lock:
+            self.counters = {}
+            self.hot_keys = {}
+
+    @staticmethod
+    def merge(total: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Add a snapshot to accumulated totals.
+
+        Args:
+            total: Accumulated snapshot (may be empty)
+            delta: Snapshot to add
+
+        Returns:
+            New snapshot with summed counters and the hottest keys of both
+        """
+        merged = {"counters": {}, "hot_keys": {}}
+        for part in (total or {}, delta or {}):
+            for ns, counters in part.get("counters", {}).items():
+                target = merged["counters"].setdefault(ns, dict.fromkeys(CacheStats.COUNTERS, 0))
+                for event, count in counters.items():
+                    target[event] = target.get(event, 0) + count
+            for ns, hot_keys in part.get("hot_keys", {}).items():
+                target = merged["hot_keys"].setdefault(ns, {})
+                for key, count in hot_keys.items():
+                    target[key] = target.get(key, 0) + count
+        for ns, hot_keys in merged["hot_keys"].items():
+            if len(hot_keys) > MAX_HOT_KEYS:
+                hottest = sorted(hot_keys.items(), key=lambda item: item[1], reverse=True)
+                merged["hot_keys"][ns] = dict(hottest[:MAX_HOT_KEYS])
+        return merged
+
+
+class CacheBackend:
+    """
+    Interface implemented by all cache backends.
+    Values can be any picklable Python object.
+    """
+
+    def __init__(self, prefix: str = DEFAULT_PREFIX):
+        self.prefix = prefix
+        self.stats = CacheStats()
+
+    def make_key(self, namespace: str, key: str, user_id: Optional[str] = None) -> str:
+        """Build the full storage key for a namespaced, user-scoped entry."""
+        return f"{self.prefix}:{namespace}:{user_id or GLOBAL_SCOPE}:{key}"
+
+    def _scope_prefix(self, namespace: Optional[str] = None, user_id: Optional[str] = None) -> str:
+        """Prefix shared by all keys of a namespace (and optionally a user)."""
+        if namespace is None:
+            return f"{self.prefix}:"
+        if user_id is None:
+            return f"{self.prefix}:{namespace}:"
+        return f"{self.prefix}:{namespace}:{user_id}:"
+
+    def get(self, namespace: str, key: str, user_id: Optional[str] = None) -> Optional[Any]:
+        """Return a cached value or None if missing or expired."""
+        raise NotImplementedError
+
+    def set(self, namespace: str, key: str, value: Any, user_id: Optional[str] = None,
+            ttl: Optional[float] = None):
+        """Store a value, optionally expiring after ttl seconds."""
+        raise NotImplementedError
+
+    def delete(self, namespace: str, key: str, user_id: Optional[str] = None):
+        """Remove a single entry."""
+        raise NotImplementedError
+
+    def get_many(self, namespace: str, keys: Iterable[str], user_id: Optional[str] = None) -> Dict[str, Any]:
+        """Fetch several entries at once; missing keys are left out of the result."""
+        raise NotImplementedError
+
+    def set_many(self, namespace: str, items: Dict[str, Any], user_id: Optional[str] = None,
+                 ttl: Optional[float] = None):
+        """Store several entries at once."""
+        for key, value in items.items():
+            self.set(namespace, key, value, user_id=user_id, ttl=ttl)
+
+    def keys(self, namespace: str, user_id: Optional[str] = None) -> List[str]:
+        """List the keys stored in a namespace, without the namespace and user prefix."""
+        raise NotImplementedError
+
+    def clear(self, namespace: Optional[str] = None, user_id: Optional[str] = None) -> int:
+        """Remove all entries of a namespace (and user), or everything. Returns the count removed."""
+        raise NotImplementedError
+
+    def entries(self, namespace: Optional[str] = None, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        List stored entries with their metadata, for inspection and snapshots.
+
+        Returns:
+            Dictionaries with namespace, user_id, key, value, ttl (seconds left or None)
+            and size (pickled bytes)
+        """
+        raise NotImplementedError
+
+    def reload(self):
+        """Pick up entries other processes saved since this process last read them (shared tiers need nothing)."""
+
+    def split_key(self, full_key: str) -> tuple:
+        """Split a full storage key into (namespace, user_id, key); user_id is None for the global scope."""
+        _, namespace, user_id, key = full_key.split(":", 3)
+        return namespace, (None if user_id == GLOBAL_SCOPE else user_id), key
+
+    def load_stats(self) -> Dict[str, Any]:
+        """Saved usage totals combined with the counters of this process."""
+        return CacheStats.merge(self.get(STATS_NAMESPACE, "totals"), self.stats.snapshot())
+
+    def save_stats(self):
+        """Merge this process's counters into the saved totals."""
+        delta = self.stats.snapshot()
+        if not delta["counters"]:
+            return
+        try:
+            self.set(STATS_NAMESPACE, "totals", CacheStats.merge(self.get(STATS_NAMESPACE, "totals"), delta))
+            self.stats.reset()
+        except Exception as e:
+            print(f"Warning: Failed to save cache statistics: {str(e)}")
+
+    def _strip_scope(self, full_key: str, namespace: str, user_id: Optional[str]) -> str:
+        """Turn a full storage key back into the caller's key."""
+        if user_id is not None:
+            return full_key[len(self._scope_prefix(namespace, user_id)):]
+        # <prefix>:<namespace>:<user>:<key> - the key itself may contain colons
+        return full_key[len(self._scope_prefix(namespace)):].split(":", 1)[1]
+
+
+class InProcessCacheBackend(CacheBackend):
+    """
+    Thread-safe in-memory cache with per-entry TTLs.
+    When persist_path is given the cache is loaded from and saved to a joblib file.
+    """
+
+    def __init__(self, persist_path: Optional[str] = None, prefix: str = DEFAULT_PREFIX,
+                 autosave: bool = True, save_interval: Optional[float] = None):
+        """
+        Initialize the in-process backend.
+
+        Args:
+            persist_path: Optional joblib file used to keep the cache between runs
+            prefix: Key prefix shared by all entries
+            autosave: Save to disk after writes (only with persist_path)
+            save_interval: Seconds writes are batched before a save; 0 saves after every
+                write (defaults to CACHE_SAVE_INTERVAL or 5). Pending writes are also saved at exit.
+        """
+        super().__init__(prefix)
+        self.persist_path = Path(persist_path) if persist_path else None
+        self.autosave = autosave
+        if save_interval is None:
+            save_interval = float(os.getenv("CACHE_SAVE_INTERVAL", DEFAULT_SAVE_INTERVAL))
+        self.save_interval = save_interval
+        self._entries: Dict[str, tuple] = {}
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()
+        # Keys written and deleted since the last save, merged into the file on the next one
+        self._written: set = set()
+        self._deleted: set = set()
+        self._save_timer: Optional[threading.Timer] = None
+        # Modification time of the file when it was last read or written
+        self._file_mtime: Optional[float] = None
+        self._load()
+        if self.persist_path:
+            atexit.register(self.flush)
+
+    def _is_live(self, entry: tuple, now: float) -> bool:
+        expires_at = entry[1]
+        return expires_at is None or expires_at > now
+
+    def get(self, namespace, key, user_id=None):
+        full_key = self.make_key(namespace, key, user_id)
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is None:
+                self.stats.record(namespace, "misses")
+                return None
+            if not self._is_live(entry, time.time()):
+                del self._entries[full_key]
+                self.stats.record(namespace, "evictions")
+                self.stats.record(namespace, "misses")
+                return None
+            self.stats.record_hit(namespace, key, user_id)
+            return entry[0]
+
+    def set(self, namespace, key, value, user_id=None, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        full_key = self.make_key(namespace, key, user_id)
+        with self._lock:
+            self._entries[full_key] = (value, expires_at)
+            self._mark_written(full_key)
+        self.stats.record(namespace, "sets")
+        self._autosave()
+
+    def set_many(self, namespace, items, user_id=None, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            for key, value in items.items():
+                full_key = self.make_key(namespace, key, user_id)
+                self._entries[full_key] = (value, expires_at)
+                self._mark_written(full_key)
+        self.stats.record(namespace, "sets", len(items))
+        self._autosave()
+
+    def delete(self, namespace, key, user_id=None):
+        full_key = self.make_key(namespace, key, user_id)
+        with self._lock:
+            removed = self._entries.pop(full_key, None)
+            if removed is not None:
+                self._mark_deleted(full_key)
+        if removed is not None:
+            self.stats.record(namespace, "deletes")
+            self._autosave()
+
+    def get_many(self, namespace, keys, user_id=None):
+        result = {}
+        for key in keys:
+            value = self.get(namespace, key, user_id)
+            if value is not None:
+                result[key] = value
+        return result
+
+    def keys(self, namespace, user_id=None):
+        scope = self._scope_prefix(namespace, user_id)
+        now = time.time()
+        with self._lock:
+            return [
+                self._strip_scope(full_key, namespace, user_id)
+                for full_key, entry in self._entries.items()
+                if full_key.startswith(scope) and self._is_live(entry, now)
+            ]
+
+    def entries(self, namespace=None, user_id=None):
+        scope = self._scope_prefix(namespace, user_id)
+        now = time.time()
+        with self._lock:
+            items = [(k, v) for k, v in self._entries.items() if k.startswith(scope) and self._is_live(v, now)]
+        result = []
+        for full_key, (value, expires_at) in items:
+            entry_namespace, entry_user, key = self.split_key(full_key)
+            result.append({
+                "namespace": entry_namespace,
+                "user_id": entry_user,
+                "key": key,
+                "value": value,
+                "ttl": expires_at - now if expires_at else None,
+                "size": len(pickle.dumps(value)),
+            })
+        return result
+
+    def clear(self, namespace=None, user_id=None):
+        scope = self._scope_prefix(namespace, user_id)
+        with self._lock:
+            doomed = [k for k in self._entries if k.startswith(scope)]
+            for full_key in doomed:
+                del self._entries[full_key]
+                self._mark_deleted(full_key)
+                self.stats.record(self.split_key(full_key)[0], "deletes")
+        if doomed:
+            self._autosave()
+        return len(doomed)
+
+    def _mark_written(self, full_key: str):
+        """Remember a write for the next save; the caller holds the lock."""
+        if self.persist_path:
+            self._written.add(full_key)
+            self._deleted.discard(full_key)
+
+    def _mark_deleted(self, full_key: str):
+        """Remember a delete for the next save; the caller holds the lock."""
+        if self.persist_path:
+            self._deleted.add(full_key)
+            self._written.discard(full_key)
+
+    def flush(self):
+        """
+        Save pending writes and deletes to disk.
+
+        The file is re-read under an exclusive lock and this process's changes are
+        merged into it, so entries other processes saved in the meantime are kept
+        (and picked up by this process). Expired entries are dropped.
+        """
+        if not self.persist_path:
+            return
+        with self._save_lock:
+            with self._lock:
+                if self._save_timer is not None:
+                    self._save_timer.cancel()
+                    self._save_timer = None
+                if not self._written and not self._deleted:
+                    return
+                written = {k: self._entries[k] for k in self._written if k in self._entries}
+                deleted = set(self._deleted)
+                self._written.clear()
+                self._deleted.clear()
+
+            try:
+                self.persist_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(f"{self.persist_path}.lock", "a") as lock_file:
+                    if fcntl:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    try:
+                        now = time.time()
+                        on_disk = self._read_file()
+                        merged = {k: v for k, v in on_disk.items() if k not in deleted and self._is_live(v, now)}
+                        merged.update(written)
+                        temp_path = f"{self.persist_path}.{os.getpid()}.tmp"
+                        joblib.dump(merged, temp_path)
+                        os.replace(temp_path, self.persist_path)
+                        self._file_mtime = self._mtime()
+                    finally:
+                        if fcntl:
+                            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            except Exception as e:
+                print(f"Warning: Failed to save cache store: {str(e)}")
+                with self._lock:
+                    # Retried on the next save, unless changed again meanwhile
+                    self._written.update(k for k in written if k not in self._deleted)
+                    self._deleted.update(k for k in deleted if k not in self._written)
+                return
+
+            with self._lock:
+                # Entries of other processes plus the changes made while saving
+                pending = {k: self._entries[k] for k in self._written if k in self._entries}
+                for full_key in self._entries.keys() - merged.keys() - pending.keys():
+                    if not self._is_live(self._entries[full_key], now):
+                        self.stats.record(self.split_key(full_key)[0], "evictions")
+                self._entries = {k: v for k, v in merged.items() if k not in self._deleted}
+                self._entries.update(pending)
+
+    def _autosave(self):
+        if not self.autosave or not self.persist_path:
+            return
+        if self.save_interval <= 0:
+            self.flush()
+            return
+        with self._lock:
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(self.save_interval, self.flush)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def reload(self):
+        """
+        Re-read the cache file when another process saved it since it was last read.
+
+        This process's unsaved writes and deletes are kept on top of the file's entries.
+        """
+        if not self.persist_path:
+            return
+        mtime = self._mtime()
+        if mtime is None or mtime == self._file_mtime:
+            return
+        try:
+            on_disk = self._read_file()
+        except Exception as e:
+            print(f"Warning: Failed to reload cache store: {str(e)}")
+            return
+        now = time.time()
+        with self._lock:
+            pending = {k: self._entries[k] for k in self._written if k in self._entries}
+            self._entries = {k: v for k, v in on_disk.items() if k not in self._deleted and self._is_live(v, now)}
+            self._entries.update(pending)
+            self._file_mtime = mtime
+
+    def _mtime(self) -> Optional[float]:
+        try:
+            return self.persist_path.stat().st_mtime
+        except OSError:
+            return None
+
+    def _read_file(self) -> Dict[str, tuple]:
+        if not self.persist_path.exists():
+            return {}
+        return joblib.load(self.persist_path)
+
+    def _load(self):
+        if not self.persist_path or not self.persist_path.exists():
+            return
+        try:
+            now = time.time()
+            self._file_mtime = self._mtime()
+            self._entries = {k: v for k, v in self._read_file().items() if self._is_live(v, now)}
+        except Exception as e:
+            print(f"Warning: Failed to load cache store: {str(e)}")
+            self._entries = {}
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Redis-backed cache shared between worker processes.
+    Falls back to an in-process backend while Redis is unreachable.
+    """
+
+    def __init__(self, url: Optional[str] = None, client: Any = None,
+                 fallback: Optional[CacheBackend] = None, prefix: str = DEFAULT_PREFIX,
+                 retry_after: float = 30.0):
+        """
+        Initialize the Redis backend.
+
+        Args:
+            url: Redis connection URL (e.g. redis://localhost:6379/0)
+            client: Pre-built Redis client, used instead of url when given
+            fallback: Backend used while Redis is down
+            prefix: Key prefix shared by all entries
+            retry_after: Seconds to wait before trying Redis again after a failure
+        """
+        super().__init__(prefix)
+        self.url = url
+        self.client = client
+        self.fallback = fallback or InProcessCacheBackend(prefix=prefix)
+        # One set of counters for Redis and the fallback
+        self.fallback.stats = self.stats
+        self.retry_after = retry_after
+        self._down_until = 0.0
+
+        if self.client is None and url:
+            try:
+                import redis
+                self.client = redis.Redis.from_url(url, socket_timeout=1.0, socket_connect_timeout=1.0)
+            except ImportError:
+                print("Warning: redis package not installed, using in-process cache")
+            except Exception as e:
+                print(f"Warning: Could not create Redis client: {str(e)}")
+
+    @property
+    def available(self) -> bool:
+        """Whether Redis should be used for the next operation."""
+        return self.client is not None and time.time() >= self._down_until
+
+    def _mark_down(self, error: Exception):
+        if time.time() >= self._down_until:
+            print(f"Warning: Redis unavailable ({str(error)}), using in-process cache for {self.retry_after:.0f}s")
+        self._down_until = time.time() + self.retry_after
+
+    def get(self, namespace, key, user_id=None):
+        if self.available:
+            try:
+                raw = self.client.get(self.make_key(namespace, key, user_id))
+                if raw is None:
+                    self.stats.record(namespace, "misses")
+                    return None
+                self.stats.record_hit(namespace, key, user_id)
+                return pickle.loads(raw)
+            except Exception as e:
+                self._mark_down(e)
+        return self.fallback.get(namespace, key, user_id)
+
+    def set(self, namespace, key, value, user_id=None, ttl=None):
+        if self.available:
+            try:
+                full_key = self.make_key(namespace, key, user_id)
+                if ttl:
+                    self.client.set(full_key, pickle.dumps(value), ex=max(1, int(ttl)))
+                else:
+                    self.client.set(full_key, pickle.dumps(value))
+                self.stats.record(namespace, "sets")
+                return
+            except Exception as e:
+                self._mark_down(e)
+        self.fallback.set(namespace, key, value, user_id, ttl)
+
+    def set_many(self, namespace, items, user_id=None, ttl=None):
+        if self.available:
+            try:
+                pipe = self.client.pipeline()
+                for key, value in items.items():
+                    full_key = self.make_key(namespace, key, user_id)
+                    if ttl:
+                        pipe.set(full_key, pickle.dumps(value), ex=max(1, int(ttl)))
+                    else:
+                        pipe.set(full_key, pickle.dumps(value))
+                pipe.execute()
+                self.stats.record(namespace, "sets", len(items))
+                return
+            except Exception as e:
+                self._mark_down(e)
+        self.fallback.set_many(namespace, items, user_id, ttl)
+
+    def delete(self, namespace, key, user_id=None):
+        if self.available:
+            try:
+                if self.client.delete(self.make_key(namespace, key, user_id)):
+                    self.stats.record(namespace, "deletes")
+            except Exception as e:
+                self._mark_down(e)
+        self.fallback.delete(namespace, key, user_id)
+
+    def get_many(self, namespace, keys, user_id=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        if self.available:
+            try:
+                # One round trip for all keys
+                pipe = self.client.pipeline()
+                for key in keys:
+                    pipe.get(self.make_key(namespace, key, user_id))
+                raw_values = pipe.execute()
+                result = {}
+                for key, raw in zip(keys, raw_values):
+                    if raw is None:
+                        self.stats.record(namespace, "misses")
+                    else:
+                        self.stats.record_hit(namespace, key, user_id)
+                        result[key] = pickle.loads(raw)
+                return result
+            except Exception as e:
+                self._mark_down(e)
+        return self.fallback.get_many(namespace, keys, user_id)
+
+    def keys(self, namespace, user_id=None):
+        if self.available:
+            try:
+                pattern = self._scope_prefix(namespace, user_id) + "*"
+                return [
+                    self._strip_scope(k.decode() if isinstance(k, bytes) else k, namespace, user_id)
+                    for k in self.client.scan_iter(match=pattern)
+                ]
+            except Exception as e:
+                self._mark_down(e)
+        return self.fallback.keys(namespace, user_id)
+
+    def entries(self, namespace=None, user_id=None):
+        if self.available:
+            try:
+                full_keys = [
+                    k.decode() if isinstance(k, bytes) else k
+                    for k in self.client.scan_iter(match=self._scope_prefix(namespace, user_id) + "*")
+                ]
+                pipe = self.client.pipeline()
+                for full_key in full_keys:
+                    pipe.get(full_key)
+                    pipe.ttl(full_key)
+                results = pipe.execute() if full_keys else []
+                entries = []
+                for i, full_key in enumerate(full_keys):
+                    raw, ttl = results[2 * i], results[2 * i + 1]
+                    if raw is None:
+                        continue
+                    entry_namespace, entry_user, key = self.split_key(full_key)
+                    entries.append({
+                        "namespace": entry_namespace,
+                        "user_id": entry_user,
+                        "key": key,
+                        "value": pickle.loads(raw),
+                        "ttl": ttl if ttl is not None and ttl >= 0 else None,
+                        "size": len(raw),
+                    })
+                return entries
+            except Exception as e:
+                self._mark_down(e)
+        return self.fallback.entries(namespace, user_id)
+
+    def server_stats(self) -> Dict[str, Any]:
+        """Server-wide eviction and expiry counters reported by Redis."""
+        if not self.available:
+            return {}
+        try:
+            info = self.client.info("stats")
+            return {name: info.get(name) for name in ("evicted_keys", "expired_keys", "keyspace_hits", "keyspace_misses")}
+        except Exception as e:
+            self._mark_down(e)
+            return {}
+
+    def clear(self, namespace=None, user_id=None):
+        removed = 0
+        if self.available:
+            try:
+                doomed = list(self.client.scan_iter(match=self._scope_prefix(namespace, user_id) + "*"))
+                if doomed:
+                    removed = self.client.delete(*doomed)
+                for full_key in doomed:
+                    full_key = full_key.decode() if isinstance(full_key, bytes) else full_key
+                    self.stats.record(self.split_key(full_key)[0], "deletes")
+            except Exception as e:
+                self._mark_down(e)
+        return removed + self.fallback.clear(namespace, user_id)
+
+
+_shared_backends: Dict[tuple, CacheBackend] = {}
+_shared_lock = threading.Lock()
+
+
+def get_cache_backend(persist_dir: Optional[str] = None, redis_url: Optional[str] = None) -> CacheBackend:
+    """
+    Return the process-wide cache backend.
+
+    Uses Redis when a URL is given or REDIS_URL is set, with an in-process
+    fallback persisted under persist_dir. The same instance is returned for the
+    same settings so every cache tier in a process shares it.
+
+    Args:
+        persist_dir: Directory for the in-process cache file (defaults to CACHE_DIR or "cache")
+        redis_url: Redis connection URL; defaults to the REDIS_URL environment variable
+
+    Returns:
+        The shared CacheBackend instance
+    """
+    redis_url = redis_url if redis_url is not None else os.getenv("REDIS_URL")
+    persist_dir = persist_dir or os.getenv("CACHE_DIR", "cache")
+    persist_path = str(Path(persist_dir) / "cache_store.joblib")
+    key = (redis_url or None, os.path.abspath(persist_path))
+
+    with _shared_lock:
+        if key not in _shared_backends:
+            local_backend = InProcessCacheBackend(persist_path=persist_path)
+            if redis_url:
+                _shared_backends[key] = RedisCacheBackend(url=redis_url, fallback=local_backend)
+                print(f"Using Redis cache backend at {redis_url}")
+            else:
+                _shared_backends[key] = local_backend
+            # Keep usage statistics across short-lived CLI runs
+            atexit.register(_shared_backends[key].save_stats)
+        return _shared_backends[key]
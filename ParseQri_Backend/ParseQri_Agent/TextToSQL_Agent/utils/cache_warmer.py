@@ -0,0 +1,228 @@
+"""
+Background pre-warming of the query cache.
+
+Two sources of questions are replayed through SQL generation and validation
+(without executing anything) so the answers land in the query cache before
+users ask for them:
+- the most frequently asked historical questions of each user and table
+- a fixed set of exploratory questions for a freshly uploaded table
+
+The work runs on a single low-priority daemon thread and pauses while the
+orchestrator is answering interactive queries.
+"""
+import os
+import time
+import queue
+import threading
+from typing import Dict, List, Optional
+from models.data_models import QueryContext
+
+# Questions most users ask first about a new table
+EXPLORATORY_QUESTIONS = [
+    "How many rows are in the {table} table?",
+    "Summarize the columns of the {table} table",
+    "What are the top categories in the {table} table?",
+]
+
+
+class CacheWarmer:
+    """
+    Replays questions through an orchestrator's generation pipeline in the background
+    and stores the validated SQL in the query cache.
+    """
+
+    def __init__(self, orchestrator, pause_seconds: float = 0.5, niceness: int = 10):
+        """
+        Initialize the cache warmer.
+
+        Args:
+            orchestrator: TextSQLOrchestrator whose agents generate and cache the SQL
+            pause_seconds: Delay between jobs, and polling interval while queries are active
+            niceness: Nice increment applied to the worker thread
+        """
+        self.orchestrator = orchestrator
+        self.pause_seconds = pause_seconds
+        self.niceness = niceness
+        self.jobs = queue.Queue()
+        self.stats = {"warmed": 0, "skipped": 0, "failed": 0}
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def enqueue(self, user_id: str, table_name: str, question: str) -> bool:
+        """
+        Queue a question for warming.
+
+        Args:
+            user_id: User the question belongs to
+            table_name: Table the question is about (may be empty)
+            question: Natural language question
+
+        Returns:
+            True if the question was queued, False if it is already pending
+        """
+        job = (user_id, table_name or "", question)
+        with self._lock:
+            if job in self._queued:
+                return False
+            self._queued.add(job)
+        self.jobs.put(job)
+        return True
+
+    def warm_after_upload(self, user_id: str, table_name: str) -> int:
+        """
+        Queue the exploratory questions for a newly uploaded table.
+
+        Args:
+            user_id: Owner of the table
+            table_name: Table name as users refer to it (without the user suffix)
+
+        Returns:
+            Number of questions queued
+        """
+        if not table_name:
+            return 0
+        queued = 0
+        for template in EXPLORATORY_QUESTIONS:
+            if self.enqueue(user_id, table_name, template.format(table=table_name)):
+                queued += 1
+        print(f"Queued {queued} exploratory questions for cache warming of {table_name}")
+        return queued
+
+    def warm_from_history(self, top_n: int = 10, user_ids: Optional[List[str]] = None) -> int:
+        """
+        Queue the most frequently asked historical questions.
+
+        Args:
+            top_n: Number of questions per user and table
+            user_ids: Users to warm, defaults to every user with recorded history
+
+        Returns:
+            Number of questions queued
+        """
+        query_cache = self.orchestrator.agents.get('query_cache')
+        if query_cache is None:
+            print("Cache warming skipped: query cache agent is not configured")
+            return 0
+
+        if user_ids is None:
+            user_ids = query_cache.history_users()
+
+        queued = 0
+        for user_id in user_ids:
+            for table_name, question in query_cache.get_top_questions(user_id, top_n):
+                if self.enqueue(user_id, table_name, question):
+                    queued += 1
+        print(f"Queued {queued} historical questions for cache warming")
+        return queued
+
+    def start(self):
+        """Start the background worker if it is not already running."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="cache-warmer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Stop the worker after the current job.
+
+        Args:
+            timeout: Maximum number of seconds to wait for the worker to exit
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until all queued questions have been processed.
+
+        Args:
+            timeout: Maximum number of seconds to wait, None to wait indefinitely
+
+        Returns:
+            True if the queue was drained, False on timeout
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while self.pending():
+            if self._thread is None or not self._thread.is_alive():
+                return False
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(0.1)
+        return True
+
+    def pending(self) -> int:
+        """Number of questions queued or in progress."""
+        with self._lock:
+            return len(self._queued)
+
+    def _run(self):
+        """Worker loop: process jobs one at a time at low priority."""
+        try:
+            # On Linux the nice value is per thread, so this only lowers the warmer
+            os.nice(self.niceness)
+        except (AttributeError, OSError):
+            pass
+
+        while not self._stop_event.is_set():
+            try:
+                job = self.jobs.get(timeout=self.pause_seconds)
+            except queue.Empty:
+                continue
+
+            # Interactive queries always go first
+            while self.orchestrator.active_queries > 0 and not self._stop_event.is_set():
+                time.sleep(self.pause_seconds)
+
+            try:
+                self._warm(*job)
+            except Exception as e:
+                self.stats["failed"] += 1
+                print(f"Cache warming failed for '{job[2]}': {str(e)}")
+            finally:
+                with self._lock:
+                    self._queued.discard(job)
+                self.jobs.task_done()
+
+            time.sleep(self.pause_seconds)
+
+    def _warm(self, user_id: str, table_name: str, question: str):
+        """Generate, validate and cache the SQL for a single question."""
+        agents = self.orchestrator.agents
+        query_cache = agents['query_cache']
+
+        if query_cache.get_cached_query(question, user_id):
+            self.stats["skipped"] += 1
+            return
+
+        context = QueryContext(
+            user_question=question,
+            db_name="",
+            table_name=table_name,
+            user_id=user_id
+        )
+
+        # Resolve the table the same way interactive queries do
+        if not context.table_name and user_id and 'metadata_indexer' in agents:
+            metadata_response = agents['metadata_indexer'].process(context)
+            if metadata_response.success and metadata_response.data.get('relevant_metadata'):
+                context.relevant_metadata = metadata_response.data['relevant_metadata']
+                context.table_name = context.relevant_metadata.get('table_name') or ""
+
+        error_message = self.orchestrator.prepare_sql(context)
+        if error_message or not context.sql_query:
+            self.stats["failed"] += 1
+            print(f"Cache warming could not prepare '{question}': {error_message}")
+            return
+
+        query_cache.cache_query(context)
+        self.stats["warmed"] += 1
+        print(f"Warmed cache for question: {question}")
+
+    def get_stats(self) -> Dict[str, int]:
+        """Return warming counters along with the number of pending questions."""
+        return dict(self.stats, pending=self.pending())
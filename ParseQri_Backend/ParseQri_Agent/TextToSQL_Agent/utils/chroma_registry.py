@@ -0,0 +1,205 @@
+"""
+Process-wide registry of ChromaDB clients and collections.
+
+Each agent used to keep its own dictionary of PersistentClient objects, one per
+user storage directory, that was never emptied. The registry shares one client
+per directory across all agents and bounds how many are open:
+- clients are kept in least-recently-used order; opening one more than
+  max_clients closes the least recently used one
+- clients idle for longer than idle_seconds are closed on the next access
+- pinned clients (the shared stores that hold background writers) are never evicted
+- access is thread-safe, and opening a client or collection is timed
+
+Callers should fetch collections from the registry for each operation instead
+of holding on to them, so an evicted client is simply reopened on next use.
+
+Like schema_fingerprint, this module only imports the standard library at load
+time (chromadb is imported when the first client opens), so the backend can
+load it from the agent directory.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+DEFAULT_MAX_CLIENTS = 64
+DEFAULT_IDLE_SECONDS = 600
+
+
+class ChromaClientRegistry:
+    """
+    Shared, bounded cache of PersistentClient objects keyed by storage directory.
+    """
+
+    def __init__(self, max_clients: int = DEFAULT_MAX_CLIENTS, idle_seconds: float = DEFAULT_IDLE_SECONDS):
+        """
+        Initialize the registry.
+
+        Args:
+            max_clients: Maximum number of unpinned clients kept open
+            idle_seconds: Close unpinned clients that were not used for this long (0 to disable)
+        """
+        self.max_clients = max_clients
+        self.idle_seconds = idle_seconds
+        self._lock = threading.RLock()
+        # path -> {"client", "collections": {name: collection}, "last_used", "pinned"}
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.stats = {
+            "client_hits": 0, "client_opens": 0, "evictions": 0,
+            "collection_hits": 0, "collection_loads": 0, "missing_collections": 0,
+            "client_load_seconds": 0.0, "max_client_load_seconds": 0.0,
+            "collection_load_seconds": 0.0,
+        }
+
+    def _open_client(self, path: str):
+        import chromadb
+        os.makedirs(path, exist_ok=True)
+        return chromadb.PersistentClient(path=path)
+
+    def _entry(self, path: str, pinned: bool) -> Dict[str, Any]:
+        """Get the entry of a directory, opening its client if needed; the caller holds the lock."""
+        entry = self._entries.get(path)
+        if entry is not None:
+            self.stats["client_hits"] += 1
+            self._entries.move_to_end(path)
+        else:
+            started = time.perf_counter()
+            client = self._open_client(path)
+            elapsed = time.perf_counter() - started
+            self.stats["client_opens"] += 1
+            self.stats["client_load_seconds"] += elapsed
+            self.stats["max_client_load_seconds"] = max(self.stats["max_client_load_seconds"], elapsed)
+            entry = {"client": client, "collections": {}, "last_used": time.time(), "pinned": False}
+            self._entries[path] = entry
+        entry["pinned"] = entry["pinned"] or pinned
+        entry["last_used"] = time.time()
+        self._evict(keep=path)
+        return entry
+
+    def client(self, path: str, pinned: bool = False):
+        """
+        Get the shared client of a storage directory.
+
+        Args:
+            path: Persist directory of the client
+            pinned: Never evict this client
+
+        Returns:
+            chromadb PersistentClient
+        """
+        with self._lock:
+            return self._entry(os.path.abspath(path), pinned)["client"]
+
+    def collection(self, path: str, name: str, create: bool = False,
+                   metadata: Optional[Dict[str, Any]] = None, pinned: bool = False,
+                   embedding_function=None):
+        """
+        Get a collection of a storage directory.
+
+        Args:
+            path: Persist directory of the client
+            name: Collection name
+            create: Create the collection when it does not exist
+            metadata: Metadata of a newly created collection
+            pinned: Never evict the client
+            embedding_function: Embedding function for query_texts and documents (Chroma's default if None)
+
+        Returns:
+            The collection, or None when it does not exist and create is False
+        """
+        with self._lock:
+            entry = self._entry(os.path.abspath(path), pinned)
+            collection = entry["collections"].get(name)
+            if collection is not None:
+                self.stats["collection_hits"] += 1
+                return collection
+
+            started = time.perf_counter()
+            # The embedding function is only passed when given, so fake clients keep working
+            extra = {"embedding_function": embedding_function} if embedding_function is not None else {}
+            try:
+                if create:
+                    collection = entry["client"].get_or_create_collection(name=name, metadata=metadata, **extra)
+                else:
+                    collection = entry["client"].get_collection(name, **extra)
+            except Exception:
+                if create:
+                    raise
+                # Missing collections are not cached, so they are found once created
+                self.stats["missing_collections"] += 1
+                return None
+            finally:
+                self.stats["collection_load_seconds"] += time.perf_counter() - started
+
+            self.stats["collection_loads"] += 1
+            entry["collections"][name] = collection
+            return collection
+
+    def _evict(self, keep: Optional[str] = None):
+        """Close idle clients and the least recently used ones beyond max_clients."""
+        now = time.time()
+        unpinned = [path for path, entry in self._entries.items() if not entry["pinned"] and path != keep]
+        if self.idle_seconds:
+            for path in list(unpinned):
+                if now - self._entries[path]["last_used"] > self.idle_seconds:
+                    self._close(path)
+                    unpinned.remove(path)
+        # Unpinned entries are in least-recently-used order
+        overflow = len(unpinned) + (0 if keep is None or self._entries[keep]["pinned"] else 1) - self.max_clients
+        for path in unpinned[:max(0, overflow)]:
+            self._close(path)
+
+    def _close(self, path: str):
+        entry = self._entries.pop(path, None)
+        if entry is None:
+            return
+        self.stats["evictions"] += 1
+        close = getattr(entry["client"], "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception as e:
+                print(f"Warning: Could not close ChromaDB client for {path}: {e}")
+
+    def evict(self, path: str):
+        """Close the client of a storage directory, e.g. after its files were deleted."""
+        with self._lock:
+            self._close(os.path.abspath(path))
+
+    def close_all(self):
+        """Close every client, pinned ones included."""
+        with self._lock:
+            for path in list(self._entries):
+                self._close(path)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Open handles, cache hits and load latency."""
+        with self._lock:
+            opens = self.stats["client_opens"]
+            loads = self.stats["collection_loads"]
+            return dict(
+                self.stats,
+                open_clients=len(self._entries),
+                pinned_clients=sum(1 for entry in self._entries.values() if entry["pinned"]),
+                open_collections=sum(len(entry["collections"]) for entry in self._entries.values()),
+                max_clients=self.max_clients,
+                avg_client_load_ms=round(1000 * self.stats["client_load_seconds"] / opens, 3) if opens else None,
+                avg_collection_load_ms=round(1000 * self.stats["collection_load_seconds"] / loads, 3) if loads else None,
+            )
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_chroma_registry() -> ChromaClientRegistry:
+    """Return the process-wide ChromaDB client registry; CHROMA_MAX_CLIENTS overrides the bound."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ChromaClientRegistry(
+                max_clients=int(os.getenv("CHROMA_MAX_CLIENTS", DEFAULT_MAX_CLIENTS)),
+                idle_seconds=float(os.getenv("CHROMA_IDLE_SECONDS", DEFAULT_IDLE_SECONDS)),
+            )
+        return _registry
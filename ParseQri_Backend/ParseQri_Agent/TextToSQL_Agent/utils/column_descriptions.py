@@ -0,0 +1,436 @@
+"""
+Batched, cached column description generation.
+
+Describing every table with its own LLM call is slow for databases with many
+tables. ColumnDescriber packs the columns of several tables into one
+structured-output request (a JSON schema listing every table and column, so the
+reply needs no free-form parsing) under a prompt token budget.
+
+Descriptions are cached in the shared cache backend by column signature: the
+column name plus a hash of its sample values. Identical columns, whether in
+other tables or other users' uploads, are described once. Description runs can
+also be queued on a background worker, so a table is indexed with placeholder
+descriptions first and stays queryable while the LLM works. Queued runs still
+finish before a process exits, so the short-lived CLI (which the backend runs
+for every upload) spools its runs instead: one JSON file per run in a pending
+directory, described by a detached worker process (main.py --describe-pending)
+that takes a lock file so only one worker calls the LLM at a time.
+"""
+import os
+import sys
+import json
+import uuid
+import hashlib
+import threading
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from utils.cache_backend import CacheBackend, get_cache_backend
+from utils.llm_cache import cached_chat
+
+try:
+    import fcntl
+except ImportError:  # Windows: workers are not exclusive, runs may be described twice
+    fcntl = None
+
+DESCRIPTION_NAMESPACE = "column_descriptions"
+DEFAULT_TOKEN_BUDGET = 1500
+# Sample values of a column shown to the LLM and hashed into its signature
+SIGNATURE_SAMPLES = 3
+# Prompt tokens of the fixed instructions around the column listing
+PROMPT_OVERHEAD_TOKENS = 150
+# Pending description runs, one JSON file each, under the metadata storage directory
+PENDING_DIR = "_pending_descriptions"
+WORKER_LOCK_FILE = "worker.lock"
+WORKER_LOG_FILE = "worker.log"
+
+
+def column_signature(column: str, samples: Optional[List[Any]] = None) -> str:
+    """
+    Signature of a column: its normalized name plus a hash of its sample values.
+
+    Args:
+        column: Column name
+        samples: Sample values of the column
+
+    Returns:
+        "<name>:<sample hash>"
+    """
+    values = sorted(str(value).strip() for value in (samples or [])[:SIGNATURE_SAMPLES])
+    digest = hashlib.sha1("\0".join(values).encode("utf-8")).hexdigest()[:16]
+    return f"{column.strip().lower()}:{digest}"
+
+
+def fallback_description(column: str) -> str:
+    """Placeholder description built from the column name."""
+    return column.replace('_', ' ').strip().title()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a prompt fragment (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+def _column_line(column: str, samples: List[Any]) -> str:
+    values = ", ".join(str(value) for value in samples[:SIGNATURE_SAMPLES])
+    return f"- {column}: {values}" if values else f"- {column}"
+
+
+def pack_batches(tables: Dict[str, Dict[str, List[Any]]],
+                 token_budget: int = DEFAULT_TOKEN_BUDGET) -> List[Dict[str, Dict[str, List[Any]]]]:
+    """
+    Pack the columns of many tables into request batches under a token budget.
+
+    Tables are kept whole where possible; a table too large for one request is
+    split across several.
+
+    Args:
+        tables: Dictionary of table name to {column: sample values}
+        token_budget: Maximum estimated prompt tokens per batch
+
+    Returns:
+        List of batches, each a dictionary of table name to {column: sample values}
+    """
+    budget = max(token_budget - PROMPT_OVERHEAD_TOKENS, 1)
+    batches: List[Dict[str, Dict[str, List[Any]]]] = []
+    current: Dict[str, Dict[str, List[Any]]] = {}
+    used = 0
+
+    for table_name, columns in tables.items():
+        header_tokens = estimate_tokens(f"Table {table_name}:")
+        for column, samples in columns.items():
+            cost = estimate_tokens(_column_line(column, samples))
+            if table_name not in current:
+                cost += header_tokens
+            if current and used + cost > budget:
+                batches.append(current)
+                current, used = {}, 0
+                cost = header_tokens + estimate_tokens(_column_line(column, samples))
+            current.setdefault(table_name, {})[column] = samples
+            used += cost
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def build_request(batch: Dict[str, Dict[str, List[Any]]]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Prompt and JSON schema of one batched description request.
+
+    Args:
+        batch: Dictionary of table name to {column: sample values}
+
+    Returns:
+        Tuple of (prompt, JSON schema of the expected reply)
+    """
+    listing = "\n\n".join(
+        f"Table {table_name}:\n" + "\n".join(_column_line(column, samples) for column, samples in columns.items())
+        for table_name, columns in batch.items()
+    )
+    prompt = f"""Task: Write a simple, clear description (max 10 words) of every column below.
+Each column is listed with a few of its values.
+
+{listing}
+
+Rules:
+- Describe WHAT the column contains, in plain non-technical language
+- Do NOT mention data types, formats or database terminology
+- Reply with JSON of the form {{"table name": {{"column name": "description"}}}}
+  covering every table and column exactly as named above
+"""
+    schema = {
+        "type": "object",
+        "properties": {
+            table_name: {
+                "type": "object",
+                "properties": {column: {"type": "string"} for column in columns},
+                "required": list(columns)
+            }
+            for table_name, columns in batch.items()
+        },
+        "required": list(batch)
+    }
+    return prompt, schema
+
+
+class ColumnDescriber:
+    """
+    Generates column descriptions in batched structured-output LLM requests,
+    caching them by column signature.
+    """
+
+    def __init__(self, llm_model: str = "llama3.1", token_budget: int = DEFAULT_TOKEN_BUDGET,
+                 backend: Optional[CacheBackend] = None, chat: Callable[..., Dict[str, Any]] = cached_chat):
+        """
+        Initialize the describer.
+
+        Args:
+            llm_model: Ollama model that writes the descriptions
+            token_budget: Maximum estimated prompt tokens per request
+            backend: Cache backend for descriptions (defaults to the process-wide backend)
+            chat: Chat function with the cached_chat signature
+        """
+        self.llm_model = llm_model
+        self.token_budget = token_budget
+        self.backend = backend or get_cache_backend()
+        self.chat = chat
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="column-descriptions")
+        self._stats_lock = threading.Lock()
+        self.stats = {"columns": 0, "cache_hits": 0, "described": 0, "requests": 0, "failed_requests": 0}
+
+    def _cache_key(self, signature: str) -> str:
+        return f"{self.llm_model}:{signature}"
+
+    def _count(self, **counts):
+        with self._stats_lock:
+            for name, count in counts.items():
+                self.stats[name] += count
+
+    def cached(self, tables: Dict[str, Dict[str, List[Any]]]) -> Dict[str, Dict[str, str]]:
+        """
+        Cached descriptions of the given columns, without calling the LLM.
+
+        Args:
+            tables: Dictionary of table name to {column: sample values}
+
+        Returns:
+            Dictionary of table name to {column: description} for the columns already described
+        """
+        signatures = {
+            (table_name, column): column_signature(column, samples)
+            for table_name, columns in tables.items() for column, samples in columns.items()
+        }
+        found = self.backend.get_many(DESCRIPTION_NAMESPACE, [self._cache_key(s) for s in set(signatures.values())])
+        descriptions: Dict[str, Dict[str, str]] = {}
+        for (table_name, column), signature in signatures.items():
+            description = found.get(self._cache_key(signature))
+            if description:
+                descriptions.setdefault(table_name, {})[column] = description
+        return descriptions
+
+    def describe(self, tables: Dict[str, Dict[str, List[Any]]]) -> Dict[str, Dict[str, str]]:
+        """
+        Describe every column of the given tables.
+
+        Cached columns are answered from the cache, identical columns are sent to
+        the LLM once, and the rest are packed into as few requests as the token
+        budget allows. Columns the LLM fails to describe get a placeholder
+        description, which is not cached.
+
+        Args:
+            tables: Dictionary of table name to {column: sample values}
+
+        Returns:
+            Dictionary of table name to {column: description}
+        """
+        descriptions = self.cached(tables)
+        total = sum(len(columns) for columns in tables.values())
+        hits = sum(len(columns) for columns in descriptions.values())
+
+        # One entry per distinct signature; the others reuse its description
+        pending: Dict[str, Dict[str, List[Any]]] = {}
+        owners: Dict[str, List[Tuple[str, str]]] = {}
+        first: Dict[str, Tuple[str, str]] = {}
+        for table_name, columns in tables.items():
+            for column, samples in columns.items():
+                if column in descriptions.get(table_name, {}):
+                    continue
+                signature = column_signature(column, samples)
+                owners.setdefault(signature, []).append((table_name, column))
+                if signature not in first:
+                    first[signature] = (table_name, column)
+                    pending.setdefault(table_name, {})[column] = list(samples or [])
+
+        generated: Dict[Tuple[str, str], str] = {}
+        for batch in pack_batches(pending, self.token_budget):
+            generated.update(self._request(batch))
+
+        to_cache = {}
+        for signature, (table_name, column) in first.items():
+            description = generated.get((table_name, column))
+            if description:
+                to_cache[self._cache_key(signature)] = description
+            for owner_table, owner_column in owners[signature]:
+                descriptions.setdefault(owner_table, {})[owner_column] = description or fallback_description(owner_column)
+        if to_cache:
+            self.backend.set_many(DESCRIPTION_NAMESPACE, to_cache)
+
+        self._count(columns=total, cache_hits=hits, described=len(to_cache))
+        # Keep the column order of the input
+        return {
+            table_name: {column: descriptions[table_name][column] for column in columns}
+            for table_name, columns in tables.items()
+        }
+
+    def _request(self, batch: Dict[str, Dict[str, List[Any]]]) -> Dict[Tuple[str, str], str]:
+        """Describe one batch with a single structured-output request."""
+        prompt, schema = build_request(batch)
+        self._count(requests=1)
+        try:
+            response = self.chat(
+                self.llm_model,
+                [{"role": "user", "content": prompt}],
+                format=schema,
+                options={"temperature": 0}
+            )
+            reply = json.loads(response['message']['content'])
+        except Exception as e:
+            print(f"Error describing columns of {', '.join(batch)}: {e}")
+            self._count(failed_requests=1)
+            return {}
+
+        generated = {}
+        for table_name, columns in batch.items():
+            described = reply.get(table_name) if isinstance(reply, dict) else None
+            if not isinstance(described, dict):
+                continue
+            for column in columns:
+                description = described.get(column)
+                if isinstance(description, str) and description.strip():
+                    generated[(table_name, column)] = description.strip()
+        return generated
+
+    def describe_in_background(self, tables: Dict[str, Dict[str, List[Any]]],
+                               on_done: Optional[Callable[[Dict[str, Dict[str, str]]], None]] = None) -> Future:
+        """
+        Queue a description run on the background worker.
+
+        Args:
+            tables: Dictionary of table name to {column: sample values}
+            on_done: Called with the descriptions once they are generated
+
+        Returns:
+            Future resolved with the descriptions
+        """
+        def run():
+            descriptions = self.describe(tables)
+            if on_done:
+                on_done(descriptions)
+            return descriptions
+
+        return self._executor.submit(run)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Counters of described columns, cache hits and LLM requests."""
+        with self._stats_lock:
+            return dict(self.stats, model=self.llm_model, token_budget=self.token_budget)
+
+
+_describers: Dict[Tuple[str, int], ColumnDescriber] = {}
+_describers_lock = threading.Lock()
+
+
+def get_column_describer(llm_model: str = "llama3.1", token_budget: int = DEFAULT_TOKEN_BUDGET) -> ColumnDescriber:
+    """
+    Return the process-wide describer of a model, so all agents share one
+    background worker and never run two description requests at once.
+    """
+    key = (llm_model, token_budget)
+    with _describers_lock:
+        if key not in _describers:
+            _describers[key] = ColumnDescriber(llm_model=llm_model, token_budget=token_budget)
+        return _describers[key]
+
+
+def spool_pending(spool_dir: str, run: Dict[str, Any]) -> str:
+    """
+    Save a description run for a worker process.
+
+    Args:
+        spool_dir: Directory of pending runs
+        run: JSON-serializable description of the run
+
+    Returns:
+        Path of the spooled run
+    """
+    os.makedirs(spool_dir, exist_ok=True)
+    path = os.path.join(spool_dir, f"{uuid.uuid4().hex}.json")
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(run, f)
+    # Workers only list complete files
+    os.replace(temp_path, path)
+    return path
+
+
+def pending_runs(spool_dir: str) -> List[str]:
+    """Paths of the spooled runs, oldest first."""
+    try:
+        names = [name for name in os.listdir(spool_dir) if name.endswith(".json")]
+    except OSError:
+        return []
+    paths = [os.path.join(spool_dir, name) for name in names]
+    return sorted(paths, key=lambda path: os.path.getmtime(path) if os.path.exists(path) else 0)
+
+
+def drain_pending(spool_dir: str, handle: Callable[[Dict[str, Any]], None]) -> int:
+    """
+    Handle every spooled run, unless another worker is already draining the directory.
+
+    A run's file is removed once it is handled; runs spooled while draining are
+    handled too, including the ones that arrive just as the lock is released.
+
+    Args:
+        spool_dir: Directory of pending runs
+        handle: Called with each run
+
+    Returns:
+        Number of runs handled
+    """
+    os.makedirs(spool_dir, exist_ok=True)
+    handled = 0
+    while pending_runs(spool_dir):
+        with open(os.path.join(spool_dir, WORKER_LOCK_FILE), "a") as lock_file:
+            if fcntl:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    # The worker holding the lock drains what is left
+                    return handled
+            try:
+                for path in pending_runs(spool_dir):
+                    try:
+                        with open(path) as f:
+                            run = json.load(f)
+                    except (OSError, ValueError) as e:
+                        print(f"Warning: Skipping unreadable description run {path}: {e}")
+                    else:
+                        handle(run)
+                        handled += 1
+                    if os.path.exists(path):
+                        os.remove(path)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return handled
+
+
+def launch_worker(command: List[str], cwd: str, log_path: str) -> Optional[subprocess.Popen]:
+    """
+    Start a worker process detached from the caller, which can exit at once.
+
+    Its output goes to log_path, so callers capturing this process's output do
+    not wait for the worker.
+
+    Args:
+        command: Arguments after the Python executable
+        cwd: Working directory of the worker
+        log_path: File the worker's output is appended to
+
+    Returns:
+        The worker process, or None if it could not be started
+    """
+    try:
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        with open(log_path, "a") as log:
+            options: Dict[str, Any] = {}
+            if os.name == "nt":
+                options["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+            else:
+                options["start_new_session"] = True
+            return subprocess.Popen([sys.executable] + command, cwd=cwd, stdin=subprocess.DEVNULL,
+                                    stdout=log, stderr=subprocess.STDOUT, close_fds=True, **options)
+    except Exception as e:
+        print(f"Warning: Could not start the column description worker: {e}")
+        return None
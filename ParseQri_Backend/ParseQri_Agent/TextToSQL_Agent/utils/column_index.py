@@ -0,0 +1,156 @@
+"""
+Column-level metadata documents and table ranking from column hits.
+
+A table used to be embedded as one short document, "Table X with columns a,
+b, c", with the column descriptions stored in metadata fields that were never
+embedded. On wide tables that document says little about any single column.
+Every column is now also indexed as its own document (name, description and
+a few sample values) in the shared column collection (see metadata_store). A question
+is matched against the columns, and the best column hits are aggregated per
+table, which ranks the tables and yields the columns worth putting in the
+prompt in the same pass.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+MAX_SAMPLE_VALUES = 3
+# Only the best few hits of a table count, so many weak matches on a wide table do not win
+HITS_PER_TABLE = 3
+
+
+def _column_key(name: str) -> str:
+    return str(name).strip().lower().replace(" ", "_")
+
+
+def sample_values(df, per_column: int = MAX_SAMPLE_VALUES) -> Dict[str, List[str]]:
+    """
+    A few distinct non-empty values of every column of a DataFrame.
+
+    Args:
+        df: pandas DataFrame, e.g. the first rows of an uploaded CSV
+        per_column: Number of values to keep per column
+
+    Returns:
+        Dictionary of column name to sample values as strings
+    """
+    samples = {}
+    for column in df.columns:
+        values = []
+        for value in df[column].dropna().unique():
+            text = str(value).strip()
+            if text and len(text) <= 50:
+                values.append(text)
+            if len(values) >= per_column:
+                break
+        samples[column] = values
+    return samples
+
+
+def column_document(table_name: str, column: str, description: Optional[str] = None,
+                    samples: Optional[List[Any]] = None) -> str:
+    """
+    Text embedded for one column.
+
+    Args:
+        table_name: Name of the table the column belongs to
+        column: Column name
+        description: Column description
+        samples: Example values of the column
+
+    Returns:
+        Document text, e.g. "Column state of table sales: State of the sale. Examples: Karnataka, Kerala"
+    """
+    text = f"Column {column} of table {table_name}"
+    readable = column.replace("_", " ")
+    if description and description.strip().lower() not in (column.lower(), readable.lower()):
+        text += f": {description.strip()}"
+    if samples:
+        text += ". Examples: " + ", ".join(str(value) for value in samples[:MAX_SAMPLE_VALUES])
+    return text
+
+
+def column_documents(user_id: str, table_name: str, columns: Dict[str, str],
+                     samples: Optional[Dict[str, List[Any]]] = None) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """
+    Documents for every column of a table.
+
+    Args:
+        user_id: User identifier
+        table_name: Name of the table
+        columns: Dictionary of column names and descriptions
+        samples: Dictionary of column name to example values (names are matched case-insensitively)
+
+    Returns:
+        List of (document_id, document_text, metadata)
+    """
+    samples_by_key = {_column_key(name): values for name, values in (samples or {}).items()}
+    documents = []
+    for column, description in columns.items():
+        documents.append((
+            f"{table_name}_{user_id}:{column}",
+            column_document(table_name, column, description, samples_by_key.get(_column_key(column))),
+            {
+                "user_id": user_id,
+                "table_name": table_name,
+                "column_name": column,
+                "description": str(description or ""),
+            }
+        ))
+    return documents
+
+
+def aggregate_column_hits(metadatas: List[Dict[str, Any]], distances: List[float]) -> Dict[str, Any]:
+    """
+    Rank tables by their best column hits.
+
+    Args:
+        metadatas: Metadata of the column hits, best first
+        distances: Cosine distances of the hits
+
+    Returns:
+        Dictionary with "tables" ([(table, score)], best first), "columns" (table to
+        matching columns, best first) and "descriptions" (table to column descriptions)
+    """
+    hits: Dict[str, List[float]] = {}
+    columns: Dict[str, List[str]] = {}
+    descriptions: Dict[str, Dict[str, str]] = {}
+    for metadata, distance in zip(metadatas, distances):
+        table_name = metadata.get("table_name")
+        column = metadata.get("column_name")
+        if not table_name or not column:
+            continue
+        hits.setdefault(table_name, []).append(max(0.0, 1.0 - distance))
+        if column not in columns.setdefault(table_name, []):
+            columns[table_name].append(column)
+            if metadata.get("description"):
+                descriptions.setdefault(table_name, {})[column] = metadata["description"]
+
+    scores = {table: sum(sorted(table_hits, reverse=True)[:HITS_PER_TABLE]) for table, table_hits in hits.items()}
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    return {"tables": ranked, "columns": columns, "descriptions": descriptions}
+
+
+def rank_tables(collection, user_id: str, query_text: str, top_k: int = 20) -> Dict[str, Any]:
+    """
+    Query a column collection and aggregate the hits into a table ranking.
+
+    Args:
+        collection: Column collection holding the user's column documents
+        user_id: User identifier
+        query_text: Natural language query
+        top_k: Number of column hits to aggregate
+
+    Returns:
+        Result of aggregate_column_hits (empty ranking when nothing matched)
+    """
+    count = collection.count()
+    if not count:
+        return {"tables": [], "columns": {}, "descriptions": {}}
+    results = collection.query(
+        query_texts=[query_text],
+        n_results=min(top_k, count),
+        where={"user_id": user_id},
+        include=["metadatas", "distances"]
+    )
+    if not results.get("ids") or not results["ids"][0]:
+        return {"tables": [], "columns": {}, "descriptions": {}}
+    return aggregate_column_hits(results["metadatas"][0], results["distances"][0])
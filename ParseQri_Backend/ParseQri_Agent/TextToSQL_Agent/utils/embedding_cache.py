@@ -0,0 +1,387 @@
+"""
+Persistent embedding cache keyed by (model, text hash).
+
+Table metadata documents and frequent questions are embedded again on every
+upsert and every query_texts lookup. The cache keeps each embedding once:
+- vectors live in an append-only file of fixed-size records (20-byte SHA-1 of
+  model and text, then the float32 vector) that is read through a memory map,
+  so opening the cache costs one pass over the keys and no vector is loaded
+  until it is used
+- a small LRU of recently used vectors sits in front of the memory map
+- records are appended with one write under a file lock, so the API workers
+  and agent processes can share a cache directory
+- a cache directory belongs to one model; opening it for another model (or
+  getting vectors of another dimension) empties it, so upgrading the model
+  invalidates the cache cleanly
+- every reset writes a new epoch to model.json; a process that sees another
+  epoch forgets the rows it mapped, so it never reads a refilled file with
+  the row numbers of the old one
+
+Like chroma_registry, this module only needs the standard library and numpy
+at load time, so the backend loads it from the agent directory too.
+"""
+import os
+import json
+import hashlib
+from contextlib import contextmanager
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are not locked across processes
+    fcntl = None
+
+FORMAT_VERSION = 1
+DEFAULT_LRU_SIZE = 4096
+CHROMA_DEFAULT_MODEL = "chroma-default/all-MiniLM-L6-v2"
+
+
+class EmbeddingCache:
+    """
+    Memory-mapped store of embeddings of one model, with an LRU in front.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, lru_size: int = DEFAULT_LRU_SIZE):
+        """
+        Open (or create) the cache of a model.
+
+        Args:
+            cache_dir: Directory of the cache; it holds the vectors of a single model
+            model_name: Name (and revision) of the embedding model
+            lru_size: Number of vectors kept in memory
+        """
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.lru_size = lru_size
+        self.vectors_path = os.path.join(cache_dir, "vectors.bin")
+        self.meta_path = os.path.join(cache_dir, "model.json")
+        self.lock_path = os.path.join(cache_dir, "cache.lock")
+        self._lock = threading.RLock()
+        self._lru: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._rows: Dict[bytes, int] = {}
+        self._map = None
+        self._count = 0
+        self._dtype = None
+        self._epoch: Optional[str] = None
+        self._meta_mtime: Optional[int] = None
+        self.stats = {"lru_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "invalidations": 0}
+
+        os.makedirs(cache_dir, exist_ok=True)
+        meta = self._read_meta()
+        if meta.get("model") != model_name or meta.get("format") != FORMAT_VERSION:
+            if meta:
+                print(f"Embedding cache in {cache_dir} was built for {meta.get('model')}, clearing it for {model_name}")
+                self.stats["invalidations"] += 1
+            self._reset()
+        else:
+            self._adopt_meta(meta)
+
+    @staticmethod
+    def _record_dtype(dim: int) -> np.dtype:
+        return np.dtype([("key", "S20"), ("vector", "<f4", (dim,))])
+
+    def _read_meta(self) -> Dict[str, Any]:
+        try:
+            with open(self.meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_meta(self, dim: Optional[int]):
+        with open(self.meta_path, "w") as f:
+            json.dump({"model": self.model_name, "dim": dim, "format": FORMAT_VERSION, "epoch": self._epoch}, f)
+        self._meta_mtime = self._meta_stamp()
+
+    def _meta_stamp(self) -> Optional[int]:
+        try:
+            return os.stat(self.meta_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _adopt_meta(self, meta: Dict[str, Any]):
+        """Take over the epoch and dimension of model.json; the caller holds the lock or is the constructor."""
+        self._epoch = meta.get("epoch")
+        self._dtype = self._record_dtype(meta["dim"]) if meta.get("dim") else None
+
+    def _check_epoch(self):
+        """
+        Forget the mapped rows when another process reset the cache since they were mapped.
+
+        model.json is only read again when its modification time changed.
+        """
+        stamp = self._meta_stamp()
+        if stamp is None or stamp == self._meta_mtime:
+            return
+        self._meta_mtime = stamp
+        meta = self._read_meta()
+        if meta.get("epoch") == self._epoch:
+            return
+        self._map = None
+        self._lru.clear()
+        self._rows.clear()
+        self._count = 0
+        if meta.get("model") == self.model_name:
+            self._adopt_meta(meta)
+        else:
+            self._epoch = meta.get("epoch")
+            self._dtype = None
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock on the cache directory, shared by appends and resets of every process."""
+        with open(self.lock_path, "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _reset(self, dim: Optional[int] = None):
+        """Drop every stored vector and start a new epoch; the caller holds the lock or is the constructor."""
+        self._map = None
+        self._epoch = os.urandom(8).hex()
+        with self._file_lock():
+            if os.path.exists(self.vectors_path):
+                os.remove(self.vectors_path)
+            self._write_meta(dim)
+        self._lru.clear()
+        self._rows.clear()
+        self._count = 0
+        self._dtype = self._record_dtype(dim) if dim else None
+
+    def key(self, text: str) -> bytes:
+        """Cache key of a text: SHA-1 of the model name and the text."""
+        return hashlib.sha1(f"{self.model_name}\0{text}".encode("utf-8")).digest()
+
+    def _refresh(self):
+        """Map records appended since the last refresh, by this or another process."""
+        self._check_epoch()
+        if self._dtype is None:
+            meta = self._read_meta()
+            if meta.get("model") != self.model_name or not meta.get("dim") or meta.get("epoch") != self._epoch:
+                return
+            self._dtype = self._record_dtype(meta["dim"])
+        try:
+            size = os.path.getsize(self.vectors_path)
+        except OSError:
+            return
+        # A record cut short by a crash is ignored
+        count = size // self._dtype.itemsize
+        if count <= self._count:
+            return
+        self._map = np.memmap(self.vectors_path, dtype=self._dtype, mode="r", shape=(count,))
+        keys = self._map["key"]
+        for row in range(self._count, count):
+            self._rows[bytes(keys[row])] = row
+        self._count = count
+
+    def _remember(self, key: bytes, vector: np.ndarray):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up the embeddings of texts.
+
+        Args:
+            texts: Texts to look up
+
+        Returns:
+            One float32 vector per text, None for texts that are not cached
+        """
+        with self._lock:
+            self._check_epoch()
+            found: List[Optional[np.ndarray]] = []
+            refreshed = False
+            for text in texts:
+                key = self.key(text)
+                vector = self._lru.get(key)
+                if vector is not None:
+                    self._lru.move_to_end(key)
+                    self.stats["lru_hits"] += 1
+                    found.append(vector)
+                    continue
+                if key not in self._rows and not refreshed:
+                    self._refresh()
+                    refreshed = True
+                row = self._rows.get(key)
+                if row is None:
+                    self.stats["misses"] += 1
+                    found.append(None)
+                    continue
+                vector = np.array(self._map["vector"][row], dtype=np.float32)
+                self._remember(key, vector)
+                self.stats["disk_hits"] += 1
+                found.append(vector)
+            return found
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        """
+        Store the embeddings of texts.
+
+        Args:
+            texts: Embedded texts
+            vectors: One vector per text
+        """
+        if not texts:
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            dim = matrix.shape[1]
+            if self._dtype is None:
+                self._refresh()
+            if self._dtype is None:
+                with self._file_lock():
+                    self._write_meta(dim)
+                self._dtype = self._record_dtype(dim)
+            elif self._dtype["vector"].shape[0] != dim:
+                print(f"Embedding dimension of {self.model_name} changed to {dim}, clearing the embedding cache")
+                self.stats["invalidations"] += 1
+                self._reset(dim)
+
+            records = np.zeros(len(texts), dtype=self._dtype)
+            for i, text in enumerate(texts):
+                key = self.key(text)
+                records[i]["key"] = key
+                self._remember(key, matrix[i].copy())
+            records["vector"] = matrix
+
+            with self._file_lock():
+                # Records of an older epoch would land in a file another process just emptied
+                if self._read_meta().get("epoch") != self._epoch:
+                    return
+                with open(self.vectors_path, "ab") as f:
+                    f.write(records.tobytes())
+                    f.flush()
+            self.stats["writes"] += len(texts)
+
+    def embed(self, texts: Sequence[str], encode: Callable[[List[str]], Sequence[Sequence[float]]]) -> List[np.ndarray]:
+        """
+        Embed texts, encoding only the ones that are not cached.
+
+        Args:
+            texts: Texts to embed
+            encode: Embeds a list of texts in one call
+
+        Returns:
+            One float32 vector per text, in order
+        """
+        vectors = self.get_many(texts)
+        missing = sorted({text for text, vector in zip(texts, vectors) if vector is None})
+        if missing:
+            encoded = np.asarray(encode(missing), dtype=np.float32)
+            self.put_many(missing, encoded)
+            by_text = dict(zip(missing, encoded))
+            vectors = [vector if vector is not None else by_text[text] for text, vector in zip(texts, vectors)]
+        return vectors
+
+    def clear(self):
+        """Drop every cached embedding."""
+        with self._lock:
+            dim = self._dtype["vector"].shape[0] if self._dtype is not None else None
+            self.stats["invalidations"] += 1
+            self._reset(dim)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Hit counts and size of the cache."""
+        with self._lock:
+            self._refresh()
+            lookups = self.stats["lru_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+            hits = lookups - self.stats["misses"]
+            return dict(
+                self.stats,
+                model=self.model_name,
+                entries=len(self._rows),
+                lru_entries=len(self._lru),
+                bytes=self._count * self._dtype.itemsize if self._dtype is not None else 0,
+                hit_ratio=round(hits / lookups, 4) if lookups else None,
+            )
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def default_cache_dir(name: str) -> str:
+    """Directory of a named embedding cache under CACHE_DIR (or "cache")."""
+    return os.path.join(os.getenv("CACHE_DIR", "cache"), "embeddings", name)
+
+
+def get_embedding_cache(model_name: str, cache_dir: Optional[str] = None) -> EmbeddingCache:
+    """
+    Return the process-wide cache of a directory.
+
+    Args:
+        model_name: Name (and revision) of the embedding model
+        cache_dir: Cache directory (defaults to CACHE_DIR/embeddings/<model name>)
+
+    Returns:
+        EmbeddingCache
+    """
+    cache_dir = os.path.abspath(cache_dir or default_cache_dir(model_name.replace("/", "_")))
+    with _caches_lock:
+        cache = _caches.get(cache_dir)
+        if cache is None or cache.model_name != model_name:
+            cache = EmbeddingCache(cache_dir, model_name,
+                                   lru_size=int(os.getenv("EMBEDDING_CACHE_LRU", DEFAULT_LRU_SIZE)))
+            _caches[cache_dir] = cache
+        return cache
+
+
+_embedding_function = None
+
+
+def cached_embedding_function():
+    """
+    Chroma's default embedding function behind the embedding cache.
+
+    Pass it to collections that are queried or written with query_texts/documents.
+    It reports the same name and config as the default function, so collections
+    created with either one can be opened with the other.
+
+    Returns:
+        Embedding function, or None if chromadb is not available or EMBEDDING_CACHE=0
+    """
+    global _embedding_function
+    if os.getenv("EMBEDDING_CACHE", "1") == "0":
+        return None
+    with _caches_lock:
+        if _embedding_function is not None:
+            return _embedding_function
+        try:
+            from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+            from chromadb import EmbeddingFunction
+        except ImportError:
+            return None
+
+        class CachedEmbeddingFunction(EmbeddingFunction):
+            def __init__(self, inner, cache_name: str):
+                self.inner = inner
+                self.cache_name = cache_name
+
+            def __call__(self, input):
+                cache = get_embedding_cache(self.cache_name)
+                return cache.embed(list(input), self.inner)
+
+            # Chroma calls name() on the class when it records a collection's configuration
+            @staticmethod
+            def name():
+                return "default"
+
+            def get_config(self):
+                return {}
+
+            @staticmethod
+            def build_from_config(config):
+                return cached_embedding_function()
+
+        _embedding_function = CachedEmbeddingFunction(DefaultEmbeddingFunction(), CHROMA_DEFAULT_MODEL)
+        return _embedding_function
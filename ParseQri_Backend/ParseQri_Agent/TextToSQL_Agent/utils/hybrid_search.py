@@ -0,0 +1,150 @@
+"""
+Hybrid retrieval of relevant tables.
+
+Vector search alone misses questions that name a table or column outright but
+phrase the rest loosely, and BM25 alone misses paraphrases. Each retriever
+ranks the candidate tables on its own (vector similarity, BM25 over names and
+descriptions, column-document hits), and reciprocal rank fusion merges the
+rankings: a table scores sum(weight / (k + rank)) over the rankings it appears
+in, so agreement between retrievers counts more than any single raw score.
+An optional cross-encoder then reranks the top of the fused list.
+
+Every candidate carries its fused score and per-retriever ranks, so callers
+can tell a clear winner from a close call and skip further disambiguation.
+Only the standard library is needed at import time (the cross-encoder is
+loaded on first use), so the API can load this module as well.
+"""
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# Damping constant of reciprocal rank fusion; 60 is the value from the original RRF paper
+RRF_K = 60
+# Fused score ratio between the first and second candidate that counts as a clear win
+CLEAR_WIN_MARGIN = 1.5
+DEFAULT_RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+def reciprocal_rank_fusion(rankings: Dict[str, Sequence[str]], k: int = RRF_K,
+                           weights: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+    """
+    Merge several rankings of the same items with reciprocal rank fusion.
+
+    Args:
+        rankings: Retriever name to its item IDs, best first
+        k: Damping constant; larger values flatten the advantage of top ranks
+        weights: Retriever name to weight (defaults to 1 for every retriever)
+
+    Returns:
+        Candidates best first, each {"table_name", "score", "ranks"} where ranks maps
+        every retriever that returned the item to its 1-based rank
+    """
+    candidates: Dict[str, Dict[str, Any]] = {}
+    for retriever, ranking in rankings.items():
+        weight = (weights or {}).get(retriever, 1.0)
+        seen = set()
+        for position, item in enumerate(ranking, start=1):
+            if item in seen:
+                continue
+            seen.add(item)
+            candidate = candidates.setdefault(item, {"table_name": item, "score": 0.0, "ranks": {}})
+            candidate["score"] += weight / (k + position)
+            candidate["ranks"][retriever] = position
+
+    return sorted(candidates.values(), key=lambda candidate: (-candidate["score"], candidate["table_name"]))
+
+
+def rerank(query_text: str, candidates: List[Dict[str, Any]], documents: Dict[str, str],
+           scorer: Callable[[str, List[str]], List[float]], top_n: int = 10) -> List[Dict[str, Any]]:
+    """
+    Reorder the top fused candidates by a cross-encoder score.
+
+    Args:
+        query_text: Natural language query
+        candidates: Fused candidates, best first
+        documents: Table name to the text the scorer compares with the query
+        scorer: Called with (query, texts), returns one relevance score per text
+        top_n: Candidates to rerank; the rest keep their fused order after them
+
+    Returns:
+        Candidates with "rerank_score" on the reranked ones, best first
+    """
+    head = [candidate for candidate in candidates[:top_n] if candidate["table_name"] in documents]
+    if len(head) < 2:
+        return candidates
+    scores = scorer(query_text, [documents[candidate["table_name"]] for candidate in head])
+    reranked = [dict(candidate, rerank_score=float(score)) for candidate, score in zip(head, scores)]
+    reranked.sort(key=lambda candidate: -candidate["rerank_score"])
+    reranked_names = {candidate["table_name"] for candidate in reranked}
+    return reranked + [candidate for candidate in candidates if candidate["table_name"] not in reranked_names]
+
+
+def clear_winner(candidates: List[Dict[str, Any]], margin: float = CLEAR_WIN_MARGIN) -> bool:
+    """
+    Whether the first candidate clearly beats the rest.
+
+    It does when it is the only candidate, or when at least two retrievers and a
+    majority of those that found anything ranked it first, and either all of them
+    did or its fused score is at least margin times the runner-up's. After a
+    rerank the cross-encoder must also agree with the fused order.
+
+    Args:
+        candidates: Candidates best first, as returned by reciprocal_rank_fusion or rerank
+        margin: Fused score ratio that counts as a clear win when retrievers disagree
+
+    Returns:
+        True when the top candidate can be used without further disambiguation
+    """
+    if not candidates:
+        return False
+    if len(candidates) == 1:
+        return True
+
+    top = candidates[0]
+    fused_top = max(candidates, key=lambda candidate: candidate["score"])
+    if "rerank_score" in top and fused_top is not top:
+        return False
+
+    # Every retriever that found anything ranked some candidate first
+    retrievers = {retriever for candidate in candidates for retriever in candidate["ranks"]}
+    top_firsts = [retriever for retriever, rank in top["ranks"].items() if rank == 1]
+    if len(top_firsts) < 2 or 2 * len(top_firsts) <= len(retrievers):
+        return False
+    if len(top_firsts) == len(retrievers):
+        return True
+    runner_up = max(candidate["score"] for candidate in candidates if candidate is not top)
+    return top["score"] >= margin * runner_up
+
+
+_scorers: Dict[str, Optional[Callable[[str, List[str]], List[float]]]] = {}
+_scorers_lock = threading.Lock()
+
+
+def cross_encoder_scorer(model_name: str = DEFAULT_RERANK_MODEL) -> Optional[Callable[[str, List[str]], List[float]]]:
+    """
+    Return a scorer backed by a local sentence-transformers cross-encoder.
+
+    The model is loaded once per process. Returns None when sentence-transformers
+    is not installed or the model cannot be loaded, so reranking is skipped.
+
+    Args:
+        model_name: Cross-encoder model name
+
+    Returns:
+        Function of (query, texts) returning one relevance score per text, or None
+    """
+    with _scorers_lock:
+        if model_name not in _scorers:
+            try:
+                from sentence_transformers import CrossEncoder
+                model = CrossEncoder(model_name)
+            except Exception as e:
+                # Remembered, so the load is not retried on every query
+                print(f"Cross-encoder reranking unavailable ({model_name}): {e}")
+                _scorers[model_name] = None
+                return None
+
+            def score(query_text: str, texts: List[str]) -> List[float]:
+                return [float(value) for value in model.predict([(query_text, text) for text in texts])]
+
+            _scorers[model_name] = score
+        return _scorers[model_name]
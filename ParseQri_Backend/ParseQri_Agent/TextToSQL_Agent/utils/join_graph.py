@@ -0,0 +1,301 @@
+"""
+Join graph over the tables of a schema, used to pick the tables a question needs.
+
+Tables are nodes and join conditions are edges. Edges come from declared
+foreign keys and, for uploaded CSV tables that have no constraints, from
+inferred keys ("customer_id" in one table and a "customer" table with an "id"
+or "customer_id" column). Given the candidate tables found by retrieval, the
+planner connects them with a minimal subgraph (the greedy shortest-path
+Steiner tree approximation), so only those tables and join paths go into the
+SQL generation prompt.
+"""
+import heapq
+import threading
+from typing import Dict, List, Any, Optional, Iterable, Tuple
+from utils.schema_catalog import get_schema_catalog
+
+# Inferred keys are less certain than declared ones, so paths prefer foreign keys
+FOREIGN_KEY_WEIGHT = 1.0
+INFERRED_KEY_WEIGHT = 1.5
+# Lexical score, relative to the best one, from which a table becomes a join candidate
+JOIN_LEXICAL_RATIO = 0.5
+
+
+def entity_names(table_name: str, user_id: Optional[str] = None) -> List[str]:
+    """Names a key column may use to refer to a table, e.g. "customers_42" -> ["customers", "customer"]."""
+    name = table_name.lower()
+    if user_id and name.endswith(f"_{str(user_id).lower()}"):
+        name = name[:-(len(str(user_id)) + 1)]
+    names = [name]
+    if name.endswith("ies"):
+        names.append(name[:-3] + "y")
+    elif name.endswith("ses") or name.endswith("xes"):
+        names.append(name[:-2])
+    elif name.endswith("s"):
+        names.append(name[:-1])
+    return names
+
+
+class JoinGraph:
+    """
+    Undirected graph of tables connected by join conditions.
+    """
+
+    def __init__(self):
+        """Initialize an empty join graph."""
+        # table -> neighbour -> edge; only the cheapest edge between two tables is kept
+        self.adjacency: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    def add_table(self, table_name: str):
+        """Add a table without any joins."""
+        self.adjacency.setdefault(table_name, {})
+
+    def add_edge(self, from_table: str, from_columns: List[str], to_table: str, to_columns: List[str],
+                 inferred: bool = False):
+        """
+        Add a join condition between two tables.
+
+        Args:
+            from_table: Referencing table
+            from_columns: Columns of the referencing table
+            to_table: Referenced table
+            to_columns: Columns of the referenced table, in the same order
+            inferred: Whether the key was inferred from column names instead of declared
+        """
+        if from_table == to_table:
+            return
+        edge = {
+            "from_table": from_table,
+            "from_columns": list(from_columns),
+            "to_table": to_table,
+            "to_columns": list(to_columns),
+            "inferred": inferred,
+            "weight": INFERRED_KEY_WEIGHT if inferred else FOREIGN_KEY_WEIGHT,
+        }
+        self.add_table(from_table)
+        self.add_table(to_table)
+        existing = self.adjacency[from_table].get(to_table)
+        if existing is None or edge["weight"] < existing["weight"]:
+            self.adjacency[from_table][to_table] = edge
+            self.adjacency[to_table][from_table] = edge
+
+    def add_foreign_keys(self, foreign_keys: Dict[str, List[Dict[str, Any]]]):
+        """
+        Add edges for declared foreign keys.
+
+        Args:
+            foreign_keys: Table name to foreign keys as returned by Inspector.get_foreign_keys
+        """
+        for table_name, table_keys in foreign_keys.items():
+            self.add_table(table_name)
+            for key in table_keys:
+                if key.get("referred_table") and key.get("constrained_columns"):
+                    self.add_edge(table_name, key["constrained_columns"],
+                                  key["referred_table"], key["referred_columns"])
+
+    def infer_keys(self, table_columns: Dict[str, Iterable[str]], user_id: Optional[str] = None):
+        """
+        Add edges for "<entity>_id" columns that refer to an "<entity>" table.
+
+        Args:
+            table_columns: Table name to its column names
+            user_id: Owner of the tables, stripped from "<base>_<user_id>" names
+        """
+        columns_by_table = {table: {col.lower(): col for col in columns} for table, columns in table_columns.items()}
+        tables_by_entity: Dict[str, List[str]] = {}
+        for table in columns_by_table:
+            self.add_table(table)
+            for entity in entity_names(table, user_id):
+                tables_by_entity.setdefault(entity, []).append(table)
+
+        for table, columns in columns_by_table.items():
+            for lower_name, column in columns.items():
+                if not lower_name.endswith("_id") or lower_name == "_id":
+                    continue
+                entity = lower_name[:-3]
+                for target in tables_by_entity.get(entity, []):
+                    if target == table:
+                        continue
+                    target_columns = columns_by_table[target]
+                    target_column = target_columns.get("id") or target_columns.get(lower_name)
+                    if target_column:
+                        self.add_edge(table, [column], target, [target_column], inferred=True)
+
+    def _shortest_paths(self, sources: Iterable[str]) -> Tuple[Dict[str, float], Dict[str, str]]:
+        """Dijkstra from a set of source tables; returns distances and predecessors."""
+        distances = {source: 0.0 for source in sources}
+        previous: Dict[str, str] = {}
+        heap = [(0.0, source) for source in distances]
+        heapq.heapify(heap)
+        while heap:
+            distance, table = heapq.heappop(heap)
+            if distance > distances.get(table, float("inf")):
+                continue
+            # Sorting neighbours keeps ties, and therefore the plan, deterministic
+            for neighbour in sorted(self.adjacency.get(table, {})):
+                candidate = distance + self.adjacency[table][neighbour]["weight"]
+                if candidate < distances.get(neighbour, float("inf")):
+                    distances[neighbour] = candidate
+                    previous[neighbour] = table
+                    heapq.heappush(heap, (candidate, neighbour))
+        return distances, previous
+
+    def connect(self, tables: List[str], max_tables: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Find a small set of tables and joins connecting the given tables.
+
+        Starting from the first table, the closest remaining table is attached to
+        the tree through its shortest path until every reachable table is connected.
+        Tables that cannot be reached are returned without joins.
+
+        Args:
+            tables: Candidate tables, most relevant first
+            max_tables: Stop adding candidates once the plan has this many tables
+
+        Returns:
+            Dictionary with "tables" (in join order), "joins" (edges) and "unreachable" tables
+        """
+        terminals = []
+        for table in tables:
+            if table in self.adjacency and table not in terminals:
+                terminals.append(table)
+        if not terminals:
+            return {"tables": [], "joins": [], "unreachable": list(tables)}
+
+        tree = [terminals[0]]
+        joins: List[Dict[str, Any]] = []
+        remaining = terminals[1:]
+        unreachable = [table for table in tables if table not in self.adjacency]
+
+        while remaining:
+            distances, previous = self._shortest_paths(tree)
+            reachable = [table for table in remaining if table in distances]
+            if not reachable:
+                unreachable.extend(remaining)
+                break
+
+            # Closest candidate first, candidate order breaks ties
+            target = min(reachable, key=lambda table: (distances[table], remaining.index(table)))
+            path = [target]
+            while path[-1] not in tree:
+                path.append(previous[path[-1]])
+            if max_tables and len(tree) + len(path) - 1 > max_tables:
+                unreachable.append(target)
+                remaining.remove(target)
+                continue
+
+            for child, parent in reversed(list(zip(path, path[1:]))):
+                joins.append(self.adjacency[parent][child])
+            tree.extend(reversed(path[:-1]))
+            remaining.remove(target)
+
+        return {"tables": tree, "joins": joins, "unreachable": unreachable}
+
+    @staticmethod
+    def describe_join(edge: Dict[str, Any]) -> str:
+        """Render a join edge as an SQL condition, e.g. "orders.customer_id = customers.id"."""
+        return " AND ".join(
+            f"{edge['from_table']}.{from_column} = {edge['to_table']}.{to_column}"
+            for from_column, to_column in zip(edge["from_columns"], edge["to_columns"])
+        )
+
+
+def join_candidates(primary_table: str, available_tables: List[str],
+                    retrieval_candidates: Optional[List[Dict[str, Any]]] = None,
+                    lexical_ranking: Optional[List[Tuple[str, float]]] = None,
+                    question_words: Iterable[str] = (), user_id: Optional[str] = None,
+                    confident: bool = False, resolve=None, max_tables: int = 5) -> List[str]:
+    """
+    Pick the tables a question may need, to be connected by the join planner.
+
+    Besides the primary table and tables the question names, retrieval decides:
+    a table ranked first by any retriever of the hybrid search, or one scoring at
+    least JOIN_LEXICAL_RATIO of the best BM25 score (names, columns and
+    descriptions), so paraphrased questions find their tables too. When retrieval
+    found a clear winner, only named tables are added.
+
+    Args:
+        primary_table: Physical name of the table selected for the question
+        available_tables: Physical names of the tables the user may query
+        retrieval_candidates: Hybrid search candidates ({"table_name", "score", "ranks"}), best first
+        lexical_ranking: (physical table name, BM25 score) pairs, best first
+        question_words: Lowercase words of the question
+        user_id: Owner of the tables
+        confident: Whether retrieval found a clear winner
+        resolve: Maps a candidate's table name to its physical name (identity if None)
+        max_tables: Upper bound on the number of candidates
+
+    Returns:
+        Physical table names, the primary table first
+    """
+    available = set(available_tables)
+    candidates = [primary_table]
+
+    def add(table: Optional[str]):
+        if table and table in available and table not in candidates and len(candidates) < max_tables:
+            candidates.append(table)
+
+    words = set(question_words)
+    for table in available_tables:
+        if words.intersection(entity_names(table, user_id)):
+            add(table)
+
+    if not confident:
+        for candidate in retrieval_candidates or []:
+            if 1 in candidate.get("ranks", {}).values():
+                name = candidate["table_name"]
+                add(resolve(name) if resolve else name)
+        if lexical_ranking:
+            best_score = lexical_ranking[0][1]
+            for table, score in lexical_ranking:
+                if best_score > 0 and score >= JOIN_LEXICAL_RATIO * best_score:
+                    add(table)
+    return candidates
+
+
+_graphs: Dict[tuple, tuple] = {}
+_graphs_lock = threading.Lock()
+
+
+def get_join_graph(engine, schema: Optional[str] = None, tables: Optional[List[str]] = None,
+                   user_id: Optional[str] = None) -> JoinGraph:
+    """
+    Return the join graph of a schema, rebuilding it when the catalog's table list changed.
+
+    Args:
+        engine: SQLAlchemy engine
+        schema: Schema (database) name
+        tables: Restrict the graph to these tables (e.g. one user's tables)
+        user_id: Owner of the tables, used to infer keys on "<base>_<user_id>" names
+
+    Returns:
+        JoinGraph with declared and inferred join edges
+    """
+    catalog = get_schema_catalog()
+    key = (catalog.engine_key(engine), schema, tuple(sorted(tables)) if tables is not None else None, user_id)
+    generation = catalog.table_generation(engine, schema)
+
+    with _graphs_lock:
+        cached = _graphs.get(key)
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+
+    table_names = tables if tables is not None else catalog.table_names(engine, schema)
+    wanted = set(table_names)
+    graph = JoinGraph()
+    for table in table_names:
+        graph.add_table(table)
+    try:
+        graph.add_foreign_keys({
+            table: [fk for fk in table_keys if fk.get("referred_table") in wanted]
+            for table, table_keys in catalog.foreign_keys(engine, schema).items() if table in wanted
+        })
+    except Exception as e:
+        print(f"Warning: Could not load foreign keys for the join graph: {e}")
+    graph.infer_keys({
+        table: [col["name"] for col in catalog.get_columns(engine, table, schema)] for table in table_names
+    }, user_id)
+
+    with _graphs_lock:
+        _graphs[key] = (generation, graph)
+    return graph
@@ -0,0 +1,314 @@
+"""
+BM25 inverted index over table names, column names and column descriptions.
+
+Used as the cheap first stage of schema linking: a question is matched
+lexically against every table of a schema before any embedding search or LLM
+call. Identifiers are split on snake_case and camelCase boundaries and every
+token is stemmed, so "customerOrders", "customer_orders" and "orders of a
+customer" share terms. The index is built once per schema version (the
+catalog's table-list generation) and a lookup only touches the postings of
+the question's terms. The index over a user's stored table metadata is kept
+the same way, per user, until a metadata write bumps its generation.
+"""
+import re
+import math
+import time
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple, Iterable
+
+# Field weights: a table name match says more than a column name or description match
+TABLE_NAME_WEIGHT = 3
+COLUMN_NAME_WEIGHT = 1
+DESCRIPTION_WEIGHT = 1
+
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "give",
+    "how", "i", "in", "is", "it", "list", "me", "much", "many", "of", "on", "or", "per", "show",
+    "tell", "that", "the", "there", "this", "to", "was", "were", "what", "when", "where", "which",
+    "who", "with", "all", "each", "find", "get", "our", "my", "we", "you", "have", "has",
+}
+
+_CAMEL_BOUNDARY = re.compile(r"(?<=[a-z0-9])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])")
+_WORD = re.compile(r"[A-Za-z]+|[0-9]+")
+
+
+def stem(word: str) -> str:
+    """
+    Reduce a lowercase word to a crude stem (plural, verb and adverb suffixes).
+
+    Args:
+        word: Lowercase word
+
+    Returns:
+        Stemmed word
+    """
+    if len(word) <= 3:
+        return word
+    for suffix, replacement in (("ies", "y"), ("sses", "ss"), ("xes", "x"), ("ches", "ch"), ("shes", "sh")):
+        if word.endswith(suffix):
+            return word[:-len(suffix)] + replacement
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    for suffix in ("ingly", "edly", "ing", "ed", "ly"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            # "shipped" -> "shipp" -> "ship"
+            if len(word) > 3 and word[-1] == word[-2] and word[-1] not in "lsz":
+                word = word[:-1]
+            break
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text or identifiers into stemmed, lowercase terms.
+
+    Args:
+        text: Question, table name, column name or description
+
+    Returns:
+        List of terms, stop words removed
+    """
+    terms = []
+    for part in re.split(r"[^A-Za-z0-9]+", text or ""):
+        for piece in _CAMEL_BOUNDARY.split(part):
+            for word in _WORD.findall(piece):
+                word = word.lower()
+                if word not in STOP_WORDS:
+                    terms.append(stem(word))
+    return terms
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a small set of documents held in an inverted index.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        """
+        Initialize an empty index.
+
+        Args:
+            k1: Term frequency saturation
+            b: Document length normalization
+        """
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self._idf: Dict[str, float] = {}
+        self._avg_length = 0.0
+        self._dirty = False
+
+    def add_document(self, doc_id: str, terms: Iterable[str]):
+        """
+        Index a document; adding a document id twice replaces the earlier terms.
+
+        Args:
+            doc_id: Document identifier (a table name)
+            terms: Terms of the document, repeated to weight them
+        """
+        if doc_id in self.doc_lengths:
+            for postings in self.postings.values():
+                postings.pop(doc_id, None)
+        length = 0
+        for term in terms:
+            postings = self.postings.setdefault(term, {})
+            postings[doc_id] = postings.get(doc_id, 0) + 1
+            length += 1
+        self.doc_lengths[doc_id] = length
+        self._dirty = True
+
+    def _finalize(self):
+        """Recompute IDF values and the average document length."""
+        count = len(self.doc_lengths)
+        self._avg_length = sum(self.doc_lengths.values()) / count if count else 0.0
+        self._idf = {
+            term: math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items() if postings
+        }
+        self._dirty = False
+
+    def search(self, query: str, top_k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Score documents against a query.
+
+        Args:
+            query: Natural language query
+            top_k: Maximum number of results (None for all matches)
+
+        Returns:
+            List of (doc_id, score) for documents sharing at least one term, best first
+        """
+        if self._dirty:
+            self._finalize()
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, frequency in self.postings[term].items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / (self._avg_length or 1))
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:top_k] if top_k else ranked
+
+
+def table_terms(table_name: str, columns: Iterable[str], descriptions: Optional[Dict[str, str]] = None,
+                user_id: Optional[str] = None) -> List[str]:
+    """
+    Weighted terms describing a table.
+
+    Args:
+        table_name: Physical table name
+        columns: Column names of the table
+        descriptions: Column name to description
+        user_id: Owner of the table, stripped from "<base>_<user_id>" names
+
+    Returns:
+        List of terms, table name terms repeated by their weight
+    """
+    name = table_name
+    if user_id and name.endswith(f"_{user_id}"):
+        name = name[:-(len(str(user_id)) + 1)]
+    terms = tokenize(name) * TABLE_NAME_WEIGHT
+    for column in columns:
+        terms.extend(tokenize(column) * COLUMN_NAME_WEIGHT)
+    for description in (descriptions or {}).values():
+        terms.extend(tokenize(description) * DESCRIPTION_WEIGHT)
+    return terms
+
+
+_indexes: Dict[tuple, tuple] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_lexical_index(engine, schema: Optional[str] = None, tables: Optional[List[str]] = None,
+                      user_id: Optional[str] = None,
+                      descriptions: Optional[Dict[str, Dict[str, str]]] = None) -> BM25Index:
+    """
+    Return the BM25 index of a schema's tables, rebuilding it when the catalog's table list changed.
+
+    Args:
+        engine: SQLAlchemy engine
+        schema: Schema (database) name
+        tables: Restrict the index to these tables (e.g. one user's tables)
+        user_id: Owner of the tables
+        descriptions: Table name to column descriptions, indexed along with the names
+
+    Returns:
+        BM25Index whose document ids are table names
+    """
+    # Imported here so the module itself needs only the standard library (the API loads it too)
+    from utils.schema_catalog import get_schema_catalog
+
+    catalog = get_schema_catalog()
+    key = (catalog.engine_key(engine), schema, tuple(sorted(tables)) if tables is not None else None, user_id)
+    generation = catalog.table_generation(engine, schema)
+    descriptions = descriptions or {}
+
+    with _indexes_lock:
+        cached = _indexes.get(key)
+        # Callers hand back the same descriptions dict while it is unchanged, which skips the comparison
+        if cached is not None and cached[0] == generation and (cached[1] is descriptions or cached[1] == descriptions):
+            return cached[2]
+
+    index = BM25Index()
+    for table in (tables if tables is not None else catalog.table_names(engine, schema)):
+        columns = [col["name"] for col in catalog.get_columns(engine, table, schema)]
+        index.add_document(table, table_terms(table, columns, descriptions.get(table), user_id))
+    # Compute IDF values now so concurrent searches only read the index
+    index._finalize()
+
+    # Replaces the index of an older table list or older descriptions
+    with _indexes_lock:
+        _indexes[key] = (generation, descriptions, index)
+    return index
+
+
+# Generations of the table metadata documents of each user, in the shared cache backend
+METADATA_NAMESPACE = "metadata_generation"
+# Seconds between re-reads of the shared backend for other processes' metadata writes
+METADATA_RELOAD_SECONDS = 10
+
+_metadata_indexes: Dict[tuple, tuple] = {}
+# id of a backend -> when get_metadata_index last reloaded it
+_reloaded_at: Dict[int, float] = {}
+
+
+def _backend(backend):
+    if backend is not None:
+        return backend
+    from utils.cache_backend import get_cache_backend
+    return get_cache_backend()
+
+
+def metadata_generation(store: str, user_id: str, backend=None) -> int:
+    """How many times a user's table metadata in a store was written, shared across processes."""
+    return _backend(backend).get(METADATA_NAMESPACE, store, user_id=str(user_id)) or 0
+
+
+def invalidate_metadata_index(store: str, user_id: str, backend=None) -> int:
+    """
+    Record that a user's table metadata changed, so every process rebuilds its BM25 index.
+
+    Args:
+        store: Key of the metadata store (e.g. its directory and collection)
+        user_id: Owner of the metadata
+        backend: Cache backend, defaults to the shared backend
+
+    Returns:
+        The new metadata generation
+    """
+    backend = _backend(backend)
+    generation = metadata_generation(store, user_id, backend) + 1
+    backend.set(METADATA_NAMESPACE, store, generation, user_id=str(user_id))
+    with _indexes_lock:
+        _metadata_indexes.pop((store, str(user_id)), None)
+    return generation
+
+
+def get_metadata_index(store: str, user_id: str,
+                       load: Callable[[], Tuple[Dict[str, List[str]], Any]],
+                       backend=None) -> Tuple[BM25Index, Any]:
+    """
+    Return the BM25 index of a user's stored table metadata, rebuilding it after a metadata write.
+
+    Args:
+        store: Key of the metadata store (e.g. its directory and collection)
+        user_id: Owner of the metadata
+        load: Reads the user's metadata; returns (document id to terms, data kept with the index)
+        backend: Cache backend holding the metadata generations, defaults to the shared backend
+
+    Returns:
+        Tuple of the BM25Index and the data load returned when it was built
+    """
+    key = (store, str(user_id))
+    backend = _backend(backend)
+    # Picks up writes of other processes (e.g. the column description worker). Reloading
+    # the file backend reads the whole store, so it is done at most every few seconds;
+    # writes of this process invalidate the index right away.
+    now = time.time()
+    with _indexes_lock:
+        reload = now - _reloaded_at.get(id(backend), 0.0) >= METADATA_RELOAD_SECONDS
+        if reload:
+            _reloaded_at[id(backend)] = now
+    if reload:
+        backend.reload()
+    generation = metadata_generation(store, user_id, backend)
+
+    with _indexes_lock:
+        cached = _metadata_indexes.get(key)
+        if cached is not None and cached[0] == generation:
+            return cached[1], cached[2]
+
+    terms, data = load()
+    index = BM25Index()
+    for doc_id, doc_terms in terms.items():
+        index.add_document(doc_id, doc_terms)
+    index._finalize()
+
+    with _indexes_lock:
+        _metadata_indexes[key] = (generation, index, data)
+    return index, data
@@ -0,0 +1,57 @@
+"""
+Memoization of LLM calls through the shared cache backend.
+
+Deterministic LLM tasks (SQL validation, column descriptions) are keyed by a hash
+of the model, the messages and the call options, so identical prompts issued by
+any worker are answered from the cache.
+"""
+import json
+import hashlib
+import ollama
+from typing import Dict, List, Any, Optional
+from utils.cache_backend import CacheBackend, get_cache_backend
+
+LLM_CACHE_NAMESPACE = "llm"
+DEFAULT_LLM_CACHE_TTL = 7 * 24 * 3600
+
+
+def llm_cache_key(model: str, messages: List[Dict[str, str]], **options) -> str:
+    """Stable hash of an LLM request."""
+    payload = json.dumps({"model": model, "messages": messages, "options": options},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def cached_chat(model: str, messages: List[Dict[str, str]],
+                backend: Optional[CacheBackend] = None,
+                ttl: Optional[float] = DEFAULT_LLM_CACHE_TTL, **options) -> Dict[str, Any]:
+    """
+    Call ollama.chat, reusing a cached response for an identical request.
+
+    Args:
+        model: Ollama model name
+        messages: Chat messages
+        backend: Cache backend to use (defaults to the process-wide backend)
+        ttl: Seconds before a cached response expires
+        **options: Extra keyword arguments passed to ollama.chat (e.g. format="json")
+
+    Returns:
+        Response dictionary with the same ['message']['content'] shape as ollama.chat
+    """
+    backend = backend or get_cache_backend()
+    key = llm_cache_key(model, messages, **options)
+
+    cached = backend.get(LLM_CACHE_NAMESPACE, key)
+    if cached is not None:
+        return cached
+
+    response = ollama.chat(model=model, messages=messages, **options)
+    result = {
+        "model": model,
+        "message": {
+            "role": response["message"]["role"],
+            "content": response["message"]["content"]
+        }
+    }
+    backend.set(LLM_CACHE_NAMESPACE, key, result, ttl=ttl)
+    return result
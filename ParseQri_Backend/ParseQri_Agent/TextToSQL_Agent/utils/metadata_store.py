@@ -0,0 +1,255 @@
+"""
+Multi-tenant metadata store shared by all users.
+
+Metadata used to live in one PersistentClient directory per user
+(<persist_dir>/<user_id>, collections "<user_id>_metadata" and
+"<user_id>_columns"), so every user meant another client, another HNSW index
+and another set of open files. All users now share one store in
+<persist_dir>/_shared with one collection per document kind:
+- table_metadata:  one document per table
+- column_metadata: one document per column
+
+Every document carries a user_id metadata field and every read filters on it.
+Document IDs already end in the user ID, so users cannot overwrite each
+other's documents. migrate_user_directories copies the old per-user
+directories into the shared store, embeddings included, so nothing is
+embedded again.
+
+VECTOR_STORE picks the backend of the collections (see utils.vector_index):
+ChromaDB, a local numpy index in <persist_dir>/_shared/local/<collection>,
+or ChromaDB failing over to the local index.
+"""
+import os
+import shutil
+from typing import Any, Callable, Dict, List, Optional
+from utils.chroma_registry import get_chroma_registry
+from utils.embedding_cache import cached_embedding_function
+from utils.vector_index import (FailoverCollection, LocalVectorIndex, get_local_index,
+                                mirror_collection, vector_store_mode)
+
+SHARED_STORE_DIR = "_shared"
+LOCAL_INDEX_DIR = "local"
+COLLECTIONS = {"tables": "table_metadata", "columns": "column_metadata"}
+# Collection name suffixes of the per-user layout
+LEGACY_SUFFIXES = {"tables": "_metadata", "columns": "_columns"}
+
+
+def shared_store_dir(persist_dir: str) -> str:
+    """Directory of the shared metadata store."""
+    return os.path.join(persist_dir, SHARED_STORE_DIR)
+
+
+def local_index_dir(persist_dir: str, kind: str = "tables") -> str:
+    """Directory of the local vector index of a collection."""
+    return os.path.join(shared_store_dir(persist_dir), LOCAL_INDEX_DIR, COLLECTIONS[kind])
+
+
+def _local_embedding_function():
+    """Embedding function of the local indexes: the cached one, else Chroma's default."""
+    embedding_function = cached_embedding_function()
+    if embedding_function is None:
+        try:
+            from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+            embedding_function = DefaultEmbeddingFunction()
+        except ImportError:
+            return None
+    return embedding_function
+
+
+def local_metadata_index(persist_dir: str, kind: str = "tables", create: bool = True) -> Optional[LocalVectorIndex]:
+    """
+    Get the local vector index of a collection of the shared metadata store.
+
+    Args:
+        persist_dir: ChromaDB storage directory of the agents
+        kind: "tables" or "columns"
+        create: Create the index when it does not exist
+
+    Returns:
+        The index, or None when it does not exist and create is False
+    """
+    directory = local_index_dir(persist_dir, kind)
+    if not create and not LocalVectorIndex.exists(directory):
+        return None
+    return get_local_index(directory, COLLECTIONS[kind], embedding_function=_local_embedding_function())
+
+
+def _chroma_collection(persist_dir: str, kind: str, create: bool):
+    # Pinned: every user's queries go through this one client
+    return get_chroma_registry().collection(
+        shared_store_dir(persist_dir),
+        COLLECTIONS[kind],
+        create=create,
+        metadata={"hnsw:space": "cosine"},
+        pinned=True,
+        embedding_function=cached_embedding_function()
+    )
+
+
+def metadata_collection(persist_dir: str, kind: str = "tables", create: bool = True):
+    """
+    Get a collection of the shared metadata store.
+
+    The backend depends on VECTOR_STORE: a ChromaDB collection, a local vector
+    index, or a ChromaDB collection failing over to the local index (which
+    answers alone while ChromaDB cannot be opened).
+
+    Args:
+        persist_dir: ChromaDB storage directory of the agents
+        kind: "tables" or "columns"
+        create: Create the collection when it does not exist
+
+    Returns:
+        The collection, or None when it does not exist and create is False
+    """
+    mode = vector_store_mode()
+    if mode == "local":
+        return local_metadata_index(persist_dir, kind, create)
+    if mode == "chroma":
+        return _chroma_collection(persist_dir, kind, create)
+
+    fallback = local_metadata_index(persist_dir, kind, create)
+    try:
+        primary = _chroma_collection(persist_dir, kind, create)
+    except Exception as e:
+        print(f"ChromaDB unavailable for {COLLECTIONS[kind]}, using the local index: {e}")
+        return fallback
+    if primary is None or fallback is None:
+        return primary or fallback
+    return FailoverCollection(primary, fallback)
+
+
+def build_local_indexes(persist_dir: str, batch_size: int = 256,
+                        progress: Optional[Callable[[str, int], None]] = None) -> Dict[str, Any]:
+    """
+    Copy the ChromaDB collections of the shared store into local vector indexes.
+
+    Embeddings are copied, so nothing is embedded again. Run it before switching
+    a deployment to VECTOR_STORE=local or failover; running it again is harmless.
+
+    Args:
+        persist_dir: ChromaDB storage directory of the agents
+        batch_size: Documents read and written per call
+        progress: Called with (kind, documents copied) after every batch
+
+    Returns:
+        Dictionary with "collections" (kind to documents copied) and "errors" (kind to error message)
+    """
+    result: Dict[str, Any] = {"collections": {}, "errors": {}}
+    for kind in COLLECTIONS:
+        try:
+            source = _chroma_collection(persist_dir, kind, create=False)
+            if source is None:
+                result["collections"][kind] = 0
+                continue
+            target = local_metadata_index(persist_dir, kind)
+            result["collections"][kind] = mirror_collection(
+                source, target, batch_size=batch_size,
+                progress=(lambda copied, kind=kind: progress(kind, copied)) if progress else None
+            )
+        except Exception as e:
+            print(f"Error building the local index of {COLLECTIONS[kind]}: {e}")
+            result["errors"][kind] = str(e)
+    return result
+
+
+def user_document_count(persist_dir: str, user_id: str, kind: str = "tables") -> int:
+    """Number of documents a user has in the shared store."""
+    collection = metadata_collection(persist_dir, kind, create=False)
+    if collection is None:
+        return 0
+    return len(collection.get(where={"user_id": str(user_id)}, include=[])["ids"])
+
+
+def delete_user_documents(persist_dir: str, user_id: str):
+    """Delete every document of a user from the shared store."""
+    for kind in COLLECTIONS:
+        collection = metadata_collection(persist_dir, kind, create=False)
+        if collection is not None:
+            collection.delete(where={"user_id": str(user_id)})
+
+
+def legacy_user_dirs(persist_dir: str) -> List[str]:
+    """User IDs that still have a per-user ChromaDB directory."""
+    if not os.path.isdir(persist_dir):
+        return []
+    return sorted(
+        entry.name for entry in os.scandir(persist_dir)
+        if entry.is_dir() and not entry.name.startswith("_")
+        and os.path.exists(os.path.join(entry.path, "chroma.sqlite3"))
+    )
+
+
+def migrate_user_directories(persist_dir: str, user_ids: Optional[List[str]] = None,
+                             remove_legacy: bool = False, batch_size: int = 256,
+                             progress: Optional[Callable[[str, str, int], None]] = None) -> Dict[str, Any]:
+    """
+    Copy the per-user ChromaDB directories into the shared store.
+
+    Documents keep their IDs and embeddings. Running it again is harmless,
+    since documents are upserted.
+
+    Args:
+        persist_dir: ChromaDB storage directory of the agents
+        user_ids: Users to migrate (defaults to every user with a legacy directory)
+        remove_legacy: Delete the ChromaDB files of a user directory once it is copied
+            (metadata log files next to them are kept)
+        batch_size: Documents read and written per call
+        progress: Called with (user_id, kind, documents copied) after every batch
+
+    Returns:
+        Dictionary with "users" (user ID to documents copied per kind), "documents"
+        (total copied) and "errors" (user ID to error message)
+    """
+    registry = get_chroma_registry()
+    result: Dict[str, Any] = {"users": {}, "documents": 0, "errors": {}}
+
+    for user_id in user_ids or legacy_user_dirs(persist_dir):
+        user_dir = os.path.join(persist_dir, user_id)
+        copied = {}
+        try:
+            for kind, suffix in LEGACY_SUFFIXES.items():
+                source = registry.collection(user_dir, f"{user_id}{suffix}")
+                copied[kind] = 0
+                if source is None:
+                    continue
+                target = metadata_collection(persist_dir, kind)
+                offset = 0
+                while True:
+                    page = source.get(include=["documents", "metadatas", "embeddings"],
+                                      limit=batch_size, offset=offset)
+                    if not page["ids"]:
+                        break
+                    metadatas = [dict(metadata or {}, user_id=str(user_id)) for metadata in page["metadatas"]]
+                    target.upsert(
+                        ids=page["ids"],
+                        embeddings=page["embeddings"],
+                        documents=page["documents"],
+                        metadatas=metadatas
+                    )
+                    offset += len(page["ids"])
+                    copied[kind] = offset
+                    if progress:
+                        progress(user_id, kind, offset)
+        except Exception as e:
+            print(f"Error migrating metadata of user {user_id}: {e}")
+            result["errors"][user_id] = str(e)
+            continue
+
+        result["users"][user_id] = copied
+        result["documents"] += sum(copied.values())
+        if remove_legacy:
+            _remove_chroma_files(user_dir)
+
+    return result
+
+
+def _remove_chroma_files(user_dir: str):
+    """Delete a per-user ChromaDB database and its index directories."""
+    get_chroma_registry().evict(user_dir)
+    for entry in os.scandir(user_dir):
+        if entry.name == "chroma.sqlite3":
+            os.remove(entry.path)
+        elif entry.is_dir():
+            # Index directories of the user's collections
+            shutil.rmtree(entry.path)
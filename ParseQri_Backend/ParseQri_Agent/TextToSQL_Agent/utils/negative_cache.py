@@ -0,0 +1,175 @@
+"""
+Short-lived cache of questions that could not be answered.
+
+When a question is judged NOT_RELEVANT, fails SQL validation, or its SQL fails
+to execute, the failure is remembered for a few minutes. Retrying the same
+question (manually or through frontend retries) then returns the previous
+failure reason straight away instead of running the LLM pipeline again.
+
+Entries are keyed by user, normalized question and the user's schema version.
+The schema version is bumped whenever the user uploads data, so a new table
+immediately makes earlier failures stale.
+
+Hit, miss, record and forced retry counts are kept in process memory and
+merged into the shared totals when the process exits, so lookups never write
+to the backend.
+"""
+import re
+import time
+import atexit
+import threading
+from typing import Dict, Any, Optional
+from utils.cache_backend import CacheBackend, get_cache_backend
+
+NEGATIVE_NAMESPACE = "negative"
+SCHEMA_VERSION_NAMESPACE = "schema_version"
+METRICS_NAMESPACE = "metrics"
+
+# Failure kinds
+NOT_RELEVANT = "not_relevant"
+INVALID_SQL = "invalid_sql"
+EXECUTION_ERROR = "execution_error"
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a question so trivial variations share one entry."""
+    question = re.sub(r"\s+", " ", question or "").strip().lower()
+    return question.rstrip("?!. ")
+
+
+class NegativeCache:
+    """
+    Remembers recent failures per user, question and schema version.
+    """
+
+    def __init__(self, backend: Optional[CacheBackend] = None, cache_dir: str = None,
+                 ttl_seconds: float = 300):
+        """
+        Initialize the negative cache.
+
+        Args:
+            backend: Cache backend to store entries in, defaults to the shared backend
+            cache_dir: Directory for the shared backend's persistence file
+            ttl_seconds: How long a failure is remembered
+        """
+        self.backend = backend or get_cache_backend(persist_dir=cache_dir)
+        self.ttl_seconds = ttl_seconds
+        self.metrics = {"hits": 0, "misses": 0, "records": 0, "forced_retries": 0}
+        # Counts not yet merged into the shared totals
+        self._unsaved = dict.fromkeys(self.metrics, 0)
+        self._metrics_lock = threading.Lock()
+        atexit.register(self.save_metrics)
+
+    def schema_version(self, user_id: Optional[str]) -> int:
+        """Current schema version of a user."""
+        return self.backend.get(SCHEMA_VERSION_NAMESPACE, "version", user_id=user_id) or 0
+
+    def bump_schema_version(self, user_id: Optional[str]) -> int:
+        """
+        Mark a user's schema as changed, which invalidates their negative entries.
+
+        Args:
+            user_id: User whose tables changed
+
+        Returns:
+            The new schema version
+        """
+        version = self.schema_version(user_id) + 1
+        self.backend.set(SCHEMA_VERSION_NAMESPACE, "version", version, user_id=user_id)
+        return version
+
+    def _key(self, question: str, user_id: Optional[str]) -> str:
+        return f"{self.schema_version(user_id)}:{normalize_question(question)}"
+
+    def get(self, question: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Look up a recent failure for a question.
+
+        Args:
+            question: Natural language question
+            user_id: User asking the question
+
+        Returns:
+            Dictionary with "reason", "kind", "sql_query", "failed_at" and "count", or None
+        """
+        entry = self.backend.get(NEGATIVE_NAMESPACE, self._key(question, user_id), user_id=user_id)
+        self._count("hits" if entry else "misses")
+        return entry
+
+    def record(self, question: str, reason: str, kind: str, user_id: Optional[str] = None,
+               sql_query: Optional[str] = None):
+        """
+        Remember that a question failed.
+
+        Args:
+            question: Natural language question
+            reason: Failure reason shown to the user
+            kind: One of NOT_RELEVANT, INVALID_SQL or EXECUTION_ERROR
+            user_id: User who asked the question
+            sql_query: SQL that was generated, if any
+        """
+        if not question:
+            return
+        key = self._key(question, user_id)
+        previous = self.backend.get(NEGATIVE_NAMESPACE, key, user_id=user_id) or {}
+        entry = {
+            "reason": reason,
+            "kind": kind,
+            "sql_query": sql_query,
+            "failed_at": time.time(),
+            "count": previous.get("count", 0) + 1,
+        }
+        self.backend.set(NEGATIVE_NAMESPACE, key, entry, user_id=user_id, ttl=self.ttl_seconds)
+        self._count("records")
+
+    def forget(self, question: str, user_id: Optional[str] = None):
+        """
+        Drop the failure for a question, used when a retry is forced.
+
+        Args:
+            question: Natural language question
+            user_id: User who asked the question
+        """
+        self.backend.delete(NEGATIVE_NAMESPACE, self._key(question, user_id), user_id=user_id)
+        self._count("forced_retries")
+
+    def clear(self, user_id: Optional[str] = None) -> int:
+        """Remove all negative entries, or those of a single user."""
+        return self.backend.clear(NEGATIVE_NAMESPACE, user_id=user_id)
+
+    def _count(self, metric: str):
+        """Increment a metric of this process."""
+        with self._metrics_lock:
+            self.metrics[metric] += 1
+            self._unsaved[metric] += 1
+
+    def save_metrics(self):
+        """Merge the counts of this process into the shared totals."""
+        with self._metrics_lock:
+            delta = {metric: count for metric, count in self._unsaved.items() if count}
+            self._unsaved = dict.fromkeys(self.metrics, 0)
+        if not delta:
+            return
+        try:
+            self.backend.set(METRICS_NAMESPACE, NEGATIVE_NAMESPACE, self._add(self._saved_totals(), delta))
+        except Exception as e:
+            print(f"Warning: Failed to save negative cache metrics: {str(e)}")
+
+    def _saved_totals(self) -> Dict[str, int]:
+        return self.backend.get(METRICS_NAMESPACE, NEGATIVE_NAMESPACE) or {}
+
+    @staticmethod
+    def _add(total: Dict[str, int], delta: Dict[str, int]) -> Dict[str, int]:
+        merged = dict(total)
+        for metric, count in delta.items():
+            merged[metric] = merged.get(metric, 0) + count
+        return merged
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Return process-local and shared metrics (the shared totals include this process's unsaved counts)."""
+        with self._metrics_lock:
+            process, unsaved = dict(self.metrics), dict(self._unsaved)
+        return {
+            "process": process,
+            "total": self._add(self._saved_totals(), unsaved),
+        }
@@ -0,0 +1,526 @@
+"""
+Parameterized query templates learned from generated SQL.
+
+Questions that only differ in their literals ("sales in 2022" vs "sales in 2023",
+"top 5" vs "top 20", a customer name) map to the same SQL shape. A template is
+learned by aligning the literals of a generated SQL query with the spans of the
+question they came from; later questions with the same shape are answered by
+binding their literals into the stored SQL without calling the LLM. Bound SQL
+is checked locally (bound_sql_issues, then an EXPLAIN by the execution agent),
+never by the LLM, which could rewrite it.
+"""
+import re
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+# Literals inside SQL text
+SQL_STRING_PATTERN = re.compile(r"'((?:[^']|'')*)'")
+SQL_NUMBER_PATTERN = re.compile(r"(?<![\w.'])(-?\d+(?:\.\d+)?)(?![\w.'])")
+
+# Numbers as they may appear in a question ("500,000", "2023", "4.5")
+QUESTION_NUMBER_PATTERN = r"-?\d{1,3}(?:,\d{3})+(?:\.\d+)?|-?\d+(?:\.\d+)?"
+
+# Capture groups used when a learned question shape is turned back into a regex
+NUMBER_CAPTURE = r"(" + QUESTION_NUMBER_PATTERN + r")"
+STRING_CAPTURE = r"(.+?)"
+
+# Comparison context immediately before a literal in SQL, used to find the column
+COLUMN_CONTEXT_PATTERN = re.compile(
+    r"[`\"]?(\w+)[`\"]?\s*(?:=|<>|!=|<=|>=|<|>|\bLIKE\b|\bIN\s*\(|\bBETWEEN\b)\s*(?:[^\s,()]+\s*,\s*)*$",
+    re.IGNORECASE
+)
+BETWEEN_AND_PATTERN = re.compile(r"[`\"]?(\w+)[`\"]?\s+BETWEEN\s+\S+\s+AND\s*$", re.IGNORECASE)
+LIMIT_CONTEXT_PATTERN = re.compile(r"\b(?:LIMIT|TOP|OFFSET)\s*$", re.IGNORECASE)
+
+NUMERIC_TYPE_MARKERS = ("INT", "DECIMAL", "NUMERIC", "FLOAT", "DOUBLE", "REAL", "BIGINT", "SMALLINT")
+
+MAX_STRING_LITERAL_LENGTH = 100
+MAX_LIMIT_VALUE = 10000
+# Words a bound string value may have beyond those of the literal the template was learned from
+MAX_EXTRA_STRING_WORDS = 2
+# Words that start another clause of the question; a value containing one swallowed that clause
+CLAUSE_WORDS = {
+    "with", "where", "and", "or", "by", "sorted", "sort", "order", "ordered", "group", "grouped",
+    "having", "limit", "top", "over", "under", "above", "below", "between", "than", "per",
+    "from", "for", "in", "who", "which", "that", "whose", "except", "excluding", "not"
+}
+
+
+def _normalize_question(question: str) -> str:
+    """Collapse whitespace so spacing differences don't change the question shape."""
+    return " ".join(question.split())
+
+
+def _parse_number(text: str) -> Optional[float]:
+    """Parse a question or SQL number, ignoring thousands separators."""
+    try:
+        return float(text.replace(",", ""))
+    except (TypeError, ValueError):
+        return None
+
+
+def _format_number(value: float, as_int: bool) -> str:
+    """Format a number the way it should appear in SQL."""
+    if as_int:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _find_unique_span(question: str, value: str, is_number: bool) -> Optional[Tuple[int, int]]:
+    """
+    Find the single span of the question holding a literal.
+
+    Args:
+        question: Normalized user question
+        value: Literal value taken from the SQL query
+        is_number: Whether the literal is numeric
+
+    Returns:
+        (start, end) of the span, or None if the literal is missing or ambiguous
+    """
+    spans = []
+    if is_number:
+        target = _parse_number(value)
+        for match in re.finditer(r"(?<![\w.])(?:" + QUESTION_NUMBER_PATTERN + r")(?![\w])", question):
+            if _parse_number(match.group(0)) == target:
+                spans.append(match.span())
+    else:
+        if not value.strip():
+            return None
+        pattern = r"(?<!\w)" + re.escape(value) + r"(?!\w)"
+        spans = [m.span() for m in re.finditer(pattern, question, re.IGNORECASE)]
+
+    if len(spans) != 1:
+        return None
+    return spans[0]
+
+
+def _column_for_literal(sql_before: str) -> Tuple[Optional[str], bool]:
+    """
+    Identify the column a literal is compared against from the SQL preceding it.
+
+    Returns:
+        Tuple of (column name or None, whether the literal is a LIMIT/OFFSET count)
+    """
+    if LIMIT_CONTEXT_PATTERN.search(sql_before):
+        return None, True
+    between = BETWEEN_AND_PATTERN.search(sql_before)
+    if between:
+        return between.group(1), False
+    context = COLUMN_CONTEXT_PATTERN.search(sql_before)
+    if context:
+        return context.group(1), False
+    return None, False
+
+
+def extract_sql_literals(sql_query: str) -> List[Dict[str, Any]]:
+    """
+    Extract string and numeric literals from an SQL query.
+
+    Args:
+        sql_query: The SQL query text
+
+    Returns:
+        List of literals with their span, kind, value and surrounding column
+    """
+    literals = []
+    string_spans = []
+
+    for match in SQL_STRING_PATTERN.finditer(sql_query):
+        raw = match.group(1).replace("''", "'")
+        # Keep LIKE wildcards around the value so they survive re-binding
+        prefix = "%" if raw.startswith("%") else ""
+        suffix = "%" if raw.endswith("%") and len(raw) > 1 else ""
+        value = raw[len(prefix):len(raw) - len(suffix)]
+        column, is_limit = _column_for_literal(sql_query[:match.start()])
+        literals.append({
+            "span": match.span(),
+            "kind": "string",
+            "value": value,
+            "wildcards": (prefix, suffix),
+            "column": column,
+            "is_limit": is_limit
+        })
+        string_spans.append(match.span())
+
+    for match in SQL_NUMBER_PATTERN.finditer(sql_query):
+        if any(start <= match.start() < end for start, end in string_spans):
+            continue
+        column, is_limit = _column_for_literal(sql_query[:match.start()])
+        literals.append({
+            "span": match.span(),
+            "kind": "number",
+            "value": match.group(1),
+            "is_int": "." not in match.group(1),
+            "column": column,
+            "is_limit": is_limit
+        })
+
+    literals.sort(key=lambda lit: lit["span"][0])
+    return literals
+
+
+def learn_template(question: str, sql_query: str,
+                   schema: Optional[Dict[str, str]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Learn a parameterized template from a question and the SQL generated for it.
+
+    Only literals that appear exactly once in the question become parameters;
+    everything else stays fixed in both the question shape and the SQL.
+
+    Args:
+        question: The natural language question
+        sql_query: The SQL generated for the question
+        schema: Column name to type mapping used for the query
+
+    Returns:
+        Template dictionary, or None if no literal could be aligned
+    """
+    if not question or not sql_query:
+        return None
+
+    question = _normalize_question(question)
+    schema = {k.lower(): str(v) for k, v in (schema or {}).items()}
+
+    # Align SQL literals with question spans; one question span may feed several SQL literals
+    params: List[Dict[str, Any]] = []
+    span_to_param: Dict[Tuple[int, int], int] = {}
+    sql_bindings: List[Tuple[Tuple[int, int], int, Tuple[str, str]]] = []
+
+    for literal in extract_sql_literals(sql_query):
+        span = _find_unique_span(question, literal["value"], literal["kind"] == "number")
+        if span is None:
+            continue
+        if span in span_to_param:
+            index = span_to_param[span]
+            if params[index]["kind"] != literal["kind"]:
+                continue
+        else:
+            index = len(params)
+            column = literal["column"]
+            params.append({
+                "kind": literal["kind"],
+                "column": column,
+                "column_type": schema.get(column.lower()) if column else None,
+                "is_int": literal.get("is_int", False),
+                "is_limit": literal["is_limit"],
+                "looks_like_year": bool(re.fullmatch(r"(19|20)\d{2}", literal["value"])),
+                "allow_negative": literal["kind"] == "number" and literal["value"].startswith("-"),
+                "words": len(literal["value"].split())
+            })
+            span_to_param[span] = index
+        sql_bindings.append((literal["span"], index, literal.get("wildcards", ("", ""))))
+
+    if not params:
+        return None
+
+    # Build the question shape as a list of fixed text and parameter slots
+    question_parts: List[Any] = []
+    cursor = 0
+    for span, index in sorted(span_to_param.items()):
+        question_parts.append(question[cursor:span[0]])
+        question_parts.append(index)
+        cursor = span[1]
+    question_parts.append(question[cursor:])
+
+    # Build the SQL template the same way
+    sql_parts: List[Any] = []
+    cursor = 0
+    for span, index, wildcards in sorted(sql_bindings):
+        sql_parts.append(sql_query[cursor:span[0]])
+        sql_parts.append({"param": index, "wildcards": list(wildcards)})
+        cursor = span[1]
+    sql_parts.append(sql_query[cursor:])
+
+    return {
+        "question_parts": question_parts,
+        "sql_parts": sql_parts,
+        "params": params,
+        "schema": schema,
+        "example_question": question
+    }
+
+
+def template_key(template: Dict[str, Any]) -> str:
+    """Stable key identifying the question shape of a template."""
+    pieces = []
+    for part in template["question_parts"]:
+        if isinstance(part, int):
+            pieces.append("{" + template["params"][part]["kind"] + "}")
+        else:
+            pieces.append(part.lower())
+    return "".join(pieces)
+
+
+def _compile_template(template: Dict[str, Any]) -> "re.Pattern":
+    """Turn the question shape into an anchored regex with one group per slot."""
+    pattern = ""
+    for part in template["question_parts"]:
+        if isinstance(part, int):
+            kind = template["params"][part]["kind"]
+            pattern += NUMBER_CAPTURE if kind == "number" else STRING_CAPTURE
+        else:
+            pattern += re.escape(part)
+    return re.compile(r"^" + pattern + r"$", re.IGNORECASE)
+
+
+def _check_value(param: Dict[str, Any], raw_value: str,
+                 resolve_value: Optional[Callable[[Optional[str], str], Optional[str]]] = None) -> Optional[Any]:
+    """
+    Type and value checks for a value about to be bound to a parameter.
+
+    String values must not reach into another clause of the question (a clause
+    word, or more words than the learned literal allows), and when resolve_value
+    is given they must be values it knows for the parameter's column.
+
+    Args:
+        param: Parameter of the template
+        raw_value: Text captured from the question
+        resolve_value: Called with (column, text), returns the stored spelling of a
+            known column value or None
+
+    Returns:
+        The checked value (float for numbers, str for strings), or None if rejected
+    """
+    column_type = (param.get("column_type") or "").upper()
+    column_is_numeric = any(marker in column_type for marker in NUMERIC_TYPE_MARKERS)
+
+    if param["kind"] == "number":
+        value = _parse_number(raw_value)
+        if value is None:
+            return None
+        if value < 0 and not param.get("allow_negative", False):
+            return None
+        if (param["is_int"] or param["is_limit"]) and value != int(value):
+            return None
+        if param["is_limit"] and not (0 < value <= MAX_LIMIT_VALUE):
+            return None
+        if param["looks_like_year"] and not (1000 <= value <= 2999):
+            return None
+        return value
+
+    value = raw_value.strip()
+    if not value or len(value) > MAX_STRING_LITERAL_LENGTH:
+        return None
+    # Never let a bound value change the structure of the query
+    if any(token in value for token in (";", "--", "/*", "*/", "\\")):
+        return None
+    words = value.lower().split()
+    if len(words) > param.get("words", 1) + MAX_EXTRA_STRING_WORDS:
+        return None
+    if any(word.strip(",.") in CLAUSE_WORDS for word in words):
+        return None
+    if column_is_numeric and _parse_number(value) is None:
+        return None
+    if resolve_value is not None:
+        return resolve_value(param.get("column"), value)
+    return value
+
+
+def bind_template(template: Dict[str, Any], question: str,
+                  resolve_value: Optional[Callable[[Optional[str], str], Optional[str]]] = None) -> Optional[str]:
+    """
+    Bind the literals of a new question into a template's SQL.
+
+    Args:
+        template: Template produced by learn_template
+        question: New natural language question
+        resolve_value: Called with (column, text) for string values, returns the stored
+            spelling of a known column value or None to reject the value
+
+    Returns:
+        The bound SQL query, or None if the question doesn't fit the template
+    """
+    question = _normalize_question(question)
+    compiled = template.get("_compiled")
+    if compiled is None:
+        compiled = _compile_template(template)
+        template["_compiled"] = compiled
+
+    match = compiled.match(question)
+    if not match:
+        return None
+
+    # Each slot appears once in the shape, in order of first occurrence
+    slot_order = [part for part in template["question_parts"] if isinstance(part, int)]
+    values: Dict[int, Any] = {}
+    for group_index, param_index in enumerate(slot_order, start=1):
+        checked = _check_value(template["params"][param_index], match.group(group_index), resolve_value)
+        if checked is None:
+            return None
+        values[param_index] = checked
+
+    sql = ""
+    for part in template["sql_parts"]:
+        if isinstance(part, dict):
+            param = template["params"][part["param"]]
+            value = values[part["param"]]
+            if param["kind"] == "number":
+                sql += _format_number(value, param["is_int"] or param["is_limit"])
+            else:
+                prefix, suffix = part["wildcards"]
+                sql += "'" + prefix + value.replace("'", "''") + suffix + "'"
+        else:
+            sql += part
+    return sql
+
+
+def bound_sql_issues(template: Dict[str, Any], sql_query: str) -> Optional[str]:
+    """
+    Check SQL bound from a template without calling the LLM or the database.
+
+    The bound SQL must still be a single SELECT, keep the template's fixed SQL
+    text in order, and only compare literals against columns of the schema the
+    template was learned for.
+
+    Args:
+        template: Template produced by learn_template
+        sql_query: SQL returned by bind_template
+
+    Returns:
+        Description of the first problem, or None if the SQL passes
+    """
+    if not sql_query or not sql_query.strip():
+        return "empty query"
+    without_strings = SQL_STRING_PATTERN.sub("''", sql_query)
+    if "--" in without_strings or "/*" in without_strings:
+        return "contains a comment"
+    statements = [part for part in without_strings.split(";") if part.strip()]
+    if len(statements) != 1:
+        return "more than one statement"
+    if not re.match(r"\s*(SELECT|WITH)\b", sql_query, re.IGNORECASE):
+        return "not a SELECT query"
+
+    cursor = 0
+    for part in template.get("sql_parts", []):
+        if isinstance(part, str) and part:
+            found = sql_query.find(part, cursor)
+            if found < 0:
+                return "does not match the template's SQL"
+            cursor = found + len(part)
+
+    schema = template.get("schema") or {}
+    if schema:
+        for literal in extract_sql_literals(sql_query):
+            column = literal["column"]
+            if column and column.lower() not in schema:
+                return f"column {column} is not in the template's schema"
+    return None
+
+
+class QueryTemplateStore:
+    """
+    Per-user collection of learned question templates.
+    Templates are matched most-specific first (longest fixed text).
+    """
+
+    def __init__(self, max_templates_per_user: int = 500):
+        """
+        Initialize the template store.
+
+        Args:
+            max_templates_per_user: Upper bound on templates kept for each user
+        """
+        self.max_templates_per_user = max_templates_per_user
+        self.templates: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # Users whose templates changed since they were last saved
+        self._changed: set = set()
+
+    def learn(self, user_id: str, question: str, sql_query: str,
+              schema: Optional[Dict[str, str]] = None) -> Optional[str]:
+        """
+        Learn a template for a user from a successfully answered question.
+
+        Returns:
+            The template key if a template was stored, None otherwise
+        """
+        template = learn_template(question, sql_query, schema)
+        if not template:
+            return None
+
+        key = template_key(template)
+        user_templates = self.templates.setdefault(user_id or "default_user", {})
+        if key not in user_templates and len(user_templates) >= self.max_templates_per_user:
+            # Drop the least used template to make room
+            least_used = min(user_templates, key=lambda k: user_templates[k].get("hits", 0))
+            del user_templates[least_used]
+
+        existing = user_templates.get(key, {})
+        template["hits"] = existing.get("hits", 0)
+        if existing.get("sql_parts") != template["sql_parts"] or existing.get("schema") != template["schema"]:
+            self._changed.add(user_id or "default_user")
+        user_templates[key] = template
+        return key
+
+    def forget(self, user_id: str, key: str) -> bool:
+        """
+        Remove a template, e.g. after its bound SQL failed.
+
+        Returns:
+            True if the template existed
+        """
+        user_templates = self.templates.get(user_id or "default_user", {})
+        if key not in user_templates:
+            return False
+        del user_templates[key]
+        self._changed.add(user_id or "default_user")
+        return True
+
+    def take_changed(self, user_id: str) -> bool:
+        """Whether a user's templates changed since the last call for that user."""
+        user_id = user_id or "default_user"
+        changed = user_id in self._changed
+        self._changed.discard(user_id)
+        return changed
+
+    def get(self, user_id: str, key: str) -> Optional[Dict[str, Any]]:
+        """A user's template with the given key, or None."""
+        return self.templates.get(user_id or "default_user", {}).get(key)
+
+    def match(self, user_id: str, question: str,
+              resolve_value: Optional[Callable[[Optional[str], str], Optional[str]]] = None) -> Optional[Tuple[str, str]]:
+        """
+        Find a template for the question and bind its literals.
+
+        Args:
+            user_id: User identifier
+            question: Natural language question
+            resolve_value: Checks string values against the known column values (see bind_template)
+
+        Returns:
+            Tuple of (template key, bound SQL), or None if no template fits
+        """
+        user_templates = self.templates.get(user_id or "default_user")
+        if not user_templates:
+            return None
+
+        def fixed_length(item):
+            return sum(len(p) for p in item[1]["question_parts"] if isinstance(p, str))
+
+        for key, template in sorted(user_templates.items(), key=fixed_length, reverse=True):
+            sql = bind_template(template, question, resolve_value)
+            if sql:
+                template["hits"] = template.get("hits", 0) + 1
+                return key, sql
+        return None
+
+    def to_dict(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """Serializable copy of the store (compiled regexes are dropped)."""
+        return {
+            user_id: {
+                key: {k: v for k, v in template.items() if k != "_compiled"}
+                for key, template in user_templates.items()
+            }
+            for user_id, user_templates in self.templates.items()
+        }
+
+    def load_dict(self, data: Dict[str, Dict[str, Dict[str, Any]]]):
+        """Replace the store contents with previously serialized templates."""
+        self.templates = {user_id: dict(user_templates) for user_id, user_templates in (data or {}).items()}
+
+    def export_user(self, user_id: str) -> Dict[str, Dict[str, Any]]:
+        """Serializable copy of one user's templates."""
+        return self.to_dict().get(user_id or "default_user", {})
+
+    def import_user(self, user_id: str, data: Dict[str, Dict[str, Any]]):
+        """Replace one user's templates with previously serialized ones."""
+        self.templates[user_id or "default_user"] = dict(data or {})
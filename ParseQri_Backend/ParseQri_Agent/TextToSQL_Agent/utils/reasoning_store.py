@@ -0,0 +1,348 @@
+"""
+Persistent write-behind store for schema-linking reasoning.
+
+Schema understanding used to add every reasoning document to an in-memory
+Chroma client while answering the question, which put an embedding on the
+critical path and lost everything on restart. The store instead:
+- queues reasoning in memory and returns immediately
+- upserts queued documents in batches from a background thread into a
+  persistent Chroma collection
+- spools whatever is still queued when the process exits to a JSONL file,
+  so the short-lived CLI never waits for embeddings; the next process picks
+  the spool up and upserts it (a claimed spool stays on disk until it is
+  written, and the claims of processes that died are picked up again)
+- looks reasoning up again for the same question with one id lookup, so it
+  can be reused instead of recomputed; reusing the reasoning of a similar
+  question costs a query embedding and a vector search, so it is opt-in
+"""
+import os
+import re
+import json
+import time
+import queue
+import atexit
+import hashlib
+import threading
+from typing import Dict, List, Any, Optional
+from utils.negative_cache import normalize_question
+from utils.chroma_registry import get_chroma_registry
+from utils.embedding_cache import cached_embedding_function
+
+COLLECTION_NAME = "schema_reasoning"
+SPOOL_FILE = "reasoning_spool.jsonl"
+
+
+def _pid_alive(pid: int) -> bool:
+    """Whether a process is still running (assumed on Windows, where signal 0 would interrupt it)."""
+    if os.name == "nt":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # It exists but belongs to another user
+        return True
+    return True
+
+
+def reasoning_id(user_id: Optional[str], question: str) -> str:
+    """Stable document id for a user's question."""
+    key = f"{user_id or ''}:{normalize_question(question)}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+class ReasoningStore:
+    """
+    Batched, asynchronous persistence and retrieval of schema-linking reasoning.
+    """
+
+    def __init__(self, persist_dir: str, collection=None, batch_size: int = 32,
+                 flush_interval: float = 2.0, max_distance: float = 0.15, reuse_similar: bool = False):
+        """
+        Initialize the reasoning store.
+
+        Args:
+            persist_dir: Directory of the persistent Chroma store and the spool file
+            collection: Collection to write to, defaults to the persistent "schema_reasoning" collection
+            batch_size: Maximum number of documents per upsert
+            flush_interval: Seconds the writer waits to fill a batch
+            max_distance: Largest embedding distance at which stored reasoning is reused
+            reuse_similar: Also reuse reasoning of similar questions (costs a query embedding
+                and a vector search on every question without stored reasoning)
+        """
+        self.persist_dir = persist_dir
+        self.spool_path = os.path.join(persist_dir, SPOOL_FILE)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_distance = max_distance
+        self.reuse_similar = reuse_similar
+        self._collection = collection
+        self._collection_lock = threading.Lock()
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._in_flight: List[Dict[str, Any]] = []
+        self.stats = {"queued": 0, "written": 0, "batches": 0, "spooled": 0, "hits": 0, "misses": 0}
+
+    @property
+    def collection(self):
+        """The persistent collection, opened on first use."""
+        with self._collection_lock:
+            if self._collection is None:
+                # Pinned: the background writer keeps using this collection
+                self._collection = get_chroma_registry().collection(
+                    self.persist_dir, COLLECTION_NAME, create=True, pinned=True,
+                    embedding_function=cached_embedding_function()
+                )
+            return self._collection
+
+    def enqueue(self, user_id: Optional[str], question: str, reasoning: Dict[str, Any],
+                tables: Optional[List[str]] = None):
+        """
+        Queue reasoning for a question; returns without touching the store.
+
+        Args:
+            user_id: User who asked the question
+            question: Natural language question
+            reasoning: Reasoning dictionary with "think" and "answer"
+            tables: Tables the reasoning was computed over
+        """
+        self._queue.put({
+            "id": reasoning_id(user_id, question),
+            "user_id": str(user_id or ""),
+            "question": question,
+            "reasoning": reasoning,
+            "tables": sorted(tables or []),
+            "created_at": time.time(),
+        })
+        self.stats["queued"] += 1
+        self.start()
+
+    def lookup(self, user_id: Optional[str], question: str,
+               available_tables: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Find stored reasoning for the same question, or failing that a similar one.
+
+        Args:
+            user_id: User asking the question
+            question: Natural language question
+            available_tables: Reasoning that refers to tables outside this list is not reused
+
+        Returns:
+            Reasoning dictionary or None
+        """
+        try:
+            collection = self.collection
+            found = collection.get(ids=[reasoning_id(user_id, question)], include=["metadatas"])
+            metadatas = found.get("metadatas") or []
+
+            if not metadatas and self.reuse_similar:
+                results = collection.query(
+                    query_texts=[question],
+                    n_results=1,
+                    where={"user_id": str(user_id or "")},
+                    include=["metadatas", "distances"]
+                )
+                if results.get("ids") and results["ids"][0] and results["distances"][0][0] <= self.max_distance:
+                    metadatas = [results["metadatas"][0][0]]
+
+            for metadata in metadatas:
+                reasoning = json.loads(metadata["reasoning"])
+                related = reasoning.get("answer", {}).get("Related_Tables", [])
+                if available_tables is not None and any(table not in available_tables for table in related):
+                    continue
+                self.stats["hits"] += 1
+                return reasoning
+        except Exception as e:
+            print(f"Warning: Could not look up stored schema reasoning: {e}")
+
+        self.stats["misses"] += 1
+        return None
+
+    def start(self):
+        """Start the background writer if it is not running."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="reasoning-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        """Upsert queued documents in batches, after draining any spool left by earlier processes."""
+        self._drain_spool()
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._in_flight = batch
+                self._write(batch)
+                self._in_flight = []
+
+    def _next_batch(self) -> List[Dict[str, Any]]:
+        """Collect up to batch_size documents, waiting at most flush_interval for more."""
+        batch = []
+        deadline = time.time() + self.flush_interval
+        while len(batch) < self.batch_size and not self._stop.is_set():
+            try:
+                batch.append(self._queue.get(timeout=max(0.05, deadline - time.time())))
+            except queue.Empty:
+                if batch or time.time() >= deadline:
+                    break
+        return batch
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        """Upsert a batch; the latest entry wins when a question was queued twice."""
+        latest = {item["id"]: item for item in batch}
+        try:
+            self.collection.upsert(
+                ids=list(latest),
+                documents=[item["question"] for item in latest.values()],
+                metadatas=[{
+                    "user_id": item["user_id"],
+                    "query": item["question"],
+                    "reasoning": json.dumps(item["reasoning"]),
+                    "tables": ";".join(item["tables"]),
+                    "related_tables": ";".join(item["reasoning"].get("answer", {}).get("Related_Tables", [])),
+                    "created_at": item["created_at"],
+                } for item in latest.values()]
+            )
+            self.stats["written"] += len(latest)
+            self.stats["batches"] += 1
+        except Exception as e:
+            print(f"Warning: Failed to store schema reasoning, spooling {len(batch)} documents: {e}")
+            self._spool(batch)
+
+    def _spool(self, items: List[Dict[str, Any]]):
+        """Append documents to the spool file for a later process to upsert."""
+        if not items:
+            return
+        try:
+            os.makedirs(self.persist_dir, exist_ok=True)
+            with open(self.spool_path, "a") as f:
+                for item in items:
+                    f.write(json.dumps(item) + "\n")
+            self.stats["spooled"] += len(items)
+        except OSError as e:
+            print(f"Warning: Could not spool schema reasoning: {e}")
+
+    def _claimable_spools(self) -> List[str]:
+        """The spool file and the claimed spools of processes that are no longer running."""
+        paths = [self.spool_path]
+        directory, base = os.path.split(self.spool_path)
+        pattern = re.compile(re.escape(base) + r"\.(\d+)(?:\.\d+)?$")
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return paths
+        for name in sorted(names):
+            match = pattern.match(name)
+            if match and int(match.group(1)) != os.getpid() and not _pid_alive(int(match.group(1))):
+                paths.append(os.path.join(directory, name))
+        return paths
+
+    def _drain_spool(self):
+        """
+        Claim the spool file and orphaned claims (by renaming them) and upsert their documents.
+
+        A claimed file is removed only once its documents are written, so when
+        this process dies while draining, the next one claims the file again.
+        Documents not yet written are kept in _in_flight, which close() spools.
+        """
+        for index, source in enumerate(self._claimable_spools()):
+            if not os.path.exists(source):
+                continue
+            claimed = f"{self.spool_path}.{os.getpid()}.{index}"
+            try:
+                os.replace(source, claimed)
+            except OSError:
+                # Another process claimed it first
+                continue
+            items = []
+            try:
+                with open(claimed) as f:
+                    for line in f:
+                        try:
+                            if line.strip():
+                                items.append(json.loads(line))
+                        except ValueError:
+                            # A line cut short by a process dying while spooling
+                            print(f"Warning: Skipping an unreadable line of {claimed}")
+            except OSError as e:
+                print(f"Warning: Could not read schema reasoning spool {claimed}: {e}")
+                continue
+            for start in range(0, len(items), self.batch_size):
+                self._in_flight = items[start:]
+                self._write(items[start:start + self.batch_size])
+            self._in_flight = []
+            # Documents that failed to write were spooled again by _write
+            os.remove(claimed)
+
+    def pending(self) -> int:
+        """Number of queued documents not yet written."""
+        return self._queue.qsize()
+
+    def flush(self, timeout: float = 30.0):
+        """
+        Write every queued document now, in the calling thread.
+
+        Args:
+            timeout: Maximum seconds to spend
+        """
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch)
+
+    def close(self, spool: bool = True):
+        """
+        Stop the writer; queued documents are spooled (or written when spool is False).
+
+        Args:
+            spool: Spool instead of embedding, so exiting processes do not wait for the store
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=0.2 if spool else self.flush_interval + 1)
+        if not spool:
+            self.flush()
+            return
+        # A batch still being embedded is spooled too; upserts by id make a repeat harmless
+        remaining = list(self._in_flight) if self._thread is not None and self._thread.is_alive() else []
+        while True:
+            try:
+                remaining.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self._spool(remaining)
+
+
+_stores: Dict[str, ReasoningStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_reasoning_store(persist_dir: str, **kwargs) -> ReasoningStore:
+    """
+    Return the process-wide reasoning store for a directory; queued reasoning is spooled at exit.
+
+    Args:
+        persist_dir: Directory of the persistent store
+        **kwargs: ReasoningStore options used when the store is created
+
+    Returns:
+        ReasoningStore
+    """
+    persist_dir = os.path.abspath(persist_dir)
+    with _stores_lock:
+        store = _stores.get(persist_dir)
+        if store is None:
+            store = ReasoningStore(persist_dir, **kwargs)
+            _stores[persist_dir] = store
+            atexit.register(store.close)
+        return store
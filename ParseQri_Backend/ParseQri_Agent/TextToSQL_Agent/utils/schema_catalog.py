@@ -0,0 +1,311 @@
+"""
+Process-wide catalog of database table names and column types.
+
+Agents used to build a new SQLAlchemy inspector and query information_schema
+for table lists and columns on every question. The catalog keeps that metadata
+per (engine URL, schema) in memory:
+- table lists are loaded lazily on first use
+- columns are loaded for the whole schema in one bulk call when the dialect
+  supports it (SQLAlchemy 2.x get_multi_columns), otherwise per table
+- entries expire after a TTL, and are invalidated explicitly by our own
+  ingestion code or automatically when a DDL statement runs on a watched engine
+- with a cache backend, table lists and bulk-loaded columns are also shared
+  with the other worker processes ("catalog" namespace, same TTL), so a new
+  worker skips the information_schema round trips another one already made
+"""
+import re
+import time
+import itertools
+import threading
+import weakref
+from typing import Dict, List, Any, Optional
+from sqlalchemy import event, inspect
+from utils.cache_backend import CacheBackend, get_cache_backend
+
+DEFAULT_TTL_SECONDS = 300
+CATALOG_NAMESPACE = "catalog"
+
+# Increases every time a table list is (re)loaded, so dependents can tell when to rebuild
+_generations = itertools.count(1)
+
+DDL_PATTERN = re.compile(r"^\s*(CREATE|ALTER|DROP|RENAME|TRUNCATE)\b", re.IGNORECASE)
+
+
+class SchemaCatalog:
+    """
+    Cache of table names and column definitions keyed by engine and schema.
+    """
+
+    def __init__(self, ttl_seconds: float = DEFAULT_TTL_SECONDS, bulk_load: bool = True,
+                 backend: Optional[CacheBackend] = None):
+        """
+        Initialize the schema catalog.
+
+        Args:
+            ttl_seconds: How long loaded metadata stays valid
+            bulk_load: Load the columns of all tables of a schema at once on the first column lookup
+            backend: Cache backend shared with other processes (None keeps the catalog in this process)
+        """
+        self.ttl_seconds = ttl_seconds
+        self.bulk_load = bulk_load
+        self.backend = backend
+        self._lock = threading.RLock()
+        # (engine key, schema) -> {"loaded_at", "tables", "columns", "bulk_loaded", "generation", "foreign_keys"}
+        self._schemas: Dict[tuple, Dict[str, Any]] = {}
+        self._watched_engines = weakref.WeakSet()
+        self.stats = {"hits": 0, "misses": 0, "shared_hits": 0, "invalidations": 0}
+
+    @staticmethod
+    def engine_key(engine) -> str:
+        """Identify an engine by its URL without the password."""
+        return engine.url.render_as_string(hide_password=True)
+
+    def _entry(self, engine, schema: Optional[str]) -> Dict[str, Any]:
+        """Get the live catalog entry for a schema, creating an empty one if needed."""
+        key = (self.engine_key(engine), schema)
+        with self._lock:
+            entry = self._schemas.get(key)
+            if entry is None or time.time() - entry["loaded_at"] > self.ttl_seconds:
+                entry = {"loaded_at": time.time(), "tables": None, "columns": {}, "bulk_loaded": False,
+                         "generation": 0, "foreign_keys": None}
+                self._schemas[key] = entry
+            return entry
+
+    @staticmethod
+    def _shared_key(engine_key: str, schema: Optional[str], part: str) -> str:
+        return f"{engine_key}|{schema or ''}|{part}"
+
+    def _shared_get(self, engine, schema: Optional[str], part: str) -> Optional[Any]:
+        """Metadata another process loaded, or None."""
+        if self.backend is None:
+            return None
+        try:
+            value = self.backend.get(CATALOG_NAMESPACE, self._shared_key(self.engine_key(engine), schema, part))
+        except Exception as e:
+            print(f"Warning: Could not read the shared schema catalog: {e}")
+            return None
+        if value is not None:
+            self.stats["shared_hits"] += 1
+        return value
+
+    def _shared_set(self, engine, schema: Optional[str], part: str, value: Any):
+        if self.backend is None:
+            return
+        try:
+            self.backend.set(CATALOG_NAMESPACE, self._shared_key(self.engine_key(engine), schema, part),
+                             value, ttl=self.ttl_seconds)
+        except Exception as e:
+            print(f"Warning: Could not share schema catalog metadata: {e}")
+
+    def table_names(self, engine, schema: Optional[str] = None) -> List[str]:
+        """
+        List the tables of a schema.
+
+        Args:
+            engine: SQLAlchemy engine
+            schema: Schema (database) name, None for the engine's default
+
+        Returns:
+            List of table names
+        """
+        self.watch_engine(engine)
+        entry = self._entry(engine, schema)
+        if entry["tables"] is not None:
+            self.stats["hits"] += 1
+            return list(entry["tables"])
+
+        self.stats["misses"] += 1
+        tables = self._shared_get(engine, schema, "tables")
+        if tables is None:
+            tables = inspect(engine).get_table_names(schema=schema)
+            self._shared_set(engine, schema, "tables", list(tables))
+        with self._lock:
+            entry["tables"] = list(tables)
+            entry["generation"] = next(_generations)
+        return list(tables)
+
+    def table_generation(self, engine, schema: Optional[str] = None) -> int:
+        """
+        Version number of a schema's table list; it changes whenever the list is reloaded.
+
+        Args:
+            engine: SQLAlchemy engine
+            schema: Schema (database) name
+
+        Returns:
+            Generation number of the currently cached table list
+        """
+        entry = self._entry(engine, schema)
+        if entry["tables"] is None:
+            self.table_names(engine, schema)
+        return entry["generation"]
+
+    def has_table(self, engine, table_name: str, schema: Optional[str] = None) -> bool:
+        """Whether a table exists in the schema."""
+        return table_name in self.table_names(engine, schema)
+
+    def get_columns(self, engine, table_name: str, schema: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Get the column definitions of a table.
+
+        Args:
+            engine: SQLAlchemy engine
+            table_name: Table name
+            schema: Schema (database) name
+
+        Returns:
+            List of column dictionaries as returned by Inspector.get_columns
+        """
+        self.watch_engine(engine)
+        entry = self._entry(engine, schema)
+        columns = entry["columns"].get(table_name)
+        if columns is not None:
+            self.stats["hits"] += 1
+            return columns
+
+        self.stats["misses"] += 1
+        if self.bulk_load and not entry["bulk_loaded"]:
+            shared_columns = self._shared_get(engine, schema, "columns")
+            if shared_columns is not None:
+                self._store_bulk_columns(entry, shared_columns)
+                if table_name in entry["columns"]:
+                    return entry["columns"][table_name]
+
+        inspector = inspect(engine)
+        if self.bulk_load and not entry["bulk_loaded"] and hasattr(inspector, "get_multi_columns"):
+            try:
+                # One round trip for every table of the schema
+                all_columns = {name: table_columns
+                               for (_, name), table_columns in inspector.get_multi_columns(schema=schema).items()}
+                if self._store_bulk_columns(entry, all_columns):
+                    self._shared_set(engine, schema, "tables", list(all_columns))
+                self._shared_set(engine, schema, "columns", all_columns)
+                if table_name in entry["columns"]:
+                    return entry["columns"][table_name]
+            except Exception as e:
+                print(f"Warning: Bulk column load failed, loading table columns individually: {e}")
+
+        columns = inspector.get_columns(table_name, schema=schema)
+        with self._lock:
+            entry["columns"][table_name] = columns
+        return columns
+
+    def _store_bulk_columns(self, entry: Dict[str, Any], all_columns: Dict[str, List[Dict[str, Any]]]) -> bool:
+        """Keep the columns of every table of a schema in its entry; True if they also gave its table list."""
+        with self._lock:
+            entry["columns"].update(all_columns)
+            entry["bulk_loaded"] = True
+            if entry["tables"] is None:
+                entry["tables"] = list(all_columns)
+                entry["generation"] = next(_generations)
+                return True
+            return False
+
+    def foreign_keys(self, engine, schema: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Get the foreign keys of every table of a schema.
+
+        Args:
+            engine: SQLAlchemy engine
+            schema: Schema (database) name
+
+        Returns:
+            Dictionary of table name to foreign key dictionaries as returned by Inspector.get_foreign_keys
+        """
+        self.watch_engine(engine)
+        entry = self._entry(engine, schema)
+        if entry["foreign_keys"] is not None:
+            self.stats["hits"] += 1
+            return entry["foreign_keys"]
+
+        self.stats["misses"] += 1
+        inspector = inspect(engine)
+        foreign_keys = {}
+        if hasattr(inspector, "get_multi_foreign_keys"):
+            try:
+                # One round trip for every table of the schema
+                for (_, name), table_keys in inspector.get_multi_foreign_keys(schema=schema).items():
+                    foreign_keys[name] = table_keys
+            except Exception as e:
+                print(f"Warning: Bulk foreign key load failed, loading table keys individually: {e}")
+                foreign_keys = {}
+        if not foreign_keys:
+            for name in self.table_names(engine, schema):
+                foreign_keys[name] = inspector.get_foreign_keys(name, schema=schema)
+
+        with self._lock:
+            entry["foreign_keys"] = foreign_keys
+        return foreign_keys
+
+    def column_types(self, engine, table_name: str, schema: Optional[str] = None) -> Dict[str, str]:
+        """Map of column name to SQL type string for a table."""
+        return {col['name']: str(col['type']) for col in self.get_columns(engine, table_name, schema)}
+
+    def invalidate(self, engine=None, schema: Optional[str] = None, table_name: Optional[str] = None):
+        """
+        Drop cached metadata.
+
+        Args:
+            engine: Only invalidate this engine (None for all engines)
+            schema: Only invalidate this schema
+            table_name: Only forget this table's columns (the table list is always reloaded)
+        """
+        engine_key = self.engine_key(engine) if engine is not None else None
+        with self._lock:
+            for key in list(self._schemas):
+                if engine_key is not None and key[0] != engine_key:
+                    continue
+                if schema is not None and key[1] != schema:
+                    continue
+                if table_name is None:
+                    del self._schemas[key]
+                else:
+                    entry = self._schemas[key]
+                    entry["tables"] = None
+                    entry["columns"].pop(table_name, None)
+                    entry["bulk_loaded"] = False
+                    entry["foreign_keys"] = None
+            self.stats["invalidations"] += 1
+        self._invalidate_shared(engine_key, schema)
+
+    def _invalidate_shared(self, engine_key: Optional[str], schema: Optional[str]):
+        """Drop the shared metadata of an engine (and schema), so other processes reload it."""
+        if self.backend is None:
+            return
+        try:
+            for key in self.backend.keys(CATALOG_NAMESPACE):
+                key_engine, key_schema, _ = key.rsplit("|", 2)
+                if engine_key is not None and key_engine != engine_key:
+                    continue
+                if schema is not None and key_schema != schema:
+                    continue
+                self.backend.delete(CATALOG_NAMESPACE, key)
+        except Exception as e:
+            print(f"Warning: Could not invalidate the shared schema catalog: {e}")
+
+    def watch_engine(self, engine):
+        """Invalidate an engine's metadata whenever a DDL statement is executed through it."""
+        if engine in self._watched_engines:
+            return
+        with self._lock:
+            if engine in self._watched_engines:
+                return
+            self._watched_engines.add(engine)
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if statement and DDL_PATTERN.match(statement):
+                self.invalidate(conn.engine)
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_schema_catalog() -> SchemaCatalog:
+    """Return the process-wide schema catalog shared by all agents."""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = SchemaCatalog(backend=get_cache_backend())
+        return _catalog
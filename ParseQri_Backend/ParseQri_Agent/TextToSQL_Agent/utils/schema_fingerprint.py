@@ -0,0 +1,201 @@
+"""
+Schema fingerprints: one version key per table shape.
+
+A fingerprint is a short hash of a table's ordered column names and types plus
+its ingest generation (a counter bumped every time our ingestion replaces the
+table). Cached artifacts record the fingerprints of the tables they were built
+from - query cache entries, column metadata in Chroma, the backend's schema
+cache - so they are validated by comparing two strings instead of inspecting
+the database again.
+
+The current fingerprint of every table is published in the shared cache
+backend ("fingerprint" namespace) whenever it is computed, so the check is a
+single key lookup for any process. Fingerprints and ingest generations are
+keyed by "<engine key>|<schema>|<table>" (see fingerprint_key), so tables of
+the same name in different databases do not overwrite each other. Type names are normalized ("VARCHAR(255)",
+"varchar" and "character varying" are the same type) so that fingerprints
+computed from SQLAlchemy reflection and from information_schema rows agree.
+
+This module only imports the standard library at load time, so the FastAPI
+backend can load it from the agent directory (see app/db/schema_fingerprint.py).
+"""
+import re
+import hashlib
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+FINGERPRINT_NAMESPACE = "fingerprint"
+INGEST_NAMESPACE = "ingest_generation"
+FINGERPRINT_LENGTH = 16
+
+TYPE_ALIASES = {
+    "integer": "int",
+    "int4": "int",
+    "int8": "bigint",
+    "character varying": "varchar",
+    "character": "char",
+    "double precision": "double",
+    "float8": "double",
+    "bool": "boolean",
+    "timestamp without time zone": "timestamp",
+    "timestamp with time zone": "timestamptz",
+}
+
+
+def normalize_type(type_name) -> str:
+    """Reduce a column type to its lowercase base name, e.g. "VARCHAR(255)" -> "varchar"."""
+    base = re.sub(r"\(.*?\)", "", str(type_name).lower())
+    base = re.sub(r"\s+", " ", base).strip()
+    return TYPE_ALIASES.get(base, base)
+
+
+def compute_fingerprint(columns: Iterable[Tuple[str, object]], ingest_generation: int = 0) -> str:
+    """
+    Fingerprint of a table shape.
+
+    Args:
+        columns: Ordered (column name, type) pairs
+        ingest_generation: How many times our ingestion replaced the table
+
+    Returns:
+        Hex digest of FINGERPRINT_LENGTH characters
+    """
+    parts = [f"{name.lower()}:{normalize_type(type_name)}" for name, type_name in columns]
+    parts.append(f"#{int(ingest_generation or 0)}")
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:FINGERPRINT_LENGTH]
+
+
+def fingerprint_key(engine_key: str, table_name: str, schema: Optional[str] = None) -> str:
+    """
+    Key of a table's fingerprint and ingest generation in the shared backend.
+
+    Args:
+        engine_key: Database URL without the password (SchemaCatalog.engine_key)
+        table_name: Physical table name
+        schema: Schema (database) name
+
+    Returns:
+        "<engine key>|<schema>|<table>"
+    """
+    return f"{engine_key}|{schema or ''}|{table_name}"
+
+
+def table_key(engine, table_name: str, schema: Optional[str] = None) -> str:
+    """fingerprint_key of a table of a SQLAlchemy engine."""
+    from utils.schema_catalog import get_schema_catalog
+    return fingerprint_key(get_schema_catalog().engine_key(engine), table_name, schema)
+
+
+def _backend(backend=None):
+    if backend is not None:
+        return backend
+    from utils.cache_backend import get_cache_backend
+    return get_cache_backend()
+
+
+def ingest_generation(key: str, backend=None) -> int:
+    """Number of times our ingestion replaced a table, by fingerprint_key."""
+    return _backend(backend).get(INGEST_NAMESPACE, key) or 0
+
+
+def bump_ingest_generation(key: str, backend=None) -> int:
+    """
+    Record that a table was (re)loaded, which changes its fingerprint.
+
+    Args:
+        key: fingerprint_key of the table
+        backend: Cache backend, defaults to the shared backend
+
+    Returns:
+        The new ingest generation
+    """
+    backend = _backend(backend)
+    generation = ingest_generation(key, backend) + 1
+    backend.set(INGEST_NAMESPACE, key, generation)
+    return generation
+
+
+def current_fingerprint(key: str, backend=None) -> Optional[str]:
+    """Last published fingerprint of a table (by fingerprint_key), without touching the database."""
+    return _backend(backend).get(FINGERPRINT_NAMESPACE, key)
+
+
+def published_fingerprints(engine_key: str, schema: Optional[str] = None, backend=None) -> Dict[str, str]:
+    """
+    Published fingerprints of every table of a database, without touching the database.
+
+    Args:
+        engine_key: Database URL without the password
+        schema: Schema (database) name
+        backend: Cache backend, defaults to the shared backend
+
+    Returns:
+        Dictionary of table name to fingerprint
+    """
+    backend = _backend(backend)
+    prefix = fingerprint_key(engine_key, "", schema)
+    keys = [key for key in backend.keys(FINGERPRINT_NAMESPACE) if key.startswith(prefix)]
+    return {key[len(prefix):]: fingerprint for key, fingerprint in backend.get_many(FINGERPRINT_NAMESPACE, keys).items()}
+
+
+def is_current(fingerprints: Optional[Dict[str, str]], backend=None) -> bool:
+    """
+    Whether recorded fingerprints still match the published ones.
+
+    Artifacts recorded without fingerprints, and tables whose fingerprint was
+    never published, are treated as current.
+
+    Args:
+        fingerprints: fingerprint_key of a table to the fingerprint recorded with an artifact
+        backend: Cache backend, defaults to the shared backend
+    """
+    if not fingerprints:
+        return True
+    backend = _backend(backend)
+    for key, fingerprint in fingerprints.items():
+        published = current_fingerprint(key, backend)
+        if published is not None and published != fingerprint:
+            return False
+    return True
+
+
+# (engine key, schema, table) -> (columns list the fingerprint was computed from, ingest generation, fingerprint)
+_memo: Dict[tuple, tuple] = {}
+_memo_lock = threading.Lock()
+
+
+def table_fingerprint(engine, table_name: str, schema: Optional[str] = None, backend=None) -> str:
+    """
+    Compute a table's fingerprint from the schema catalog and publish it.
+
+    The catalog keeps the table's columns in memory, so this is a dictionary
+    lookup unless the catalog was invalidated.
+
+    Args:
+        engine: SQLAlchemy engine
+        table_name: Physical table name
+        schema: Schema (database) name
+        backend: Cache backend, defaults to the shared backend
+
+    Returns:
+        The table's fingerprint
+    """
+    from utils.schema_catalog import get_schema_catalog
+    catalog = get_schema_catalog()
+    backend = _backend(backend)
+    columns = catalog.get_columns(engine, table_name, schema)
+    shared_key = fingerprint_key(catalog.engine_key(engine), table_name, schema)
+    generation = ingest_generation(shared_key, backend)
+    key = (catalog.engine_key(engine), schema, table_name)
+
+    with _memo_lock:
+        cached = _memo.get(key)
+    if cached is not None and cached[0] is columns and cached[1] == generation:
+        return cached[2]
+
+    fingerprint = compute_fingerprint(((col["name"], col["type"]) for col in columns), generation)
+    if current_fingerprint(shared_key, backend) != fingerprint:
+        backend.set(FINGERPRINT_NAMESPACE, shared_key, fingerprint)
+    with _memo_lock:
+        _memo[key] = (columns, generation, fingerprint)
+    return fingerprint
@@ -0,0 +1,177 @@
+"""
+Indexed resolution of per-user table names.
+
+Uploaded tables are stored as "<base_name>_<user_id>" (older uploads used
+"<user_id>_<base_name>"). Instead of scanning every table name of the schema on
+each question, the registry indexes the table list once per schema change:
+- a set of physical names and a lowercase map for exact lookups
+- user -> base name -> physical table for the suffix convention
+- a sorted name list for prefix searches with bisect
+
+The table list comes from the schema catalog, so ingestion (which invalidates
+the catalog) also makes the registry rebuild on its next use.
+"""
+import bisect
+import threading
+from typing import Dict, List, Optional, Iterable
+from utils.schema_catalog import get_schema_catalog
+
+
+class TableRegistry:
+    """
+    Lookup structures over the table names of one schema.
+    """
+
+    def __init__(self, table_names: Iterable[str]):
+        """
+        Build the indexes.
+
+        Args:
+            table_names: Physical table names of the schema
+        """
+        self.sorted_names = sorted(set(table_names))
+        self.names = set(self.sorted_names)
+        self.lower_names: Dict[str, str] = {}
+        for name in self.sorted_names:
+            self.lower_names.setdefault(name.lower(), name)
+
+        # user_id -> base_name -> physical name, from "<base>_<user>" names
+        self.by_user: Dict[str, Dict[str, str]] = {}
+        for name in self.sorted_names:
+            if '_' in name:
+                base_name, user_id = name.rsplit('_', 1)
+                if base_name:
+                    self.by_user.setdefault(user_id, {})[base_name] = name
+
+        # User IDs containing underscores are resolved by a one-time scan and memoized
+        self._user_tables: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def exists(self, table_name: str) -> bool:
+        """Whether a physical table exists."""
+        return table_name in self.names
+
+    def find_by_prefix(self, prefix: str) -> List[str]:
+        """Table names starting with a prefix, in sorted order."""
+        start = bisect.bisect_left(self.sorted_names, prefix)
+        end = bisect.bisect_left(self.sorted_names, prefix + '￿')
+        return self.sorted_names[start:end]
+
+    def tables_for_user(self, user_id: str) -> List[str]:
+        """
+        Tables of a user, sorted by name.
+
+        Tables named "<base>_<user_id>" are returned; when there are none, the older
+        "<user_id>_<base>" and "<base>_<user_id>_<suffix>" forms are used instead.
+
+        Args:
+            user_id: User identifier
+
+        Returns:
+            List of physical table names
+        """
+        user_id = str(user_id)
+        with self._lock:
+            if user_id in self._user_tables:
+                return list(self._user_tables[user_id])
+
+        if '_' not in user_id:
+            tables = sorted(self.by_user.get(user_id, {}).values())
+        else:
+            suffix = f"_{user_id}"
+            tables = [name for name in self.sorted_names if name.endswith(suffix) and len(name) > len(suffix)]
+
+        if not tables:
+            infix = f"_{user_id}_"
+            tables = sorted(set(self.find_by_prefix(f"{user_id}_")) |
+                            {name for name in self.sorted_names if infix in name})
+
+        with self._lock:
+            self._user_tables[user_id] = tables
+        return list(tables)
+
+    @staticmethod
+    def base_name(table_name: str, user_id: Optional[str] = None) -> str:
+        """Strip the user part from a physical or user-facing table name."""
+        if user_id:
+            user_id = str(user_id)
+            if table_name.endswith(f"_{user_id}"):
+                return table_name[:-(len(user_id) + 1)]
+            if table_name.startswith(f"{user_id}_"):
+                return table_name[len(user_id) + 1:]
+        return table_name
+
+    def resolve(self, table_name: str, user_id: Optional[str] = None) -> Optional[str]:
+        """
+        Resolve a table name as written by a user or the LLM to a physical table.
+
+        Candidates are tried in a fixed order so the result is deterministic:
+        exact name, case-insensitive name, "<base>_<user>", "<user>_<base>",
+        the user's tables extending the base name (shortest first), then the same
+        steps for the first segment of the name (names carrying a UUID suffix).
+
+        Args:
+            table_name: Table name to resolve
+            user_id: Owner of the table, if known
+
+        Returns:
+            Physical table name or None if nothing matches
+        """
+        if not table_name:
+            return None
+        if table_name in self.names:
+            return table_name
+        if table_name.lower() in self.lower_names:
+            return self.lower_names[table_name.lower()]
+        if not user_id:
+            return None
+
+        user_id = str(user_id)
+        base_name = self.base_name(table_name, user_id)
+        candidates = [base_name]
+        first_segment = base_name.split('_')[0]
+        if first_segment and first_segment != base_name:
+            candidates.append(first_segment)
+
+        user_tables = self.tables_for_user(user_id)
+        for base in candidates:
+            for name in (f"{base}_{user_id}", f"{user_id}_{base}"):
+                if name in self.names:
+                    return name
+            extended = [
+                name for name in user_tables
+                if name.startswith(f"{base}_") or name.startswith(f"{user_id}_{base}_")
+            ]
+            if extended:
+                return min(extended, key=lambda name: (len(name), name))
+        return None
+
+
+_registries: Dict[tuple, tuple] = {}
+_registries_lock = threading.Lock()
+
+
+def get_table_registry(engine, schema: Optional[str] = None) -> TableRegistry:
+    """
+    Return the table registry of a schema, rebuilding it when the catalog's table list changed.
+
+    Args:
+        engine: SQLAlchemy engine
+        schema: Schema (database) name
+
+    Returns:
+        TableRegistry for the current table list
+    """
+    catalog = get_schema_catalog()
+    key = (catalog.engine_key(engine), schema)
+    generation = catalog.table_generation(engine, schema)
+
+    with _registries_lock:
+        cached = _registries.get(key)
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+
+    registry = TableRegistry(catalog.table_names(engine, schema))
+    with _registries_lock:
+        _registries[key] = (generation, registry)
+    return registry
@@ -0,0 +1,299 @@
+"""
+Cached registry of known user IDs.
+
+User validation used to list the Chroma storage directory, split every MySQL
+table name, or walk the storage directory again at CLI start. The registry
+collects user IDs once from its sources and keeps them in memory:
+- the auth "users" table of the main database
+- the user directories of the Chroma storage
+- the user_id column of uploaded tables (table names are not trusted: a
+  "sales_2023" table does not belong to a user "2023")
+
+The result is written to a small JSON index file so later processes (the agent
+runs as a short-lived CLI) start from the index instead of the sources. The
+index is rebuilt after a TTL by a background thread, so callers keep getting
+the previous users meanwhile, and listeners are notified whenever users are
+added or removed. Sources added with background=True (the table owner scan)
+are never read in the calling thread, not even on a cold start; until the
+background refresh (or an explicit refresh(), e.g. main.py --refresh-users)
+reads them, the users they found last time are used.
+"""
+import os
+import json
+import time
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Set
+from sqlalchemy import text, select, table as table_clause, column as column_clause
+from utils.schema_catalog import get_schema_catalog
+
+DEFAULT_INDEX_PATH = os.path.join("cache", "user_index.json")
+DEFAULT_TTL_SECONDS = 300
+# Distinct owners read from one table; uploaded tables hold a single user
+MAX_OWNERS_PER_TABLE = 100
+
+
+def auth_users_source(engine, schema: Optional[str] = None) -> Callable[[], Iterable[str]]:
+    """Source reading user IDs from the backend's auth "users" table."""
+    def load():
+        if not get_schema_catalog().has_table(engine, "users", schema):
+            return []
+        table = f"{schema}.users" if schema else "users"
+        with engine.connect() as conn:
+            return [str(row[0]) for row in conn.execute(text(f"SELECT id FROM {table}"))]
+    return load
+
+
+def chroma_dir_source(storage_dir: str) -> Callable[[], Iterable[str]]:
+    """Source reading user IDs from the per-user directories of the Chroma storage directory."""
+    def load():
+        if not os.path.isdir(storage_dir):
+            return []
+        # Directories starting with "_" hold shared stores, not users
+        return [entry.name for entry in os.scandir(storage_dir) if entry.is_dir() and not entry.name.startswith("_")]
+    return load
+
+
+def table_owner_source(engine, schema: Optional[str] = None) -> Callable[[], Iterable[str]]:
+    """
+    Source reading user IDs from the user_id column of the tables that have one.
+
+    It runs a SELECT DISTINCT per table, so register it with background=True.
+    """
+    def load():
+        catalog = get_schema_catalog()
+        owners = set()
+        with engine.connect() as conn:
+            for table_name in catalog.table_names(engine, schema):
+                if "user_id" not in catalog.column_types(engine, table_name, schema):
+                    continue
+                query = (
+                    select(column_clause("user_id"))
+                    .select_from(table_clause(table_name, schema=schema))
+                    .distinct()
+                    .limit(MAX_OWNERS_PER_TABLE)
+                )
+                owners.update(str(row[0]) for row in conn.execute(query) if row[0] is not None)
+        return owners
+    return load
+
+
+class UserRegistry:
+    """
+    In-memory set of user IDs backed by an index file.
+    """
+
+    def __init__(self, index_path: str = DEFAULT_INDEX_PATH, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        """
+        Initialize the user registry.
+
+        Args:
+            index_path: JSON file the user IDs are persisted to
+            ttl_seconds: How long the users are trusted before the sources are read again
+        """
+        self.index_path = index_path
+        self.ttl_seconds = ttl_seconds
+        self._sources: Dict[str, Callable[[], Iterable[str]]] = {}
+        self._background_sources: Set[str] = set()
+        # Users each source returned when it was last read, kept in the index
+        self._source_users: Dict[str, Set[str]] = {}
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._listeners: List[Callable[[Set[str], Set[str]], None]] = []
+        self._users: Optional[Set[str]] = None
+        self._loaded_at = 0.0
+        self._lock = threading.RLock()
+
+    def add_source(self, name: str, loader: Callable[[], Iterable[str]], background: bool = False):
+        """
+        Register a source of user IDs; a source with the same name is replaced.
+
+        Args:
+            name: Source name, e.g. "auth_users" or "chroma"
+            loader: Callable returning user IDs
+            background: Only read the source in background or explicit refreshes (for slow sources)
+        """
+        with self._lock:
+            is_new = name not in self._sources
+            self._sources[name] = loader
+            if background:
+                self._background_sources.add(name)
+            else:
+                self._background_sources.discard(name)
+        if is_new and self._users is not None:
+            # Pick up the users only this source knows about on the next lookup
+            self._loaded_at = 0.0
+
+    def subscribe(self, listener: Callable[[Set[str], Set[str]], None]):
+        """
+        Call a listener with (added, removed) user IDs whenever the registry changes.
+
+        Args:
+            listener: Callable taking the sets of added and removed user IDs
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+    def users(self) -> List[str]:
+        """Known user IDs in sorted order."""
+        return sorted(self._current())
+
+    def exists(self, user_id: Optional[str]) -> bool:
+        """Whether a user ID is known."""
+        return user_id is not None and str(user_id) in self._current()
+
+    def register(self, user_id: str):
+        """
+        Add a user, e.g. after their first upload.
+
+        Args:
+            user_id: User identifier
+        """
+        user_id = str(user_id)
+        if not self._valid(user_id) or user_id in self._current():
+            return
+        with self._lock:
+            users = set(self._users) | {user_id}
+        self._update(users)
+
+    def refresh(self, include_background: bool = True) -> List[str]:
+        """
+        Read every source again and rewrite the index.
+
+        Args:
+            include_background: Also read the background sources; when False their
+                users from the last read are kept
+
+        Returns:
+            Known user IDs in sorted order
+        """
+        with self._lock:
+            sources = dict(self._sources)
+            background = set(self._background_sources)
+
+        if not sources:
+            # Nothing to rebuild from; keep what the index has without touching it
+            self._update(self._read_index() or set(), persist=False)
+            return sorted(self._users)
+
+        source_users: Dict[str, Set[str]] = {}
+        for name, loader in sources.items():
+            if name in background and not include_background:
+                source_users[name] = set(self._source_users.get(name, set()))
+                continue
+            try:
+                source_users[name] = {str(user_id) for user_id in loader() if self._valid(str(user_id))}
+            except Exception as e:
+                print(f"Warning: Could not load users from {name}: {e}")
+                source_users[name] = set(self._source_users.get(name, set()))
+        users = set().union(*source_users.values())
+        with self._lock:
+            self._source_users = source_users
+        self._update(users)
+        return sorted(users)
+
+    def _current(self) -> Set[str]:
+        """
+        Return the cached users, loading them from the index when needed.
+
+        Stale users are returned as they are while a background thread reads the
+        sources again; only a cold start without any index reads the (foreground)
+        sources in the calling thread.
+        """
+        with self._lock:
+            if self._users is None and os.path.exists(self.index_path):
+                self._users = self._read_index() or set()
+                self._loaded_at = os.path.getmtime(self.index_path)
+            if self._users is not None:
+                if time.time() - self._loaded_at > self.ttl_seconds:
+                    self._refresh_in_background()
+                return self._users
+            cold_background = bool(self._background_sources)
+
+        self.refresh(include_background=False)
+        if cold_background:
+            with self._lock:
+                self._refresh_in_background()
+        return self._users
+
+    def _refresh_in_background(self):
+        """Start a background refresh unless one is running (called with the lock held)."""
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return
+        self._refresh_thread = threading.Thread(target=self._background_refresh, name="user-registry", daemon=True)
+        self._refresh_thread.start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Warning: Background user refresh failed: {e}")
+
+    def wait_for_refresh(self, timeout: Optional[float] = None):
+        """Block until a running background refresh is done."""
+        thread = self._refresh_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    @staticmethod
+    def _valid(user_id: str) -> bool:
+        # Names starting with "_" or "." are internal storage folders, not users
+        return bool(user_id) and not user_id.startswith(('_', '.'))
+
+    def _read_index(self) -> Optional[Set[str]]:
+        if not os.path.exists(self.index_path):
+            return None
+        try:
+            with open(self.index_path, 'r') as f:
+                index = json.load(f)
+            self._source_users = {name: set(users) for name, users in index.get("sources", {}).items()}
+            return set(index.get("users", []))
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read user index {self.index_path}: {e}")
+            return None
+
+    def _update(self, users: Set[str], persist: bool = True):
+        """Replace the cached users, persist them and notify listeners of the difference."""
+        with self._lock:
+            previous = self._users if self._users is not None else set()
+            self._users = users
+            self._loaded_at = time.time()
+            listeners = list(self._listeners)
+
+        if persist:
+            self._write_index(users)
+
+        added, removed = users - previous, previous - users
+        if added or removed:
+            for listener in listeners:
+                try:
+                    listener(added, removed)
+                except Exception as e:
+                    print(f"Warning: User registry listener failed: {e}")
+
+    def _write_index(self, users: Set[str]):
+        try:
+            index_dir = os.path.dirname(self.index_path)
+            if index_dir:
+                os.makedirs(index_dir, exist_ok=True)
+            tmp_path = f"{self.index_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({
+                    "users": sorted(users),
+                    "sources": {name: sorted(found) for name, found in self._source_users.items()},
+                    "updated_at": time.time()
+                }, f)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"Warning: Could not write user index {self.index_path}: {e}")
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_user_registry() -> UserRegistry:
+    """Return the process-wide user registry shared by all agents."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = UserRegistry()
+        return _registry
@@ -0,0 +1,448 @@
+"""
+Index of categorical column values, used to link question phrases to filters.
+
+Questions like "sales in Karnataka" name a value, not a column; without knowing
+that "Karnataka" is a value of the "state" column the SQL generator has to
+guess both the column and the spelling. The index keeps the distinct values of
+low-cardinality text columns:
+- built from the DataFrame when a CSV is loaded, so no query is needed
+- built with SELECT DISTINCT ... LIMIT for tables of external databases and
+  refreshed after a maximum age, by a background thread so no question waits
+  for the scans (refresh_in_background)
+- persisted per user in the shared cache backend ("values" namespace)
+
+Values are normalized into phrases held in a dictionary, plus a sorted list for
+prefix lookup and short-prefix buckets for fuzzy lookup, so matching a question
+only costs a few dictionary probes per word and never touches the table.
+"""
+import re
+import time
+import queue
+import bisect
+import difflib
+import threading
+from typing import Dict, List, Any, Optional, Iterable, Tuple
+from pandas.api.types import is_object_dtype, is_string_dtype
+from sqlalchemy import String, select, table as table_clause, column as column_clause
+from utils.cache_backend import CacheBackend, get_cache_backend
+from utils.schema_catalog import get_schema_catalog
+from utils.lexical_index import STOP_WORDS
+
+VALUES_NAMESPACE = "values"
+DEFAULT_MAX_DISTINCT = 100
+MAX_VALUE_LENGTH = 64
+MAX_PHRASE_WORDS = 4
+# Columns that identify rows or owners rather than categories
+EXCLUDED_COLUMNS = {"user_id", "id"}
+
+_NUMERIC = re.compile(r"^[\d\s.,:/+-]*$")
+
+
+def normalize_value(value: Any) -> str:
+    """Lowercase a value and collapse punctuation, e.g. "Tamil-Nadu " -> "tamil nadu"."""
+    return " ".join(re.findall(r"[a-z0-9]+", str(value).lower()))
+
+
+class ValueIndex:
+    """
+    Distinct values of categorical columns with exact, prefix and fuzzy lookup.
+    """
+
+    def __init__(self, max_distinct: int = DEFAULT_MAX_DISTINCT, fuzzy_cutoff: float = 0.85):
+        """
+        Initialize an empty value index.
+
+        Args:
+            max_distinct: Columns with more distinct values are not categorical and are skipped
+            fuzzy_cutoff: Minimum similarity ratio for a fuzzy match
+        """
+        self.max_distinct = max_distinct
+        self.fuzzy_cutoff = fuzzy_cutoff
+        # table -> {"columns": {column: [values]}, "built_at": timestamp}
+        self.tables: Dict[str, Dict[str, Any]] = {}
+        self._phrases: Dict[str, List[Tuple[str, str, str]]] = {}
+        self._sorted: List[str] = []
+        self._buckets: Dict[str, List[str]] = {}
+        self._dirty = False
+
+    def categorical_values(self, values: Iterable[Any]) -> Optional[List[str]]:
+        """
+        Distinct values of a column if it is categorical.
+
+        Args:
+            values: Column values, possibly with duplicates and None
+
+        Returns:
+            Sorted distinct values, or None when the column has too many values or is not text
+        """
+        distinct = set()
+        for value in values:
+            if value is None or not isinstance(value, str):
+                continue
+            value = value.strip()
+            if not value or len(value) > MAX_VALUE_LENGTH or _NUMERIC.match(value):
+                continue
+            distinct.add(value)
+            if len(distinct) > self.max_distinct:
+                return None
+        return sorted(distinct) if distinct else None
+
+    def add_table(self, table_name: str, columns: Dict[str, Iterable[Any]]):
+        """
+        Index the categorical columns of a table, replacing what was indexed for it.
+
+        Args:
+            table_name: Physical table name
+            columns: Column name to its values
+        """
+        indexed = {}
+        for column, values in columns.items():
+            if column.lower() in EXCLUDED_COLUMNS:
+                continue
+            distinct = self.categorical_values(values)
+            if distinct:
+                indexed[column] = distinct
+        self.tables[table_name] = {"columns": indexed, "built_at": time.time()}
+        self._dirty = True
+
+    def remove_table(self, table_name: str):
+        """Forget the values of a table."""
+        if self.tables.pop(table_name, None) is not None:
+            self._dirty = True
+
+    def is_stale(self, table_name: str, max_age: Optional[float] = None) -> bool:
+        """Whether a table is missing from the index or was indexed more than max_age seconds ago."""
+        entry = self.tables.get(table_name)
+        if entry is None:
+            return True
+        return bool(max_age) and time.time() - entry["built_at"] > max_age
+
+    def _build_lookups(self):
+        """Rebuild the phrase dictionary, the sorted phrase list and the fuzzy buckets."""
+        phrases: Dict[str, List[Tuple[str, str, str]]] = {}
+        for table_name, entry in self.tables.items():
+            for column, values in entry["columns"].items():
+                for value in values:
+                    phrase = normalize_value(value)
+                    if phrase:
+                        phrases.setdefault(phrase, []).append((table_name, column, value))
+        buckets: Dict[str, List[str]] = {}
+        for phrase in phrases:
+            buckets.setdefault(phrase[:2], []).append(phrase)
+        self._phrases = phrases
+        self._sorted = sorted(phrases)
+        self._buckets = buckets
+        self._dirty = False
+
+    def lookup(self, phrase: str) -> List[Tuple[str, str, str]]:
+        """
+        Exact lookup of a normalized phrase.
+
+        Returns:
+            List of (table, column, value)
+        """
+        if self._dirty:
+            self._build_lookups()
+        return list(self._phrases.get(normalize_value(phrase), []))
+
+    def complete(self, prefix: str, limit: int = 10) -> List[Tuple[str, str, str]]:
+        """
+        Values starting with a prefix, e.g. "karn" -> "Karnataka".
+
+        Args:
+            prefix: Beginning of a value
+            limit: Maximum number of phrases to return
+
+        Returns:
+            List of (table, column, value)
+        """
+        if self._dirty:
+            self._build_lookups()
+        prefix = normalize_value(prefix)
+        if not prefix:
+            return []
+        matches = []
+        start = bisect.bisect_left(self._sorted, prefix)
+        for phrase in self._sorted[start:start + limit]:
+            if not phrase.startswith(prefix):
+                break
+            matches.extend(self._phrases[phrase])
+        return matches
+
+    def fuzzy(self, phrase: str) -> List[Tuple[str, str, str]]:
+        """
+        Closest value to a misspelled phrase sharing its first two characters.
+
+        Returns:
+            List of (table, column, value), empty when nothing is similar enough
+        """
+        if self._dirty:
+            self._build_lookups()
+        phrase = normalize_value(phrase)
+        candidates = self._buckets.get(phrase[:2], [])
+        close = difflib.get_close_matches(phrase, candidates, n=1, cutoff=self.fuzzy_cutoff)
+        return list(self._phrases[close[0]]) if close else []
+
+    def match(self, question: str, tables: Optional[List[str]] = None, limit: int = 10) -> List[Dict[str, str]]:
+        """
+        Find the values a question mentions.
+
+        Longer phrases are tried first and a word is used by at most one match.
+        Exact matches are preferred, then a unique prefix (for words of four or
+        more characters), then a fuzzy match (for phrases of five or more characters).
+
+        Args:
+            question: Natural language question
+            tables: Only return values of these tables
+            limit: Maximum number of matches
+
+        Returns:
+            List of dictionaries with table, column, value, phrase and match ("exact", "prefix" or "fuzzy")
+        """
+        if self._dirty:
+            self._build_lookups()
+        if not self._phrases:
+            return []
+
+        words = normalize_value(question).split()
+        used = [False] * len(words)
+        wanted = set(tables) if tables is not None else None
+        links: List[Dict[str, str]] = []
+        seen = set()
+
+        for size in range(min(MAX_PHRASE_WORDS, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                if any(used[start:start + size]):
+                    continue
+                phrase = " ".join(words[start:start + size])
+                if size == 1 and (phrase in STOP_WORDS or phrase.isdigit()):
+                    continue
+
+                kind, found = "exact", self._phrases.get(phrase, [])
+                if not found and size == 1 and len(phrase) >= 4:
+                    completions = self.complete(phrase, limit=2)
+                    if len({normalize_value(value) for _, _, value in completions}) == 1:
+                        kind, found = "prefix", completions
+                if not found and len(phrase) >= 5:
+                    kind, found = "fuzzy", self.fuzzy(phrase)
+
+                found = [item for item in found if wanted is None or item[0] in wanted]
+                if not found:
+                    continue
+                for start_word in range(start, start + size):
+                    used[start_word] = True
+                for table_name, column, value in found:
+                    if (table_name, column, value) not in seen:
+                        seen.add((table_name, column, value))
+                        links.append({"table": table_name, "column": column, "value": value,
+                                      "phrase": phrase, "match": kind})
+        return links[:limit]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Compact representation for the cache backend."""
+        return {"max_distinct": self.max_distinct, "tables": self.tables}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ValueIndex":
+        """Rebuild an index from to_dict output."""
+        index = cls(max_distinct=data.get("max_distinct", DEFAULT_MAX_DISTINCT))
+        index.tables = data.get("tables", {})
+        index._dirty = True
+        return index
+
+
+def index_dataframe(index: ValueIndex, table_name: str, df) -> ValueIndex:
+    """
+    Index the categorical columns of a DataFrame being loaded into a table.
+
+    Args:
+        index: Index to add the table to
+        table_name: Physical table name
+        df: pandas DataFrame with the table's rows
+
+    Returns:
+        The updated index
+    """
+    columns = {}
+    for column in df.columns:
+        dtype = df[column].dtype
+        if (is_object_dtype(dtype) or is_string_dtype(dtype)) and df[column].nunique(dropna=True) <= index.max_distinct:
+            columns[column] = df[column].dropna().unique()
+    index.add_table(table_name, columns)
+    return index
+
+
+def index_table_from_engine(index: ValueIndex, engine, table_name: str, schema: Optional[str] = None) -> ValueIndex:
+    """
+    Index the categorical text columns of a database table with SELECT DISTINCT ... LIMIT queries.
+
+    Args:
+        index: Index to add the table to
+        engine: SQLAlchemy engine
+        table_name: Physical table name
+        schema: Schema (database) name
+
+    Returns:
+        The updated index
+    """
+    columns = {}
+    text_columns = [col["name"] for col in get_schema_catalog().get_columns(engine, table_name, schema)
+                    if isinstance(col["type"], String) and col["name"].lower() not in EXCLUDED_COLUMNS]
+    source = table_clause(table_name, schema=schema)
+    with engine.connect() as conn:
+        for name in text_columns:
+            col = column_clause(name)
+            # One row more than the limit tells us the column is not categorical
+            query = select(col).select_from(source).where(col.isnot(None)).distinct().limit(index.max_distinct + 1)
+            columns[name] = [row[0] for row in conn.execute(query)]
+    index.add_table(table_name, columns)
+    return index
+
+
+_indexes: Dict[tuple, ValueIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_value_index(user_id: Optional[str], schema: Optional[str] = None,
+                    backend: Optional[CacheBackend] = None) -> ValueIndex:
+    """
+    Return a user's value index, loading it from the cache backend once per process.
+
+    Args:
+        user_id: Owner of the tables
+        schema: Schema (database) name the tables live in
+        backend: Cache backend, defaults to the shared backend
+
+    Returns:
+        ValueIndex (empty when nothing was indexed yet)
+    """
+    backend = backend or get_cache_backend()
+    key = (id(backend), user_id, schema)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            data = backend.get(VALUES_NAMESPACE, schema or "default", user_id=user_id)
+            index = ValueIndex.from_dict(data) if data else ValueIndex()
+            _indexes[key] = index
+        return index
+
+
+def save_value_index(user_id: Optional[str], index: ValueIndex, schema: Optional[str] = None,
+                     backend: Optional[CacheBackend] = None):
+    """
+    Persist a user's value index to the cache backend.
+
+    Args:
+        user_id: Owner of the tables
+        index: Index to store
+        schema: Schema (database) name the tables live in
+        backend: Cache backend, defaults to the shared backend
+    """
+    backend = backend or get_cache_backend()
+    with _indexes_lock:
+        _indexes[(id(backend), user_id, schema)] = index
+    backend.set(VALUES_NAMESPACE, schema or "default", index.to_dict(), user_id=user_id)
+
+
+def refresh_value_index(engine, user_id: Optional[str], tables: List[str], schema: Optional[str] = None,
+                        max_age: Optional[float] = None, backend: Optional[CacheBackend] = None) -> ValueIndex:
+    """
+    Index the given tables when they are missing from a user's index or older than max_age.
+
+    Args:
+        engine: SQLAlchemy engine
+        user_id: Owner of the tables
+        tables: Tables the question may use
+        schema: Schema (database) name
+        max_age: Seconds after which a table is indexed again (None to index each table once)
+        backend: Cache backend, defaults to the shared backend
+
+    Returns:
+        The user's value index
+    """
+    current = get_value_index(user_id, schema, backend)
+    stale = [table_name for table_name in tables if current.is_stale(table_name, max_age)]
+    if not stale:
+        return current
+    # Scanned into a copy, so questions keep matching the current index meanwhile
+    index = ValueIndex.from_dict({"max_distinct": current.max_distinct, "tables": dict(current.tables)})
+    changed = False
+    for table_name in stale:
+        try:
+            index_table_from_engine(index, engine, table_name, schema)
+            changed = True
+        except Exception as e:
+            print(f"Warning: Could not index values of {table_name}: {e}")
+    if not changed:
+        return current
+    save_value_index(user_id, index, schema, backend)
+    return index
+
+
+_refresh_queue: "queue.Queue[tuple]" = queue.Queue()
+_refresh_pending: set = set()
+_refresh_thread: Optional[threading.Thread] = None
+_refresh_lock = threading.Lock()
+
+
+def refresh_in_background(engine, user_id: Optional[str], tables: List[str], schema: Optional[str] = None,
+                          max_age: Optional[float] = None, backend: Optional[CacheBackend] = None) -> bool:
+    """
+    Queue the tables missing from a user's index or older than max_age for indexing off the question path.
+
+    One worker thread runs the SELECT DISTINCT scans and saves the index; until it
+    is done, questions match what is already indexed. The thread is not a daemon,
+    so a short-lived CLI process finishes the scans after answering.
+
+    Args:
+        engine: SQLAlchemy engine
+        user_id: Owner of the tables
+        tables: Tables the question may use
+        schema: Schema (database) name
+        max_age: Seconds after which a table is indexed again (None to index each table once)
+        backend: Cache backend, defaults to the shared backend
+
+    Returns:
+        Whether a refresh was queued (False when nothing is stale or it is already queued)
+    """
+    global _refresh_thread
+    stale = [table_name for table_name in tables if get_value_index(user_id, schema, backend).is_stale(table_name, max_age)]
+    if not stale:
+        return False
+    key = (id(engine), user_id, schema, tuple(sorted(stale)))
+    with _refresh_lock:
+        if key in _refresh_pending:
+            return False
+        _refresh_pending.add(key)
+        _refresh_queue.put((key, engine, user_id, stale, schema, max_age, backend))
+        if _refresh_thread is None:
+            _refresh_thread = threading.Thread(target=_refresh_worker, name="value-indexer")
+            _refresh_thread.start()
+    return True
+
+
+def _refresh_worker():
+    """Index queued tables until the queue is empty."""
+    global _refresh_thread
+    while True:
+        with _refresh_lock:
+            try:
+                key, engine, user_id, tables, schema, max_age, backend = _refresh_queue.get_nowait()
+            except queue.Empty:
+                _refresh_thread = None
+                return
+        try:
+            refresh_value_index(engine, user_id, tables, schema, max_age, backend)
+        except Exception as e:
+            print(f"Warning: Background value indexing failed: {e}")
+        finally:
+            with _refresh_lock:
+                _refresh_pending.discard(key)
+
+
+def wait_for_refreshes(timeout: Optional[float] = None):
+    """Block until the background value indexer is idle (for tests and CLI tools)."""
+    with _refresh_lock:
+        thread = _refresh_thread
+    if thread is not None:
+        thread.join(timeout)
@@ -0,0 +1,639 @@
+"""
+Local vector index with the collection interface of ChromaDB.
+
+LocalVectorIndex keeps a collection in these files:
+- vectors.f32: normalized float32 embeddings, one fixed-size row per document,
+  read through a memory map so opening an index loads no vectors
+- index.json: a snapshot of the document IDs, texts and metadata of the rows
+- index.<n>.log: JSON lines appended by every write since the snapshot, each
+  with the new state of the rows it changed; folded into a new snapshot once
+  the log outgrows it, so a write costs the rows it touched, not the index
+
+Queries are brute-force dot products in numpy, which is exact and fast for
+the few thousand documents a tenant has. When a query's where filter leaves
+hnsw_threshold rows or more, an in-memory HNSW graph (hnswlib, when
+installed) answers it instead; it is built on the first such query after a
+change. Only the parts of the ChromaDB collection API this project uses are
+implemented: add, upsert, update, get, query (with where filters on
+metadata), delete and count, with results in ChromaDB's layout. Writes merge
+metadata into the stored metadata as ChromaDB does.
+
+VECTOR_STORE selects the store of the metadata collections per deployment:
+- chroma (default): ChromaDB only
+- local: the local index only; ChromaDB is never opened, which also skips
+  its client startup
+- failover: ChromaDB, with every write mirrored to the local index and reads
+  served by the local index whenever ChromaDB fails
+
+Like embedding_cache, this module needs only the standard library and numpy
+at load time.
+"""
+import os
+import json
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: writes are not locked across processes
+    fcntl = None
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+FORMAT_VERSION = 2
+VECTOR_STORE_MODES = ("chroma", "local", "failover")
+# Rows from which queries use an HNSW graph instead of brute force (when hnswlib is installed)
+DEFAULT_HNSW_THRESHOLD = 20000
+# Log size from which a write rewrites the snapshot, unless the snapshot is larger still
+LOG_COMPACT_BYTES = 1 << 20
+DEFAULT_INCLUDE_GET = ("documents", "metadatas")
+DEFAULT_INCLUDE_QUERY = ("documents", "metadatas", "distances")
+
+
+def vector_store_mode() -> str:
+    """Vector store selected by the VECTOR_STORE environment variable."""
+    mode = os.getenv("VECTOR_STORE", "chroma").strip().lower()
+    if mode not in VECTOR_STORE_MODES:
+        print(f"Unknown VECTOR_STORE '{mode}', using chroma")
+        return "chroma"
+    return mode
+
+
+def matches(metadata: Optional[Dict[str, Any]], where: Optional[Dict[str, Any]]) -> bool:
+    """
+    Whether metadata satisfies a ChromaDB where filter.
+
+    Supports field equality, $eq, $ne, $in, $nin, $gt, $gte, $lt, $lte, $and and $or.
+
+    Args:
+        metadata: Metadata of a document
+        where: ChromaDB where filter (None matches everything)
+
+    Returns:
+        True if the document matches
+    """
+    if not where:
+        return True
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if operator == "$eq" and value != operand:
+                    return False
+                if operator == "$ne" and value == operand:
+                    return False
+                if operator == "$in" and value not in operand:
+                    return False
+                if operator == "$nin" and value in operand:
+                    return False
+                if operator in ("$gt", "$gte", "$lt", "$lte"):
+                    if value is None:
+                        return False
+                    if operator == "$gt" and not value > operand:
+                        return False
+                    if operator == "$gte" and not value >= operand:
+                        return False
+                    if operator == "$lt" and not value < operand:
+                        return False
+                    if operator == "$lte" and not value <= operand:
+                        return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype("<f4")
+
+
+class LocalVectorIndex:
+    """
+    Memory-mapped embeddings with brute-force (or HNSW) cosine search.
+    """
+
+    def __init__(self, directory: str, name: str,
+                 embedding_function: Optional[Callable[[List[str]], Sequence[Sequence[float]]]] = None,
+                 hnsw_threshold: int = DEFAULT_HNSW_THRESHOLD):
+        """
+        Open (or create) a local index.
+
+        Args:
+            directory: Directory of the index files
+            name: Collection name
+            embedding_function: Embeds documents and query_texts; needed unless
+                embeddings are always passed explicitly
+            hnsw_threshold: Rows matching a query's filter from which it uses an HNSW graph
+        """
+        self.directory = directory
+        self.name = name
+        self.embedding_function = embedding_function
+        self.hnsw_threshold = hnsw_threshold
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.meta_path = os.path.join(directory, "index.json")
+        self.lock_path = os.path.join(directory, "index.lock")
+        self._lock = threading.RLock()
+        self._loaded_mtime = None
+        self._snapshot_size = 0
+        # Log of the loaded snapshot and how much of it was applied
+        self._log_generation = 0
+        self._log_offset = 0
+        self._dimension: Optional[int] = None
+        self._ids: List[Optional[str]] = []
+        self._documents: List[Optional[str]] = []
+        self._metadatas: List[Optional[Dict[str, Any]]] = []
+        self._rows: Dict[str, int] = {}
+        self._vectors = None
+        self._hnsw = None
+        os.makedirs(directory, exist_ok=True)
+        self._refresh()
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        """Whether an index was written to directory."""
+        return os.path.exists(os.path.join(directory, "index.json"))
+
+    @property
+    def log_path(self) -> str:
+        """Log of the writes made since the loaded snapshot."""
+        return os.path.join(self.directory, f"index.{self._log_generation}.log")
+
+    def _refresh(self):
+        """Pick up what other writers (or processes) changed: a new snapshot and new log lines."""
+        try:
+            stat = os.stat(self.meta_path)
+        except FileNotFoundError:
+            return
+        changed = False
+        # A new snapshot is a new file, which also tells apart two snapshots written within one mtime tick
+        if (stat.st_mtime_ns, stat.st_ino) != self._loaded_mtime:
+            with open(self.meta_path) as f:
+                state = json.load(f)
+            self._dimension = state.get("dimension")
+            self._ids = state.get("ids", [])
+            self._documents = state.get("documents", [])
+            self._metadatas = state.get("metadatas", [])
+            self._rows = {doc_id: row for row, doc_id in enumerate(self._ids) if doc_id is not None}
+            self._log_generation = state.get("log", 0)
+            self._log_offset = 0
+            self._snapshot_size = stat.st_size
+            self._loaded_mtime = (stat.st_mtime_ns, stat.st_ino)
+            changed = True
+        if self._replay_log() or changed:
+            self._map_vectors()
+            self._hnsw = None
+
+    def _replay_log(self) -> bool:
+        """Apply the complete log lines written since the last call; returns whether there were any."""
+        try:
+            with open(self.log_path, "rb") as f:
+                f.seek(self._log_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return False
+        # A line without its newline is still being written (or its writer died)
+        data = data[:data.rfind(b"\n") + 1]
+        if not data:
+            return False
+        for line in data.splitlines():
+            entry = json.loads(line)
+            self._dimension = entry.get("dimension", self._dimension)
+            for row, doc_id, document, metadata in entry["rows"]:
+                while len(self._ids) <= row:
+                    self._ids.append(None)
+                    self._documents.append(None)
+                    self._metadatas.append(None)
+                if self._ids[row] is not None and self._rows.get(self._ids[row]) == row:
+                    del self._rows[self._ids[row]]
+                self._ids[row] = doc_id
+                self._documents[row] = document
+                self._metadatas[row] = metadata
+                if doc_id is not None:
+                    self._rows[doc_id] = row
+        self._log_offset += len(data)
+        return True
+
+    def _map_vectors(self):
+        """Memory-map one vector per row."""
+        self._vectors = None
+        if self._ids and self._dimension:
+            self._vectors = np.memmap(self.vectors_path, dtype="<f4", mode="r",
+                                      shape=(len(self._ids), self._dimension))
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        if self.embedding_function is None:
+            raise ValueError(f"Local index {self.name} has no embedding function; pass embeddings")
+        return np.asarray(self.embedding_function(list(texts)), dtype="<f4")
+
+    def count(self) -> int:
+        """Number of documents in the index."""
+        with self._lock:
+            self._refresh()
+            return len(self._rows)
+
+    def add(self, ids: List[str], embeddings=None, documents: Optional[List[str]] = None,
+            metadatas: Optional[List[Dict[str, Any]]] = None):
+        """Add documents; existing IDs are replaced."""
+        self.upsert(ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def upsert(self, ids: List[str], embeddings=None, documents: Optional[List[str]] = None,
+               metadatas: Optional[List[Dict[str, Any]]] = None):
+        """
+        Insert documents or replace the documents with the same IDs; their metadata
+        is merged into the stored metadata, as ChromaDB does.
+
+        Args:
+            ids: Document IDs
+            embeddings: One embedding per document (computed from documents when omitted)
+            documents: Document texts
+            metadatas: Document metadata
+        """
+        if not ids:
+            return
+        if embeddings is None:
+            if documents is None:
+                raise ValueError("upsert needs embeddings or documents")
+            embeddings = self._embed(documents)
+        self._write(list(ids), _normalize(np.asarray(embeddings, dtype="<f4").reshape(len(ids), -1)),
+                    documents, metadatas)
+
+    def update(self, ids: List[str], embeddings=None, documents: Optional[List[str]] = None,
+               metadatas: Optional[List[Dict[str, Any]]] = None):
+        """Update existing documents; unknown IDs are ignored, omitted fields are kept and metadata is merged."""
+        with self._lock:
+            self._refresh()
+            known = [i for i, doc_id in enumerate(ids) if doc_id in self._rows]
+        if not known:
+            return
+        ids = [ids[i] for i in known]
+        documents = [documents[i] for i in known] if documents is not None else None
+        metadatas = [metadatas[i] for i in known] if metadatas is not None else None
+        vectors = None
+        if embeddings is not None:
+            embeddings = np.asarray(embeddings, dtype="<f4")
+            vectors = _normalize(embeddings.reshape(len(embeddings), -1)[known])
+        elif documents is not None:
+            vectors = _normalize(self._embed(documents))
+        self._write(ids, vectors, documents, metadatas)
+
+    def _write(self, ids: List[str], vectors: Optional[np.ndarray], documents: Optional[List[str]],
+               metadatas: Optional[List[Dict[str, Any]]]):
+        """
+        Write rows in place (new IDs take free rows, then the end of the file) and log them.
+
+        Like ChromaDB, given metadata is merged into a row's metadata (a None value
+        removes the key) and omitted documents are kept.
+        """
+        with self._lock, self._file_lock():
+            self._refresh()
+            if vectors is not None:
+                if self._dimension is None:
+                    self._dimension = int(vectors.shape[1])
+                elif vectors.shape[1] != self._dimension:
+                    raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match "
+                                     f"index {self.name} of dimension {self._dimension}")
+
+            free_rows = [row for row, doc_id in enumerate(self._ids) if doc_id is None]
+            free_rows.reverse()
+            row_of = []
+            for i, doc_id in enumerate(ids):
+                row = self._rows.get(doc_id)
+                if row is None:
+                    row = free_rows.pop() if free_rows else len(self._ids)
+                    if row == len(self._ids):
+                        self._ids.append(None)
+                        self._documents.append(None)
+                        self._metadatas.append(None)
+                    self._ids[row] = doc_id
+                    self._rows[doc_id] = row
+                if documents is not None:
+                    self._documents[row] = documents[i]
+                if metadatas is not None and metadatas[i] is not None:
+                    merged = dict(self._metadatas[row] or {}, **metadatas[i])
+                    self._metadatas[row] = {key: value for key, value in merged.items() if value is not None}
+                row_of.append(row)
+
+            if vectors is not None:
+                self._vectors = None  # Release the read-only map before writing
+                row_bytes = self._dimension * 4
+                mode = "r+b" if os.path.exists(self.vectors_path) else "w+b"
+                with open(self.vectors_path, mode) as f:
+                    for row, vector in zip(row_of, vectors):
+                        f.seek(row * row_bytes)
+                        f.write(vector.tobytes())
+            self._commit(row_of)
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            include: Sequence[str] = DEFAULT_INCLUDE_GET) -> Dict[str, Any]:
+        """
+        Get documents by ID and/or metadata filter.
+
+        Returns:
+            Dictionary with "ids" and, per include, "documents", "metadatas" and "embeddings"
+            (the others are None), like ChromaDB's get
+        """
+        with self._lock:
+            self._refresh()
+            rows = self._select(where, ids)
+            rows = rows[offset or 0:]
+            if limit is not None:
+                rows = rows[:limit]
+            return {
+                "ids": [self._ids[row] for row in rows],
+                "documents": [self._documents[row] for row in rows] if "documents" in include else None,
+                "metadatas": [self._metadatas[row] for row in rows] if "metadatas" in include else None,
+                "embeddings": (np.array(self._vectors[rows]) if rows else np.zeros((0, self._dimension or 0)))
+                if "embeddings" in include else None,
+            }
+
+    def query(self, query_embeddings=None, query_texts: Optional[List[str]] = None, n_results: int = 10,
+              where: Optional[Dict[str, Any]] = None,
+              include: Sequence[str] = DEFAULT_INCLUDE_QUERY) -> Dict[str, Any]:
+        """
+        Find the nearest documents of every query by cosine distance.
+
+        Returns:
+            Dictionary with one list per query under "ids" and, per include, "documents",
+            "metadatas" and "distances", like ChromaDB's query
+        """
+        if query_embeddings is None:
+            if query_texts is None:
+                raise ValueError("query needs query_embeddings or query_texts")
+            query_embeddings = self._embed(query_texts)
+        queries = _normalize(np.atleast_2d(np.asarray(query_embeddings, dtype="<f4")))
+
+        with self._lock:
+            self._refresh()
+            rows = self._select(where)
+            hits = self._search(queries, rows, n_results, filtered=where is not None)
+            return {
+                "ids": [[self._ids[row] for row, _ in found] for found in hits],
+                "documents": [[self._documents[row] for row, _ in found] for found in hits]
+                if "documents" in include else None,
+                "metadatas": [[self._metadatas[row] for row, _ in found] for found in hits]
+                if "metadatas" in include else None,
+                "distances": [[distance for _, distance in found] for found in hits]
+                if "distances" in include else None,
+            }
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None):
+        """Delete documents by ID and/or metadata filter; their rows are reused by later writes."""
+        if ids is None and where is None:
+            return
+        with self._lock, self._file_lock():
+            self._refresh()
+            rows = self._select(where, ids)
+            if not rows:
+                return
+            for row in rows:
+                del self._rows[self._ids[row]]
+                self._ids[row] = None
+                self._documents[row] = None
+                self._metadatas[row] = None
+            self._commit(rows)
+
+    def _select(self, where: Optional[Dict[str, Any]], ids: Optional[List[str]] = None) -> List[int]:
+        """Live rows matching the IDs and the filter, in ID order when IDs are given."""
+        if ids is not None:
+            rows = [self._rows[doc_id] for doc_id in ids if doc_id in self._rows]
+        else:
+            rows = [row for row, doc_id in enumerate(self._ids) if doc_id is not None]
+        if where:
+            rows = [row for row in rows if matches(self._metadatas[row], where)]
+        return rows
+
+    def _search(self, queries: np.ndarray, rows: List[int], n_results: int, filtered: bool) -> List[List[tuple]]:
+        """(row, cosine distance) of the nearest rows of every query, nearest first."""
+        k = min(n_results, len(rows))
+        if k <= 0 or self._vectors is None:
+            return [[] for _ in queries]
+
+        # The graph pays off for the rows this query may return, not for the whole index
+        if len(rows) >= self.hnsw_threshold and hnswlib is not None:
+            try:
+                return self._search_hnsw(queries, rows, k, filtered)
+            except Exception as e:
+                print(f"HNSW search of {self.name} failed, using brute force: {e}")
+
+        candidates = np.asarray(rows)
+        similarities = np.asarray(self._vectors[candidates]) @ queries.T
+        results = []
+        for column in range(queries.shape[0]):
+            scores = similarities[:, column]
+            top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+            top = top[np.argsort(-scores[top], kind="stable")]
+            results.append([(int(candidates[i]), float(1.0 - scores[i])) for i in top])
+        return results
+
+    def _search_hnsw(self, queries: np.ndarray, rows: List[int], k: int, filtered: bool) -> List[List[tuple]]:
+        if self._hnsw is None:
+            live = np.asarray([row for row, doc_id in enumerate(self._ids) if doc_id is not None])
+            index = hnswlib.Index(space="ip", dim=self._dimension)
+            index.init_index(max_elements=len(live), ef_construction=200, M=16)
+            index.add_items(np.asarray(self._vectors[live]), live)
+            index.set_ef(max(64, k))
+            self._hnsw = index
+        allowed = set(rows)
+        labels, distances = self._hnsw.knn_query(
+            queries, k=k, filter=(lambda label: label in allowed) if filtered else None
+        )
+        # hnswlib reports inner-product distance as 1 - similarity, the same as cosine distance
+        return [[(int(label), float(distance)) for label, distance in zip(row_labels, row_distances)]
+                for row_labels, row_distances in zip(labels, distances)]
+
+    def _commit(self, rows: List[int]):
+        """Append the new state of rows to the log, or write a snapshot when there is none or the log outgrew it."""
+        if not os.path.exists(self.meta_path) or self._log_offset > max(LOG_COMPACT_BYTES, self._snapshot_size):
+            self._save()
+            return
+        entry = {
+            "dimension": self._dimension,
+            "rows": [[row, self._ids[row], self._documents[row], self._metadatas[row]] for row in rows],
+        }
+        line = (json.dumps(entry) + "\n").encode()
+        with open(self.log_path, "ab") as f:
+            # Drop a line a crashed writer left unfinished; the file lock keeps out live writers
+            f.truncate(self._log_offset)
+            f.write(line)
+        self._log_offset += len(line)
+        self._map_vectors()
+        self._hnsw = None
+
+    def _save(self):
+        """Write a snapshot atomically, start a new log and reopen the memory map."""
+        old_log = self.log_path
+        state = {
+            "format": FORMAT_VERSION,
+            "name": self.name,
+            "dimension": self._dimension,
+            "ids": self._ids,
+            "documents": self._documents,
+            "metadatas": self._metadatas,
+            "log": self._log_generation + 1,
+        }
+        temp_path = f"{self.meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.meta_path)
+        try:
+            os.remove(old_log)
+        except FileNotFoundError:
+            pass
+        self._loaded_mtime = None
+        self._refresh()
+
+    def _file_lock(self):
+        return _FileLock(self.lock_path)
+
+
+class _FileLock:
+    """Exclusive lock on a file, so processes sharing an index do not interleave writes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "a")
+        if fcntl:
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+
+
+class FailoverCollection:
+    """
+    A ChromaDB collection whose writes are mirrored to a local index, which
+    also answers reads whenever ChromaDB fails.
+    """
+
+    def __init__(self, primary, fallback: LocalVectorIndex):
+        """
+        Args:
+            primary: ChromaDB collection
+            fallback: Local index kept in step with it
+        """
+        self.primary = primary
+        self.fallback = fallback
+        self.name = getattr(primary, "name", fallback.name)
+
+    def _read(self, method: str, *args, **kwargs):
+        try:
+            return getattr(self.primary, method)(*args, **kwargs)
+        except Exception as e:
+            print(f"ChromaDB {method} on {self.name} failed, using the local index: {e}")
+            return getattr(self.fallback, method)(*args, **kwargs)
+
+    def _write(self, method: str, *args, **kwargs):
+        if method in ("add", "upsert", "update"):
+            kwargs = self._with_embeddings(kwargs)
+        try:
+            getattr(self.primary, method)(*args, **kwargs)
+        except Exception as e:
+            print(f"ChromaDB {method} on {self.name} failed, writing to the local index only: {e}")
+        getattr(self.fallback, method)(*args, **kwargs)
+
+    def _with_embeddings(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Embed the documents of a write once, so ChromaDB and the local index store the same vectors."""
+        if kwargs.get("embeddings") is not None or kwargs.get("documents") is None:
+            return kwargs
+        if self.fallback.embedding_function is None:
+            return kwargs
+        try:
+            return dict(kwargs, embeddings=self.fallback._embed(kwargs["documents"]).tolist())
+        except Exception as e:
+            print(f"Could not embed documents for {self.name}, each store embeds them: {e}")
+            return kwargs
+
+    def count(self) -> int:
+        return self._read("count")
+
+    def get(self, *args, **kwargs) -> Dict[str, Any]:
+        return self._read("get", *args, **kwargs)
+
+    def query(self, *args, **kwargs) -> Dict[str, Any]:
+        return self._read("query", *args, **kwargs)
+
+    def add(self, *args, **kwargs):
+        self._write("add", *args, **kwargs)
+
+    def upsert(self, *args, **kwargs):
+        self._write("upsert", *args, **kwargs)
+
+    def update(self, *args, **kwargs):
+        self._write("update", *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        self._write("delete", *args, **kwargs)
+
+
+def mirror_collection(source, target: LocalVectorIndex, batch_size: int = 256,
+                      progress: Optional[Callable[[int], None]] = None) -> int:
+    """
+    Copy every document of a collection, embeddings included, into a local index.
+
+    Args:
+        source: ChromaDB collection (or another index)
+        target: Local index to fill
+        batch_size: Documents read and written per call
+        progress: Called with the number of documents copied after every batch
+
+    Returns:
+        Number of documents copied
+    """
+    copied = 0
+    while True:
+        page = source.get(include=["documents", "metadatas", "embeddings"], limit=batch_size, offset=copied)
+        if not page["ids"]:
+            return copied
+        target.upsert(ids=page["ids"], embeddings=page["embeddings"],
+                      documents=page["documents"], metadatas=page["metadatas"])
+        copied += len(page["ids"])
+        if progress:
+            progress(copied)
+
+
+_indexes: Dict[str, LocalVectorIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_local_index(directory: str, name: str, embedding_function=None,
+                    hnsw_threshold: int = DEFAULT_HNSW_THRESHOLD) -> LocalVectorIndex:
+    """
+    Return the process-wide local index stored in directory.
+
+    Args:
+        directory: Directory of the index files
+        name: Collection name
+        embedding_function: Embeds documents and query_texts
+        hnsw_threshold: Rows matching a query's filter from which it uses an HNSW graph
+
+    Returns:
+        The shared LocalVectorIndex
+    """
+    key = os.path.abspath(directory)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = LocalVectorIndex(directory, name, embedding_function, hnsw_threshold)
+        elif embedding_function is not None and index.embedding_function is None:
+            index.embedding_function = embedding_function
+        return index
@@ -11,6 +11,9 @@ class Settings(BaseSettings):
     # Optional Redis configuration (can be disabled)
     REDIS_URL: Optional[str] = None
     
+    # Comma-separated user IDs allowed to use the cache admin endpoints
+    CACHE_ADMIN_USERS: Optional[str] = None
+    
     # Optional ChromaDB configuration
     CHROMA_PERSIST_DIR: Optional[str] = "./data/chroma_storage"
 
@@ -0,0 +1,22 @@
+from pathlib import Path
+from types import ModuleType
+import importlib.util
+import sys
+
+# A few of the TextToSQL agent's utilities (schema fingerprints, the ChromaDB client registry)
+# only need the standard library at import time, so the API loads them straight from the agent
+# directory instead of keeping a second copy that could drift.
+AGENT_DIR = Path(__file__).parent.parent.parent / "ParseQri_Agent" / "TextToSQL_Agent"
+
+
+def load_agent_module(name: str) -> ModuleType:
+    """Load utils/<name>.py of the agent once and return the module."""
+    module_name = f"parseqri_agent_{name}"
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+
+    spec = importlib.util.spec_from_file_location(module_name, AGENT_DIR / "utils" / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
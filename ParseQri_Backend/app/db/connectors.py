@@ -7,8 +7,13 @@ import pymongo
 from app.core.exceptions import DatabaseConnectionError, DataInsertionError
 from app.schemas.db import DBConfigOut, DBType
 import os
-import chromadb
-from sentence_transformers import SentenceTransformer
+from app.db.encoder import get_encoder
+from app.db.schema_fingerprint import columns_fingerprint, shared_cache
+from app.db.agent_modules import load_agent_module
+
+get_chroma_registry = load_agent_module("chroma_registry").get_chroma_registry
+lexical_index = load_agent_module("lexical_index")
+hybrid_search = load_agent_module("hybrid_search")
 
 class ChromaDBManager:
     """Centralized ChromaDB manager for all users and data sources"""
@@ -16,67 +21,273 @@ class ChromaDBManager:
     def __init__(self, persist_dir: str = "./data/chroma_storage"):
         self.persist_dir = persist_dir
         os.makedirs(persist_dir, exist_ok=True)
-        self.client = chromadb.PersistentClient(path=persist_dir)
-        self.encoder = SentenceTransformer('all-MiniLM-L6-v2')
+        # The same bounded client registry the agent uses; the unified store stays open
+        self.registry = get_chroma_registry()
+        self.client = self.registry.client(persist_dir, pinned=True)
+        # Loaded on first use and shared with every other caller in this process
+        self.encoder = get_encoder()
         
     def get_collection(self, collection_name: str = "unified_metadata"):
         """Get or create a unified collection for all metadata"""
-        try:
-            collection = self.client.get_collection(collection_name)
-        except:
-            collection = self.client.create_collection(
-                name=collection_name,
-                metadata={"hnsw:space": "cosine"}
-            )
-        return collection
+        return self.registry.collection(
+            self.persist_dir,
+            collection_name,
+            create=True,
+            metadata={"hnsw:space": "cosine"},
+            pinned=True
+        )
+    
+    def metadata_store(self, collection_name: str = "unified_metadata") -> str:
+        """Key of a collection in the shared cache of BM25 indexes over stored metadata"""
+        return f"{os.path.abspath(self.persist_dir)}|{collection_name}"
+    
+    def stats(self) -> Dict[str, Any]:
+        """Open ChromaDB handles, load latency and encoder batching of this process"""
+        return dict(self.registry.metrics(), encoder=self.encoder.metrics())
     
     def store_table_metadata(self, user_id: int, source_type: str, source_name: str, 
                            table_name: str, schema_info: Dict[str, Any]):
         """Store table metadata in ChromaDB with user context"""
+        self.store_tables_metadata(user_id, source_type, source_name, {table_name: schema_info})
+    
+    def store_tables_metadata(self, user_id: int, source_type: str, source_name: str,
+                              tables: Dict[str, Dict[str, Any]],
+                              signals: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        Store the metadata of many tables of one source, embedded in one batch.
+        
+        signals holds the change signals of each table (see get_change_signals);
+        they are kept with the metadata so incremental refreshes can skip unchanged tables.
+        """
+        if not tables:
+            return
         collection = self.get_collection()
         
-        # Create metadata document
-        metadata_text = f"""
+        ids, texts, metadatas = [], [], []
+        for table_name, schema_info in tables.items():
+            columns = schema_info.get('columns', [])
+            # Create metadata document
+            texts.append(f"""
         Table: {table_name}
         Source: {source_name} ({source_type})
         User: {user_id}
-        Columns: {', '.join([f"{col['column_name']} ({col['data_type']})" for col in schema_info.get('columns', [])])}
-        Description: Table from {source_type} database containing {len(schema_info.get('columns', []))} columns
-        """
-        
-        # Generate embedding
-        embedding = self.encoder.encode(metadata_text).tolist()
-        
-        # Store in ChromaDB
-        doc_id = f"{user_id}_{source_type}_{source_name}_{table_name}"
-        collection.upsert(
-            ids=[doc_id],
-            embeddings=[embedding],
-            documents=[metadata_text],
-            metadatas=[{
+        Columns: {', '.join([f"{col['column_name']} ({col['data_type']})" for col in columns])}
+        Description: Table from {source_type} database containing {len(columns)} columns
+        """)
+            ids.append(f"{user_id}_{source_type}_{source_name}_{table_name}")
+            metadata = {
                 "user_id": str(user_id),
                 "source_type": source_type,
                 "source_name": source_name,
                 "table_name": table_name,
-                "column_count": len(schema_info.get('columns', []))
-            }]
+                "column_count": len(columns),
+                "schema_fingerprint": columns_fingerprint(columns)
+            }
+            # ChromaDB metadata values cannot be None
+            metadata.update({
+                f"signal_{name}": value
+                for name, value in (signals or {}).get(table_name, {}).items() if value is not None
+            })
+            metadatas.append(metadata)
+        
+        # Generate embeddings
+        embeddings = self.encoder.encode(texts)
+        
+        # Store in ChromaDB
+        collection.upsert(ids=ids, embeddings=embeddings, documents=texts, metadatas=metadatas)
+        lexical_index.invalidate_metadata_index(self.metadata_store(), str(user_id), backend=shared_cache(reload=False))
+    
+    def _source_filter(self, user_id: int, source_type: str, source_name: str) -> Dict[str, Any]:
+        return {"$and": [
+            {"user_id": str(user_id)}, {"source_type": source_type}, {"source_name": source_name}
+        ]}
+    
+    def get_table_signals(self, user_id: int, source_type: str, source_name: str) -> Dict[str, Dict[str, Any]]:
+        """Stored change signals of every table of a source, keyed by table name"""
+        results = self.get_collection().get(
+            where=self._source_filter(user_id, source_type, source_name), include=["metadatas"]
         )
+        stored = {}
+        for metadata in results["metadatas"] or []:
+            stored[metadata["table_name"]] = {
+                name[len("signal_"):]: value for name, value in metadata.items() if name.startswith("signal_")
+            }
+            stored[metadata["table_name"]].setdefault("schema_fingerprint", metadata.get("schema_fingerprint"))
+        return stored
     
-    def search_relevant_tables(self, user_id: int, query: str, limit: int = 5) -> List[Dict[str, Any]]:
-        """Search for relevant tables based on query"""
+    def delete_tables_metadata(self, user_id: int, source_type: str, source_name: str, table_names: List[str]):
+        """Delete the metadata of tables that no longer exist in a source"""
+        if table_names:
+            self.get_collection().delete(
+                ids=[f"{user_id}_{source_type}_{source_name}_{table_name}" for table_name in table_names]
+            )
+            lexical_index.invalidate_metadata_index(self.metadata_store(), str(user_id), backend=shared_cache(reload=False))
+    
+    def search_relevant_tables(self, user_id: int, query: str, limit: int = 5,
+                               candidates_per_retriever: int = 20) -> Dict[str, Any]:
+        """
+        Search for relevant tables based on query.
+        
+        Vector similarity and BM25 over the table documents each rank the user's
+        tables; reciprocal rank fusion merges the two rankings. The result keeps the
+        ChromaDB query layout (ids, documents, metadatas, distances), in fused order,
+        and adds "candidates" (with fused scores and per-retriever ranks) and
+        "clear_winner" (whether the first table clearly beats the rest).
+        """
         collection = self.get_collection()
+        where = {"user_id": str(user_id)}
+        # BM25 over the table names and documents, built once per user until their metadata changes;
+        # get_metadata_index re-reads the shared cache itself, at most every few seconds
+        index, stored = lexical_index.get_metadata_index(
+            self.metadata_store(), str(user_id), lambda: self._load_table_terms(collection, where),
+            backend=shared_cache(reload=False)
+        )
+        if not stored["ids"]:
+            return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]],
+                    "candidates": [], "clear_winner": False}
         
         # Generate query embedding
-        query_embedding = self.encoder.encode(query).tolist()
+        query_embedding = self.encoder.encode(query)
         
         # Search ChromaDB
         results = collection.query(
             query_embeddings=[query_embedding],
-            n_results=limit,
-            where={"user_id": str(user_id)}
+            n_results=min(candidates_per_retriever, len(stored["ids"])),
+            where=where
         )
+        distances = dict(zip(results["ids"][0], results["distances"][0]))
+        
+        lexical = [doc_id for doc_id, _ in index.search(query, candidates_per_retriever)]
         
-        return results
+        fused = hybrid_search.reciprocal_rank_fusion({"vector": results["ids"][0], "lexical": lexical})
+        documents = dict(zip(stored["ids"], stored["documents"]))
+        metadatas = dict(zip(stored["ids"], stored["metadatas"]))
+        top = [candidate["table_name"] for candidate in fused[:limit]]
+        
+        return {
+            "ids": [top],
+            "documents": [[documents[doc_id] for doc_id in top]],
+            "metadatas": [[metadatas[doc_id] for doc_id in top]],
+            "distances": [[distances.get(doc_id) for doc_id in top]],
+            "candidates": [
+                {"id": candidate["table_name"], "table_name": metadatas[candidate["table_name"]].get("table_name"),
+                 "score": candidate["score"], "ranks": candidate["ranks"]}
+                for candidate in fused[:limit]
+            ],
+            "clear_winner": hybrid_search.clear_winner(fused)
+        }
+
+    def _load_table_terms(self, collection, where: Dict[str, Any]):
+        """A user's stored table documents and the BM25 terms of each, by document id"""
+        stored = collection.get(where=where, include=["documents", "metadatas"])
+        terms = {}
+        for doc_id, document, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"]):
+            terms[doc_id] = lexical_index.table_terms(metadata.get("table_name", ""), []) + \
+                lexical_index.tokenize(document or "")
+        return terms, stored
+
+def assemble_database_schema(tables: List[Dict[str, Any]], columns: List[Dict[str, Any]],
+                             constraints: List[Dict[str, Any]], indexes: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Assembles the rows of the bulk information_schema queries into per-table schemas.
+
+    Args:
+        tables: Rows with table_name and row_estimate
+        columns: Rows with table_name, column_name, data_type, is_nullable and column_default,
+            ordered by table and ordinal position
+        constraints: Rows with table_name, constraint_name, constraint_type ('p' or 'f'),
+            column_name, referenced_table and referenced_column, ordered by table, constraint and position
+        indexes: Rows with table_name, index_name, is_unique and column_name, ordered by table, index and position
+
+    Returns:
+        Dictionary of table name to {"columns", "primary_keys", "foreign_keys", "indexes", "row_estimate"}.
+        Columns have the same keys as get_table_schema returns; foreign keys use the
+        constrained_columns/referred_table/referred_columns keys of SQLAlchemy's inspector.
+    """
+    schema = {}
+    for row in tables:
+        estimate = row.get("row_estimate")
+        schema[row["table_name"]] = {
+            "columns": [],
+            "primary_keys": [],
+            "foreign_keys": [],
+            "indexes": [],
+            # PostgreSQL reports -1 for tables that were never analyzed
+            "row_estimate": int(estimate) if estimate is not None and estimate >= 0 else None
+        }
+
+    for row in columns:
+        table = schema.get(row["table_name"])
+        if table is not None:
+            table["columns"].append({
+                "column_name": row["column_name"],
+                "data_type": row["data_type"],
+                "is_nullable": row["is_nullable"],
+                "column_default": row["column_default"]
+            })
+
+    foreign_keys = {}
+    for row in constraints:
+        table = schema.get(row["table_name"])
+        if table is None:
+            continue
+        if row["constraint_type"] == "p":
+            table["primary_keys"].append(row["column_name"])
+        elif row["constraint_type"] == "f":
+            key = (row["table_name"], row["constraint_name"])
+            if key not in foreign_keys:
+                foreign_keys[key] = {
+                    "name": row["constraint_name"],
+                    "constrained_columns": [],
+                    "referred_table": row["referenced_table"],
+                    "referred_columns": []
+                }
+                table["foreign_keys"].append(foreign_keys[key])
+            foreign_keys[key]["constrained_columns"].append(row["column_name"])
+            foreign_keys[key]["referred_columns"].append(row["referenced_column"])
+
+    table_indexes = {}
+    for row in indexes:
+        table = schema.get(row["table_name"])
+        if table is None:
+            continue
+        key = (row["table_name"], row["index_name"])
+        if key not in table_indexes:
+            table_indexes[key] = {"name": row["index_name"], "columns": [], "unique": bool(row["is_unique"])}
+            table["indexes"].append(table_indexes[key])
+        table_indexes[key]["columns"].append(row["column_name"])
+
+    return schema
+
+def assemble_change_signals(tables: List[Dict[str, Any]], columns: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Assembles per-table change signals from one tables query and one columns query.
+
+    Args:
+        tables: Rows with table_name, row_estimate and optionally update_time
+            (MySQL) or modifications (PostgreSQL rows inserted, updated and deleted)
+        columns: Rows with table_name, column_name and data_type, ordered by table and ordinal position
+
+    Returns:
+        Dictionary of table name to {"schema_fingerprint", "row_estimate", "update_time", "modifications"};
+        values a database does not report are None
+    """
+    table_columns: Dict[str, List[Dict[str, Any]]] = {}
+    for row in columns:
+        table_columns.setdefault(row["table_name"], []).append(row)
+
+    signals = {}
+    for row in tables:
+        estimate = row.get("row_estimate")
+        update_time = row.get("update_time")
+        modifications = row.get("modifications")
+        signals[row["table_name"]] = {
+            "schema_fingerprint": columns_fingerprint(table_columns.get(row["table_name"], [])),
+            "row_estimate": int(estimate) if estimate is not None and estimate >= 0 else None,
+            "update_time": update_time.isoformat() if hasattr(update_time, "isoformat") else update_time,
+            "modifications": int(modifications) if modifications is not None else None
+        }
+    return signals
 
 class MySQLConnector:
     def __init__(self, config: DBConfigOut):
@@ -131,6 +342,16 @@ class MySQLConnector:
         except Exception as e:
             raise DatabaseConnectionError(f"Query execution failed: {str(e)}")
 
+    def fetch_pooled(self, query: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Executes a read query on its own pooled connection, so several threads can fetch at once."""
+        try:
+            with self.engine.connect() as connection:
+                result = connection.execute(text(query), params or {})
+                columns = list(result.keys())
+                return [dict(zip(columns, row)) for row in result.fetchall()]
+        except Exception as e:
+            raise DatabaseConnectionError(f"Query execution failed: {str(e)}")
+
     def insert_data(self, table: str, data: List[Dict[str, Any]]) -> None:
         """Inserts data into a table."""
         if not self.connection:
@@ -166,10 +387,84 @@ class MySQLConnector:
                 ORDINAL_POSITION;
         """
         try:
-            return self.fetch_query(query, {"table_name": table_name, "schema": self.config.db_name})
+            return self.fetch_pooled(query, {"table_name": table_name, "schema": self.config.db_name})
         except Exception as e:
             raise DatabaseConnectionError(f"Failed to get table schema: {str(e)}")
     
+    def get_database_schema(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Retrieves tables, columns, keys, indexes and row estimates of the whole database
+        with one set-based information_schema query each, instead of one query per table.
+        """
+        params = {"schema": self.config.db_name}
+        try:
+            tables = self.fetch_query("""
+                SELECT TABLE_NAME AS table_name, TABLE_ROWS AS row_estimate
+                FROM INFORMATION_SCHEMA.TABLES
+                WHERE TABLE_SCHEMA = :schema
+                ORDER BY TABLE_NAME;
+            """, params)
+            columns = self.fetch_query("""
+                SELECT 
+                    TABLE_NAME AS table_name,
+                    COLUMN_NAME AS column_name,
+                    DATA_TYPE AS data_type,
+                    IS_NULLABLE AS is_nullable,
+                    COLUMN_DEFAULT AS column_default
+                FROM INFORMATION_SCHEMA.COLUMNS
+                WHERE TABLE_SCHEMA = :schema
+                ORDER BY TABLE_NAME, ORDINAL_POSITION;
+            """, params)
+            constraints = self.fetch_query("""
+                SELECT 
+                    TABLE_NAME AS table_name,
+                    CONSTRAINT_NAME AS constraint_name,
+                    CASE WHEN CONSTRAINT_NAME = 'PRIMARY' THEN 'p'
+                         WHEN REFERENCED_TABLE_NAME IS NOT NULL THEN 'f' END AS constraint_type,
+                    COLUMN_NAME AS column_name,
+                    REFERENCED_TABLE_NAME AS referenced_table,
+                    REFERENCED_COLUMN_NAME AS referenced_column
+                FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
+                WHERE TABLE_SCHEMA = :schema
+                    AND (CONSTRAINT_NAME = 'PRIMARY' OR REFERENCED_TABLE_NAME IS NOT NULL)
+                ORDER BY TABLE_NAME, CONSTRAINT_NAME, ORDINAL_POSITION;
+            """, params)
+            indexes = self.fetch_query("""
+                SELECT 
+                    TABLE_NAME AS table_name,
+                    INDEX_NAME AS index_name,
+                    NON_UNIQUE = 0 AS is_unique,
+                    COLUMN_NAME AS column_name
+                FROM INFORMATION_SCHEMA.STATISTICS
+                WHERE TABLE_SCHEMA = :schema
+                ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX;
+            """, params)
+            return assemble_database_schema(tables, columns, constraints, indexes)
+        except Exception as e:
+            raise DatabaseConnectionError(f"Failed to get database schema: {str(e)}")
+    
+    def get_change_signals(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Retrieves cheap per-table change signals (UPDATE_TIME, row estimate, column-list
+        fingerprint) with two information_schema queries.
+        """
+        params = {"schema": self.config.db_name}
+        try:
+            tables = self.fetch_query("""
+                SELECT TABLE_NAME AS table_name, TABLE_ROWS AS row_estimate, UPDATE_TIME AS update_time
+                FROM INFORMATION_SCHEMA.TABLES
+                WHERE TABLE_SCHEMA = :schema;
+            """, params)
+            columns = self.fetch_query("""
+                SELECT TABLE_NAME AS table_name, COLUMN_NAME AS column_name, DATA_TYPE AS data_type
+                FROM INFORMATION_SCHEMA.COLUMNS
+                WHERE TABLE_SCHEMA = :schema
+                ORDER BY TABLE_NAME, ORDINAL_POSITION;
+            """, params)
+            return assemble_change_signals(tables, columns)
+        except Exception as e:
+            raise DatabaseConnectionError(f"Failed to get change signals: {str(e)}")
+    
     def list_tables(self) -> List[str]:
         """Lists all tables in the current database."""
         try:
@@ -260,6 +555,16 @@ class PostgresConnector:
         except Exception as e:
             raise DatabaseConnectionError(f"Query execution failed: {str(e)}")
 
+    def fetch_pooled(self, query: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Executes a read query on its own pooled connection, so several threads can fetch at once."""
+        try:
+            with self.engine.connect() as connection:
+                result = connection.execute(text(query), params or {})
+                columns = list(result.keys())
+                return [dict(zip(columns, row)) for row in result.fetchall()]
+        except Exception as e:
+            raise DatabaseConnectionError(f"Query execution failed: {str(e)}")
+
     def insert_data(self, table: str, data: List[Dict[str, Any]]) -> None:
         """Inserts data into a table."""
         if not self.connection:
@@ -295,10 +600,102 @@ class PostgresConnector:
                 ordinal_position;
         """
         try:
-            return self.fetch_query(query, {"table_name": table_name})
+            return self.fetch_pooled(query, {"table_name": table_name})
         except Exception as e:
             raise DatabaseConnectionError(f"Failed to get table schema: {str(e)}")
     
+    def get_database_schema(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Retrieves tables, columns, keys, indexes and row estimates of the whole database
+        with one set-based catalog query each, instead of one query per table.
+        """
+        params = {"schema": "public"}
+        try:
+            tables = self.fetch_query("""
+                SELECT t.table_name AS table_name, c.reltuples AS row_estimate
+                FROM information_schema.tables t
+                LEFT JOIN pg_namespace n ON n.nspname = t.table_schema
+                LEFT JOIN pg_class c ON c.relnamespace = n.oid AND c.relname = t.table_name
+                WHERE t.table_schema = :schema
+                ORDER BY t.table_name;
+            """, params)
+            columns = self.fetch_query("""
+                SELECT 
+                    table_name AS table_name,
+                    column_name AS column_name, 
+                    data_type AS data_type, 
+                    is_nullable AS is_nullable,
+                    column_default AS column_default
+                FROM information_schema.columns
+                WHERE table_schema = :schema
+                ORDER BY table_name, ordinal_position;
+            """, params)
+            constraints = self.fetch_query("""
+                SELECT 
+                    src.relname AS table_name,
+                    con.conname AS constraint_name,
+                    con.contype AS constraint_type,
+                    att.attname AS column_name,
+                    ref.relname AS referenced_table,
+                    ref_att.attname AS referenced_column
+                FROM pg_constraint con
+                JOIN pg_class src ON src.oid = con.conrelid
+                JOIN pg_namespace n ON n.oid = src.relnamespace
+                CROSS JOIN LATERAL unnest(con.conkey, con.confkey) WITH ORDINALITY AS k(attnum, ref_attnum, ord)
+                JOIN pg_attribute att ON att.attrelid = con.conrelid AND att.attnum = k.attnum
+                LEFT JOIN pg_class ref ON ref.oid = con.confrelid
+                LEFT JOIN pg_attribute ref_att ON ref_att.attrelid = con.confrelid AND ref_att.attnum = k.ref_attnum
+                WHERE n.nspname = :schema AND con.contype IN ('p', 'f')
+                ORDER BY src.relname, con.conname, k.ord;
+            """, params)
+            indexes = self.fetch_query("""
+                SELECT 
+                    t.relname AS table_name,
+                    i.relname AS index_name,
+                    ix.indisunique AS is_unique,
+                    a.attname AS column_name
+                FROM pg_index ix
+                JOIN pg_class t ON t.oid = ix.indrelid
+                JOIN pg_class i ON i.oid = ix.indexrelid
+                JOIN pg_namespace n ON n.oid = t.relnamespace
+                CROSS JOIN LATERAL unnest(ix.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+                JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+                WHERE n.nspname = :schema
+                ORDER BY t.relname, i.relname, k.ord;
+            """, params)
+            return assemble_database_schema(tables, columns, constraints, indexes)
+        except Exception as e:
+            raise DatabaseConnectionError(f"Failed to get database schema: {str(e)}")
+    
+    def get_change_signals(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Retrieves cheap per-table change signals (row estimate, rows modified since the
+        statistics were reset, column-list fingerprint) with two catalog queries.
+        PostgreSQL has no table UPDATE_TIME, so pg_stat_user_tables counters stand in for it.
+        """
+        params = {"schema": "public"}
+        try:
+            tables = self.fetch_query("""
+                SELECT 
+                    t.table_name AS table_name,
+                    c.reltuples AS row_estimate,
+                    s.n_tup_ins + s.n_tup_upd + s.n_tup_del AS modifications
+                FROM information_schema.tables t
+                LEFT JOIN pg_namespace n ON n.nspname = t.table_schema
+                LEFT JOIN pg_class c ON c.relnamespace = n.oid AND c.relname = t.table_name
+                LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+                WHERE t.table_schema = :schema;
+            """, params)
+            columns = self.fetch_query("""
+                SELECT table_name AS table_name, column_name AS column_name, data_type AS data_type
+                FROM information_schema.columns
+                WHERE table_schema = :schema
+                ORDER BY table_name, ordinal_position;
+            """, params)
+            return assemble_change_signals(tables, columns)
+        except Exception as e:
+            raise DatabaseConnectionError(f"Failed to get change signals: {str(e)}")
+    
     def list_tables(self) -> List[str]:
         """Lists all tables in the current database."""
         try:
@@ -0,0 +1,161 @@
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Union
+import os
+import queue
+import threading
+import time
+from app.db.agent_modules import load_agent_module
+
+get_embedding_cache = load_agent_module("embedding_cache").get_embedding_cache
+
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_WAIT_MS = 5
+
+
+class BatchingEncoder:
+    """
+    Sentence encoder shared by the whole process.
+
+    The SentenceTransformer model is loaded on the first encode call instead of at
+    import time, so API workers that never embed anything do not pay for it.
+    Encode calls from concurrent requests are queued and merged by a worker thread
+    into one batched forward pass: the worker takes the first waiting request, then
+    keeps collecting requests for up to max_wait_ms or until max_batch_size texts
+    are waiting. Texts already in the embedding cache never reach the queue.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_ms: float = DEFAULT_MAX_WAIT_MS, cache=None):
+        self.model_name = model_name
+        self.cache = cache
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+        self.stats = {"requests": 0, "texts": 0, "batches": 0, "model_load_seconds": None}
+
+    @property
+    def model(self):
+        """The SentenceTransformer model, loaded on first use."""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    started = time.perf_counter()
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name)
+                    self.stats["model_load_seconds"] = round(time.perf_counter() - started, 3)
+                    print(f"Loaded sentence encoder {self.model_name} in {self.stats['model_load_seconds']}s")
+        return self._model
+
+    def _ensure_worker(self):
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="sentence-encoder", daemon=True)
+                self._worker.start()
+
+    def encode(self, texts: Union[str, List[str]]) -> Union[List[float], List[List[float]]]:
+        """
+        Embed one text or a list of texts.
+
+        Args:
+            texts: A text, or a list of texts
+
+        Returns:
+            The embedding of the text, or one embedding per text in the same order
+        """
+        single = isinstance(texts, str)
+        batch = [texts] if single else list(texts)
+        if not batch:
+            return []
+
+        if self.cache is not None:
+            vectors = [vector.tolist() for vector in self.cache.embed(batch, self._encode_queued)]
+        else:
+            vectors = self._encode_queued(batch)
+        return vectors[0] if single else vectors
+
+    def _encode_queued(self, batch: List[str]) -> List[List[float]]:
+        """Hand texts to the worker and wait for their embeddings."""
+        future: Future = Future()
+        self._ensure_worker()
+        self._queue.put((batch, future))
+        return future.result()
+
+    def _collect(self) -> List[tuple]:
+        """Block for one request, then gather more until the batch is full or the wait is over."""
+        requests = [self._queue.get()]
+        size = len(requests[0][0])
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            requests.append(request)
+            size += len(request[0])
+        return requests
+
+    def _run(self):
+        while True:
+            requests = self._collect()
+            texts = [text for batch, _ in requests for text in batch]
+            try:
+                vectors = self.model.encode(texts, batch_size=self.max_batch_size).tolist()
+            except Exception as e:
+                for _, future in requests:
+                    future.set_exception(e)
+                continue
+
+            self.stats["requests"] += len(requests)
+            self.stats["texts"] += len(texts)
+            self.stats["batches"] += 1
+            start = 0
+            for batch, future in requests:
+                future.set_result(vectors[start:start + len(batch)])
+                start += len(batch)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Model state and how well requests were merged."""
+        batches = self.stats["batches"]
+        return dict(
+            self.stats,
+            model=self.model_name,
+            model_loaded=self._model is not None,
+            queued=self._queue.qsize(),
+            avg_batch_texts=round(self.stats["texts"] / batches, 2) if batches else None,
+            cache=self.cache.metrics() if self.cache is not None else None,
+        )
+
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+
+def get_encoder() -> BatchingEncoder:
+    """
+    Return the process-wide sentence encoder.
+
+    EMBEDDING_MODEL, ENCODER_MAX_BATCH and ENCODER_MAX_WAIT_MS override the defaults;
+    EMBEDDING_CACHE=0 turns the persistent embedding cache off.
+    """
+    global _encoder
+    with _encoder_lock:
+        if _encoder is None:
+            model_name = os.getenv("EMBEDDING_MODEL", DEFAULT_MODEL)
+            cache = None
+            if os.getenv("EMBEDDING_CACHE", "1") != "0":
+                cache = get_embedding_cache(f"sentence-transformers/{model_name}")
+            _encoder = BatchingEncoder(
+                model_name=model_name,
+                max_batch_size=int(os.getenv("ENCODER_MAX_BATCH", DEFAULT_MAX_BATCH_SIZE)),
+                max_wait_ms=float(os.getenv("ENCODER_MAX_WAIT_MS", DEFAULT_MAX_WAIT_MS)),
+                cache=cache,
+            )
+        return _encoder
@@ -5,8 +5,9 @@ from app.core.security import verify_token
 from app.schemas.db import DBConfigCreate, DBConfigOut, DBConnectionTest
 from .models import UserDatabase
 from .connectors import DatabaseConnectorFactory, chroma_manager
-from app.services.metadata_extraction import metadata_extraction_service
+from app.services.extraction_jobs import extraction_job_manager
 from typing import List, Dict, Any
+import asyncio
 
 router = APIRouter(prefix="/db", tags=["db"])
 
@@ -82,10 +83,20 @@ def create_db_config(
 @router.post("/extract-metadata/{config_id}")
 async def extract_and_store_metadata(
     config_id: int,
+    background: bool = False,
+    incremental: bool = False,
     token: dict = Depends(verify_token),
     db: Session = Depends(get_db)
 ):
-    """Extract metadata from external database and store in ChromaDB using Database_Agent_SQL"""
+    """
+    Extract metadata from external database and store in ChromaDB.
+    
+    The extraction runs as a background job. With background=true the job ID is
+    returned at once (poll /db/extract-metadata/jobs/{job_id}); otherwise the
+    request waits for the job without blocking other requests.
+    With incremental=true only tables that changed since the last extraction are
+    extracted again, and tables that no longer exist are removed.
+    """
     try:
         user_id = token.get("user_id")
         
@@ -113,8 +124,17 @@ async def extract_and_store_metadata(
             db_type=db_config.db_type
         )
         
-        # Use the enhanced metadata extraction service
-        result = await metadata_extraction_service.extract_metadata(config_obj, str(user_id))
+        job = extraction_job_manager.submit(config_obj, str(user_id), incremental=incremental)
+        if background:
+            return {
+                "success": True,
+                "status": job["status"],
+                "message": "Metadata refresh started" if incremental else "Metadata extraction started",
+                "job_id": job["job_id"]
+            }
+        
+        # Wait for the job on the event loop instead of blocking it
+        result = await asyncio.wrap_future(extraction_job_manager.future(job["job_id"]))
         
         # Ensure consistent response format
         if result["status"] == "error":
@@ -132,7 +152,10 @@ async def extract_and_store_metadata(
                 "status": "success",
                 "message": result["message"],
                 "metadata": result.get("metadata", []),
-                "extraction_method": result.get("extraction_method", "unknown")
+                "extraction_method": result.get("extraction_method", "unknown"),
+                "changes": result.get("changes"),
+                "dropped": result.get("dropped"),
+                "job_id": job["job_id"]
             }
         
     except HTTPException:
@@ -146,6 +169,21 @@ async def extract_and_store_metadata(
             "metadata": []
         }
 
+@router.get("/extract-metadata/jobs/{job_id}")
+def get_extraction_job(
+    job_id: str,
+    include_metadata: bool = False,
+    token: dict = Depends(verify_token)
+):
+    """Status and progress of a metadata extraction job (and its result once finished)"""
+    job = extraction_job_manager.status(job_id, include_result=include_metadata)
+    if not job or job["user_id"] != str(token.get("user_id")):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Extraction job not found"
+        )
+    return job
+
 @router.post("/default-config", response_model=DBConfigOut)
 def create_default_db_config(
     token: dict = Depends(verify_token),
@@ -283,4 +321,9 @@ def search_metadata(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to search metadata: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@router.get("/chroma-stats")
+def get_chroma_stats(token: dict = Depends(verify_token)):
+    """Open ChromaDB client handles, cache hits and load latency of the API process"""
+    return {"status": "success", "stats": chroma_manager.stats()}
@@ -0,0 +1,92 @@
+import os
+from typing import Any, Dict, List, Optional
+from sqlalchemy.engine import make_url
+from app.core.config import settings
+from app.db.agent_modules import AGENT_DIR, load_agent_module
+
+# Schema fingerprints are computed by the TextToSQL agent (utils/schema_fingerprint.py),
+# so the API and the agent agree on them.
+_fingerprint_module = load_agent_module("schema_fingerprint")
+_cache_backend_module = load_agent_module("cache_backend")
+
+compute_fingerprint = _fingerprint_module.compute_fingerprint
+normalize_type = _fingerprint_module.normalize_type
+fingerprint_key = _fingerprint_module.fingerprint_key
+
+# Driver of the URL the agent builds for each database type (main.py update_config_for_external_db)
+AGENT_DRIVERS = {"mysql": "mysql+pymysql", "postgres": "postgresql"}
+
+
+def shared_cache(reload: bool = True):
+    """
+    The agent's shared cache backend, where it publishes fingerprints and ingest generations.
+
+    Redis when REDIS_URL is set, else the agent's cache file, re-read (when reload is set)
+    if an agent process saved it since the last call.
+    """
+    backend = _cache_backend_module.get_cache_backend(
+        persist_dir=str(AGENT_DIR / os.getenv("CACHE_DIR", "cache")),
+        redis_url=settings.REDIS_URL
+    )
+    if reload:
+        backend.reload()
+    return backend
+
+
+def database_key(config) -> Optional[str]:
+    """
+    Engine key the agent uses for a user database, or None for databases it cannot query.
+
+    Args:
+        config: Database configuration (DBConfigOut)
+    """
+    driver = AGENT_DRIVERS.get(config.db_type)
+    if not driver:
+        return None
+    url = make_url(f"{driver}://{config.db_user}:{config.db_password}@{config.host}:{config.port}/{config.db_name}")
+    return url.render_as_string(hide_password=True)
+
+
+def table_key(config, table_name: str) -> Optional[str]:
+    """Key of a table's fingerprint and ingest generation; the agent uses the database name as schema."""
+    engine_key = database_key(config)
+    return fingerprint_key(engine_key, table_name, config.db_name) if engine_key else None
+
+
+def ingest_generation(config, table_name: str) -> int:
+    """How many times a table was loaded from a CSV, shared with the agent."""
+    key = table_key(config, table_name)
+    return _fingerprint_module.ingest_generation(key, shared_cache()) if key else 0
+
+
+def bump_ingest_generation(config, table_name: str) -> int:
+    """Record that a table was (re)loaded, which changes its fingerprint for the API and the agent."""
+    key = table_key(config, table_name)
+    return _fingerprint_module.bump_ingest_generation(key, shared_cache()) if key else 0
+
+
+def published_fingerprint(config, table_name: str) -> Optional[str]:
+    """Fingerprint the agent last published for a table, without touching the database."""
+    key = table_key(config, table_name)
+    return _fingerprint_module.current_fingerprint(key, shared_cache()) if key else None
+
+
+def published_fingerprints(config) -> Dict[str, str]:
+    """Fingerprints the agent published for every table of a database, without touching the database."""
+    engine_key = database_key(config)
+    if not engine_key:
+        return {}
+    return _fingerprint_module.published_fingerprints(engine_key, config.db_name, shared_cache())
+
+
+def columns_fingerprint(column_info: List[Dict[str, Any]], ingest_generation: int = 0) -> str:
+    """Fingerprint of a table from connector column rows ({"column_name", "data_type"})."""
+    return compute_fingerprint(
+        ((col.get("column_name"), col.get("data_type")) for col in column_info),
+        ingest_generation
+    )
+
+
+def schema_fingerprint(schema: Dict[str, str], ingest_generation: int = 0) -> str:
+    """Fingerprint of a table from a {column name: SQL type} mapping."""
+    return compute_fingerprint(schema.items(), ingest_generation)
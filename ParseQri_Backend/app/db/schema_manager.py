@@ -6,6 +6,8 @@ from sqlalchemy import create_engine, MetaData, Table, Column, inspect
 from sqlalchemy.types import Integer, String, Float, Boolean
 from app.core.exceptions import SchemaGenerationError, DataInsertionError
 from app.db.connectors import DatabaseConnectorFactory, MySQLConnector, PostgresConnector, MongoDBConnector
+from app.db.schema_fingerprint import (schema_fingerprint, ingest_generation, bump_ingest_generation,
+                                        published_fingerprint)
 from app.schemas.db import DBConfigOut
 from app.schemas.data import SchemaMetadata
 import logging
@@ -76,6 +78,60 @@ class UniversalSchemaManager:
         self.db_connector = db_connector
         self.db_type = self._detect_db_type()
         self.schema_cache = {}
+        # Fingerprint of every cached schema; ingest generations are shared with the agent
+        self.schema_fingerprints = {}
+        self.db_config = getattr(db_connector, "config", None)
+    
+    def _cache_schema(self, table_name: str, schema: Dict[str, str]) -> str:
+        """
+        Caches a table schema together with its fingerprint.
+        
+        Args:
+            table_name: Name of the table
+            schema: Dictionary mapping column names to SQL data types
+            
+        Returns:
+            The schema fingerprint
+        """
+        self.schema_cache[table_name] = schema
+        generation = ingest_generation(self.db_config, table_name) if self.db_config else 0
+        fingerprint = schema_fingerprint(schema, generation)
+        self.schema_fingerprints[table_name] = fingerprint
+        return fingerprint
+    
+    def get_schema_fingerprint(self, table_name: str) -> str:
+        """
+        Gets the fingerprint of a table schema.
+        
+        The fingerprint the agent published is used when there is one, so the API
+        and the agent agree; otherwise it is computed from the schema, which is
+        read only when it is not cached.
+        
+        Args:
+            table_name: Name of the table
+            
+        Returns:
+            The schema fingerprint
+        """
+        published = published_fingerprint(self.db_config, table_name) if self.db_config else None
+        if published:
+            return published
+        if table_name not in self.schema_fingerprints:
+            self.get_table_metadata(table_name)
+        return self.schema_fingerprints[table_name]
+    
+    def is_schema_current(self, table_name: str, fingerprint: str) -> bool:
+        """
+        Checks a fingerprint recorded with a cached artifact against the cached schema.
+        
+        Args:
+            table_name: Name of the table
+            fingerprint: Fingerprint recorded with the artifact
+            
+        Returns:
+            True if the table still has the recorded shape
+        """
+        return self.get_schema_fingerprint(table_name) == fingerprint
     
     def _detect_db_type(self):
         """Detect the database type from the connector."""
@@ -174,7 +230,7 @@ class UniversalSchemaManager:
             self.db_connector.execute_query(query)
             
             # Cache the schema for this table
-            self.schema_cache[table_name] = schema
+            self._cache_schema(table_name, schema)
             
             logger.info(f"Created table '{table_name}' with schema: {schema}")
         except Exception as e:
@@ -202,6 +258,12 @@ class UniversalSchemaManager:
                 schema = self.infer_schema_from_csv(csv_path)
                 self.create_table_from_schema(table_name, schema)
             
+            # New rows change the table's fingerprint even when its columns stay the same
+            if self.db_config:
+                bump_ingest_generation(self.db_config, table_name)
+            if table_name in self.schema_cache:
+                self._cache_schema(table_name, self.schema_cache[table_name])
+            
             # Read CSV in chunks and insert
             total_rows = 0
             for chunk in pd.read_csv(csv_path, chunksize=batch_size):
@@ -272,6 +334,11 @@ class UniversalSchemaManager:
                     # Raise error if we can't get column info
                     raise
             
+            # Cache this schema
+            fingerprint = self._cache_schema(table_name, {
+                col.get("column_name"): col.get("data_type") for col in column_info
+            })
+            
             # Create a metadata dictionary that matches SchemaMetadata format
             metadata = {
                 "table_name": table_name,
@@ -280,12 +347,8 @@ class UniversalSchemaManager:
                         "name": col.get("column_name"),
                         "type": col.get("data_type")
                     } for col in column_info
-                ]
-            }
-            
-            # Cache this schema
-            self.schema_cache[table_name] = {
-                col.get("column_name"): col.get("data_type") for col in column_info
+                ],
+                "schema_fingerprint": fingerprint
             }
             
             return metadata
@@ -293,6 +356,36 @@ class UniversalSchemaManager:
             logger.error(f"Error getting table metadata: {e}")
             raise
     
+    def _table_metadata_from_schema(self, table_name: str, table_schema: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Builds table metadata from an entry of the connector's bulk database schema.
+        
+        Args:
+            table_name: Name of the table
+            table_schema: Entry returned by get_database_schema
+            
+        Returns:
+            Dictionary with the same layout as get_table_metadata, plus keys, indexes and row estimate
+        """
+        column_info = table_schema["columns"]
+        fingerprint = self._cache_schema(table_name, {
+            col.get("column_name"): col.get("data_type") for col in column_info
+        })
+        return {
+            "table_name": table_name,
+            "columns": [
+                {
+                    "name": col.get("column_name"),
+                    "type": col.get("data_type")
+                } for col in column_info
+            ],
+            "primary_keys": table_schema.get("primary_keys", []),
+            "foreign_keys": table_schema.get("foreign_keys", []),
+            "indexes": table_schema.get("indexes", []),
+            "row_estimate": table_schema.get("row_estimate"),
+            "schema_fingerprint": fingerprint
+        }
+    
     def get_database_metadata(self) -> Dict[str, Any]:
         """
         Retrieves metadata for all tables in the database.
@@ -301,15 +394,25 @@ class UniversalSchemaManager:
             Dictionary with database metadata
         """
         try:
+            metadata = {
+                "tables": {}
+            }
+            
+            # SQL connectors can return the whole schema in a few set-based queries
+            if hasattr(self.db_connector, "get_database_schema"):
+                try:
+                    database_schema = self.db_connector.get_database_schema()
+                    for table, table_schema in database_schema.items():
+                        metadata["tables"][table] = self._table_metadata_from_schema(table, table_schema)
+                    return metadata
+                except Exception as e:
+                    logger.error(f"Bulk schema extraction failed, falling back to per-table queries: {e}")
+            
             if self.db_type == 'mongodb':
                 tables = self.db_connector.list_collections()
             else:
                 tables = self.db_connector.list_tables()
             
-            metadata = {
-                "tables": {}
-            }
-            
             for table in tables:
                 metadata["tables"][table] = self.get_table_metadata(table)
             
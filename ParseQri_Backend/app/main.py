@@ -15,6 +15,7 @@ from app.routes.api import router
 from app.auth.routes import router as auth_router
 from app.routes.data import router as data_router, global_router as data_global_router, api_router as data_api_router
 from app.db.routes import router as db_router
+from app.services.extraction_jobs import metadata_refresh_scheduler
 
 # OAuth2 scheme for Swagger UI authorization
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
@@ -109,11 +110,15 @@ async def startup_event():
     # Start the input directory watcher in a background thread
     threading.Thread(target=start_watcher, daemon=True).start()
     
+    # Periodically re-extract the metadata of tables that changed in the users' databases
+    metadata_refresh_scheduler.start()
+    
     print("Application startup complete")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Run on application shutdown"""
+    metadata_refresh_scheduler.stop()
     print("Application shutting down")
 
 @app.get("/")
@@ -9,6 +9,7 @@ import os
 from app.auth.routes import router as auth_router
 from app.db.routes import router as db_router
 from app.routes.data import router as data_router
+from app.routes.cache_admin import router as cache_admin_router
 from app.core.security import verify_token
 from app.core.database import get_db
 from sqlalchemy.orm import Session
@@ -20,6 +21,7 @@ router = APIRouter()
 router.include_router(auth_router)
 router.include_router(db_router)
 router.include_router(data_router)
+router.include_router(cache_admin_router)
 
 # Text to SQL router with API prefix
 text_to_sql_router = APIRouter(
@@ -33,6 +35,7 @@ class TextToSQLQuery(BaseModel):
     query: str
     user_id: str = "default_user"
     visualization: bool = False
+    force_retry: bool = False
 
 class TextToSQLResponse(BaseModel):
     answer: str
@@ -99,6 +102,10 @@ async def process_text_to_sql(
         if query_data.user_id:
             cmd.append(f"--user={query_data.user_id}")
             
+        # Skip the agent's cache of recent failures when the user explicitly retries
+        if query_data.force_retry:
+            cmd.append("--force-retry")
+            
         # Add database configuration ID to tell the agent which database to use
         cmd.append(f"--db-id={user_db_config.id}")
         
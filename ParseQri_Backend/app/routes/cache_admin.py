@@ -0,0 +1,118 @@
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, BackgroundTasks, Query
+from fastapi.responses import FileResponse
+from pydantic import BaseModel
+from typing import List, Optional
+from pathlib import Path
+import subprocess
+import tempfile
+import shutil
+import json
+import sys
+import os
+from app.core.config import settings
+from app.core.security import verify_token
+
+# Cache administration for the TextToSQL agent's cache tiers (query, template, negative, llm, history).
+# The agent owns the cache, so every endpoint runs one of its --cache-* CLI commands.
+router = APIRouter(
+    prefix="/admin/cache",
+    tags=["cache-admin"],
+)
+
+AGENT_DIR = Path(__file__).parent.parent.parent / "ParseQri_Agent" / "TextToSQL_Agent"
+RESULT_MARKER = "Cache Admin Result:"
+
+class CacheInvalidateRequest(BaseModel):
+    user_id: Optional[str] = None
+    table_name: Optional[str] = None
+    tiers: Optional[List[str]] = None
+
+def require_cache_admin(token: dict = Depends(verify_token)) -> dict:
+    """Allow only users listed in CACHE_ADMIN_USERS."""
+    user_id = str(token.get("user_id") or token.get("sub") or "")
+    admins = [u.strip() for u in (settings.CACHE_ADMIN_USERS or "").split(",") if u.strip()]
+    if not admins:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Cache administration is disabled. Set CACHE_ADMIN_USERS to enable it."
+        )
+    if user_id not in admins:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not a cache administrator")
+    return token
+
+def run_cache_command(args: List[str]) -> dict:
+    """Run a --cache-* command of the agent and return its JSON result."""
+    cmd = [sys.executable, str(AGENT_DIR / "main.py")] + args
+
+    # Point the agent at the same shared cache tier as the API
+    env = dict(os.environ)
+    if settings.REDIS_URL:
+        env["REDIS_URL"] = settings.REDIS_URL
+    # Snapshots are signed, so nodes sharing SECRET_KEY can import each other's exports
+    env.setdefault("CACHE_SNAPSHOT_KEY", settings.SECRET_KEY)
+
+    print(f"Running command: {' '.join(cmd)}")
+    process = subprocess.run(cmd, cwd=str(AGENT_DIR), text=True, capture_output=True, env=env)
+
+    marker = process.stdout.rfind(RESULT_MARKER)
+    if process.returncode != 0 or marker == -1:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Agent error: {process.stderr or process.stdout[-500:]}"
+        )
+
+    result = json.loads(process.stdout[marker + len(RESULT_MARKER):])
+    if "error" in result:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=result["error"])
+    return result
+
+def scope_args(user_id: Optional[str], tiers: Optional[List[str]]) -> List[str]:
+    """CLI arguments selecting the user and tiers a command applies to."""
+    args = [f"--user={user_id}"] if user_id else ["--all-users"]
+    for tier in tiers or []:
+        args.append(f"--cache-tier={tier}")
+    return args
+
+@router.get("/stats")
+async def get_cache_stats(token: dict = Depends(require_cache_admin)):
+    """Hit/miss ratios, entry counts, byte sizes, evictions and hot keys per cache tier."""
+    return run_cache_command(["--cache-stats", "--all-users"])["stats"]
+
+@router.post("/invalidate")
+async def invalidate_cache(request: CacheInvalidateRequest, token: dict = Depends(require_cache_admin)):
+    """Remove cache entries for a user and/or a table."""
+    args = ["--cache-invalidate"] + scope_args(request.user_id, request.tiers)
+    if request.table_name:
+        args.append(f"--table={request.table_name}")
+    return run_cache_command(args)
+
+@router.get("/export")
+async def export_cache(
+    background_tasks: BackgroundTasks,
+    user_id: Optional[str] = None,
+    tier: Optional[List[str]] = Query(None),
+    token: dict = Depends(require_cache_admin)
+):
+    """Download a cache snapshot, e.g. to warm a new node."""
+    snapshot_dir = tempfile.mkdtemp(prefix="cache_export_")
+    snapshot_path = os.path.join(snapshot_dir, "cache_snapshot.bin")
+    background_tasks.add_task(shutil.rmtree, snapshot_dir, True)
+
+    run_cache_command([f"--cache-export={snapshot_path}"] + scope_args(user_id, tier))
+    return FileResponse(snapshot_path, filename="cache_snapshot.bin", media_type="application/octet-stream")
+
+@router.post("/import")
+async def import_cache(
+    file: UploadFile = File(...),
+    tier: Optional[List[str]] = Query(None),
+    token: dict = Depends(require_cache_admin)
+):
+    """Load a cache snapshot produced by the export endpoint; unsigned or tampered files are rejected."""
+    snapshot_dir = tempfile.mkdtemp(prefix="cache_import_")
+    try:
+        snapshot_path = os.path.join(snapshot_dir, "cache_snapshot.bin")
+        with open(snapshot_path, "wb") as buffer:
+            shutil.copyfileobj(file.file, buffer)
+        return run_cache_command([f"--cache-import={snapshot_path}"] + scope_args(None, tier))
+    finally:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
@@ -5,6 +5,7 @@ from app.core.security import verify_token
 from app.db.models import UserDatabase
 from app.db.connectors import DatabaseConnectorFactory
 from app.db.schema_manager import SchemaManager
+from app.db.schema_fingerprint import published_fingerprints
 from app.schemas.db import DBConfigOut
 from app.schemas.data import SchemaMetadata, ColumnMetadata
 import os
@@ -399,5 +400,55 @@ def get_schema(
             detail=f"Failed to retrieve schema: {str(e)}"
         )
 
+@router.get("/schema-fingerprints/{db_id}")
+def get_schema_fingerprints(
+    db_id: int,
+    token: dict = Depends(verify_token),
+    db: Session = Depends(get_db)
+):
+    """
+    Get the schema fingerprint of every table, so clients can validate cached schemas.
+
+    The fingerprints are the ones the agent published in the shared cache, read
+    without touching the database; the database is inspected only when the agent
+    has not fingerprinted any of its tables yet.
+    """
+    try:
+        user_id = token.get("user_id")
+        db_config = db.query(UserDatabase).filter(UserDatabase.id == db_id, UserDatabase.user_id == user_id).first()
+        if not db_config:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Database config not found")
+
+        config = DBConfigOut(
+            id=db_config.id,
+            user_id=db_config.user_id,
+            db_type=db_config.db_type,
+            host=db_config.host,
+            port=db_config.port,
+            db_name=db_config.db_name,
+            db_user=db_config.db_user,
+            db_password=db_config.db_password
+        )
+        fingerprints = published_fingerprints(config)
+        if not fingerprints:
+            connector = DatabaseConnectorFactory.create_connector(config)
+            try:
+                metadata = SchemaManager(connector).get_database_metadata()
+            finally:
+                connector.close()
+            fingerprints = {
+                table: table_metadata.get("schema_fingerprint")
+                for table, table_metadata in metadata["tables"].items()
+            }
+
+        return {"db_id": db_id, "fingerprints": fingerprints}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to compute schema fingerprints: {str(e)}"
+        )
+
 # Export all routers
 __all__ = ['router', 'global_router', 'api_router']
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from app.schemas.db import DBType
 
 class ColumnMetadata(BaseModel):
@@ -11,5 +11,6 @@ class ColumnMetadata(BaseModel):
 class SchemaMetadata(BaseModel):
     table_name: str
     columns: List[ColumnMetadata]
+    schema_fingerprint: Optional[str] = None
     
     model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
@@ -5,5 +5,6 @@ Contains service classes for various business logic operations.
 """
 
 from .metadata_extraction import metadata_extraction_service
+from .extraction_jobs import extraction_job_manager, metadata_refresh_scheduler
 
-__all__ = ["metadata_extraction_service"] 
\ No newline at end of file
+__all__ = ["metadata_extraction_service", "extraction_job_manager", "metadata_refresh_scheduler"] 
\ No newline at end of file
@@ -0,0 +1,273 @@
+"""
+Extraction Jobs
+
+Runs metadata extraction as background jobs and keeps their status, so a
+request for a large database returns at once and the client polls for the
+result instead of holding a connection open for the whole extraction.
+MetadataRefreshScheduler periodically queues incremental refreshes of every
+configured database, which only re-extract the tables that changed. It is
+opt-in (METADATA_REFRESH_INTERVAL), and with several uvicorn workers only the
+one holding the scheduler lock file runs it.
+"""
+
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: every worker schedules refreshes
+    fcntl = None
+
+from app.core.database import SessionLocal
+from app.db.models import UserDatabase
+from app.schemas.db import DBConfigOut
+from app.services.metadata_extraction import metadata_extraction_service
+
+# Databases extracted at the same time; each job fetches its tables on its own pool
+MAX_CONCURRENT_JOBS = int(os.getenv("EXTRACTION_JOBS", "2"))
+# Finished jobs kept for status requests
+MAX_FINISHED_JOBS = 200
+# Seconds between scheduled incremental refreshes of every configured database (0, the default, turns them off)
+METADATA_REFRESH_INTERVAL = float(os.getenv("METADATA_REFRESH_INTERVAL", "0"))
+# File whose lock elects the one worker process that schedules refreshes
+METADATA_REFRESH_LOCK = os.getenv("METADATA_REFRESH_LOCK", os.path.join("data", "metadata_refresh.lock"))
+
+
+class ExtractionJobManager:
+    """
+    Queue of metadata extraction jobs with their status and results.
+    """
+
+    def __init__(self, service=metadata_extraction_service, max_concurrent_jobs: int = MAX_CONCURRENT_JOBS,
+                 max_finished_jobs: int = MAX_FINISHED_JOBS):
+        """
+        Initialize the job manager.
+
+        Args:
+            service: Metadata extraction service that runs the jobs
+            max_concurrent_jobs: Jobs that run at the same time; the rest wait in the queue
+            max_finished_jobs: Finished jobs kept before the oldest are forgotten
+        """
+        self.service = service
+        self.max_finished_jobs = max_finished_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix="metadata-extraction")
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._futures: Dict[str, Future] = {}
+
+    def submit(self, config: DBConfigOut, user_id: str, incremental: bool = False) -> Dict[str, Any]:
+        """
+        Queue the extraction of a database.
+
+        Args:
+            config: Database configuration
+            user_id: User identifier
+            incremental: Only re-extract the tables that changed since the last extraction
+
+        Returns:
+            Status of the new job
+        """
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "user_id": str(user_id),
+            "config_id": config.id,
+            "kind": "refresh" if incremental else "extract",
+            "status": "queued",
+            "stage": None,
+            "progress": {"done": 0, "total": None},
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._forget_finished()
+            self._futures[job_id] = self._executor.submit(self._run, job_id, config, str(user_id), incremental)
+        return self.status(job_id)
+
+    def _run(self, job_id: str, config: DBConfigOut, user_id: str, incremental: bool = False) -> Dict[str, Any]:
+        self._update(job_id, status="running", started_at=time.time())
+
+        def progress(stage: str, done: int, total: int):
+            self._update(job_id, stage=stage, progress={"done": done, "total": total})
+
+        try:
+            run = self.service.refresh_metadata_sync if incremental else self.service.extract_metadata_sync
+            result = run(config, user_id, progress=progress)
+        except Exception as e:
+            print(f"Metadata extraction job {job_id} failed: {e}")
+            self._update(job_id, status="failed", error=str(e), finished_at=time.time())
+            raise
+        failed = result.get("status") == "error"
+        self._update(
+            job_id,
+            status="failed" if failed else "succeeded",
+            error=result.get("message") if failed else None,
+            result=result,
+            finished_at=time.time()
+        )
+        return result
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def _forget_finished(self):
+        """Drop the oldest finished jobs beyond max_finished_jobs; the caller holds the lock."""
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] in ("succeeded", "failed")]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+            self._futures.pop(job_id, None)
+
+    def active_job(self, config_id: int) -> Optional[str]:
+        """ID of a queued or running job of a database configuration, if there is one."""
+        with self._lock:
+            for job_id, job in self._jobs.items():
+                if job["config_id"] == config_id and job["status"] in ("queued", "running"):
+                    return job_id
+        return None
+
+    def future(self, job_id: str) -> Optional[Future]:
+        """Future of a job, resolved with the extraction result."""
+        with self._lock:
+            return self._futures.get(job_id)
+
+    def status(self, job_id: str, include_result: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Status of a job.
+
+        Args:
+            job_id: Job identifier
+            include_result: Include the extracted metadata of a finished job
+
+        Returns:
+            Job status, or None for unknown (or forgotten) jobs
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            status = dict(job, progress=dict(job["progress"]))
+        if not include_result:
+            status.pop("result")
+        elapsed_from = status["started_at"] or status["created_at"]
+        status["elapsed_seconds"] = round((status["finished_at"] or time.time()) - elapsed_from, 3)
+        return status
+
+
+class MetadataRefreshScheduler:
+    """
+    Background thread that queues an incremental refresh of every configured
+    MySQL and PostgreSQL database at a fixed interval, skipping databases that
+    already have a job.
+    
+    Every uvicorn worker creates a scheduler, so the thread only starts in the
+    worker that takes the lock file without waiting; it holds the lock until stop().
+    """
+
+    def __init__(self, manager: ExtractionJobManager, interval: float = METADATA_REFRESH_INTERVAL,
+                 lock_path: str = METADATA_REFRESH_LOCK):
+        """
+        Initialize the scheduler.
+
+        Args:
+            manager: Job manager the refreshes are queued on
+            interval: Seconds between two rounds of refreshes (0 turns the scheduler off)
+            lock_path: Lock file held by the worker that runs the scheduler
+        """
+        self.manager = manager
+        self.interval = interval
+        self.lock_path = lock_path
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock_file = None
+
+    def _acquire_leadership(self) -> bool:
+        """Take the scheduler lock file unless another worker holds it."""
+        if fcntl is None:
+            return True
+        try:
+            os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+            self._lock_file = open(self.lock_path, "a")
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+            return False
+
+    def start(self):
+        """Start the scheduler thread, unless it is turned off, already running or run by another worker."""
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        if self._lock_file is None and not self._acquire_leadership():
+            print("Metadata refresh is scheduled by another worker")
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="metadata-refresh", daemon=True)
+        self._thread.start()
+        print(f"Metadata refresh scheduled every {self.interval:g} seconds")
+
+    def stop(self):
+        """Stop the scheduler thread and hand the lock to another worker; queued jobs still run."""
+        self._stop.set()
+        if self._lock_file is not None:
+            # Closing the file releases the lock
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _loop(self):
+        # The first round waits one interval, so startup is not slowed by catalog queries
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Error scheduling metadata refresh: {e}")
+
+    def run_once(self) -> int:
+        """
+        Queue an incremental refresh of every configured database.
+
+        Returns:
+            Number of jobs queued
+        """
+        db = SessionLocal()
+        try:
+            configs = db.query(UserDatabase).all()
+        finally:
+            db.close()
+
+        queued = 0
+        for db_config in configs:
+            # MongoDB has no cheap change signals, so it is only extracted on request
+            if db_config.db_type not in ("mysql", "postgres") or self.manager.active_job(db_config.id):
+                continue
+            config = DBConfigOut(
+                id=db_config.id,
+                user_id=db_config.user_id,
+                host=db_config.host,
+                port=db_config.port,
+                db_name=db_config.db_name,
+                db_user=db_config.db_user,
+                db_password=db_config.db_password,
+                db_type=db_config.db_type
+            )
+            self.manager.submit(config, str(db_config.user_id), incremental=True)
+            queued += 1
+        return queued
+
+
+# Create singleton instances
+extraction_job_manager = ExtractionJobManager()
+metadata_refresh_scheduler = MetadataRefreshScheduler(extraction_job_manager)
@@ -8,7 +8,8 @@ Provides enhanced metadata extraction capabilities with schema analysis.
 import sys
 import os
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import asyncio
 from sqlalchemy import create_engine, inspect
 
@@ -19,6 +20,53 @@ SchemaAnalyzer = None
 
 from app.schemas.db import DBConfigOut
 from app.db.connectors import DatabaseConnectorFactory, chroma_manager
+from app.db.schema_fingerprint import columns_fingerprint
+
+# Tables (or MongoDB collections) whose schemas are fetched at the same time
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "8"))
+# Changed tables from which a refresh pulls the whole schema in bulk instead of table by table
+BULK_REFRESH_TABLES = int(os.getenv("BULK_REFRESH_TABLES", "20"))
+# Relative change of a table's row estimate that counts as a data change
+ROW_ESTIMATE_TOLERANCE = 0.1
+
+
+def table_change_reason(stored: Optional[Dict[str, Any]], current: Dict[str, Any],
+                        row_tolerance: float = ROW_ESTIMATE_TOLERANCE) -> Optional[str]:
+    """
+    Compare the stored change signals of a table with its current ones.
+    
+    Args:
+        stored: Signals recorded at the last extraction (None for tables never extracted)
+        current: Signals just read from the database
+        row_tolerance: Relative row estimate change that counts as changed data
+            (estimates drift even when nothing is written)
+        
+    Returns:
+        Why the table needs to be extracted again ("new", "schema", "no_baseline",
+        "updated", "rows"), or None when it is unchanged
+    """
+    if stored is None:
+        return "new"
+    if stored.get("schema_fingerprint") != current.get("schema_fingerprint"):
+        return "schema"
+    
+    compared = False
+    for signal in ("update_time", "modifications"):
+        if current.get(signal) is None:
+            continue
+        if stored.get(signal) is None:
+            return "no_baseline"
+        if stored[signal] != current[signal]:
+            return "updated"
+        compared = True
+    
+    old_rows, new_rows = stored.get("row_estimate"), current.get("row_estimate")
+    if new_rows is not None:
+        if old_rows is None:
+            return None if compared else "no_baseline"
+        if abs(new_rows - old_rows) > row_tolerance * max(old_rows, 1):
+            return "rows"
+    return None
 
 
 class MetadataExtractionService:
@@ -30,23 +78,50 @@ class MetadataExtractionService:
     - Relationship detection
     - Column type analysis
     - Data quality insights
+    
+    Extraction is blocking work (database round trips, embeddings), so it runs
+    on worker threads: extract_metadata hands it off instead of running it on
+    the event loop, and per-table schema queries run in parallel over the
+    connector's connection pool.
     """
     
-    def __init__(self):
-        """Initialize the metadata extraction service."""
+    def __init__(self, max_workers: int = EXTRACTION_WORKERS):
+        """
+        Initialize the metadata extraction service.
+        
+        Args:
+            max_workers: Tables whose schemas are fetched at the same time
+        """
         self.schema_agent = None
         self.database_agent = None
+        self.max_workers = max_workers
         
         # Initialize agents if available (currently disabled)
         # The Database_Agent_SQL module is not available, so we'll use the connector approach only
     
     async def extract_metadata(self, config: DBConfigOut, user_id: str) -> Dict[str, Any]:
         """
-        Extract comprehensive metadata from a database.
+        Extract comprehensive metadata from a database without blocking the event loop.
+        
+        Args:
+            config: Database configuration
+            user_id: User identifier
+            
+        Returns:
+            Dictionary containing extracted metadata
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.extract_metadata_sync, config, user_id)
+    
+    def extract_metadata_sync(self, config: DBConfigOut, user_id: str,
+                              progress: Optional[Callable[[str, int, int], None]] = None) -> Dict[str, Any]:
+        """
+        Extract comprehensive metadata from a database on the calling thread.
         
         Args:
             config: Database configuration
             user_id: User identifier
+            progress: Called with (stage, done, total) as tables are extracted and stored
             
         Returns:
             Dictionary containing extracted metadata
@@ -66,14 +141,17 @@ class MetadataExtractionService:
             # Extract metadata using connector approach
             metadata_extracted = []
             
+            signals = None
             try:
                 if config.db_type in ["mysql", "postgres"]:
+                    # Read the change signals first, so writes made during extraction show up at the next refresh
+                    signals = self._read_change_signals(connector)
                     # Use direct connector approach
-                    metadata_extracted = await self._extract_with_connector(connector, config)
+                    metadata_extracted = self._extract_with_connector(connector, config, progress)
                     
                 elif config.db_type == "mongodb":
                     # MongoDB extraction
-                    metadata_extracted = await self._extract_mongodb_metadata(connector, config)
+                    metadata_extracted = self._extract_mongodb_metadata(connector, config, progress)
                 else:
                     print(f"Warning: Unsupported database type: {config.db_type}")
                     return {
@@ -89,9 +167,13 @@ class MetadataExtractionService:
                     "metadata": []
                 }
             
-            # Store metadata in ChromaDB
+            # Store metadata in ChromaDB, embedded and upserted in one batch
             try:
-                await self._store_metadata_in_chroma(user_id, config, metadata_extracted)
+                if progress:
+                    progress("storing", 0, len(metadata_extracted))
+                self._store_metadata_in_chroma(user_id, config, metadata_extracted, signals)
+                if progress:
+                    progress("storing", len(metadata_extracted), len(metadata_extracted))
             except Exception as e:
                 print(f"Warning: Failed to store metadata in ChromaDB: {str(e)}")
                 # Continue with the process even if ChromaDB storage fails
@@ -116,55 +198,200 @@ class MetadataExtractionService:
                 "metadata": []
             }
     
-    async def _extract_with_connector(self, connector, config: DBConfigOut) -> List[Dict[str, Any]]:
+    def refresh_metadata_sync(self, config: DBConfigOut, user_id: str,
+                              progress: Optional[Callable[[str, int, int], None]] = None) -> Dict[str, Any]:
+        """
+        Bring stored metadata up to date, extracting and embedding only the tables that changed.
+        
+        Each table's cheap change signals (UPDATE_TIME or modification counters, row
+        estimate, column-list fingerprint) are compared with the ones stored at the last
+        extraction. Changed and new tables are extracted again and re-embedded, tables
+        that no longer exist are deleted, and unchanged tables are left alone.
+        MongoDB has no such signals, so it is extracted in full.
+        
+        Args:
+            config: Database configuration
+            user_id: User identifier
+            progress: Called with (stage, done, total) as tables are extracted and stored
+            
+        Returns:
+            Dictionary with the metadata of the refreshed tables, "changes" (table name to
+            reason), "dropped" (deleted tables) and "unchanged" (number of tables skipped)
+        """
+        if config.db_type not in ["mysql", "postgres"]:
+            return self.extract_metadata_sync(config, user_id, progress)
+        
+        try:
+            connector = DatabaseConnectorFactory.create_connector(config)
+        except Exception as e:
+            print(f"Error creating database connector: {str(e)}")
+            return {
+                "status": "error",
+                "message": f"Failed to connect to database: {str(e)}",
+                "metadata": []
+            }
+        
+        try:
+            current = connector.get_change_signals()
+            stored = chroma_manager.get_table_signals(user_id, config.db_type, config.db_name)
+            
+            changes = {}
+            for table_name, signals in current.items():
+                reason = table_change_reason(stored.get(table_name), signals)
+                if reason:
+                    changes[table_name] = reason
+            dropped = sorted(set(stored) - set(current))
+            
+            metadata_extracted = []
+            if changes:
+                metadata_extracted = self._extract_with_connector(connector, config, progress, tables=list(changes))
+                if progress:
+                    progress("storing", 0, len(metadata_extracted))
+                self._store_metadata_in_chroma(user_id, config, metadata_extracted, current)
+                if progress:
+                    progress("storing", len(metadata_extracted), len(metadata_extracted))
+            chroma_manager.delete_tables_metadata(user_id, config.db_type, config.db_name, dropped)
+        except Exception as e:
+            print(f"Error refreshing metadata: {str(e)}")
+            return {
+                "status": "error",
+                "message": f"Failed to refresh metadata: {str(e)}",
+                "metadata": []
+            }
+        finally:
+            try:
+                connector.close()
+            except Exception as e:
+                print(f"Warning: Failed to close database connection: {str(e)}")
+        
+        print(f"Metadata refresh of {config.db_name} for user {user_id}: "
+              f"{len(changes)} changed, {len(dropped)} dropped, {len(current) - len(changes)} unchanged")
+        return {
+            "status": "success",
+            "message": f"Metadata refreshed for {len(changes)} changed tables, {len(dropped)} dropped tables removed",
+            "metadata": metadata_extracted,
+            "changes": changes,
+            "dropped": dropped,
+            "unchanged": len(current) - len(changes),
+            "extraction_method": "incremental"
+        }
+    
+    def _read_change_signals(self, connector) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Change signals of every table, or None when the database does not provide them"""
+        try:
+            return connector.get_change_signals()
+        except Exception as e:
+            print(f"Warning: Could not read change signals, the next refresh will extract every table: {str(e)}")
+            return None
+    
+    def _map_parallel(self, fetch: Callable[[str], Any], names: List[str], stage: str,
+                      progress: Optional[Callable[[str, int, int], None]] = None) -> List[Any]:
+        """
+        Run fetch for every name on a bounded thread pool.
+        
+        Args:
+            fetch: Blocking function of one table or collection name
+            names: Table or collection names
+            stage: Stage name reported to progress
+            progress: Called with (stage, done, total) as names finish
+            
+        Returns:
+            Results in the order of names
+        """
+        if not names:
+            return []
+        done = 0
+        results = [None] * len(names)
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(names)))) as pool:
+            futures = {pool.submit(fetch, name): i for i, name in enumerate(names)}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                done += 1
+                if progress:
+                    progress(stage, done, len(names))
+        return results
+    
+    def _extract_with_connector(self, connector, config: DBConfigOut,
+                                progress: Optional[Callable[[str, int, int], None]] = None,
+                                tables: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """
         Extract metadata using database connector (fallback method).
         
         Args:
             connector: Database connector
             config: Database configuration
+            progress: Called with (stage, done, total) as tables are extracted
+            tables: Extract only these tables (defaults to every table)
             
         Returns:
             List of table metadata
         """
         metadata_extracted = []
         
-        # Get all tables
-        tables = connector.list_tables()
+        # Pull the whole schema in a handful of set-based queries instead of one query per table,
+        # unless only a few tables are wanted
+        if hasattr(connector, "get_database_schema") and (tables is None or len(tables) >= BULK_REFRESH_TABLES):
+            try:
+                database_schema = connector.get_database_schema()
+                wanted = set(tables) if tables is not None else None
+                for table_name, table_schema in database_schema.items():
+                    if wanted is not None and table_name not in wanted:
+                        continue
+                    metadata_extracted.append({
+                        "table_name": table_name,
+                        "column_count": len(table_schema["columns"]),
+                        "columns": table_schema["columns"],
+                        "primary_keys": table_schema["primary_keys"],
+                        "foreign_keys": table_schema["foreign_keys"],
+                        "relationships": self._analyze_table_relationships(table_name, table_schema["foreign_keys"]),
+                        "indexes": table_schema["indexes"],
+                        "row_estimate": table_schema["row_estimate"],
+                        "schema_fingerprint": columns_fingerprint(table_schema["columns"]),
+                        "extraction_method": "connector_bulk"
+                    })
+                if progress:
+                    progress("extracting", len(metadata_extracted), len(metadata_extracted))
+                return metadata_extracted
+            except Exception as e:
+                print(f"Warning: Bulk schema extraction failed, falling back to per-table queries: {str(e)}")
+                metadata_extracted = []
         
-        for table_name in tables:
-            # Get table schema
-            schema_info = connector.get_table_schema(table_name)
-            
+        # Get all tables, then their schemas in parallel over pooled connections
+        if tables is None:
+            tables = connector.list_tables()
+        schemas = self._map_parallel(connector.get_table_schema, tables, "extracting", progress)
+        
+        for table_name, schema_info in zip(tables, schemas):
             metadata_extracted.append({
                 "table_name": table_name,
                 "column_count": len(schema_info),
                 "columns": schema_info,
+                "schema_fingerprint": columns_fingerprint(schema_info),
                 "extraction_method": "connector"
             })
         
         return metadata_extracted
     
-    async def _extract_mongodb_metadata(self, connector, config: DBConfigOut) -> List[Dict[str, Any]]:
+    def _extract_mongodb_metadata(self, connector, config: DBConfigOut,
+                                  progress: Optional[Callable[[str, int, int], None]] = None) -> List[Dict[str, Any]]:
         """
         Extract metadata from MongoDB.
         
         Args:
             connector: MongoDB connector
             config: Database configuration
+            progress: Called with (stage, done, total) as collections are sampled
             
         Returns:
             List of collection metadata
         """
         metadata_extracted = []
         
-        # Get all collections
+        # Get all collections, then sample them in parallel (MongoClient is thread-safe and pooled)
         collections = connector.list_collections()
+        schemas = self._map_parallel(connector.get_collection_schema, collections, "extracting", progress)
         
-        for collection_name in collections:
-            # Get collection schema
-            schema_info = connector.get_collection_schema(collection_name)
-            
+        for collection_name, schema_info in zip(collections, schemas):
             metadata_extracted.append({
                 "collection_name": collection_name,
                 "field_count": len(schema_info),
@@ -174,8 +401,9 @@ class MetadataExtractionService:
         
         return metadata_extracted
     
-    async def _store_metadata_in_chroma(self, user_id: str, config: DBConfigOut, 
-                                       metadata_extracted: List[Dict[str, Any]]) -> None:
+    def _store_metadata_in_chroma(self, user_id: str, config: DBConfigOut, 
+                                 metadata_extracted: List[Dict[str, Any]],
+                                 signals: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
         """
         Store extracted metadata in ChromaDB.
         
@@ -183,20 +411,24 @@ class MetadataExtractionService:
             user_id: User identifier
             config: Database configuration
             metadata_extracted: List of extracted metadata
+            signals: Change signals of the tables, kept for incremental refreshes
         """
         try:
+            tables = {}
             for metadata in metadata_extracted:
                 table_name = metadata.get("table_name") or metadata.get("collection_name")
                 
                 if table_name:
-                    # Store in ChromaDB
-                    chroma_manager.store_table_metadata(
-                        user_id=user_id,
-                        source_type=config.db_type,
-                        source_name=config.db_name,
-                        table_name=table_name,
-                        schema_info={"columns": metadata.get("columns", metadata.get("fields", []))}
-                    )
+                    tables[table_name] = {"columns": metadata.get("columns", metadata.get("fields", []))}
+            
+            # Store in ChromaDB, all tables embedded in one batch
+            chroma_manager.store_tables_metadata(
+                user_id=user_id,
+                source_type=config.db_type,
+                source_name=config.db_name,
+                tables=tables,
+                signals=signals
+            )
         except Exception as e:
             print(f"Warning: Could not store metadata in ChromaDB: {e}")
     
@@ -0,0 +1,51 @@
+"""
+Tests for the change signals of incremental metadata refreshes.
+"""
+import datetime
+import pytest
+
+# The connectors module imports every database driver
+pytest.importorskip("mysql.connector")
+pytest.importorskip("psycopg2")
+pytest.importorskip("pymongo")
+
+from app.db.connectors import assemble_change_signals
+from app.services.metadata_extraction import table_change_reason
+
+COLUMNS = [
+    {"table_name": "sales", "column_name": "id", "data_type": "int"},
+    {"table_name": "sales", "column_name": "state", "data_type": "varchar"},
+    {"table_name": "stock", "column_name": "id", "data_type": "int"},
+]
+
+
+def test_signals_are_assembled_per_table():
+    updated = datetime.datetime(2024, 5, 1, 12, 0)
+    signals = assemble_change_signals([
+        {"table_name": "sales", "row_estimate": 120, "update_time": updated},
+        {"table_name": "stock", "row_estimate": -1, "modifications": 7},
+    ], COLUMNS)
+
+    assert signals["sales"]["update_time"] == "2024-05-01T12:00:00"
+    assert signals["sales"]["row_estimate"] == 120
+    assert signals["sales"]["modifications"] is None
+    # PostgreSQL reports -1 for tables that were never analyzed
+    assert signals["stock"]["row_estimate"] is None
+    assert signals["stock"]["modifications"] == 7
+    assert signals["sales"]["schema_fingerprint"] != signals["stock"]["schema_fingerprint"]
+    retyped = assemble_change_signals([{"table_name": "sales"}], [dict(COLUMNS[0]), dict(COLUMNS[1], data_type="text")])
+    assert retyped["sales"]["schema_fingerprint"] != signals["sales"]["schema_fingerprint"]
+
+
+def test_change_reasons():
+    stored = {"schema_fingerprint": "a", "update_time": "2024-05-01T12:00:00", "modifications": None, "row_estimate": 100}
+
+    assert table_change_reason(None, stored) == "new"
+    assert table_change_reason(stored, dict(stored, schema_fingerprint="b")) == "schema"
+    assert table_change_reason(stored, dict(stored, update_time="2024-05-02T08:00:00")) == "updated"
+    assert table_change_reason(stored, dict(stored, modifications=3)) == "no_baseline"
+    assert table_change_reason(stored, dict(stored)) is None
+    # Row estimates drift a little even when nothing is written
+    assert table_change_reason(stored, dict(stored, row_estimate=105)) is None
+    assert table_change_reason(stored, dict(stored, row_estimate=150)) == "rows"
+    assert table_change_reason({"schema_fingerprint": "a"}, {"schema_fingerprint": "a", "row_estimate": 10}) == "no_baseline"